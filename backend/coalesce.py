@@ -0,0 +1,125 @@
+"""Single-flight coalescing of concurrent identical requests.
+
+Bursty typing, client retries and several suggestion panels refreshing for
+the same note routinely issue the same AI request more than once within a
+second.  :class:`SingleFlight` lets the first caller for a key start the work
+and every concurrent caller with the same key await that one in-flight
+task instead of starting its own.
+
+Waiters are reference counted: a caller that goes away (cancelled request,
+closed WebSocket) only cancels the shared task when it was the last one still
+waiting.  Results and exceptions are delivered to every waiter, so callers
+must treat the returned value as shared and not mutate it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Generic, Optional, TypeVar
+
+import structlog
+from prometheus_client import REGISTRY, Counter, Gauge
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+
+def _get_or_create_metric(metric_cls, name: str, documentation: str, labelnames, **kwargs):
+    existing = REGISTRY._names_to_collectors.get(name)
+    if existing is not None:
+        return existing
+    return metric_cls(name, documentation, labelnames=labelnames, **kwargs)
+
+
+COALESCED_CALLS = _get_or_create_metric(
+    Counter,
+    "revenuepilot_coalesced_calls_total",
+    "Calls answered by joining an identical in-flight request",
+    ("route",),
+)
+INFLIGHT_CALLS = _get_or_create_metric(
+    Gauge,
+    "revenuepilot_coalesce_inflight",
+    "Distinct requests currently in flight per coalescing group",
+    ("group",),
+)
+
+
+def request_key(*parts: Any) -> str:
+    """Return a stable digest for JSON-serialisable request *parts*."""
+
+    blob = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Flight(Generic[T]):
+    task: "asyncio.Task[T]"
+    waiters: int = 0
+
+
+class SingleFlight(Generic[T]):
+    """Share one in-flight task between concurrent callers with the same key."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._flights: Dict[str, _Flight[T]] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def _forget(self, key: str, task: "asyncio.Task[T]") -> None:
+        flight = self._flights.get(key)
+        if flight is not None and flight.task is task:
+            del self._flights[key]
+        INFLIGHT_CALLS.labels(self.name).set(len(self._flights))
+        if not task.cancelled() and task.exception() is not None:
+            # Retrieved here so an exception nobody awaited is not reported
+            # as "never retrieved" when every waiter was cancelled.
+            logger.debug("coalesced_call_failed", group=self.name, error=str(task.exception()))
+
+    async def run(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[T]],
+        *,
+        route: Optional[str] = None,
+        on_join: Optional[Callable[[], None]] = None,
+    ) -> T:
+        """Await ``factory()`` once per *key* across concurrent callers.
+
+        ``on_join`` is called when this caller shares an existing flight
+        instead of starting one; ``route`` labels the saved-call metric.
+        """
+
+        flight = self._flights.get(key)
+        if flight is None or flight.task.done():
+            task = asyncio.ensure_future(factory())
+            flight = self._flights[key] = _Flight(task)
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+            INFLIGHT_CALLS.labels(self.name).set(len(self._flights))
+        else:
+            COALESCED_CALLS.labels(route or self.name).inc()
+            if on_join is not None:
+                on_join()
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.task.cancelled() or flight.waiters > 1:
+                raise
+            flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+
+__all__ = [
+    "COALESCED_CALLS",
+    "SingleFlight",
+    "request_key",
+]
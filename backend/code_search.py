@@ -0,0 +1,511 @@
+"""In-process search index for CPT, ICD-10 and HCPCS code autocomplete.
+
+Clinicians type partial codes ("E11.6") and partial descriptions ("type 2
+diab") interchangeably, so the index answers both shapes of query:
+
+* a sorted code-prefix table (a flattened trie searched with ``bisect``)
+  keyed on dot-less codes so ``E116`` and ``E11.6`` resolve identically, and
+* an inverted token index over descriptions ranked with BM25.  The final
+  query token is treated as a prefix so results update while typing.
+
+BM25 weights are precomputed per posting when the index is built and posting
+lists are kept best-first, so single-term queries stop after ``limit`` hits and
+multi-term queries only score candidates drawn from their rarer terms.  The index is
+populated from the ``cpt_codes``/``icd10_codes``/``hcpcs_codes`` tables
+(filled by ``scripts/ingest_cms_code_tables.py``) layered over the bundled
+defaults, and is rebuilt automatically when the tables change.
+"""
+
+from __future__ import annotations
+
+import bisect
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from backend import code_tables
+
+# BM25 tuning parameters (standard defaults).
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Upper bound on vocabulary terms a trailing prefix token may expand to.
+MAX_PREFIX_EXPANSIONS = 64
+# Minimum length before the trailing token is expanded as a prefix.
+MIN_PREFIX_LENGTH = 2
+# Posting-list length above which a term only re-scores rarer-term candidates.
+COMMON_TERM_POSTINGS = 1000
+# How often (seconds) the shared index checks the database for changes.
+REFRESH_CHECK_SECONDS = 30.0
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_CODE_QUERY_RE = re.compile(r"^[A-Z0-9][A-Z0-9.]*$")
+_STOPWORDS = frozenset(
+    {"a", "an", "and", "as", "by", "for", "in", "of", "on", "or", "the", "to", "with"}
+)
+
+_TABLES: Tuple[Tuple[str, str, str], ...] = (
+    ("cpt_codes", "CPT", "codes"),
+    ("icd10_codes", "ICD-10", "diagnoses"),
+    ("hcpcs_codes", "HCPCS", "codes"),
+)
+
+_SPECIALTY_MAP_PATH = Path(__file__).with_name("code_intervals_by_specialty.json")
+
+
+def _tokenize(text: str) -> List[str]:
+    return [tok for tok in _TOKEN_RE.findall(text.lower()) if tok not in _STOPWORDS]
+
+
+def _code_key(code: str) -> str:
+    return code.replace(".", "").strip().upper()
+
+
+@dataclass(frozen=True)
+class CodeEntry:
+    """Single searchable code."""
+
+    code: str
+    type: str
+    category: str
+    description: str
+    specialties: frozenset[str] = frozenset()
+
+
+class CodeSearchIndex:
+    """Immutable prefix + BM25 index over a collection of :class:`CodeEntry`."""
+
+    def __init__(
+        self,
+        entries: Iterable[CodeEntry],
+        *,
+        specialty_prefixes: Optional[Mapping[str, Sequence[str]]] = None,
+    ) -> None:
+        by_code: Dict[str, CodeEntry] = {}
+        for entry in entries:
+            if entry.code:
+                by_code[entry.code] = entry
+        self._entries: List[CodeEntry] = [by_code[code] for code in sorted(by_code)]
+        self._specialty_prefixes: Dict[str, Tuple[str, ...]] = {
+            str(name).strip().lower(): tuple(_code_key(prefix) for prefix in prefixes)
+            for name, prefixes in (specialty_prefixes or {}).items()
+        }
+
+        # Code prefix table: (dot-less key, doc id) sorted by key.
+        keyed = sorted((_code_key(entry.code), doc_id) for doc_id, entry in enumerate(self._entries))
+        self._code_keys: List[str] = [key for key, _ in keyed]
+        self._code_ids: List[int] = [doc_id for _, doc_id in keyed]
+
+        # Inverted index with precomputed BM25 weights per posting.
+        term_freqs: List[Dict[str, int]] = []
+        doc_freq: Dict[str, int] = {}
+        total_len = 0
+        for entry in self._entries:
+            counts: Dict[str, int] = {}
+            tokens = _tokenize(entry.description)
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token in counts:
+                doc_freq[token] = doc_freq.get(token, 0) + 1
+            term_freqs.append(counts)
+            total_len += len(tokens)
+
+        n_docs = len(self._entries)
+        avgdl = (total_len / n_docs) if n_docs else 0.0
+        self._postings: Dict[str, List[Tuple[float, int]]] = {}
+        for doc_id, counts in enumerate(term_freqs):
+            doc_len = sum(counts.values())
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * (doc_len / avgdl if avgdl else 0.0))
+            for token, tf in counts.items():
+                df = doc_freq[token]
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                weight = idf * tf * (BM25_K1 + 1) / (tf + norm)
+                self._postings.setdefault(token, []).append((weight, doc_id))
+        for postings in self._postings.values():
+            postings.sort(reverse=True)
+        self._vocabulary: List[str] = sorted(self._postings)
+        self._lookups: Dict[str, Dict[int, float]] = {}
+        self._lookups_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def specialties(self) -> List[str]:
+        return sorted(self._specialty_prefixes)
+
+    # ------------------------------------------------------------------
+    # Filtering helpers
+    # ------------------------------------------------------------------
+    def _filter(
+        self, code_type: Optional[str], specialty: Optional[str]
+    ) -> Optional[Callable[[CodeEntry], bool]]:
+        type_norm = code_type.strip().upper() if code_type else None
+        if type_norm in {"ICD10", "ICD"}:
+            type_norm = "ICD-10"
+        spec_norm = specialty.strip().lower() if specialty else None
+        if not type_norm and not spec_norm:
+            return None
+        prefixes = self._specialty_prefixes.get(spec_norm, ()) if spec_norm else ()
+
+        def accept(entry: CodeEntry) -> bool:
+            if type_norm and entry.type != type_norm:
+                return False
+            if spec_norm:
+                if spec_norm in entry.specialties:
+                    return True
+                return bool(prefixes) and _code_key(entry.code).startswith(prefixes)
+            return True
+
+        return accept
+
+    # ------------------------------------------------------------------
+    # Query paths
+    # ------------------------------------------------------------------
+    def _code_prefix_ids(self, prefix: str) -> Iterator[int]:
+        lo = bisect.bisect_left(self._code_keys, prefix)
+        hi = bisect.bisect_left(self._code_keys, prefix + "\uffff", lo)
+        for idx in range(lo, hi):
+            yield self._code_ids[idx]
+
+    def _expand(self, token: str) -> List[str]:
+        lo = bisect.bisect_left(self._vocabulary, token)
+        hi = bisect.bisect_left(self._vocabulary, token + "\uffff", lo)
+        return self._vocabulary[lo : min(hi, lo + MAX_PREFIX_EXPANSIONS)]
+
+    def _query_groups(self, query: str) -> List[List[str]]:
+        """Map each query token to the vocabulary terms it matches."""
+
+        tokens = _tokenize(query)
+        if not tokens:
+            return []
+        prefix_last = not query[-1:].isspace() and len(tokens[-1]) >= MIN_PREFIX_LENGTH
+        groups: List[List[str]] = []
+        for position, token in enumerate(tokens):
+            if prefix_last and position == len(tokens) - 1:
+                terms = self._expand(token)
+            else:
+                terms = [token] if token in self._postings else []
+            if terms:
+                groups.append(terms)
+        return groups
+
+    def _group_size(self, terms: Sequence[str]) -> int:
+        return sum(len(self._postings[term]) for term in terms)
+
+    def _group_stream(self, terms: Sequence[str]) -> Iterator[Tuple[float, int]]:
+        """Yield ``(weight, doc_id)`` best-first, once per document."""
+
+        if len(terms) == 1:
+            yield from self._postings[terms[0]]
+            return
+        emitted: set[int] = set()
+        for weight, doc_id in heapq.merge(
+            *(self._postings[term] for term in terms), reverse=True
+        ):
+            if doc_id not in emitted:
+                emitted.add(doc_id)
+                yield weight, doc_id
+
+    def _term_lookup(self, term: str) -> Dict[int, float]:
+        lookup = self._lookups.get(term)
+        if lookup is None:
+            # Searches run in worker threads; build each lookup only once.
+            with self._lookups_lock:
+                lookup = self._lookups.get(term)
+                if lookup is None:
+                    lookup = {doc_id: weight for weight, doc_id in self._postings[term]}
+                    self._lookups[term] = lookup
+        return lookup
+
+    def _description_matches(
+        self,
+        query: str,
+        limit: int,
+        accept: Optional[Callable[[CodeEntry], bool]],
+        exclude: set[int],
+    ) -> List[Tuple[float, int]]:
+        groups = self._query_groups(query)
+        if not groups:
+            return []
+
+        def allowed(doc_id: int) -> bool:
+            return doc_id not in exclude and (accept is None or accept(self._entries[doc_id]))
+
+        def fill(stream: Iterable[Tuple[float, int]], found: List[Tuple[float, int]], skip: set[int]) -> None:
+            for weight, doc_id in stream:
+                if len(found) >= limit:
+                    break
+                if doc_id not in skip and allowed(doc_id):
+                    found.append((weight, doc_id))
+
+        if len(groups) == 1:
+            # Posting lists are sorted by weight so the first accepted hits win.
+            found: List[Tuple[float, int]] = []
+            fill(self._group_stream(groups[0]), found, set())
+            return found
+
+        # Rare terms drive candidate generation; common terms only add weight
+        # to those candidates through cached lookups.
+        sizes = [self._group_size(terms) for terms in groups]
+        drivers = [i for i, size in enumerate(sizes) if size <= COMMON_TERM_POSTINGS]
+        if not drivers:
+            drivers = [min(range(len(groups)), key=sizes.__getitem__)]
+        scores: Dict[int, Tuple[int, float]] = {}
+        for i in drivers:
+            # Capped so queries made only of common terms stay bounded; the
+            # lists are best-first so the cap drops the weakest postings.
+            driver = islice(self._group_stream(groups[i]), COMMON_TERM_POSTINGS)
+            for weight, doc_id in driver:
+                matched, score = scores.get(doc_id, (0, 0.0))
+                scores[doc_id] = (matched + 1, score + weight)
+        for i, terms in enumerate(groups):
+            if i in drivers:
+                continue
+            if len(terms) == 1:
+                merged = self._term_lookup(terms[0])
+            else:
+                merged = {}
+                for term in terms:
+                    for doc_id, weight in self._term_lookup(term).items():
+                        if weight > merged.get(doc_id, 0.0):
+                            merged[doc_id] = weight
+            for doc_id, (matched, score) in scores.items():
+                weight = merged.get(doc_id)
+                if weight:
+                    scores[doc_id] = (matched + 1, score + weight)
+        ranked = heapq.nlargest(
+            limit,
+            ((key, doc_id) for doc_id, key in scores.items() if allowed(doc_id)),
+        )
+        found = [(score, doc_id) for (_, score), doc_id in ranked]
+        if len(found) < limit:
+            # Top up with documents that only match the common terms.
+            for i, terms in enumerate(groups):
+                if i not in drivers:
+                    fill(self._group_stream(terms), found, set(scores))
+        return found
+
+    def search(
+        self,
+        query: str,
+        *,
+        limit: int = 20,
+        code_type: Optional[str] = None,
+        specialty: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return up to ``limit`` ranked matches for ``query``.
+
+        Code-prefix matches rank ahead of description matches; within the
+        prefix block codes are ordered hierarchically (``E11`` before
+        ``E11.9``).  Description matches are ordered by the number of query
+        terms matched and then by BM25 score.
+        """
+
+        text = (query or "").strip()
+        if not text or limit <= 0:
+            return []
+        accept = self._filter(code_type, specialty)
+        results: List[Dict[str, Any]] = []
+        seen: set[int] = set()
+
+        code_query = _code_key(text)
+        if _CODE_QUERY_RE.fullmatch(text.upper()) and code_query:
+            for doc_id in self._code_prefix_ids(code_query):
+                entry = self._entries[doc_id]
+                if accept is not None and not accept(entry):
+                    continue
+                seen.add(doc_id)
+                results.append(self._format(entry, "code", 1.0))
+                if len(results) >= limit:
+                    return results
+
+        remaining = limit - len(results)
+        for score, doc_id in self._description_matches(query, remaining, accept, seen):
+            results.append(self._format(self._entries[doc_id], "description", score))
+        return results
+
+    @staticmethod
+    def _format(entry: CodeEntry, match: str, score: float) -> Dict[str, Any]:
+        return {
+            "code": entry.code,
+            "type": entry.type,
+            "category": entry.category,
+            "description": entry.description,
+            "match": match,
+            "score": round(score, 4),
+        }
+
+
+# ---------------------------------------------------------------------------
+# Index construction from the database and bundled defaults
+# ---------------------------------------------------------------------------
+
+
+def load_specialty_prefixes(path: Optional[str] = None) -> Dict[str, List[str]]:
+    """Return ``{specialty: [code prefixes]}`` from the specialty interval map."""
+
+    candidate = path or os.environ.get("CODE_INTERVALS_FILE") or str(_SPECIALTY_MAP_PATH)
+    try:
+        with open(candidate, "r", encoding="utf-8") as fh:
+            raw = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(raw, dict):
+        return {}
+    return {
+        str(name): [str(prefix) for prefix in codes]
+        for name, codes in raw.items()
+        if isinstance(codes, dict)
+    }
+
+
+def _as_specialties(raw: Any) -> frozenset[str]:
+    values = code_tables._load_json_field(raw, [])
+    if not isinstance(values, list):
+        return frozenset()
+    return frozenset(str(value).strip().lower() for value in values if value)
+
+
+def _default_entries() -> Iterator[CodeEntry]:
+    from backend.codes_data import load_code_metadata  # local import mirrors code_tables
+
+    for code, info in load_code_metadata().items():
+        yield CodeEntry(
+            code=code,
+            type=str(info.get("type") or ""),
+            category=str(info.get("category") or "codes"),
+            description=str(info.get("description") or ""),
+        )
+    defaults = (
+        (code_tables.DEFAULT_CPT_CODES, "CPT", "codes"),
+        (code_tables.DEFAULT_ICD10_CODES, "ICD-10", "diagnoses"),
+        (code_tables.DEFAULT_HCPCS_CODES, "HCPCS", "codes"),
+    )
+    for table, code_type, category in defaults:
+        for code, info in table.items():
+            yield CodeEntry(
+                code=code,
+                type=code_type,
+                category=category,
+                description=str(info.get("description") or ""),
+                specialties=_as_specialties(info.get("specialties")),
+            )
+
+
+def _database_entries(conn: sqlite3.Connection) -> Iterator[CodeEntry]:
+    for table, code_type, category in _TABLES:
+        try:
+            rows = conn.execute(f"SELECT code, description, specialties FROM {table}").fetchall()
+        except sqlite3.Error:
+            continue
+        for code, description, specialties in rows:
+            if not code:
+                continue
+            yield CodeEntry(
+                code=str(code).strip().upper(),
+                type=code_type,
+                category=category,
+                description=str(description or ""),
+                specialties=_as_specialties(specialties),
+            )
+
+
+def _database_signature(conn: Optional[sqlite3.Connection]) -> Tuple[Any, ...]:
+    if conn is None:
+        return ()
+    signature: List[Any] = []
+    for table, _, _ in _TABLES:
+        try:
+            row = conn.execute(f"SELECT COUNT(*), MAX(last_updated) FROM {table}").fetchone()
+        except sqlite3.Error:
+            row = None
+        signature.append(tuple(row) if row is not None else None)
+    return tuple(signature)
+
+
+def build_index(conn: Optional[sqlite3.Connection] = None) -> CodeSearchIndex:
+    """Build a fresh index from defaults overlaid with database rows."""
+
+    entries: List[CodeEntry] = list(_default_entries())
+    if conn is not None:
+        entries.extend(_database_entries(conn))
+    return CodeSearchIndex(entries, specialty_prefixes=load_specialty_prefixes())
+
+
+_INDEX_LOCK = threading.Lock()
+_INDEX: Optional[CodeSearchIndex] = None
+_INDEX_SIGNATURE: Tuple[Any, ...] = ()
+_INDEX_CHECKED_AT = 0.0
+
+
+def get_code_search_index(session: sqlite3.Connection | None = None) -> CodeSearchIndex:
+    """Return the shared index, rebuilding it when the code tables change."""
+
+    global _INDEX, _INDEX_SIGNATURE, _INDEX_CHECKED_AT
+
+    conn = code_tables._resolve_connection(session)
+    conn_id = id(conn) if conn is not None else None
+
+    def _fresh() -> bool:
+        return (
+            _INDEX is not None
+            and _INDEX_SIGNATURE[:1] == (conn_id,)
+            and time.monotonic() - _INDEX_CHECKED_AT < REFRESH_CHECK_SECONDS
+        )
+
+    if _fresh():
+        return _INDEX  # type: ignore[return-value]
+    with _INDEX_LOCK:
+        if _fresh():
+            return _INDEX  # type: ignore[return-value]
+        signature = (conn_id, *_database_signature(conn))
+        if _INDEX is None or signature != _INDEX_SIGNATURE:
+            _INDEX = build_index(conn)
+            _INDEX_SIGNATURE = signature
+        _INDEX_CHECKED_AT = time.monotonic()
+        return _INDEX
+
+
+def invalidate_code_search_index() -> None:
+    """Drop the shared index so the next lookup rebuilds it."""
+
+    global _INDEX, _INDEX_SIGNATURE, _INDEX_CHECKED_AT
+    with _INDEX_LOCK:
+        _INDEX = None
+        _INDEX_SIGNATURE = ()
+        _INDEX_CHECKED_AT = 0.0
+
+
+def search_codes(
+    query: str,
+    *,
+    limit: int = 20,
+    code_type: Optional[str] = None,
+    specialty: Optional[str] = None,
+    session: sqlite3.Connection | None = None,
+) -> List[Dict[str, Any]]:
+    """Search the shared index; see :meth:`CodeSearchIndex.search`."""
+
+    index = get_code_search_index(session)
+    return index.search(query, limit=limit, code_type=code_type, specialty=specialty)
+
+
+__all__ = [
+    "CodeEntry",
+    "CodeSearchIndex",
+    "build_index",
+    "get_code_search_index",
+    "invalidate_code_search_index",
+    "load_specialty_prefixes",
+    "search_codes",
+]
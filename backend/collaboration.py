@@ -0,0 +1,432 @@
+"""Note-scoped collaborative editing with operational transform.
+
+Clients joined to the same note share one :class:`NoteRoom`.  The server
+holds the authoritative text and a revision counter.  Edits travel as compact
+text operations rather than whole note bodies: an operation is a list whose
+items are
+
+* a positive ``int`` – keep that many characters,
+* a negative ``int`` – delete that many characters,
+* a ``str`` – insert the text.
+
+so typing one character into a note of any length is ``[pos, "x", rest]``.
+
+A client sends ``{"type": "op", "revision": r, "op": [...]}`` where ``r`` is
+the last server revision it has seen.  The server transforms the operation
+against everything applied since ``r``, applies it, acknowledges the sender
+with ``{"event": "ack", "revision": n}`` and broadcasts
+``{"event": "op", "revision": n, "op": [...]}`` to the other participants.
+This is the classic single-server OT protocol, so clients only ever need to
+transform against their own unacknowledged operation.
+
+Only the most recent ``history_limit`` operations are kept.  Every
+``compact_every`` operations (and when an idle room is swept) the document is
+saved through the ``save`` callback, which in the API writes a
+``note_versions`` row.  A client whose revision has fallen out of the kept
+history receives a fresh snapshot instead.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import structlog
+from fastapi import WebSocket, WebSocketDisconnect
+
+from backend.ws_streams import WS_REGISTRY_SIZE, AuthCallable, env_float, serialise_frame
+
+logger = structlog.get_logger(__name__)
+
+Component = Union[int, str]
+Operation = List[Component]
+
+
+class OperationError(ValueError):
+    """Raised when an operation is malformed or does not fit the document."""
+
+
+class StaleRevision(Exception):
+    """The client's revision is older than the retained history."""
+
+
+# -- text operations -------------------------------------------------------
+
+
+class _Builder:
+    """Accumulate components, merging neighbours of the same kind."""
+
+    def __init__(self) -> None:
+        self.ops: Operation = []
+
+    def retain(self, count: int) -> None:
+        if count <= 0:
+            return
+        if self.ops and isinstance(self.ops[-1], int) and self.ops[-1] > 0:
+            self.ops[-1] += count
+        else:
+            self.ops.append(count)
+
+    def insert(self, text: str) -> None:
+        if not text:
+            return
+        ops = self.ops
+        if ops and isinstance(ops[-1], str):
+            ops[-1] += text
+        elif ops and isinstance(ops[-1], int) and ops[-1] < 0:
+            # Keep inserts ahead of deletes so equal edits compare equal.
+            if len(ops) > 1 and isinstance(ops[-2], str):
+                ops[-2] += text
+            else:
+                ops.insert(len(ops) - 1, text)
+        else:
+            ops.append(text)
+
+    def delete(self, count: int) -> None:
+        if count <= 0:
+            return
+        if self.ops and isinstance(self.ops[-1], int) and self.ops[-1] < 0:
+            self.ops[-1] -= count
+        else:
+            self.ops.append(-count)
+
+
+def normalise(op: Sequence[Any]) -> Operation:
+    """Validate *op* and merge adjacent components."""
+
+    if not isinstance(op, (list, tuple)):
+        raise OperationError("operation must be a list")
+    builder = _Builder()
+    for component in op:
+        if isinstance(component, bool):
+            raise OperationError("invalid component")
+        if isinstance(component, int):
+            if component > 0:
+                builder.retain(component)
+            else:
+                builder.delete(-component)
+        elif isinstance(component, str):
+            builder.insert(component)
+        else:
+            raise OperationError("invalid component")
+    return builder.ops
+
+
+def base_length(op: Operation) -> int:
+    return sum(abs(c) for c in op if isinstance(c, int))
+
+
+def target_length(op: Operation) -> int:
+    length = 0
+    for component in op:
+        if isinstance(component, str):
+            length += len(component)
+        elif component > 0:
+            length += component
+    return length
+
+
+def apply(document: str, op: Operation) -> str:
+    """Return *document* with *op* applied."""
+
+    if base_length(op) != len(document):
+        raise OperationError(
+            f"operation spans {base_length(op)} characters, document has {len(document)}"
+        )
+    parts: List[str] = []
+    cursor = 0
+    for component in op:
+        if isinstance(component, str):
+            parts.append(component)
+        elif component > 0:
+            parts.append(document[cursor:cursor + component])
+            cursor += component
+        else:
+            cursor -= component
+    return "".join(parts)
+
+
+def transform(a: Operation, b: Operation) -> Tuple[Operation, Operation]:
+    """Transform concurrent *a* and *b* so ``b' ∘ a == a' ∘ b``.
+
+    Both operations must apply to the same document.  Inserts at the same
+    position are ordered with *a* first.
+    """
+
+    if base_length(a) != base_length(b):
+        raise OperationError("concurrent operations must share a base document")
+    a_prime, b_prime = _Builder(), _Builder()
+    ia, ib = iter(a), iter(b)
+    x: Optional[Component] = next(ia, None)
+    y: Optional[Component] = next(ib, None)
+    while x is not None or y is not None:
+        if isinstance(x, str):
+            a_prime.insert(x)
+            b_prime.retain(len(x))
+            x = next(ia, None)
+            continue
+        if isinstance(y, str):
+            a_prime.retain(len(y))
+            b_prime.insert(y)
+            y = next(ib, None)
+            continue
+        if x is None or y is None:  # pragma: no cover - guarded by base_length
+            raise OperationError("operations have different lengths")
+        size = min(abs(x), abs(y))
+        if x > 0 and y > 0:
+            a_prime.retain(size)
+            b_prime.retain(size)
+        elif x < 0 and y > 0:
+            a_prime.delete(size)
+        elif x > 0 and y < 0:
+            b_prime.delete(size)
+        # Both deleting the same text: nothing left to do for either side.
+        x = _consume(x, size)
+        y = _consume(y, size)
+        if x == 0:
+            x = next(ia, None)
+        if y == 0:
+            y = next(ib, None)
+    return a_prime.ops, b_prime.ops
+
+
+def _consume(component: int, size: int) -> int:
+    return component - size if component > 0 else component + size
+
+
+# -- rooms -------------------------------------------------------------------
+
+
+@dataclass
+class NoteRoom:
+    """Authoritative document state for one note."""
+
+    note_id: str
+    document: str
+    revision: int = 0
+    history: List[Operation] = field(default_factory=list)
+    clients: Dict[WebSocket, str] = field(default_factory=dict)
+    saved_revision: int = 0
+    last_editor: Optional[str] = None
+    last_active: float = field(default_factory=time.monotonic)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def base_revision(self) -> int:
+        """Oldest revision a client can still submit against."""
+
+        return self.revision - len(self.history)
+
+    def receive(self, revision: int, op: Operation) -> Operation:
+        """Transform *op* (made at *revision*) to the head, apply and return it."""
+
+        if revision < self.base_revision or revision > self.revision:
+            raise StaleRevision(revision)
+        for concurrent in self.history[revision - self.base_revision:]:
+            op, _ = transform(op, concurrent)
+        self.document = apply(self.document, op)
+        self.history.append(op)
+        self.revision += 1
+        return op
+
+    def snapshot(self, event: str = "snapshot") -> Dict[str, Any]:
+        return {
+            "event": event,
+            "noteId": self.note_id,
+            "revision": self.revision,
+            "document": self.document,
+            "participants": sorted(set(self.clients.values())),
+        }
+
+
+LoadCallable = Callable[[str], str]
+SaveCallable = Callable[[str, str, Optional[str]], None]
+
+
+class CollaborationHub:
+    """Registry of note rooms; plugs into :func:`backend.ws_streams.run_sweeper`."""
+
+    def __init__(
+        self,
+        load: LoadCallable,
+        save: SaveCallable,
+        *,
+        name: str = "collaboration-rooms",
+        history_limit: Optional[int] = None,
+        compact_every: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ) -> None:
+        self.name = name
+        self._load = load
+        self._save = save
+        self.history_limit = max(
+            1, int(history_limit if history_limit is not None else env_float("COLLAB_HISTORY_LIMIT", 200))
+        )
+        self.compact_every = max(
+            1, int(compact_every if compact_every is not None else env_float("COLLAB_COMPACT_OPS", 50))
+        )
+        self.ttl = ttl if ttl is not None else env_float("COLLAB_ROOM_TTL_SECONDS", 300.0)
+        self.rooms: Dict[str, NoteRoom] = {}
+
+    def room(self, note_id: str) -> NoteRoom:
+        room = self.rooms.get(note_id)
+        if room is None:
+            room = self.rooms[note_id] = NoteRoom(note_id, self._load(note_id) or "")
+            self._report()
+        room.last_active = time.monotonic()
+        return room
+
+    def _persist(self, room: NoteRoom) -> None:
+        if room.saved_revision == room.revision:
+            return
+        try:
+            self._save(room.note_id, room.document, room.last_editor)
+        except Exception as exc:
+            logger.warning("collaboration_save_failed", note_id=room.note_id, error=str(exc))
+            return
+        room.saved_revision = room.revision
+
+    def _compact(self, room: NoteRoom) -> None:
+        if room.revision - room.saved_revision >= self.compact_every:
+            self._persist(room)
+        overflow = len(room.history) - self.history_limit
+        if overflow > 0:
+            del room.history[:overflow]
+
+    async def _send(self, room: NoteRoom, websocket: WebSocket, frame: str) -> None:
+        try:
+            await websocket.send_text(frame)
+        except Exception:
+            room.clients.pop(websocket, None)
+
+    async def _broadcast(self, room: NoteRoom, payload: Mapping[str, Any], *, exclude: Optional[WebSocket] = None) -> None:
+        frame = serialise_frame(payload)
+        for websocket in list(room.clients):
+            if websocket is not exclude:
+                await self._send(room, websocket, frame)
+
+    async def join(self, note_id: str, websocket: WebSocket, username: str) -> NoteRoom:
+        room = self.room(note_id)
+        async with room.lock:
+            room.clients[websocket] = username
+            await self._send(room, websocket, serialise_frame(room.snapshot()))
+            await self._broadcast(
+                room,
+                {"event": "presence", "noteId": note_id, "userId": username, "state": "joined"},
+                exclude=websocket,
+            )
+        return room
+
+    async def leave(self, room: NoteRoom, websocket: WebSocket) -> None:
+        async with room.lock:
+            username = room.clients.pop(websocket, None)
+            room.last_active = time.monotonic()
+            if username is not None:
+                await self._broadcast(
+                    room,
+                    {"event": "presence", "noteId": room.note_id, "userId": username, "state": "left"},
+                )
+            if not room.clients:
+                self._persist(room)
+
+    async def submit(self, room: NoteRoom, websocket: WebSocket, message: Mapping[str, Any]) -> None:
+        """Handle one ``op`` message from *websocket*."""
+
+        async with room.lock:
+            username = room.clients.get(websocket)
+            try:
+                revision = int(message.get("revision"))
+                op = room.receive(revision, normalise(message.get("op")))
+            except StaleRevision:
+                await self._send(room, websocket, serialise_frame(room.snapshot("resync")))
+                return
+            except (OperationError, TypeError, ValueError) as exc:
+                await self._send(
+                    room,
+                    websocket,
+                    serialise_frame({"event": "error", "code": "invalid_op", "detail": str(exc)}),
+                )
+                await self._send(room, websocket, serialise_frame(room.snapshot("resync")))
+                return
+            room.last_editor = username
+            room.last_active = time.monotonic()
+            await self._send(
+                room, websocket, serialise_frame({"event": "ack", "noteId": room.note_id, "revision": room.revision})
+            )
+            await self._broadcast(
+                room,
+                {
+                    "event": "op",
+                    "noteId": room.note_id,
+                    "revision": room.revision,
+                    "op": op,
+                    "userId": username,
+                },
+                exclude=websocket,
+            )
+            self._compact(room)
+
+    async def handle(self, websocket: WebSocket, note_id: str, authenticator: AuthCallable) -> None:
+        """Authenticate *websocket* and run its collaboration session."""
+
+        user = await authenticator(websocket)
+        note_id = (note_id or "").strip()
+        if not note_id:
+            await websocket.close(code=1008)
+            return
+        await websocket.accept()
+        room = await self.join(note_id, websocket, str(user.get("sub") or ""))
+        try:
+            while True:
+                message = await websocket.receive_json()
+                if not isinstance(message, Mapping):
+                    continue
+                kind = message.get("type")
+                if kind == "op":
+                    await self.submit(room, websocket, message)
+                elif kind == "sync":
+                    async with room.lock:
+                        await self._send(room, websocket, serialise_frame(room.snapshot()))
+        except WebSocketDisconnect:
+            pass
+        except Exception as exc:  # pragma: no cover - unexpected payload
+            logger.debug("collaboration_receive_error", note_id=note_id, error=str(exc))
+        finally:
+            await self.leave(room, websocket)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Save and drop rooms nobody has used for ``ttl`` seconds."""
+
+        now = time.monotonic() if now is None else now
+        removed = 0
+        for note_id, room in list(self.rooms.items()):
+            if room.clients or room.lock.locked() or now - room.last_active < self.ttl:
+                continue
+            self._persist(room)
+            if room.saved_revision != room.revision:
+                continue  # keep unsaved edits until a save succeeds
+            del self.rooms[note_id]
+            removed += 1
+        self._report()
+        return removed
+
+    def save_all(self) -> None:
+        """Persist every room with unsaved edits (used at shutdown)."""
+
+        for room in list(self.rooms.values()):
+            self._persist(room)
+
+    def _report(self) -> None:
+        WS_REGISTRY_SIZE.labels(self.name, "rooms").set(len(self.rooms))
+
+
+__all__ = [
+    "CollaborationHub",
+    "NoteRoom",
+    "OperationError",
+    "apply",
+    "normalise",
+    "transform",
+]
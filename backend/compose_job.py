@@ -74,6 +74,7 @@ class ComposeJobPayload:
     encounter_id: Optional[str] = None
     note_id: Optional[str] = None
     username: Optional[str] = None
+    clinic: Optional[str] = None
 
 
 @dataclass(slots=True)
@@ -497,14 +498,18 @@ class ComposePipeline:
                 state.message = "Validation identified blocking issues."
             await emit()
             return state
-        except ComposeJobCancelled:
+        except (ComposeJobCancelled, asyncio.CancelledError) as exc:
+            # Task cancellation interrupts in-flight model calls; only treat it
+            # as a job cancellation when the caller actually requested one.
+            if isinstance(exc, asyncio.CancelledError) and not (is_cancelled and is_cancelled()):
+                raise
             state.status = "cancelled"
             state.stage = FINAL_REVIEW_STAGE
             state.message = "Compose job cancelled"
             state.progress = min(state.progress, STAGE_PROGRESS.get(state.stage, 1.0))
             state.steps[-1].update({"status": "cancelled", "progress": state.progress})
             await emit()
-            raise
+            raise ComposeJobCancelled() from None
         except Exception as exc:  # pragma: no cover - defensive logging
             logger.exception(
                 "compose_pipeline_error composeId=%s error=%s", job.compose_id, exc
@@ -0,0 +1,327 @@
+"""Fair scheduling for compose jobs.
+
+Compose requests are grouped into *flows* keyed by clinic and user.  Jobs are
+ordered with weighted fair queuing: each job gets a virtual finish tag of
+``max(virtual_time, flow_last_finish) + cost / weight`` and the scheduler
+always hands out the smallest tag.  A clinician bulk-composing a day's notes
+therefore only advances their own flow's tags, and other users' jobs slot in
+between theirs.  A per-flow in-flight cap keeps one flow from occupying every
+worker while others are waiting; it is ignored when nobody else is queued so
+the pool stays work-conserving.
+
+The scheduler is event-loop local and lock free: all mutation happens on the
+loop that owns it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Generic, List, Mapping, Optional, Tuple, TypeVar
+
+from prometheus_client import REGISTRY, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+FlowKey = Tuple[str, str]
+
+
+def _get_or_create_metric(metric_cls, name: str, documentation: str, labelnames, **kwargs):
+    existing = REGISTRY._names_to_collectors.get(name)
+    if existing is not None:
+        return existing
+    return metric_cls(name, documentation, labelnames=labelnames, **kwargs)
+
+
+_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+COMPOSE_QUEUE_WAIT = _get_or_create_metric(
+    Histogram,
+    "revenuepilot_compose_queue_wait_seconds",
+    "Time compose jobs spend queued before a worker picks them up",
+    (),
+    buckets=_LATENCY_BUCKETS,
+)
+COMPOSE_RUN_TIME = _get_or_create_metric(
+    Histogram,
+    "revenuepilot_compose_run_seconds",
+    "Compose job execution time by final status",
+    ("status",),
+    buckets=_LATENCY_BUCKETS,
+)
+COMPOSE_QUEUE_DEPTH = _get_or_create_metric(
+    Gauge,
+    "revenuepilot_compose_queue_depth",
+    "Compose jobs waiting for a worker",
+    (),
+)
+COMPOSE_INFLIGHT = _get_or_create_metric(
+    Gauge,
+    "revenuepilot_compose_inflight",
+    "Compose jobs currently running",
+    (),
+)
+
+
+@dataclass
+class ScheduledItem(Generic[T]):
+    item: T
+    flow: FlowKey
+    finish_tag: float
+    enqueued_at: float
+    started_at: Optional[float] = None
+
+
+@dataclass
+class _Flow:
+    items: Deque[ScheduledItem[Any]] = field(default_factory=deque)
+    last_finish: float = 0.0
+    inflight: int = 0
+
+
+class FairScheduler(Generic[T]):
+    """Weighted fair queue of jobs keyed by ``(clinic, user)`` flows."""
+
+    def __init__(
+        self,
+        *,
+        weights: Optional[Mapping[str, float]] = None,
+        max_inflight_per_flow: Optional[int] = None,
+    ) -> None:
+        self._weights = {str(k): float(v) for k, v in (weights or {}).items() if float(v) > 0}
+        self.max_inflight_per_flow = max_inflight_per_flow
+        self._flows: Dict[FlowKey, _Flow] = {}
+        self._heads: List[Tuple[float, int, FlowKey]] = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._size = 0
+        self._inflight = 0
+        self._available: Optional[asyncio.Condition] = None
+
+    # -- helpers -----------------------------------------------------------
+
+    def _condition(self) -> asyncio.Condition:
+        if self._available is None:
+            self._available = asyncio.Condition()
+        return self._available
+
+    def weight_for(self, flow: FlowKey) -> float:
+        clinic, user = flow
+        return self._weights.get(user) or self._weights.get(clinic) or 1.0
+
+    def _push_head(self, key: FlowKey, flow: _Flow) -> None:
+        if flow.items:
+            heapq.heappush(self._heads, (flow.items[0].finish_tag, next(self._sequence), key))
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "queued": self._size,
+            "inflight": self._inflight,
+            "flows": {
+                f"{clinic}/{user}": {"queued": len(flow.items), "inflight": flow.inflight}
+                for (clinic, user), flow in self._flows.items()
+                if flow.items or flow.inflight
+            },
+        }
+
+    # -- producer ----------------------------------------------------------
+
+    def put_nowait(
+        self,
+        item: T,
+        *,
+        user: Optional[str] = None,
+        clinic: Optional[str] = None,
+        cost: float = 1.0,
+    ) -> ScheduledItem[T]:
+        key: FlowKey = (clinic or "", user or "")
+        flow = self._flows.get(key)
+        if flow is None:
+            flow = self._flows[key] = _Flow()
+        start = max(self._virtual_time, flow.last_finish)
+        finish = start + max(cost, 1e-6) / self.weight_for(key)
+        flow.last_finish = finish
+        scheduled = ScheduledItem(item=item, flow=key, finish_tag=finish, enqueued_at=time.monotonic())
+        flow.items.append(scheduled)
+        if len(flow.items) == 1:
+            self._push_head(key, flow)
+        self._size += 1
+        COMPOSE_QUEUE_DEPTH.set(self._size)
+        return scheduled
+
+    async def put(self, item: T, **kwargs: Any) -> ScheduledItem[T]:
+        scheduled = self.put_nowait(item, **kwargs)
+        condition = self._condition()
+        async with condition:
+            condition.notify()
+        return scheduled
+
+    def remove(self, predicate) -> int:
+        """Drop queued items matching ``predicate``; returns the number removed."""
+
+        removed = 0
+        for key, flow in self._flows.items():
+            kept = deque(entry for entry in flow.items if not predicate(entry.item))
+            dropped = len(flow.items) - len(kept)
+            if dropped:
+                flow.items = kept
+                removed += dropped
+        if removed:
+            self._size -= removed
+            self._heads = []
+            for key, flow in self._flows.items():
+                self._push_head(key, flow)
+            COMPOSE_QUEUE_DEPTH.set(self._size)
+        return removed
+
+    # -- consumer ----------------------------------------------------------
+
+    def _eligible(self, flow: _Flow) -> bool:
+        cap = self.max_inflight_per_flow
+        return cap is None or flow.inflight < cap
+
+    def get_nowait(self) -> Optional[ScheduledItem[T]]:
+        """Pop the job with the smallest finish tag from an eligible flow."""
+
+        if not self._size:
+            return None
+        skipped: List[Tuple[float, int, FlowKey]] = []
+        chosen: Optional[Tuple[float, int, FlowKey]] = None
+        while self._heads:
+            entry = heapq.heappop(self._heads)
+            flow = self._flows[entry[2]]
+            if not flow.items or flow.items[0].finish_tag != entry[0]:
+                continue  # stale head
+            if self._eligible(flow):
+                chosen = entry
+                break
+            skipped.append(entry)
+        if chosen is None and skipped:
+            # Every waiting flow is at its cap: stay work-conserving.
+            chosen = skipped.pop(0)
+        for entry in skipped:
+            heapq.heappush(self._heads, entry)
+        if chosen is None:
+            return None
+        key = chosen[2]
+        flow = self._flows[key]
+        scheduled = flow.items.popleft()
+        self._push_head(key, flow)
+        self._virtual_time = max(self._virtual_time, scheduled.finish_tag)
+        self._size -= 1
+        flow.inflight += 1
+        self._inflight += 1
+        scheduled.started_at = time.monotonic()
+        COMPOSE_QUEUE_DEPTH.set(self._size)
+        COMPOSE_INFLIGHT.set(self._inflight)
+        COMPOSE_QUEUE_WAIT.observe(max(0.0, scheduled.started_at - scheduled.enqueued_at))
+        return scheduled
+
+    async def get(self) -> ScheduledItem[T]:
+        condition = self._condition()
+        async with condition:
+            while True:
+                scheduled = self.get_nowait()
+                if scheduled is not None:
+                    return scheduled
+                await condition.wait()
+
+    def task_done(self, scheduled: ScheduledItem[T], status: str = "completed") -> None:
+        flow = self._flows.get(scheduled.flow)
+        if flow is not None:
+            flow.inflight = max(0, flow.inflight - 1)
+            if not flow.items and not flow.inflight and flow.last_finish <= self._virtual_time:
+                self._flows.pop(scheduled.flow, None)
+        self._inflight = max(0, self._inflight - 1)
+        COMPOSE_INFLIGHT.set(self._inflight)
+        if scheduled.started_at is not None:
+            COMPOSE_RUN_TIME.labels(status).observe(max(0.0, time.monotonic() - scheduled.started_at))
+
+
+class ProgressCoalescer:
+    """Rate-limit persistence of progress snapshots.
+
+    ``offer`` records the latest snapshot and reports whether it should be
+    written now: the first snapshot, terminal snapshots and anything arriving
+    ``interval`` seconds after the previous write are flushed; intermediate
+    ones are superseded by later snapshots.  When a ``flush`` callback is
+    given, a held-back snapshot is also written by a timer once the interval
+    has elapsed, so the stored state never lags behind a long quiet stage.
+    """
+
+    def __init__(self, interval: float, flush: Optional[Callable[[Any], None]] = None) -> None:
+        self.interval = max(0.0, interval)
+        self._flush = flush
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._last_flush: Optional[float] = None
+        self.pending: Optional[Any] = None
+        self.writes = 0
+
+    def offer(self, snapshot: Any, *, force: bool = False) -> bool:
+        self.pending = snapshot
+        now = time.monotonic()
+        if force or self._last_flush is None or now - self._last_flush >= self.interval:
+            self._cancel_timer()
+            self._last_flush = now
+            self.pending = None
+            self.writes += 1
+            return True
+        if self._flush is not None and self._timer is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return False
+            delay = max(0.0, self.interval - (now - self._last_flush))
+            self._timer = loop.call_later(delay, self._on_timer)
+        return False
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        snapshot = self.drain()
+        if snapshot is not None and self._flush is not None:
+            try:
+                self._flush(snapshot)
+            except Exception:  # pragma: no cover - persistence is best effort
+                logger.exception("Failed to flush progress snapshot")
+
+    def drain(self) -> Optional[Any]:
+        """Return (and clear) the snapshot that has not been written yet."""
+
+        self._cancel_timer()
+        snapshot, self.pending = self.pending, None
+        if snapshot is not None:
+            self._last_flush = time.monotonic()
+            self.writes += 1
+        return snapshot
+
+    def discard(self) -> None:
+        """Drop the held-back snapshot, e.g. when a final state supersedes it."""
+
+        self._cancel_timer()
+        self.pending = None
+
+
+__all__ = [
+    "FairScheduler",
+    "ProgressCoalescer",
+    "ScheduledItem",
+]
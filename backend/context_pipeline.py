@@ -5,7 +5,6 @@ from __future__ import annotations
 import asyncio
 import copy
 import hashlib
-import logging
 import os
 import re
 from collections import defaultdict
@@ -13,9 +12,10 @@ from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Mapping, Optional, TypeVar
 
 import sqlalchemy as sa
+import structlog
 from sqlalchemy.orm import Session
 
 from backend.db import models as db_models
@@ -23,8 +23,14 @@ from backend.clinical_parsing import ClinicalFactExtractor
 from backend.embedding import HashingVectorizerEmbedding
 from backend.encryption import decrypt_artifact
 from backend.security import hash_identifier
+from backend.ws_streams import WS_REGISTRY_SIZE
 
-logger = logging.getLogger(__name__)
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = structlog.get_logger(__name__)
+
+_T = TypeVar("_T")
 
 StageLiteral = str
 
@@ -65,16 +71,22 @@ def _decode_text(data: bytes) -> str:
 
 
 class ContextEventManager:
-    """Simple broker for streaming context events to WebSocket listeners."""
+    """Simple broker for streaming context events to WebSocket listeners.
+
+    Listener queues are bounded: a listener that stops draining loses its
+    oldest events rather than growing the queue for the life of the process.
+    """
 
-    def __init__(self) -> None:
+    def __init__(self, max_queue: int = 256) -> None:
         self._listeners: dict[str, set[asyncio.Queue[dict[str, Any]]]] = defaultdict(set)
         self._lock = asyncio.Lock()
+        self.max_queue = max(1, int(max_queue))
 
     async def connect(self, correlation_id: str) -> asyncio.Queue[dict[str, Any]]:
-        queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize=self.max_queue)
         async with self._lock:
             self._listeners[correlation_id].add(queue)
+        self._report()
         return queue
 
     async def disconnect(self, correlation_id: str, queue: asyncio.Queue[dict[str, Any]]) -> None:
@@ -85,16 +97,44 @@ class ContextEventManager:
             listeners.discard(queue)
             if not listeners:
                 self._listeners.pop(correlation_id, None)
+        self._report()
 
     async def broadcast(self, correlation_id: str, payload: Mapping[str, Any]) -> None:
         listeners = list(self._listeners.get(correlation_id, set()))
         if not listeners:
             return
         for queue in listeners:
+            if queue.full():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:  # pragma: no cover - raced with consumer
+                    pass
+                logger.debug("context_event.drop_oldest", correlation_id=correlation_id)
             try:
                 queue.put_nowait(dict(payload))
             except asyncio.QueueFull:  # pragma: no cover - defensive
-                logger.debug("context_event.drop", correlation_id=correlation_id, payload=payload)
+                logger.debug("context_event.drop", correlation_id=correlation_id)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop correlation IDs left without listeners and refresh the gauges."""
+
+        empty = [key for key, listeners in self._listeners.items() if not listeners]
+        for key in empty:
+            self._listeners.pop(key, None)
+        self._report()
+        return len(empty)
+
+    def sizes(self) -> dict[str, int]:
+        return {
+            "correlations": len(self._listeners),
+            "queued_events": sum(
+                queue.qsize() for listeners in self._listeners.values() for queue in listeners
+            ),
+        }
+
+    def _report(self) -> None:
+        for kind, value in self.sizes().items():
+            WS_REGISTRY_SIZE.labels("context", kind).set(value)
 
 
 class ChartContextPipeline:
@@ -108,8 +148,10 @@ class ChartContextPipeline:
         upload_dir: Path | Callable[[], Path] | None = None,
         fact_extractor: Optional[ClinicalFactExtractor] = None,
         embedding_model: Optional[HashingVectorizerEmbedding] = None,
+        async_session_factory: Optional[Callable[[], Optional[AsyncSession]]] = None,
     ) -> None:
         self._session_factory = session_factory
+        self._async_session_factory = async_session_factory
         self._default_profile = default_profile
         self._event_manager = ContextEventManager()
         self._tasks: dict[str, asyncio.Task[None]] = {}
@@ -335,32 +377,51 @@ class ChartContextPipeline:
 
     def get_status(self, patient_id: str) -> Optional[dict[str, Any]]:
         with self._session_scope() as session:
-            latest = (
-                session.execute(
-                    sa.select(db_models.ChartParseJob)
-                    .where(db_models.ChartParseJob.patient_id == patient_id)
-                    .order_by(db_models.ChartParseJob.created_at.desc())
-                    .limit(1)
-                )
-                .scalars()
-                .first()
-            )
-            if not latest:
-                return None
-            correlation_id = latest.correlation_id
-            return self.get_status_by_correlation(correlation_id)
+            return self._status_for_patient(session, patient_id)
 
     def get_status_by_correlation(self, correlation_id: str) -> Optional[dict[str, Any]]:
         with self._session_scope() as session:
-            jobs = (
-                session.execute(
-                    sa.select(db_models.ChartParseJob)
-                    .where(db_models.ChartParseJob.correlation_id == correlation_id)
-                    .order_by(db_models.ChartParseJob.created_at.asc())
-                )
-                .scalars()
-                .all()
+            return self._status_for_correlation(session, correlation_id)
+
+    async def get_status_async(self, patient_id: str) -> Optional[dict[str, Any]]:
+        return await self._run_session(
+            lambda session: self._status_for_patient(session, patient_id)
+        )
+
+    async def get_status_by_correlation_async(
+        self, correlation_id: str
+    ) -> Optional[dict[str, Any]]:
+        return await self._run_session(
+            lambda session: self._status_for_correlation(session, correlation_id)
+        )
+
+    def _status_for_patient(self, session: Session, patient_id: str) -> Optional[dict[str, Any]]:
+        latest = (
+            session.execute(
+                sa.select(db_models.ChartParseJob)
+                .where(db_models.ChartParseJob.patient_id == patient_id)
+                .order_by(db_models.ChartParseJob.created_at.desc())
+                .limit(1)
+            )
+            .scalars()
+            .first()
+        )
+        if not latest:
+            return None
+        return self._status_for_correlation(session, latest.correlation_id)
+
+    def _status_for_correlation(
+        self, session: Session, correlation_id: str
+    ) -> Optional[dict[str, Any]]:
+        jobs = (
+            session.execute(
+                sa.select(db_models.ChartParseJob)
+                .where(db_models.ChartParseJob.correlation_id == correlation_id)
+                .order_by(db_models.ChartParseJob.created_at.asc())
             )
+            .scalars()
+            .all()
+        )
         if not jobs:
             return None
         return self._build_status_payload(correlation_id, jobs)
@@ -414,29 +475,51 @@ class ChartContextPipeline:
         return normalized
 
     def get_snapshot(self, patient_id: str, stage: str) -> Optional[dict[str, Any]]:
-        desired = stage or "superficial"
-        desired = desired.lower()
         with self._session_scope() as session:
-            superficial = session.get(db_models.PatientContextSuperficial, patient_id)
-            deep = session.get(db_models.PatientContextNormalized, patient_id)
-            chunks = (
-                session.execute(
-                    sa.select(db_models.PatientIndexChunk)
-                    .where(db_models.PatientIndexChunk.patient_id == patient_id)
-                )
-                .scalars()
-                .all()
-            )
-            doc_rows = (
-                session.execute(
-                    sa.select(
-                        db_models.ChartDocument.doc_id,
-                        db_models.ChartDocument.name,
-                        db_models.ChartDocument.pages,
-                    ).where(db_models.ChartDocument.patient_id == patient_id)
-                )
-                .all()
+            records = self._snapshot_records(session, patient_id)
+        return self._build_snapshot(patient_id, stage, *records)
+
+    async def get_snapshot_async(self, patient_id: str, stage: str) -> Optional[dict[str, Any]]:
+        records = await self._run_session(
+            lambda session: self._snapshot_records(session, patient_id)
+        )
+        return self._build_snapshot(patient_id, stage, *records)
+
+    @staticmethod
+    def _snapshot_records(session: Session, patient_id: str) -> tuple[Any, Any, bool, list[Any]]:
+        superficial = session.get(db_models.PatientContextSuperficial, patient_id)
+        deep = session.get(db_models.PatientContextNormalized, patient_id)
+        has_chunks = (
+            session.execute(
+                sa.select(db_models.PatientIndexChunk.chunk_id)
+                .where(db_models.PatientIndexChunk.patient_id == patient_id)
+                .limit(1)
+            ).first()
+            is not None
+        )
+        doc_rows = (
+            session.execute(
+                sa.select(
+                    db_models.ChartDocument.doc_id,
+                    db_models.ChartDocument.name,
+                    db_models.ChartDocument.pages,
+                ).where(db_models.ChartDocument.patient_id == patient_id)
             )
+            .all()
+        )
+        return superficial, deep, has_chunks, doc_rows
+
+    def _build_snapshot(
+        self,
+        patient_id: str,
+        stage: str,
+        superficial: Any,
+        deep: Any,
+        has_chunks: bool,
+        doc_rows: list[Any],
+    ) -> Optional[dict[str, Any]]:
+        desired = stage or "superficial"
+        desired = desired.lower()
         documents = {
             str(row.doc_id): {
                 "doc_id": str(row.doc_id),
@@ -465,7 +548,7 @@ class ChartContextPipeline:
                 },
             }
         best_stage = _DEEP
-        if desired in {"final", "indexed"} and chunks:
+        if desired in {"final", "indexed"} and has_chunks:
             best_stage = _INDEXED
         problems = self._normalize_fact_entries(deep.problems, documents)
         medications = self._normalize_fact_entries(deep.meds, documents)
@@ -958,15 +1041,18 @@ class ChartContextPipeline:
                                 },
                             )
                         )
-                        embedding = self._embedding_model.embed(text_segment)
-                        embeddings.append(
-                            db_models.PatientIndexEmbedding(
-                                chunk_id=chunk_id,
-                                embedding=embedding,
-                                model=f"hashing-{self._embedding_model.dimensions}",
-                                created_at=_utc_now(),
-                            )
-                        )
+        if chunks:
+            vectors = self._embedding_model.embed_many([chunk.text for chunk in chunks])
+            model_name = f"hashing-{self._embedding_model.dimensions}"
+            for chunk, vector in zip(chunks, vectors):
+                embeddings.append(
+                    db_models.PatientIndexEmbedding(
+                        chunk_id=chunk.chunk_id,
+                        embedding=vector.tolist(),
+                        model=model_name,
+                        created_at=_utc_now(),
+                    )
+                )
         logger.info(
             "context_pipeline.index.metrics",
             correlation_id=correlation_id,
@@ -1007,6 +1093,22 @@ class ChartContextPipeline:
     # Persistence helpers
     # ------------------------------------------------------------------
 
+    async def _run_session(self, fn: Callable[[Session], _T]) -> _T:
+        """Run ``fn(session)`` without blocking the event loop when possible.
+
+        With an async session factory the query runs through the async driver
+        via :meth:`AsyncSession.run_sync`; otherwise it falls back to the
+        synchronous session (in-memory databases used by tests).
+        """
+
+        session = self._async_session_factory() if self._async_session_factory else None
+        if session is None:
+            with self._session_scope() as sync_session:
+                return fn(sync_session)
+        async with session:
+            async with session.begin():
+                return await session.run_sync(fn)
+
     @contextmanager
     def _session_scope(self):  # type: ignore[override]
         session = self._session_factory()
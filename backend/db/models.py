@@ -1355,6 +1355,33 @@ class ChartParseJobEvent(Base):
     job = sa.orm.relationship(ChartParseJob, backref="events")
 
 
+class BackgroundJob(Base):
+    __tablename__ = "background_jobs"
+
+    id = sa.Column(Integer, primary_key=True, autoincrement=True)
+    queue = sa.Column(String, nullable=False, default="default")
+    name = sa.Column(String, nullable=False)
+    payload = sa.Column(sa.JSON, nullable=True)
+    priority = sa.Column(Integer, nullable=False, default=0)
+    status = sa.Column(String, nullable=False, default="queued")
+    attempts = sa.Column(Integer, nullable=False, default=0)
+    max_attempts = sa.Column(Integer, nullable=False, default=3)
+    dedupe_key = sa.Column(String, nullable=True, unique=True)
+    run_at = sa.Column(Float, nullable=False)
+    enqueued_at = sa.Column(Float, nullable=False)
+    started_at = sa.Column(Float, nullable=True)
+    finished_at = sa.Column(Float, nullable=True)
+    lease_owner = sa.Column(String, nullable=True)
+    lease_expires_at = sa.Column(Float, nullable=True)
+    result = sa.Column(sa.JSON, nullable=True)
+    last_error = sa.Column(Text, nullable=True)
+
+    __table_args__ = (
+        sa.Index("idx_background_jobs_claim", "status", "queue", "priority", "run_at"),
+        sa.Index("idx_background_jobs_lease", "status", "lease_expires_at"),
+    )
+
+
 class PatientContextSuperficial(Base):
     __tablename__ = "patient_context_superficial"
 
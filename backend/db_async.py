@@ -0,0 +1,172 @@
+"""Async SQLAlchemy engine and session helpers.
+
+The synchronous engine in :mod:`backend.database_legacy` blocks the event
+loop for every query issued from an ``async def`` handler.  This module
+exposes an async counterpart built on ``sqlalchemy.ext.asyncio``:
+
+* :func:`async_database_url` maps the configured URL onto an async driver
+  (``sqlite+aiosqlite`` or ``postgresql+psycopg``);
+* :func:`get_async_sessionmaker` returns a cached ``async_sessionmaker`` per
+  URL, and :func:`async_session_scope` / :func:`get_async_session` wrap it in
+  a transaction for helpers and FastAPI dependencies respectively.
+
+Existing ORM query code can be reused unchanged through
+``AsyncSession.run_sync``.  The async drivers are optional:
+:func:`async_driver_available` reports whether they are installed so callers
+can fall back to the synchronous session.
+
+Synchronous endpoints still run in Starlette's thread pool;
+:func:`configure_sync_threadpool` bounds it (``DB_THREADPOOL_SIZE``) so
+blocking handlers cannot exhaust the database with unbounded threads, and
+:func:`run_in_db_thread` offloads individual blocking calls onto the same
+bounded pool.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import os
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, Optional, TypeVar
+
+import anyio
+import structlog
+from sqlalchemy import event
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+_SESSIONMAKERS: Dict[str, "async_sessionmaker[AsyncSession]"] = {}
+_ENGINES: Dict[str, "AsyncEngine"] = {}
+
+
+def async_database_url(url: str) -> str:
+    """Return *url* rewritten for an async driver."""
+
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        raise ValueError(f"Unsupported database URL: {url!r}")
+    base = scheme.split("+", 1)[0]
+    if base == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    if base in {"postgres", "postgresql"}:
+        return f"postgresql+psycopg://{rest}"
+    raise ValueError(f"No async driver configured for {scheme!r}")
+
+
+def async_driver_available(url: str) -> bool:
+    """Return whether the async driver for *url* (and greenlet) is installed."""
+
+    try:
+        driver = async_database_url(url).split("://", 1)[0].split("+", 1)[1]
+    except ValueError:
+        return False
+    module = {"aiosqlite": "aiosqlite", "psycopg": "psycopg"}.get(driver, driver)
+    return all(importlib.util.find_spec(name) is not None for name in (module, "greenlet"))
+
+
+def _configure_sqlite(dbapi_connection: Any, _record: Any) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout={int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))}")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    finally:
+        cursor.close()
+
+
+def create_async_engine_for(url: str, *, echo: bool = False, **options: Any) -> "AsyncEngine":
+    """Create an async engine for *url* (sync or async form)."""
+
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    async_url = async_database_url(url)
+    engine = create_async_engine(async_url, echo=echo, **options)
+    if async_url.startswith("sqlite"):
+        event.listen(engine.sync_engine, "connect", _configure_sqlite)
+    return engine
+
+
+def get_async_sessionmaker(url: Optional[str] = None) -> "async_sessionmaker[AsyncSession]":
+    """Return the cached async session factory for *url*.
+
+    Defaults to the URL from :func:`backend.db.config.get_database_settings`.
+    """
+
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    if url is None:
+        from backend.db.config import get_database_settings
+
+        url = get_database_settings().url
+    factory = _SESSIONMAKERS.get(url)
+    if factory is None:
+        engine = _ENGINES[url] = create_async_engine_for(url)
+        factory = _SESSIONMAKERS[url] = async_sessionmaker(
+            engine, expire_on_commit=False, autoflush=False
+        )
+    return factory
+
+
+@asynccontextmanager
+async def async_session_scope(url: Optional[str] = None) -> AsyncIterator["AsyncSession"]:
+    """Yield an :class:`AsyncSession` inside a transaction."""
+
+    async with get_async_sessionmaker(url)() as session:
+        async with session.begin():
+            yield session
+
+
+async def get_async_session() -> AsyncIterator["AsyncSession"]:
+    """FastAPI dependency yielding an async session committed on success."""
+
+    async with async_session_scope() as session:
+        yield session
+
+
+async def dispose_async_engines() -> None:
+    engines = list(_ENGINES.values())
+    _ENGINES.clear()
+    _SESSIONMAKERS.clear()
+    for engine in engines:
+        await engine.dispose()
+
+
+def configure_sync_threadpool(size: Optional[int] = None) -> int:
+    """Bound the thread pool used for sync endpoints and :func:`run_in_db_thread`.
+
+    Must be called from within the running event loop (e.g. the lifespan).
+    """
+
+    if size is None:
+        try:
+            size = int(os.getenv("DB_THREADPOOL_SIZE", "16"))
+        except ValueError:
+            size = 16
+    size = max(1, size)
+    anyio.to_thread.current_default_thread_limiter().total_tokens = size
+    return size
+
+
+async def run_in_db_thread(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking database call on the bounded thread pool."""
+
+    return await anyio.to_thread.run_sync(partial(fn, *args, **kwargs))
+
+
+__all__ = [
+    "async_database_url",
+    "async_driver_available",
+    "async_session_scope",
+    "configure_sync_threadpool",
+    "create_async_engine_for",
+    "dispose_async_engines",
+    "get_async_session",
+    "get_async_sessionmaker",
+    "run_in_db_thread",
+]
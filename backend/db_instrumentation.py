@@ -0,0 +1,405 @@
+"""Per-request SQL instrumentation and query budgets.
+
+Two layers are instrumented:
+
+* raw ``sqlite3`` work, through :class:`InstrumentedConnection`, a
+  ``sqlite3.Connection`` subclass whose cursors time ``execute``,
+  ``executemany`` and ``executescript`` (open connections with
+  :func:`connect`);
+* SQLAlchemy, through ``before/after_cursor_execute`` listeners registered
+  on every :class:`~sqlalchemy.engine.Engine` by
+  :func:`instrument_sqlalchemy`.
+
+SQLAlchemy statements that run on an instrumented connection are counted
+once, by the SQLAlchemy listeners.  Timings cover statement execution; rows
+fetched afterwards are not included.
+
+Every statement feeds ``revenuepilot_db_query_seconds{source}``.  While a
+request is being served (see :func:`start_request`/:func:`finish_request`)
+statements are also collected into a :class:`QueryStats`: the query count,
+total DB time, the slowest statements and the most repeated ones, normalised
+so literals do not split them.  At the end of the request the totals go to
+per-route histograms and the summary is kept by trace id for
+``/status/observability/trace/{trace_id}``.
+
+:func:`query_budget` is the test-mode assertion: it fails when a request, or
+the wrapped block itself, runs more statements than its declared budget,
+which is how N+1 regressions show up.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple, Union
+
+import structlog
+from prometheus_client import REGISTRY, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = structlog.get_logger(__name__)
+
+
+def _get_or_create_metric(metric_cls, name: str, documentation: str, labelnames, **kwargs):
+    existing = REGISTRY._names_to_collectors.get(name)
+    if existing is not None:
+        return existing
+    return metric_cls(name, documentation, labelnames=labelnames, **kwargs)
+
+
+DB_QUERY_SECONDS = _get_or_create_metric(
+    Histogram,
+    "revenuepilot_db_query_seconds",
+    "Execution time of individual SQL statements",
+    ("source",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+DB_QUERIES_PER_REQUEST = _get_or_create_metric(
+    Histogram,
+    "revenuepilot_db_queries_per_request",
+    "SQL statements executed while serving a request",
+    ("route",),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250, 500),
+)
+DB_TIME_PER_REQUEST = _get_or_create_metric(
+    Histogram,
+    "revenuepilot_db_time_per_request_seconds",
+    "Total SQL execution time while serving a request",
+    ("route",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+
+_MAX_STATEMENT = 300
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE)
+
+_REQUEST_STATS: ContextVar[Optional["QueryStats"]] = ContextVar("db_query_stats", default=None)
+# Set while a SQLAlchemy statement runs so the sqlite3 layer does not count it again.
+_LOCAL = threading.local()
+_CAPTURES: List["QueryCapture"] = []
+_CAPTURES_LOCK = threading.Lock()
+_SQLALCHEMY_INSTRUMENTED = False
+
+
+def instrumentation_enabled() -> bool:
+    return os.getenv("DB_QUERY_INSTRUMENTATION", "1").lower() not in {"0", "false", "no"}
+
+
+@lru_cache(maxsize=2048)
+def normalize_statement(sql: str) -> str:
+    """Collapse literals and whitespace so equivalent statements group together."""
+
+    text = _STRING_RE.sub("?", sql)
+    text = _NUMBER_RE.sub("?", text)
+    text = _IN_LIST_RE.sub("IN (?)", text)
+    return " ".join(text.split())[:_MAX_STATEMENT]
+
+
+class QueryStats:
+    """Statements recorded for one request."""
+
+    def __init__(self, keep_slowest: int = 5) -> None:
+        self.keep_slowest = keep_slowest
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter = Counter()
+        self._slowest: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, seconds: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+            self.statements[statement] += 1
+            slowest = self._slowest
+            if len(slowest) < self.keep_slowest or seconds > slowest[-1][0]:
+                slowest.append((seconds, statement))
+                slowest.sort(key=lambda item: item[0], reverse=True)
+                del slowest[self.keep_slowest :]
+
+    def summary(self, top: int = 5) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queries": self.count,
+                "dbMs": round(self.seconds * 1000, 3),
+                "slowest": [
+                    {"statement": statement, "ms": round(seconds * 1000, 3)}
+                    for seconds, statement in self._slowest[:top]
+                ],
+                "repeated": [
+                    {"statement": statement, "count": count}
+                    for statement, count in self.statements.most_common(top)
+                    if count > 1
+                ],
+            }
+
+
+class QueryTraceStore:
+    """Bounded map of trace id to the DB summary of that request."""
+
+    def __init__(self, max_entries: int = 500) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, trace_id: str, summary: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[trace_id] = summary
+            self._entries.move_to_end(trace_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._entries.get(trace_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+QUERY_TRACES = QueryTraceStore()
+
+
+def get_query_trace(trace_id: str) -> Optional[Dict[str, Any]]:
+    return QUERY_TRACES.get(trace_id)
+
+
+def record_query(sql: str, seconds: float, source: str) -> None:
+    DB_QUERY_SECONDS.labels(source).observe(seconds)
+    stats = _REQUEST_STATS.get()
+    if stats is None and not _CAPTURES:
+        return
+    statement = normalize_statement(sql)
+    if stats is not None:
+        stats.record(statement, seconds)
+    for capture in list(_CAPTURES):
+        capture.record_query(statement)
+
+
+# -- sqlite3 ---------------------------------------------------------------
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        if getattr(_LOCAL, "sqlalchemy", False):
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query(sql, time.perf_counter() - start, "sqlite3")
+
+    def executemany(self, sql, seq_of_parameters):
+        if getattr(_LOCAL, "sqlalchemy", False):
+            return super().executemany(sql, seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(sql, time.perf_counter() - start, "sqlite3")
+
+    def executescript(self, sql_script):
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            record_query(sql_script, time.perf_counter() - start, "sqlite3")
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """``sqlite3.Connection`` whose statements are timed and counted."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # ``Connection.execute`` does not route through ``cursor()``.
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def connect(database: Union[str, os.PathLike], **kwargs: Any) -> sqlite3.Connection:
+    """``sqlite3.connect`` returning an instrumented connection when enabled."""
+
+    if instrumentation_enabled():
+        kwargs.setdefault("factory", InstrumentedConnection)
+    return sqlite3.connect(database, **kwargs)
+
+
+# -- SQLAlchemy -------------------------------------------------------------
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    _LOCAL.sqlalchemy = True
+    conn.info.setdefault("_query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    _LOCAL.sqlalchemy = False
+    started = conn.info.get("_query_started")
+    if started:
+        record_query(statement, time.perf_counter() - started.pop(), "sqlalchemy")
+
+
+def _handle_error(exception_context) -> None:
+    _LOCAL.sqlalchemy = False
+    conn = exception_context.connection
+    started = conn.info.get("_query_started") if conn is not None else None
+    if started:
+        started.pop()
+
+
+def instrument_sqlalchemy() -> None:
+    """Register the cursor listeners on every engine (idempotent)."""
+
+    global _SQLALCHEMY_INSTRUMENTED
+    if _SQLALCHEMY_INSTRUMENTED or not instrumentation_enabled():
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+    _SQLALCHEMY_INSTRUMENTED = True
+
+
+# -- requests ---------------------------------------------------------------
+
+
+def start_request() -> Token:
+    return _REQUEST_STATS.set(QueryStats())
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _REQUEST_STATS.get()
+
+
+def finish_request(token: Token, route: str, trace_id: Optional[str]) -> QueryStats:
+    """Close the request's stats and publish them to metrics and the trace store."""
+
+    stats = _REQUEST_STATS.get() or QueryStats()
+    _REQUEST_STATS.reset(token)
+    DB_QUERIES_PER_REQUEST.labels(route).observe(stats.count)
+    DB_TIME_PER_REQUEST.labels(route).observe(stats.seconds)
+    if stats.count:
+        summary = stats.summary()
+        summary["route"] = route
+        if trace_id:
+            QUERY_TRACES.put(trace_id, summary)
+        for capture in list(_CAPTURES):
+            capture.record_request(route, trace_id, summary)
+    return stats
+
+
+def server_timing(stats: QueryStats) -> str:
+    return f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries"'
+
+
+# -- budgets ----------------------------------------------------------------
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised by :func:`query_budget` when a budget is exceeded."""
+
+
+class QueryCapture:
+    """Statements and finished requests observed inside :func:`query_budget`."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.statements: Counter = Counter()
+        self.requests: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record_query(self, statement: str) -> None:
+        with self._lock:
+            self.count += 1
+            self.statements[statement] += 1
+
+    def record_request(self, route: str, trace_id: Optional[str], summary: Dict[str, Any]) -> None:
+        with self._lock:
+            self.requests.append({**summary, "route": route, "traceId": trace_id})
+
+    def violations(self, budget: Union[int, Mapping[str, int]]) -> List[str]:
+        problems = []
+        for request in self.requests:
+            limit = budget if isinstance(budget, int) else budget.get(request["route"])
+            if limit is not None and request["queries"] > limit:
+                repeated = "; ".join(
+                    f"{item['count']}x {item['statement']}" for item in request["repeated"][:3]
+                )
+                problems.append(
+                    f"{request['route']} ran {request['queries']} queries "
+                    f"(budget {limit}){': ' + repeated if repeated else ''}"
+                )
+        if isinstance(budget, int) and not self.requests and self.count > budget:
+            repeated = "; ".join(
+                f"{count}x {statement}"
+                for statement, count in self.statements.most_common(3)
+                if count > 1
+            )
+            problems.append(
+                f"block ran {self.count} queries (budget {budget})"
+                f"{': ' + repeated if repeated else ''}"
+            )
+        return problems
+
+
+@contextmanager
+def query_budget(budget: Union[int, Mapping[str, int]]) -> Iterator[QueryCapture]:
+    """Fail when code inside the block exceeds a query budget.
+
+    ``budget`` is either a limit applied to every request finished inside
+    the block, or a mapping of ``"METHOD /route/template"`` to a limit.  With
+    an integer budget and no requests (service-level code), the limit
+    applies to all statements run in the block.
+    """
+
+    capture = QueryCapture()
+    with _CAPTURES_LOCK:
+        _CAPTURES.append(capture)
+    try:
+        yield capture
+    finally:
+        with _CAPTURES_LOCK:
+            _CAPTURES.remove(capture)
+    problems = capture.violations(budget)
+    if problems:
+        raise QueryBudgetExceeded("Query budget exceeded:\n" + "\n".join(problems))
+
+
+__all__ = [
+    "DB_QUERIES_PER_REQUEST",
+    "DB_QUERY_SECONDS",
+    "DB_TIME_PER_REQUEST",
+    "InstrumentedConnection",
+    "InstrumentedCursor",
+    "QUERY_TRACES",
+    "QueryBudgetExceeded",
+    "QueryCapture",
+    "QueryStats",
+    "QueryTraceStore",
+    "connect",
+    "current_stats",
+    "finish_request",
+    "get_query_trace",
+    "instrument_sqlalchemy",
+    "normalize_statement",
+    "query_budget",
+    "record_query",
+    "server_timing",
+    "start_request",
+]
@@ -0,0 +1,249 @@
+"""Connection pool for the raw SQLite path.
+
+Most raw SQL in the backend runs on one module-level ``db_conn`` shared by
+async handlers, threadpool endpoints and ``asyncio.to_thread`` jobs.
+:class:`SQLitePool` gives code that runs off the event loop its own
+connections instead:
+
+* one writer connection, checked out by one thread or task at a time, whose
+  checkout is a transaction (commit on success, rollback on error);
+* up to ``DB_POOL_READERS`` read-only connections that run concurrently with
+  the writer and each other (WAL mode lets readers proceed during writes).
+
+Every connection is configured with ``journal_mode=WAL``,
+``synchronous=NORMAL`` and a ``busy_timeout`` (``DB_BUSY_TIMEOUT_MS``).
+Checkouts nest: a ``read()`` or ``write()`` inside an open ``write()`` in the
+same thread or task reuses the writer, so helpers can be composed inside a
+single transaction.  Checkouts block, so code on the event loop must not hold
+one across an ``await``; the pool is meant for threadpool endpoints and
+``asyncio.to_thread`` jobs.
+
+In-memory databases cannot be shared between connections;
+:meth:`SQLitePool.wrap` serves an existing connection from behind a lock
+instead, which is how tests and ``:memory:`` deployments use the pool.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, List, Optional
+
+import structlog
+from prometheus_client import REGISTRY, Histogram
+
+from backend.db_instrumentation import connect
+
+logger = structlog.get_logger(__name__)
+
+
+def _get_or_create_metric(metric_cls, name: str, documentation: str, labelnames, **kwargs):
+    existing = REGISTRY._names_to_collectors.get(name)
+    if existing is not None:
+        return existing
+    return metric_cls(name, documentation, labelnames=labelnames, **kwargs)
+
+
+DB_POOL_WAIT = _get_or_create_metric(
+    Histogram,
+    "revenuepilot_db_pool_wait_seconds",
+    "Time spent waiting to check out a pooled SQLite connection",
+    ("mode",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+
+
+class PoolTimeout(RuntimeError):
+    """Raised when no connection could be checked out in time."""
+
+
+def configure_connection(
+    conn: sqlite3.Connection,
+    *,
+    busy_timeout_ms: int = 5000,
+    synchronous: str = "NORMAL",
+) -> sqlite3.Connection:
+    """Apply the pool's pragmas and row factory to *conn*."""
+
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+    try:
+        mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()
+        if mode and str(mode[0]).lower() == "wal":
+            conn.execute(f"PRAGMA synchronous={synchronous}")
+    except sqlite3.OperationalError as exc:
+        # A database locked by another process keeps its journal mode.
+        logger.warning("sqlite_wal_unavailable", error=str(exc))
+    return conn
+
+
+class SQLitePool:
+    """Single-writer, multi-reader pool of SQLite connections."""
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        readers: int = 4,
+        busy_timeout_ms: int = 5000,
+        checkout_timeout: float = 30.0,
+    ) -> None:
+        self.path = str(path)
+        self.readers = max(0, int(readers))
+        self.busy_timeout_ms = int(busy_timeout_ms)
+        self.checkout_timeout = checkout_timeout
+        self._writer: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.Lock()
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._opened = 0
+        self._open_lock = threading.Lock()
+        self._all: List[sqlite3.Connection] = []
+        self._held: ContextVar[Optional[sqlite3.Connection]] = ContextVar(
+            f"sqlite_pool_held_{id(self)}", default=None
+        )
+        self._shared: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def from_env(cls, path: str) -> "SQLitePool":
+        def _number(name: str, default: float) -> float:
+            try:
+                return float(os.getenv(name, str(default)))
+            except ValueError:
+                return default
+
+        return cls(
+            path,
+            readers=int(_number("DB_POOL_READERS", 4)),
+            busy_timeout_ms=int(_number("DB_BUSY_TIMEOUT_MS", 5000)),
+            checkout_timeout=_number("DB_POOL_TIMEOUT_SECONDS", 30.0),
+        )
+
+    @classmethod
+    def wrap(cls, conn: sqlite3.Connection) -> "SQLitePool":
+        """Return a pool that serialises all checkouts onto *conn*."""
+
+        pool = cls(":memory:", readers=0)
+        pool._shared = pool._writer = conn
+        return pool
+
+    @property
+    def shared(self) -> bool:
+        return self._shared is not None
+
+    def _connect(self, *, read_only: bool) -> sqlite3.Connection:
+        conn = connect(self.path, check_same_thread=False, timeout=self.busy_timeout_ms / 1000)
+        configure_connection(conn, busy_timeout_ms=self.busy_timeout_ms)
+        if read_only:
+            conn.execute("PRAGMA query_only=ON")
+        self._all.append(conn)
+        return conn
+
+    def _writer_conn(self) -> sqlite3.Connection:
+        if self._writer is None:
+            self._writer = self._connect(read_only=False)
+        return self._writer
+
+    @contextmanager
+    def _hold_writer(self, mode: str) -> Iterator[sqlite3.Connection]:
+        started = time.perf_counter()
+        if not self._write_lock.acquire(timeout=self.checkout_timeout):
+            raise PoolTimeout(f"timed out waiting for the SQLite {mode} connection")
+        DB_POOL_WAIT.labels(mode).observe(time.perf_counter() - started)
+        try:
+            conn = self._writer_conn()
+            token = self._held.set(conn)
+            try:
+                yield conn
+            finally:
+                self._held.reset(token)
+        finally:
+            self._write_lock.release()
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """Check out the writer for one transaction."""
+
+        held = self._held.get()
+        if held is not None:
+            yield held
+            return
+        with self._hold_writer("write") as conn:
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        """Check out a read-only connection."""
+
+        held = self._held.get()
+        if held is not None:
+            yield held
+            return
+        if self.shared or self.readers == 0:
+            with self._hold_writer("read") as conn:
+                yield conn
+            return
+        started = time.perf_counter()
+        conn = self._checkout_reader()
+        DB_POOL_WAIT.labels("read").observe(time.perf_counter() - started)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def _checkout_reader(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._open_lock:
+            if self._opened < self.readers:
+                self._opened += 1
+                try:
+                    return self._connect(read_only=True)
+                except Exception:
+                    self._opened -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.checkout_timeout)
+        except queue.Empty as exc:
+            raise PoolTimeout("timed out waiting for a SQLite read connection") from exc
+
+    def run(self, fn: Callable[[sqlite3.Connection], object], *, write: bool = False):
+        """Call ``fn(conn)`` with a checked-out connection."""
+
+        with (self.write() if write else self.read()) as conn:
+            return fn(conn)
+
+    def close(self) -> None:
+        if self.shared:
+            return
+        with self._write_lock:
+            for conn in self._all:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._all.clear()
+            self._writer = None
+            self._idle = queue.LifoQueue()
+            self._opened = 0
+
+
+__all__ = [
+    "PoolTimeout",
+    "SQLitePool",
+    "configure_connection",
+]
@@ -16,6 +16,7 @@ from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Seque
 
 from pydantic import BaseModel, Field, field_validator
 
+from backend.memory_diagnostics import register_cache
 from backend.security import DEID_POLICY
 from backend.sanitizer import sanitize_text
 
@@ -79,6 +80,7 @@ _UNIT_PATTERN = re.compile(r"^[A-Za-z0-9/%°\[\]\s\-\.]+$")
 
 _FEATURE_CACHE_CAPACITY = 256
 _FEATURE_CACHE: "OrderedDict[Tuple[str, str], Features]" = OrderedDict()
+register_cache("dcsb.features", _FEATURE_CACHE)
 
 
 def _normalize_text(value: Any) -> str:
@@ -18,13 +18,26 @@ DATE, DOB, IP, MRN, PHI (generic fallback for philter), etc.
 
 The regex implementation intentionally prioritizes longer spans (names with
 prefixes, multi-part surnames) to reduce partial masking.
+
+Presidio and scrubadub hits are collected as spans over the original text,
+overlaps are resolved once by priority and length, and the output is
+assembled in a single join.  The regex engine is defined by its sequential
+passes (later patterns see the tokens of earlier ones) but runs as a span
+scan too: every pattern is matched once against the original text and
+matches that provably cannot interact become spans directly.  Only the
+neighbourhood of matches that touch each other is re-run through the
+sequential passes, and that result joins the resolver as one more span.
 """
 from __future__ import annotations
 
 import os
 import re
+import bisect
 import hashlib
-from typing import List, Dict, Any, Iterable, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, List, Dict, Any, Iterable, Iterator, Optional, Sequence, Tuple
 
 _PRESIDIO_AVAILABLE = False
 _PHILTER_AVAILABLE = False
@@ -104,104 +117,379 @@ _PRESIDIO_ENTITY_MAP = {
     "US_DRIVER_LICENSE": "MRN",  # treat as MRN for test expectations when misclassified
 }
 
+_FALLBACKS: ContextVar[Optional[List[str]]] = ContextVar("deid_fallbacks", default=None)
+
+
+@contextmanager
+def track_fallbacks() -> Iterator[List[str]]:
+    """Collect the engines that fell back to regex inside the block.
+
+    Callers caching results use this to avoid pinning degraded output from a
+    transient engine failure.
+    """
+
+    sink: List[str] = []
+    token = _FALLBACKS.set(sink)
+    try:
+        yield sink
+    finally:
+        _FALLBACKS.reset(token)
+
+
+def _regex_fallback(engine: str, text: str, hash_tokens: bool) -> str:
+    sink = _FALLBACKS.get()
+    if sink is not None:
+        sink.append(engine)
+    return _regex_scrub(text, hash_tokens)
+
+
 def _hash(value: str, hash_tokens: bool) -> str:
     return hashlib.sha1(value.encode()).hexdigest()[:10] if hash_tokens else value
 
-def _regex_scrub(text: str, hash_tokens: bool = True) -> str:
-    # First replace emails explicitly so URL pattern doesn't consume them.
+
+@dataclass(frozen=True, slots=True)
+class Span:
+    """A detected PHI span over the original text.
+
+    ``raw`` is the value that gets hashed into the token; it may differ from
+    ``text[start:end]`` (e.g. trailing punctuation is swallowed but not hashed).
+    Lower ``priority`` wins overlaps.  ``token``, when set, is emitted as-is
+    instead of the ``[tag:hash]`` token.
+    """
+
+    start: int
+    end: int
+    tag: str
+    raw: str
+    priority: int = 100
+    token: Optional[str] = None
+
+
+def _repl_ssn(hash_tokens: bool) -> Callable[[re.Match[str]], str]:
+    return lambda m: f"[SSN:{_hash(m.group(0), hash_tokens)}]"
+
+
+def _repl_email(hash_tokens: bool) -> Callable[[re.Match[str]], str]:
     # Strip common trailing punctuation adjacent to emails (e.g. commas / periods).
-    def _repl_email(m: re.Match) -> str:
+    return lambda m: f"[EMAIL:{_hash(m.group(0).rstrip('.,;:'), hash_tokens)}]"
+
+
+def _repl_tag(tag: str, hash_tokens: bool) -> Callable[[re.Match[str]], str]:
+    def inner(m: re.Match[str]) -> str:
+        raw = m.group(0).strip().rstrip('.')
+        # Skip if already tokenised (prevents nested replacements)
+        if raw.startswith('[') and ':' in raw and raw.endswith(']'):
+            return raw
+        return f"[{tag}:{_hash(raw, hash_tokens)}]"
+    return inner
+
+
+# Cheap substring tests for passes that usually have nothing to do.  A pass
+# is skipped only when its pattern cannot match the current text, so the
+# output is unchanged.
+_PASS_NEEDS: Dict[re.Pattern[str], Callable[[str], bool]] = {
+    EMAIL_PATTERN: lambda text: "@" in text,
+    URL_PATTERN: lambda text: "http" in text or "www." in text,
+    DOB_PATTERN: lambda text: "dob" in text.lower(),
+    MRN_PATTERN: lambda text: "mrn" in text.lower(),
+}
+
+
+def _sub(pattern: re.Pattern[str], repl: Callable[[re.Match[str]], str], text: str) -> str:
+    needs = _PASS_NEEDS.get(pattern)
+    if needs is not None and not needs(text):
+        return text
+    return pattern.sub(repl, text)
+
+
+# The regex engine's passes in order: early SSN replacement so later patterns
+# cannot miss it, then emails so the URL pattern doesn't consume them, the
+# tagged patterns, and final (idempotent) SSN and email passes.
+_REGEX_PASSES: List[Tuple[re.Pattern[str], str, Callable[[bool], Callable[[re.Match[str]], str]]]] = [
+    (SSN_PATTERN, "SSN", _repl_ssn),
+    (EMAIL_PATTERN, "EMAIL", _repl_email),
+    *((pattern, tag, lambda hash_tokens, tag=tag: _repl_tag(tag, hash_tokens)) for pattern, tag in TOKEN_ORDER),
+    (SSN_PATTERN, "SSN", _repl_ssn),
+    (EMAIL_PATTERN, "EMAIL", _repl_email),
+]
+
+# Context kept around interacting matches when they are re-run sequentially.
+_WINDOW_PAD = 32
+_GLUED = re.compile(r"\w\w")
+
+
+def _sequential_scrub(text: str, hash_tokens: bool, first: int = 0) -> str:
+    """Run the regex passes from index *first* over *text*, one ``sub`` each."""
+
+    for pattern, _tag, repl in _REGEX_PASSES[first:]:
+        text = _sub(pattern, repl(hash_tokens), text)
+    return text
+
+
+# (start, pass index, end, match) for one pattern match over the original text.
+_Candidate = Tuple[int, int, int, "re.Match[str]"]
+
+
+def _regex_candidates(text: str) -> List[_Candidate]:
+    """Match every pattern once against the original text, ordered by start.
+
+    A match is attributed to the first pass using its pattern.
+    """
+
+    found: List[_Candidate] = []
+    seen = set()
+    for index, (pattern, _tag, _repl) in enumerate(_REGEX_PASSES):
+        if pattern in seen:
+            continue
+        seen.add(pattern)
+        needs = _PASS_NEEDS.get(pattern)
+        if needs is not None and not needs(text):
+            continue
+        found.extend([(match.start(), index, match.end(), match) for match in pattern.finditer(text)])
+    # (start, pass) is unique, so the sort never compares match objects.
+    found.sort()
+    return found
+
+
+def _glued(text: str, position: int) -> bool:
+    # Replacing either side with a bracketed token would add a word boundary.
+    return position > 0 and _GLUED.match(text, position - 1) is not None
+
+
+def _independent_roots(text: str, group: Sequence[_Candidate]) -> Optional[List[_Candidate]]:
+    """Matches the sequential passes would replace as found, or None.
+
+    A match inside one from an earlier pass disappears with it.  Tokens are
+    bracketed and only the URL pattern runs through brackets, so a match that
+    touches none from another pass and leaves word boundaries intact is
+    replaced exactly as found.  Anything else interacts with its neighbours.
+    """
+
+    if len(group) == 1:
+        start, _index, end, _match = group[0]
+        return None if _glued(text, start) or _glued(text, end) else group
+    roots: List[_Candidate] = []
+    for candidate in sorted(group, key=lambda item: item[1]):
+        start, index, end, _match = candidate
+        if any(root[0] <= start and end <= root[2] and root[1] < index for root in roots):
+            continue
+        if any(
+            root[0] <= end and start <= root[2] and (root[1] != index or root[0] < end and start < root[2])
+            for root in roots
+        ):
+            return None
+        if _glued(text, start) or _glued(text, end):
+            return None
+        roots.append(candidate)
+    return roots
+
+
+def _window_bounds(
+    text: str, starts: Sequence[int], ends: Sequence[int], lo: int, hi: int, pad: int
+) -> Tuple[int, int, int, int]:
+    """Widen ``text[lo:hi]`` by *pad*, cut at whitespace, without splitting groups.
+
+    Returns the window and the extent of the groups inside it.
+    """
+
+    size = len(text)
+    while True:
+        start, end = max(0, lo - pad), min(size, hi + pad)
+        while start > 0 and not text[start - 1].isspace():
+            start -= 1
+        while end < size and not text[end].isspace():
+            end += 1
+        first = bisect.bisect_left(ends, start)
+        last = bisect.bisect_right(starts, end)
+        if first >= last or (starts[first] >= lo and ends[last - 1] <= hi):
+            return start, end, lo, hi
+        lo, hi = min(lo, starts[first]), max(hi, ends[last - 1])
+
+
+def _window_spans(
+    text: str, extents: Sequence[Tuple[int, int]], dirty: Sequence[Tuple[int, int]], hash_tokens: bool
+) -> List[Span]:
+    """Sequentially scrub windows around the *dirty* group extents.
+
+    Each window becomes one pre-rendered span.  The padding around the groups
+    holds no matches of its own; tokens may still extend into it (a URL runs
+    on through a token), but if the outer half of the padding is untouched
+    nothing reached across the cut.  Otherwise the padding grows, at worst to
+    the whole text.
+    """
+
+    starts = [extent[0] for extent in extents]
+    ends = [extent[1] for extent in extents]
+    pad = _WINDOW_PAD
+    while True:
+        bounds: List[Tuple[int, int, int, int]] = []
+        for lo, hi in dirty:
+            if bounds and hi <= bounds[-1][3]:
+                continue
+            window = _window_bounds(text, starts, ends, lo, hi, pad)
+            while bounds and window[0] < bounds[-1][1]:
+                window = _window_bounds(text, starts, ends, bounds.pop()[2], window[3], pad)
+            bounds.append(window)
+        spans: List[Span] = []
+        for start, end, lo, hi in bounds:
+            token = _sequential_scrub(text[start:end], hash_tokens)
+            head, tail = text[start:start + (lo - start) // 2], text[end - (end - hi) // 2:end]
+            if len(token) < len(head) + len(tail) or not token.startswith(head) or not token.endswith(tail):
+                break
+            spans.append(Span(start, end, "REGEX", text[start:end], -1, token))
+        else:
+            return spans
+        pad *= 4
+
+
+def _regex_scrub(text: str, hash_tokens: bool = True) -> str:
+    candidates = _regex_candidates(text)
+    if not candidates:
+        return text
+
+    # Matches that overlap or touch (transitively) form a group.
+    groups: List[List[_Candidate]] = []
+    extents: List[Tuple[int, int]] = []
+    group_end = -1
+    for candidate in candidates:
+        if candidate[0] <= group_end:
+            groups[-1].append(candidate)
+            if candidate[2] > group_end:
+                group_end = candidate[2]
+                extents[-1] = (extents[-1][0], group_end)
+        else:
+            groups.append([candidate])
+            group_end = candidate[2]
+            extents.append((candidate[0], group_end))
+
+    renderers = [repl(hash_tokens) for _pattern, _tag, repl in _REGEX_PASSES]
+    spans: List[Span] = []
+    dirty: List[Tuple[int, int]] = []
+    for group, extent in zip(groups, extents):
+        roots = _independent_roots(text, group)
+        if roots is None:
+            dirty.append(extent)
+            continue
+        for start, index, end, match in roots:
+            token = renderers[index](match)
+            if not hash_tokens:
+                # Unhashed tokens carry the raw value, which later passes re-match.
+                token = _sequential_scrub(token, False, index + 1)
+            spans.append(Span(start, end, _REGEX_PASSES[index][1], match.group(0), index, token))
+    if dirty:
+        spans.extend(_window_spans(text, extents, dirty, hash_tokens))
+    return assemble(text, spans, hash_tokens)
+
+
+def resolve_spans(spans: Iterable[Span]) -> List[Span]:
+    """Pick non-overlapping spans: lower priority first, then longer, then earlier."""
+
+    ordered = sorted(spans, key=lambda span: (span.priority, span.start - span.end, span.start))
+    chosen: List[Span] = []
+    starts: List[int] = []
+    for span in ordered:
+        if span.end <= span.start:
+            continue
+        index = bisect.bisect_left(starts, span.start)
+        if index > 0 and chosen[index - 1].end > span.start:
+            continue
+        if index < len(chosen) and chosen[index].start < span.end:
+            continue
+        starts.insert(index, span.start)
+        chosen.insert(index, span)
+    return chosen
+
+
+def assemble(text: str, spans: Iterable[Span], hash_tokens: bool = True) -> str:
+    """Resolve overlapping *spans* and replace the winners in one join."""
+
+    parts: List[str] = []
+    cursor = 0
+    for span in resolve_spans(spans):
+        parts.append(text[cursor:span.start])
+        parts.append(span.token if span.token is not None else f"[{span.tag}:{_hash(span.raw, hash_tokens)}]")
+        cursor = span.end
+    if not parts:
+        return text
+    parts.append(text[cursor:])
+    return "".join(parts)
+
+
+def _presidio_from_results(text: str, results: Iterable[Any], hash_tokens: bool = True) -> str:
+    """Build Presidio output for *text* from analyzer *results*.
+
+    Split out of :func:`_presidio` so batch workers that analyse many texts in
+    one pipeline call can share the span handling.
+    """
+
+    # SSN and whole-email spans outrank analyzer spans so Presidio cannot
+    # split an email into DOMAIN/URL pieces or miss an SSN.
+    spans: List[Span] = [
+        Span(m.start(), m.end(), "SSN", m.group(0), priority=0)
+        for m in SSN_PATTERN.finditer(text)
+    ]
+    for m in EMAIL_PATTERN.finditer(text):
         raw = m.group(0).rstrip('.,;:')
-        return f"[EMAIL:{_hash(raw, hash_tokens)}]"
-    # Early SSN replacement so later patterns cannot miss it
-    text = SSN_PATTERN.sub(lambda m: f"[SSN:{_hash(m.group(0), hash_tokens)}]", text)
-    text = EMAIL_PATTERN.sub(_repl_email, text)
-
-    def _repl(tag: str):
-        def inner(m: re.Match) -> str:
-            raw = m.group(0).strip().rstrip('.')
-            # Skip if already tokenised (prevents nested replacements)
-            if raw.startswith('[') and ':' in raw and raw.endswith(']'):
-                return raw
-            return f"[{tag}:{_hash(raw, hash_tokens)}]"
-        return inner
-    for pattern, tag in TOKEN_ORDER:
-        text = pattern.sub(_repl(tag), text)
-    # Final safety passes (idempotent): SSN then Email again
-    text = SSN_PATTERN.sub(lambda m: f"[SSN:{_hash(m.group(0), hash_tokens)}]", text)
-    text = EMAIL_PATTERN.sub(_repl_email, text)
+        spans.append(Span(m.start(), m.start() + len(raw), "EMAIL", raw, priority=1))
+    for result in results:
+        tag = _PRESIDIO_ENTITY_MAP.get(result.entity_type, result.entity_type).upper()
+        spans.append(Span(result.start, result.end, tag, text[result.start:result.end], priority=10))
+    text = assemble(text, spans, hash_tokens)
+    # Run MRN regex afterwards to catch patterns Presidio missed/misclassified
+    text = _sub(MRN_PATTERN, lambda m: f"[MRN:{_hash(m.group(1), hash_tokens)}]", text)
+    # Final pass to ensure any raw emails escaped earlier are scrubbed.
+    text = _sub(EMAIL_PATTERN, lambda m: f"[EMAIL:{_hash(m.group(0), hash_tokens)}]", text)
     return text
 
 def _presidio(text: str, hash_tokens: bool = True) -> str:
     if not _PRESIDIO_AVAILABLE or not _analyzer:
-        return _regex_scrub(text, hash_tokens)
+        return _regex_fallback("presidio", text, hash_tokens)
     try:
-        # Collect email spans first to avoid partial DOMAIN/URL replacements by Presidio.
-        # Also perform early SSN replacement before analyzer to guarantee redaction.
-        text = SSN_PATTERN.sub(lambda m: f"[SSN:{_hash(m.group(0), hash_tokens)}]", text)
-        email_spans = []  # (start, end, raw)
-        for m in EMAIL_PATTERN.finditer(text):
-            raw = m.group(0).rstrip('.,;:')
-            end = m.start() + len(raw)
-            email_spans.append((m.start(), end, raw))
         results = _analyzer.analyze(text=text, entities=None, language="en")
-        # Filter out analyzer spans that overlap email spans so we can replace whole email.
-        def overlaps(a_start, a_end, b_start, b_end):
-            return not (a_end <= b_start or b_end <= a_start)
-        filtered = []
-        for r in results:
-            if any(overlaps(r.start, r.end, es, ee) for es, ee, _ in email_spans):
-                continue
-            filtered.append(r)
-        # Build combined span list: existing analyzer spans + email spans as synthetic objects.
-        combined = []
-        for r in filtered:
-            combined.append((r.start, r.end, r.entity_type, text[r.start:r.end]))
-        for es, ee, raw in email_spans:
-            combined.append((es, ee, 'EMAIL_ADDRESS', raw))
-        # Sort spans descending by start index for safe in-place replacement.
-        combined.sort(key=lambda t: t[0], reverse=True)
-        for start, end, ent_type, raw in combined:
-            mapped = _PRESIDIO_ENTITY_MAP.get(ent_type, ent_type).upper()
-            tag = mapped
-            text = text[: start] + f"[{tag}:{_hash(raw, hash_tokens)}]" + text[end:]
-        # Normalise any residual driver license tokens to MRN
-        text = re.sub(r"\[US_DRIVER_LICENSE:(.*?)\]", r"[MRN:\1]", text)
-        # Run MRN regex afterwards to catch patterns Presidio missed/misclassified
-        text = MRN_PATTERN.sub(lambda m: f"[MRN:{_hash(m.group(1), hash_tokens)}]", text)
-        # Final pass to ensure any raw emails escaped earlier are scrubbed.
-        text = EMAIL_PATTERN.sub(lambda m: f"[EMAIL:{_hash(m.group(0), hash_tokens)}]", text)
-        return text
+        return _presidio_from_results(text, results, hash_tokens)
     except Exception:  # pragma: no cover - fall back
-        return _regex_scrub(text, hash_tokens)
+        return _regex_fallback("presidio", text, hash_tokens)
 
 def _philter_engine(text: str, hash_tokens: bool = True) -> str:
     if not _PHILTER_AVAILABLE or not _philter:
-        return _regex_scrub(text, hash_tokens)
+        return _regex_fallback("philter", text, hash_tokens)
     try:
         result = _philter.philter(text)
         # Philter returns text with * for removed characters; convert simple sequences
         # of 3+ asterisks back to a generic PHI token.
         return re.sub(r"\*{3,}", lambda m: f"[PHI:{_hash(m.group(0), hash_tokens)}]", result)
     except Exception:  # pragma: no cover
-        return _regex_scrub(text, hash_tokens)
+        return _regex_fallback("philter", text, hash_tokens)
+
+_scrubber = None
+_scrubber_factory = None
+
+
+def _get_scrubber():
+    """Return a shared ``scrubadub.Scrubber`` (rebuilt if the factory changes)."""
+
+    global _scrubber, _scrubber_factory
+    factory = scrubadub.Scrubber  # type: ignore[union-attr]
+    if _scrubber is None or _scrubber_factory is not factory:
+        _scrubber = factory()
+        _scrubber_factory = factory
+    return _scrubber
+
 
 def _scrubadub_engine(text: str, hash_tokens: bool = True) -> str:
     if not _SCRUBBER_AVAILABLE or not scrubadub:  # type: ignore
-        return _regex_scrub(text, hash_tokens)
+        return _regex_fallback("scrubadub", text, hash_tokens)
     try:
-        scrubber = scrubadub.Scrubber()  # type: ignore
-        for filth in scrubber.iter_filth(text):  # type: ignore
-            raw = filth.text
+        spans = []
+        for filth in _get_scrubber().iter_filth(text):  # type: ignore
             tag = filth.type.upper()
             # Normalise some common types for consistency with tests
             if tag == "PERSON":
                 tag = "NAME"
-            replacement = f"[{tag}:{_hash(raw, hash_tokens)}]"
-            text = text.replace(raw, replacement)
-        return text
+            spans.append(Span(filth.beg, filth.end, tag, filth.text))
+        return assemble(text, spans, hash_tokens)
     except Exception:  # pragma: no cover
-        return _regex_scrub(text, hash_tokens)
+        return _regex_fallback("scrubadub", text, hash_tokens)
 
 def deidentify(
     text: str,
@@ -0,0 +1,293 @@
+"""Paragraph-level cache for de-identification results.
+
+Between two AI requests a clinician has usually edited a sentence or two, yet
+every ``/suggest``, ``/beautify`` and ``/summarize`` call de-identifies the
+whole note, chart and transcript again.  :class:`ParagraphDeidCache` splits
+text into paragraphs, scrubs only the paragraphs it has not seen for the same
+``(engine, hash_tokens)`` pair and stitches the cached results back together.
+
+Paragraphs are split on blank lines, but only where none of the built-in
+detectors can match across the break (see :func:`split_paragraphs`), so regex
+output is byte-identical to scrubbing the text in one go.  NER engines see
+paragraph-sized inputs, which matches how they window text anyway.
+
+Memory is bounded by the number of cached characters (``DEID_CACHE_MAX_CHARS``,
+``0`` disables the cache).  When ``DEID_CACHE_PATH`` is set the entries are
+persisted across restarts, encrypted with the artifact key.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import structlog
+from prometheus_client import Counter
+
+from backend import deid as deid_module
+from backend.memory_diagnostics import register_cache
+
+logger = structlog.get_logger(__name__)
+
+DEID_CACHE_PARAGRAPHS = Counter(
+    "revenuepilot_deid_cache_paragraphs_total",
+    "Paragraphs served from or added to the de-identification cache",
+    ("result",),
+)
+
+CacheKey = Tuple[str, bool, str]
+
+_PERSIST_VERSION = 1
+
+# A blank line plus any surrounding whitespace.
+_PARAGRAPH_BREAK = re.compile(r"\s*\n[^\S\n]*\n\s*")
+# Detectors can only continue across a run of whitespace after a word
+# character (month names, "MRN", "DOB", street numbers), a comma (", 2020")
+# or a colon ("DOB:"), or after a "Dr." title.
+_JOINS_NEXT = re.compile(r"[\w,:]")
+
+
+def _ruleset_fingerprint() -> str:
+    """Identify the detector set so persisted results are dropped when it changes."""
+
+    digest = hashlib.sha256()
+    for pattern, tag in deid_module.TOKEN_ORDER:
+        digest.update(tag.encode())
+        digest.update(pattern.pattern.encode())
+    digest.update(deid_module.EMAIL_PATTERN.pattern.encode())
+    return digest.hexdigest()[:16]
+
+
+def split_paragraphs(text: str) -> List[Tuple[str, str]]:
+    """Split *text* into ``(paragraph, separator)`` pairs.
+
+    Joining every paragraph and separator reproduces *text*.  Breaks that a
+    detector could match across are not split on.
+    """
+
+    pieces: List[Tuple[str, str]] = []
+    cursor = 0
+    for match in _PARAGRAPH_BREAK.finditer(text):
+        start, end = match.span()
+        if start == 0 or end == len(text):
+            continue
+        before = text[start - 1]
+        if _JOINS_NEXT.match(before) or text.endswith("Dr.", 0, start):
+            continue
+        pieces.append((text[cursor:start], text[start:end]))
+        cursor = end
+    pieces.append((text[cursor:], ""))
+    return pieces
+
+
+class ParagraphDeidCache:
+    """LRU of scrubbed paragraphs keyed by engine, hashing mode and content hash."""
+
+    def __init__(self, max_chars: int = 4_000_000, path: Optional[str] = None) -> None:
+        self.max_chars = max(0, int(max_chars))
+        self.path = Path(path) if path else None
+        self._entries: "OrderedDict[CacheKey, str]" = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "ParagraphDeidCache":
+        try:
+            max_chars = int(os.getenv("DEID_CACHE_MAX_CHARS", "4000000"))
+        except ValueError:
+            max_chars = 4_000_000
+        path = os.getenv("DEID_CACHE_PATH", "").strip() or None
+        return cls(max_chars=max_chars, path=path)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_chars > 0
+
+    # -- storage -------------------------------------------------------------
+
+    @staticmethod
+    def _key(engine: str, hash_tokens: bool, paragraph: str) -> CacheKey:
+        digest = hashlib.sha256(paragraph.encode("utf-8")).hexdigest()
+        return (engine, bool(hash_tokens), digest)
+
+    def _get(self, key: CacheKey) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def _put(self, key: CacheKey, value: str) -> None:
+        cost = len(value)
+        if cost > self.max_chars:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._chars -= len(previous)
+            self._entries[key] = value
+            self._chars += cost
+            while self._chars > self.max_chars and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._chars -= len(evicted)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._chars = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "chars": self._chars,
+                "maxChars": self.max_chars,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    # -- scrubbing -----------------------------------------------------------
+
+    def _lookup(self, key: CacheKey) -> Optional[str]:
+        cleaned = self._get(key)
+        if cleaned is None:
+            self.misses += 1
+            DEID_CACHE_PARAGRAPHS.labels("miss").inc()
+        else:
+            self.hits += 1
+            DEID_CACHE_PARAGRAPHS.labels("hit").inc()
+        return cleaned
+
+    def scrub(
+        self,
+        text: str,
+        *,
+        engine: str,
+        hash_tokens: bool,
+        scrubber: Callable[[str], str],
+    ) -> str:
+        """Return ``scrubber(text)``, reusing cached paragraphs where possible."""
+
+        if not text or not self.enabled:
+            return scrubber(text)
+        self._ensure_loaded()
+        parts: List[str] = []
+        for paragraph, separator in split_paragraphs(text):
+            if paragraph:
+                key = self._key(engine, hash_tokens, paragraph)
+                cleaned = self._lookup(key)
+                if cleaned is None:
+                    with deid_module.track_fallbacks() as fallbacks:
+                        cleaned = scrubber(paragraph)
+                    if not fallbacks:
+                        self._put(key, cleaned)
+                parts.append(cleaned)
+            parts.append(separator)
+        return "".join(parts)
+
+    async def scrub_async(
+        self,
+        text: str,
+        *,
+        engine: str,
+        hash_tokens: bool,
+        scrubber: Callable[[str], Awaitable[str]],
+    ) -> str:
+        """Async :meth:`scrub`; uncached paragraphs are scrubbed concurrently.
+
+        Submitting every miss at once lets a batching scrubber (see
+        :mod:`backend.deid_service`) analyse them in a single batch.
+        """
+
+        if not text or not self.enabled:
+            return await scrubber(text)
+        self._ensure_loaded()
+        pieces = split_paragraphs(text)
+        cleaned: Dict[str, str] = {}
+        missing: Dict[str, CacheKey] = {}
+        for paragraph, _ in pieces:
+            if not paragraph or paragraph in cleaned or paragraph in missing:
+                continue
+            key = self._key(engine, hash_tokens, paragraph)
+            value = self._lookup(key)
+            if value is None:
+                missing[paragraph] = key
+            else:
+                cleaned[paragraph] = value
+
+        async def _fill(paragraph: str, key: CacheKey) -> None:
+            with deid_module.track_fallbacks() as fallbacks:
+                value = await scrubber(paragraph)
+            if not fallbacks:
+                self._put(key, value)
+            cleaned[paragraph] = value
+
+        await asyncio.gather(*(_fill(paragraph, key) for paragraph, key in missing.items()))
+        return "".join(cleaned.get(paragraph, paragraph) + separator for paragraph, separator in pieces)
+
+    # -- persistence ---------------------------------------------------------
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            from backend.encryption import decrypt_artifact
+
+            payload = json.loads(decrypt_artifact(self.path.read_bytes()).decode("utf-8"))
+        except Exception as exc:
+            logger.warning("deid_cache_load_failed", path=str(self.path), error=str(exc))
+            return
+        if (
+            payload.get("version") != _PERSIST_VERSION
+            or payload.get("ruleset") != _ruleset_fingerprint()
+        ):
+            logger.info("deid_cache_discarded", path=str(self.path), reason="ruleset_changed")
+            return
+        for engine, hash_tokens, digest, value in payload.get("entries", []):
+            if isinstance(value, str):
+                self._put((str(engine), bool(hash_tokens), str(digest)), value)
+        logger.info("deid_cache_loaded", path=str(self.path), entries=len(self._entries))
+
+    def save(self) -> bool:
+        """Persist the cache (encrypted) if a path is configured."""
+
+        if self.path is None or not self.enabled:
+            return False
+        from backend.encryption import encrypt_artifact
+
+        with self._lock:
+            entries = [[engine, hash_tokens, digest, value] for (engine, hash_tokens, digest), value in self._entries.items()]
+        payload = {"version": _PERSIST_VERSION, "ruleset": _ruleset_fingerprint(), "entries": entries}
+        blob = encrypt_artifact(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp_path.write_bytes(blob)
+        os.replace(tmp_path, self.path)
+        return True
+
+
+DEID_CACHE = ParagraphDeidCache.from_env()
+register_cache("deid.paragraphs", DEID_CACHE.stats)
+
+
+__all__ = [
+    "DEID_CACHE",
+    "ParagraphDeidCache",
+    "split_paragraphs",
+]
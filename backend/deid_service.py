@@ -0,0 +1,297 @@
+"""Batched Presidio de-identification in a pool of worker processes.
+
+Presidio's spaCy pipeline is CPU bound and holds the GIL, so calling
+``AnalyzerEngine.analyze`` from request handlers serialises every AI request
+in the process.  :class:`DeidService` keeps a pool of worker processes, each
+with a warm ``AnalyzerEngine``, and exposes an async API.  Texts arriving
+within ``DEID_BATCH_WINDOW_MS`` of each other are grouped into one batch and
+analysed in a single ``nlp.pipe`` pass via ``BatchAnalyzerEngine`` when the
+installed Presidio provides it.
+
+Each call waits at most ``DEID_TIMEOUT_SECONDS``; on timeout or worker failure
+the text is scrubbed with the regex engine instead, so a stuck or crashed
+worker degrades quality rather than availability.  At most
+``DEID_MAX_QUEUE`` texts wait for a batch; beyond that new texts fall back to
+regex immediately instead of queueing behind a backlog they would time out in.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import structlog
+from prometheus_client import REGISTRY, Counter, Histogram
+
+from backend import deid as deid_module
+
+logger = structlog.get_logger(__name__)
+
+
+def _get_or_create_metric(metric_cls, name: str, documentation: str, labelnames, **kwargs):
+    existing = REGISTRY._names_to_collectors.get(name)
+    if existing is not None:
+        return existing
+    return metric_cls(name, documentation, labelnames=labelnames, **kwargs)
+
+
+DEID_QUEUE_SECONDS = _get_or_create_metric(
+    Histogram,
+    "revenuepilot_deid_queue_seconds",
+    "Time texts wait before their de-identification batch is dispatched",
+    (),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+DEID_BATCH_SIZE = _get_or_create_metric(
+    Histogram,
+    "revenuepilot_deid_batch_size",
+    "Number of texts analysed per de-identification batch",
+    (),
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+DEID_BATCH_SECONDS = _get_or_create_metric(
+    Histogram,
+    "revenuepilot_deid_batch_seconds",
+    "Worker time spent analysing one de-identification batch",
+    (),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+DEID_FALLBACKS = _get_or_create_metric(
+    Counter,
+    "revenuepilot_deid_service_fallbacks_total",
+    "Texts scrubbed with the regex engine because the Presidio service failed",
+    ("reason",),
+)
+
+
+# -- worker process -----------------------------------------------------------
+
+_worker_analyzer: Any = None
+_worker_batch: Any = None
+
+
+def _init_worker() -> None:
+    """Warm the worker's analyzer once per process.
+
+    Importing :mod:`backend.deid` in the worker already builds its module
+    analyzer, so that instance is reused rather than loading spaCy twice.
+    """
+
+    global _worker_analyzer, _worker_batch
+    _worker_analyzer = deid_module._analyzer
+    if _worker_analyzer is None:
+        return
+    try:
+        from presidio_analyzer import BatchAnalyzerEngine  # type: ignore
+
+        _worker_batch = BatchAnalyzerEngine(analyzer_engine=_worker_analyzer)
+    except Exception:  # pragma: no cover - older presidio releases
+        _worker_batch = None
+    _worker_analyzer.analyze(text="Warm up John Smith", language="en")
+
+
+def presidio_batch(texts: Sequence[str], hash_tokens: bool) -> List[str]:
+    """Scrub *texts* with this process's analyzer in one pipeline pass."""
+
+    analyzer = _worker_analyzer or deid_module._analyzer
+    if analyzer is None:
+        raise RuntimeError("presidio analyzer unavailable")
+    items = list(texts)
+    if _worker_batch is not None:
+        results = list(_worker_batch.analyze_iterator(items, language="en", batch_size=len(items)))
+    else:
+        results = [analyzer.analyze(text=text, entities=None, language="en") for text in items]
+    return [
+        deid_module._presidio_from_results(text, found, hash_tokens)
+        for text, found in zip(items, results)
+    ]
+
+
+# -- event-loop side ------------------------------------------------------------
+
+
+@dataclass
+class _Pending:
+    text: str
+    hash_tokens: bool
+    future: "asyncio.Future[str]"
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+def _default_executor(workers: int) -> Executor:
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    )
+
+
+class DeidService:
+    """Async front end that micro-batches texts onto a worker pool."""
+
+    def __init__(
+        self,
+        *,
+        workers: int = 2,
+        batch_window: float = 0.005,
+        max_batch: int = 16,
+        timeout: float = 2.0,
+        max_queue: int = 256,
+        batch_fn: Callable[[Sequence[str], bool], List[str]] = presidio_batch,
+        executor_factory: Optional[Callable[[int], Executor]] = None,
+    ) -> None:
+        self.workers = max(0, int(workers))
+        self.batch_window = max(0.0, batch_window)
+        self.max_batch = max(1, int(max_batch))
+        self.timeout = timeout
+        self.max_queue = max(1, int(max_queue))
+        self._batch_fn = batch_fn
+        self._executor_factory = executor_factory or _default_executor
+        self._executor: Optional[Executor] = None
+        self._queue: Optional["asyncio.Queue[_Pending]"] = None
+        self._collector: Optional["asyncio.Task[None]"] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._batches: set["asyncio.Task[None]"] = set()
+
+    @classmethod
+    def from_env(cls) -> "DeidService":
+        def _number(name: str, default: float) -> float:
+            try:
+                return float(os.getenv(name, str(default)))
+            except ValueError:
+                return default
+
+        return cls(
+            workers=int(_number("DEID_WORKERS", 2)),
+            batch_window=_number("DEID_BATCH_WINDOW_MS", 5) / 1000.0,
+            max_batch=int(_number("DEID_MAX_BATCH", 16)),
+            timeout=_number("DEID_TIMEOUT_SECONDS", 2.0),
+            max_queue=int(_number("DEID_MAX_QUEUE", 256)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def _ensure_started(self) -> "asyncio.Queue[_Pending]":
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._collector = loop.create_task(self._collect(self._queue))
+        if self._executor is None:
+            self._executor = self._executor_factory(self.workers)
+        return self._queue
+
+    async def deidentify(self, text: str, *, hash_tokens: bool = True) -> str:
+        """Scrub *text* with Presidio, falling back to regex on timeout or failure."""
+
+        if not text:
+            return text
+        queue = self._ensure_started()
+        future: "asyncio.Future[str]" = asyncio.get_running_loop().create_future()
+        try:
+            queue.put_nowait(_Pending(text=text, hash_tokens=hash_tokens, future=future))
+        except asyncio.QueueFull:
+            DEID_FALLBACKS.labels("overload").inc()
+            return deid_module._regex_fallback("presidio", text, hash_tokens)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            # Drop the text from any batch not yet dispatched; it has been
+            # answered by the regex fallback already.
+            future.cancel()
+            reason = "timeout"
+        except Exception as exc:
+            reason = "error"
+            logger.warning("deid_service_batch_failed", error=str(exc))
+        DEID_FALLBACKS.labels(reason).inc()
+        return deid_module._regex_fallback("presidio", text, hash_tokens)
+
+    async def _collect(self, queue: "asyncio.Queue[_Pending]") -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            groups: Dict[bool, List[_Pending]] = {}
+            for item in batch:
+                groups.setdefault(item.hash_tokens, []).append(item)
+            for hash_tokens, items in groups.items():
+                task = loop.create_task(self._run_batch(items, hash_tokens))
+                self._batches.add(task)
+                task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, items: List[_Pending], hash_tokens: bool) -> None:
+        live = [item for item in items if not item.future.done()]
+        if not live:
+            return
+        dispatched = time.monotonic()
+        for item in live:
+            DEID_QUEUE_SECONDS.observe(max(0.0, dispatched - item.enqueued_at))
+        DEID_BATCH_SIZE.observe(len(live))
+        executor = self._executor
+        try:
+            if executor is None:
+                raise RuntimeError("deid service is stopped")
+            results = await asyncio.get_running_loop().run_in_executor(
+                executor, self._batch_fn, [item.text for item in live], hash_tokens
+            )
+        except BaseException as exc:
+            if isinstance(exc, BrokenProcessPool) and self._executor is executor:
+                # A crashed worker poisons the pool; start a fresh one lazily.
+                self._executor = None
+                executor.shutdown(wait=False, cancel_futures=True)
+            for item in live:
+                if not item.future.done():
+                    item.future.set_exception(exc if isinstance(exc, Exception) else RuntimeError(str(exc)))
+            if not isinstance(exc, Exception):
+                raise
+            return
+        finally:
+            DEID_BATCH_SECONDS.observe(max(0.0, time.monotonic() - dispatched))
+        for item, result in zip(live, results):
+            if not item.future.done():
+                item.future.set_result(result)
+
+    async def stop(self) -> None:
+        collector, self._collector = self._collector, None
+        if collector is not None:
+            collector.cancel()
+            try:
+                await collector
+            except (asyncio.CancelledError, RuntimeError):
+                pass
+        for task in list(self._batches):
+            task.cancel()
+        self._queue = None
+        self._loop = None
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+DEID_SERVICE = DeidService.from_env()
+
+
+__all__ = [
+    "DEID_SERVICE",
+    "DeidService",
+    "presidio_batch",
+]
@@ -3,21 +3,39 @@
 from __future__ import annotations
 
 import hashlib
-import math
 import re
-from typing import Iterable, List
+from functools import lru_cache
+from typing import Iterable, List, Sequence
+
+import numpy as np
 
 _TOKEN_RE = re.compile(r"[a-z0-9]+", re.IGNORECASE)
 
 
+@lru_cache(maxsize=65536)
+def _token_hash(token: str) -> int:
+    """Return the 32-bit SHA-1 prefix that assigns *token* to a bucket.
+
+    Bucket assignment must not change: ``hashing-<dims>`` vectors are stored
+    in the patient index and compared against freshly computed ones.  Clinical
+    vocabulary is small and repetitive, so caching the digest per token
+    removes almost all hashing cost.
+    """
+
+    return int.from_bytes(hashlib.sha1(token.encode("utf-8")).digest()[:4], "big")
+
+
 class HashingVectorizerEmbedding:
     """Simple hashing-based embedding model.
 
     The model tokenizes text into alphanumeric tokens, maps tokens into a
     fixed-size vector using SHA-1 hashing and L2 normalises the result.  The
-    implementation is deterministic, fast and requires no external
-    dependencies which makes it suitable for unit tests while still behaving
+    implementation is deterministic, fast and needs no model weights or
+    network access which makes it suitable for unit tests while still behaving
     like a "real" embedding model.
+
+    :meth:`embed_many` embeds a batch into one ``float32`` matrix with a
+    single ``np.bincount`` over all token buckets.
     """
 
     def __init__(self, dimensions: int = 128) -> None:
@@ -29,19 +47,36 @@ class HashingVectorizerEmbedding:
     def dimensions(self) -> int:
         return self._dimensions
 
+    def _buckets(self, text: str) -> List[int]:
+        dims = self._dimensions
+        return [_token_hash(token) % dims for token in self._tokenize(text)]
+
     def embed(self, text: str) -> List[float]:
-        tokens = self._tokenize(text)
-        if not tokens:
+        buckets = self._buckets(text)
+        if not buckets:
             return [0.0] * self._dimensions
-        vector = [0.0] * self._dimensions
-        for token in tokens:
-            digest = hashlib.sha1(token.encode("utf-8")).digest()
-            bucket = int.from_bytes(digest[:4], "big") % self._dimensions
-            vector[bucket] += 1.0
-        norm = math.sqrt(sum(value * value for value in vector))
-        if norm:
-            vector = [value / norm for value in vector]
-        return vector
+        vector = np.bincount(buckets, minlength=self._dimensions).astype(np.float64)
+        vector /= np.sqrt(vector @ vector)
+        return vector.tolist()
+
+    def embed_many(self, texts: Sequence[str]) -> np.ndarray:
+        """Return a ``(len(texts), dimensions)`` float32 array of unit vectors.
+
+        Rows for texts without tokens are all zeros, as with :meth:`embed`.
+        """
+
+        dims = self._dimensions
+        flat: List[int] = []
+        for row, text in enumerate(texts):
+            offset = row * dims
+            flat.extend(offset + bucket for bucket in self._buckets(text))
+        counts = np.bincount(
+            np.asarray(flat, dtype=np.int64), minlength=len(texts) * dims
+        ).astype(np.float32)
+        matrix = counts.reshape(len(texts), dims)
+        norms = np.sqrt(np.einsum("ij,ij->i", matrix, matrix))
+        np.divide(matrix, norms[:, None], out=matrix, where=norms[:, None] > 0)
+        return matrix
 
     def _tokenize(self, text: str) -> Iterable[str]:
         return _TOKEN_RE.findall(text.lower())
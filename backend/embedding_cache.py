@@ -0,0 +1,259 @@
+"""Tiered cache of embedding vectors.
+
+The AI gate embeds every changed span on every evaluation, and most spans
+repeat across keystrokes, tabs and restarts.  :class:`EmbeddingCache` puts
+a size-bounded in-process LRU (``EMBEDDING_CACHE_MAX_ENTRIES``) in front of
+an optional SQLite store (``EMBEDDING_CACHE_PATH``) that every worker process
+can open at the same time thanks to WAL mode.
+
+Vectors are keyed by a SHA-256 over the model name and the text, and are
+stored on disk as packed float32 arrays, so vectors read back from disk
+carry float32 precision.  The store keeps at most
+``EMBEDDING_CACHE_MAX_ROWS`` rows; the least recently used rows are evicted
+once that bound is exceeded.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import structlog
+from prometheus_client import REGISTRY, Counter
+
+logger = structlog.get_logger(__name__)
+
+
+def _get_or_create_metric(metric_cls, name: str, documentation: str, labelnames, **kwargs):
+    existing = REGISTRY._names_to_collectors.get(name)
+    if existing is not None:
+        return existing
+    return metric_cls(name, documentation, labelnames=labelnames, **kwargs)
+
+
+EMBEDDING_CACHE_LOOKUPS = _get_or_create_metric(
+    Counter,
+    "revenuepilot_embedding_cache_lookups_total",
+    "Embedding lookups answered from memory, disk or the embedding model",
+    ("result",),
+)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS embedding_cache ("
+    "key TEXT PRIMARY KEY,"
+    "model TEXT NOT NULL,"
+    "vector BLOB NOT NULL,"
+    "last_used REAL NOT NULL)"
+)
+_SCHEMA_INDEX = "CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache(last_used)"
+
+# SQLite's default limit on host parameters is 999 on older builds.
+_SQL_CHUNK = 500
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+def pack_vector(vector: Sequence[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(blob: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+def _chunks(items: Sequence[str], size: int = _SQL_CHUNK) -> Iterable[Sequence[str]]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+class EmbeddingCache:
+    """In-process LRU plus optional shared SQLite store of embedding vectors."""
+
+    def __init__(
+        self,
+        max_entries: int = 4096,
+        path: Optional[str] = None,
+        max_rows: int = 200_000,
+    ) -> None:
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.max_entries = int(max_entries)
+        self.path = Path(path) if path else None
+        self.max_rows = max(0, int(max_rows))
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes_since_evict = 0
+
+    @classmethod
+    def from_env(cls, *, max_entries: Optional[int] = None) -> "EmbeddingCache":
+        def _number(name: str, default: float) -> float:
+            try:
+                return float(os.getenv(name, str(default)))
+            except ValueError:
+                return default
+
+        return cls(
+            max_entries=max_entries or int(_number("EMBEDDING_CACHE_MAX_ENTRIES", 4096)),
+            path=os.getenv("EMBEDDING_CACHE_PATH", "").strip() or None,
+            max_rows=int(_number("EMBEDDING_CACHE_MAX_ROWS", 200_000)),
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # -- persistent tier -----------------------------------------------------
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        if self._conn is None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=5.0)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(_SCHEMA)
+                conn.execute(_SCHEMA_INDEX)
+                conn.commit()
+            except sqlite3.Error as exc:
+                logger.warning("embedding_cache_open_failed", path=str(self.path), error=str(exc))
+                self.path = None
+                return None
+            self._conn = conn
+        return self._conn
+
+    def _load(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        conn = self._db()
+        if conn is None or not keys:
+            return {}
+        found: Dict[str, List[float]] = {}
+        try:
+            for chunk in _chunks(keys):
+                placeholders = ",".join("?" for _ in chunk)
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embedding_cache WHERE key IN ({placeholders})",
+                    tuple(chunk),
+                ).fetchall()
+                found.update((key, unpack_vector(blob)) for key, blob in rows)
+            if found:
+                with conn:
+                    conn.executemany(
+                        "UPDATE embedding_cache SET last_used=? WHERE key=?",
+                        [(time.time(), key) for key in found],
+                    )
+        except sqlite3.Error as exc:
+            logger.warning("embedding_cache_read_failed", error=str(exc))
+        return found
+
+    def _store(self, model: str, items: Sequence[Tuple[str, List[float]]]) -> None:
+        conn = self._db()
+        if conn is None or not items:
+            return
+        now = time.time()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache (key, model, vector, last_used) VALUES (?, ?, ?, ?)",
+                    [(key, model, pack_vector(vector), now) for key, vector in items],
+                )
+            self._writes_since_evict += len(items)
+            if self.max_rows and self._writes_since_evict >= max(1, self.max_rows // 10):
+                self._evict(conn)
+        except sqlite3.Error as exc:
+            logger.warning("embedding_cache_write_failed", error=str(exc))
+
+    def _evict(self, conn: sqlite3.Connection) -> int:
+        self._writes_since_evict = 0
+        (count,) = conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()
+        excess = count - self.max_rows
+        if excess <= 0:
+            return 0
+        with conn:
+            conn.execute(
+                "DELETE FROM embedding_cache WHERE key IN "
+                "(SELECT key FROM embedding_cache ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+        return excess
+
+    # -- public API ----------------------------------------------------------
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Return cached vectors for *texts* (``None`` where not cached)."""
+
+        keys = [cache_key(model, text) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        with self._lock:
+            missing: List[str] = []
+            for idx, key in enumerate(keys):
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    results[idx] = vector
+                else:
+                    missing.append(key)
+            loaded = self._load(list(dict.fromkeys(missing)))
+            for key, vector in loaded.items():
+                self._remember(key, vector)
+        memory_hits = len(texts) - len(missing)
+        disk_hits = 0
+        for idx, key in enumerate(keys):
+            if results[idx] is None and key in loaded:
+                results[idx] = loaded[key]
+                disk_hits += 1
+        if memory_hits:
+            EMBEDDING_CACHE_LOOKUPS.labels("memory").inc(memory_hits)
+        if disk_hits:
+            EMBEDDING_CACHE_LOOKUPS.labels("disk").inc(disk_hits)
+        if len(texts) - memory_hits - disk_hits:
+            EMBEDDING_CACHE_LOOKUPS.labels("miss").inc(len(texts) - memory_hits - disk_hits)
+        return results
+
+    def put_many(self, model: str, items: Sequence[Tuple[str, List[float]]]) -> None:
+        """Store ``(text, vector)`` pairs in both tiers."""
+
+        keyed = {cache_key(model, text): vector for text, vector in items}
+        with self._lock:
+            for key, vector in keyed.items():
+                self._remember(key, vector)
+            self._store(model, list(keyed.items()))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            conn = self._db()
+            if conn is not None:
+                with conn:
+                    conn.execute("DELETE FROM embedding_cache")
+
+    def close(self) -> None:
+        with self._lock:
+            conn, self._conn = self._conn, None
+            if conn is not None:
+                conn.close()
+
+
+__all__ = [
+    "EmbeddingCache",
+    "cache_key",
+    "pack_vector",
+    "unpack_vector",
+]
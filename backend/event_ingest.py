@@ -0,0 +1,253 @@
+"""Buffered ingest of analytics events into the ``events`` table.
+
+``/event`` and ``/api/activity/log`` used to insert and commit one row per
+request and keep every event in an unbounded module-level list.
+:class:`EventIngestBuffer` instead takes validated, redacted event dicts into
+a bounded queue and a background writer flushes them with one
+``executemany`` per transaction.  When the queue is full new events are
+dropped and counted rather than growing memory without limit.
+
+Until :meth:`EventIngestBuffer.start` is awaited (e.g. scripts and tests
+that never run the application lifespan) submitted events are written
+straight away, still as a single batch per call.
+
+The column layout of ``events`` is resolved once per connection instead of
+running ``PRAGMA table_info`` for every insert.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sqlite3
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import structlog
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+
+logger = structlog.get_logger(__name__)
+
+
+def _get_or_create_metric(metric_cls, name: str, documentation: str, labelnames, **kwargs):
+    existing = REGISTRY._names_to_collectors.get(name)
+    if existing is not None:
+        return existing
+    return metric_cls(name, documentation, labelnames=labelnames, **kwargs)
+
+
+EVENT_INGEST_QUEUE_DEPTH = _get_or_create_metric(
+    Gauge,
+    "revenuepilot_event_ingest_queue_depth",
+    "Analytics events waiting to be written",
+    (),
+)
+EVENT_INGEST_DROPPED = _get_or_create_metric(
+    Counter,
+    "revenuepilot_event_ingest_dropped_total",
+    "Analytics events dropped because the ingest queue was full",
+    (),
+)
+EVENT_INGEST_FLUSH_ROWS = _get_or_create_metric(
+    Histogram,
+    "revenuepilot_event_ingest_flush_rows",
+    "Rows written per analytics event flush",
+    (),
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+
+
+_BASE_COLUMNS = (
+    "eventType",
+    "timestamp",
+    "details",
+    "revenue",
+    "codes",
+    "compliance_flags",
+    "public_health",
+    "satisfaction",
+)
+
+
+def _json_or_none(value: Any) -> Optional[str]:
+    return json.dumps(value) if value is not None else None
+
+
+def event_row(event: Mapping[str, Any], *, time_to_close: bool) -> Tuple[Any, ...]:
+    """Return insert parameters for *event* in :func:`insert_sql` column order."""
+
+    details = event.get("details") or {}
+    public_health = details.get("publicHealth")
+    row: List[Any] = [
+        event["eventType"],
+        event["timestamp"],
+        json.dumps(details, ensure_ascii=False),
+        details.get("revenue"),
+    ]
+    if time_to_close:
+        row.append(details.get("timeToClose"))
+    row.extend(
+        [
+            _json_or_none(details.get("codes")),
+            _json_or_none(details.get("compliance")),
+            1 if public_health is True else 0 if public_health is False else None,
+            details.get("satisfaction"),
+        ]
+    )
+    return tuple(row)
+
+
+def insert_sql(*, time_to_close: bool) -> str:
+    columns = list(_BASE_COLUMNS)
+    if time_to_close:
+        columns.insert(4, "time_to_close")
+    placeholders = ", ".join("?" for _ in columns)
+    return f"INSERT INTO events ({', '.join(columns)}) VALUES ({placeholders})"
+
+
+class EventIngestBuffer:
+    """Bounded queue plus batch writer for analytics events."""
+
+    def __init__(
+        self,
+        connection: Callable[[], sqlite3.Connection],
+        *,
+        max_queue: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 0.25,
+    ) -> None:
+        self._connection = connection
+        self.max_queue = max(1, int(max_queue))
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(0.0, flush_interval)
+        self._queue: Optional["asyncio.Queue[Dict[str, Any]]"] = None
+        self._writer: Optional["asyncio.Task[None]"] = None
+        self._schema: Optional[Tuple[sqlite3.Connection, bool]] = None
+
+    @classmethod
+    def from_env(cls, connection: Callable[[], sqlite3.Connection]) -> "EventIngestBuffer":
+        def _number(name: str, default: float) -> float:
+            try:
+                return float(os.getenv(name, str(default)))
+            except ValueError:
+                return default
+
+        return cls(
+            connection,
+            max_queue=int(_number("EVENT_INGEST_MAX_QUEUE", 10_000)),
+            batch_size=int(_number("EVENT_INGEST_BATCH_SIZE", 500)),
+            flush_interval=_number("EVENT_INGEST_FLUSH_MS", 250) / 1000.0,
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._writer is not None and not self._writer.done()
+
+    def _has_time_to_close(self, conn: sqlite3.Connection) -> bool:
+        schema = self._schema
+        if schema is None or schema[0] is not conn:
+            try:
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(events)")}
+            except sqlite3.Error:
+                columns = set()
+            schema = self._schema = (conn, "time_to_close" in columns)
+        return schema[1]
+
+    def write(self, events: Sequence[Mapping[str, Any]]) -> None:
+        """Insert *events* in one transaction."""
+
+        if not events:
+            return
+        conn = self._connection()
+        time_to_close = self._has_time_to_close(conn)
+        rows = [event_row(event, time_to_close=time_to_close) for event in events]
+        with conn:
+            conn.executemany(insert_sql(time_to_close=time_to_close), rows)
+        EVENT_INGEST_FLUSH_ROWS.observe(len(rows))
+
+    def _write_logged(self, events: Sequence[Mapping[str, Any]]) -> None:
+        try:
+            self.write(events)
+        except Exception as exc:
+            logger.error("events_persist_failed", error=str(exc), count=len(events))
+
+    def submit(self, events: Sequence[Dict[str, Any]]) -> int:
+        """Queue *events* for writing and return how many were accepted."""
+
+        if not self.running or self._queue is None:
+            self._write_logged(events)
+            return len(events)
+        accepted = 0
+        for event in events:
+            try:
+                self._queue.put_nowait(event)
+            except asyncio.QueueFull:
+                EVENT_INGEST_DROPPED.inc(len(events) - accepted)
+                logger.warning("events_ingest_dropped", count=len(events) - accepted)
+                break
+            accepted += 1
+        EVENT_INGEST_QUEUE_DEPTH.set(self._queue.qsize())
+        return accepted
+
+    def _take(self, queue: "asyncio.Queue[Dict[str, Any]]", batch: List[Dict[str, Any]]) -> None:
+        while len(batch) < self.batch_size and not queue.empty():
+            batch.append(queue.get_nowait())
+
+    async def _run(self, queue: "asyncio.Queue[Dict[str, Any]]") -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.flush_interval
+            try:
+                while len(batch) < self.batch_size:
+                    self._take(queue, batch)
+                    remaining = deadline - loop.time()
+                    if len(batch) >= self.batch_size or remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                self._write_logged(batch)
+                raise
+            EVENT_INGEST_QUEUE_DEPTH.set(queue.qsize())
+            # The application connection is shared with request handlers on
+            # this loop, so the batch is written here rather than in a thread.
+            self._write_logged(batch)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._writer = asyncio.get_running_loop().create_task(self._run(self._queue))
+
+    async def flush(self) -> None:
+        """Write everything currently queued."""
+
+        queue = self._queue
+        if queue is None:
+            return
+        while not queue.empty():
+            batch: List[Dict[str, Any]] = []
+            self._take(queue, batch)
+            self._write_logged(batch)
+        EVENT_INGEST_QUEUE_DEPTH.set(0)
+
+    async def stop(self) -> None:
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.cancel()
+            try:
+                await writer
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        self._queue = None
+
+
+__all__ = [
+    "EventIngestBuffer",
+    "event_row",
+    "insert_sql",
+]
@@ -8,6 +8,7 @@ from functools import lru_cache
 from typing import Dict, List, Tuple
 
 from backend.egress import secure_get
+from backend.memory_diagnostics import register_cache
 
 CDC_VACCINES_URL = "https://www.cdc.gov/vaccines/schedules/schedule.json"
 USPSTF_SCREENINGS_URL = "https://api.uspreventiveservicestaskforce.org/v1/recommendations"
@@ -26,6 +27,8 @@ def _download(url: str) -> List[dict]:
 
 
 _guideline_cache: Dict[Tuple[int, str, str], Dict[str, List[str]]] = {}
+register_cache("guidelines.results", _guideline_cache)
+register_cache("guidelines.downloads", lambda: _download.cache_info().currsize)
 
 
 def get_guidelines(age: int, sex: str, region: str) -> Dict[str, List[str]]:
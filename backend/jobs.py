@@ -0,0 +1,640 @@
+"""Durable background job queue backed by the ``background_jobs`` table.
+
+Jobs are persisted rows so they survive restarts and can be shared by several
+API processes pointed at the same database.  Workers claim a row with a
+conditional ``UPDATE`` (portable across SQLite and PostgreSQL), hold a lease
+that is renewed by a heartbeat while the handler runs, and expired leases are
+recovered by whichever process notices them first.  Periodic jobs are enqueued
+with a de-duplication key derived from the schedule slot, so only one process
+enqueues each run.
+
+Each named queue has its own concurrency limit, which keeps a slow code
+refresh from blocking short maintenance jobs.  Handlers flagged as
+``cpu_bound`` run in a process pool instead of on the event loop.
+
+The bookkeeping methods (:meth:`JobQueue.claim`, :meth:`JobQueue.complete`,
+...) are synchronous so CLIs and tests can call them directly; the worker,
+scheduler and maintenance loops run them in threads so database I/O never
+blocks the event loop.  Engines bound to a single shared connection
+(``StaticPool``) cannot be used from several threads, so those run inline.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional
+
+import sqlalchemy as sa
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import StaticPool
+
+from backend.db.models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+JOBS_TABLE: sa.Table = BackgroundJob.__table__
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+DEFAULT_LEASE_SECONDS = 60.0
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_RETRY_DELAY = 5.0
+MAX_RETRY_DELAY = 300.0
+FINISHED_RETENTION_SECONDS = 7 * 24 * 60 * 60
+_CLAIM_BATCH = 8
+
+
+def _get_or_create_metric(metric_cls, name: str, documentation: str, labelnames, **kwargs):
+    existing = REGISTRY._names_to_collectors.get(name)
+    if existing is not None:
+        return existing
+    return metric_cls(name, documentation, labelnames=labelnames, **kwargs)
+
+
+JOB_QUEUE_DEPTH = _get_or_create_metric(
+    Gauge,
+    "revenuepilot_job_queue_depth",
+    "Background jobs by queue and status",
+    ("queue", "status"),
+)
+JOB_LATENCY = _get_or_create_metric(
+    Histogram,
+    "revenuepilot_job_latency_seconds",
+    "Background job latency split into queue wait and run time",
+    ("queue", "stage"),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0),
+)
+JOBS_FINISHED_TOTAL = _get_or_create_metric(
+    Counter,
+    "revenuepilot_jobs_finished_total",
+    "Background job attempts by queue and outcome",
+    ("queue", "outcome"),
+)
+
+
+@dataclass(frozen=True)
+class QueueConfig:
+    """Concurrency limit for a named queue within one process."""
+
+    name: str
+    concurrency: int = 1
+
+
+@dataclass(frozen=True)
+class JobSpec:
+    """Registered handler for jobs called ``name``.
+
+    ``handler`` is invoked with the job payload as keyword arguments.  It may be
+    a coroutine function, a plain function (run in a thread) or, when
+    ``cpu_bound`` is set, a picklable module-level function run in the process
+    pool.
+    """
+
+    name: str
+    handler: Callable[..., Any]
+    queue: str = "default"
+    priority: int = 0
+    cpu_bound: bool = False
+    max_attempts: int = 3
+    timeout: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class PeriodicJob:
+    """Enqueue ``name`` once per ``interval`` seconds across all processes."""
+
+    name: str
+    interval: float
+    payload: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class ClaimedJob:
+    id: int
+    name: str
+    queue: str
+    payload: Dict[str, Any]
+    attempts: int
+    max_attempts: int
+    run_at: float
+    started_at: float
+
+
+@dataclass
+class _QueueState:
+    config: QueueConfig
+    running: int = 0
+
+
+def _json_safe(value: Any) -> Any:
+    try:
+        json.dumps(value)
+    except (TypeError, ValueError):
+        return repr(value)
+    return value
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class JobQueue:
+    """Persistent job queue with leased workers and periodic scheduling."""
+
+    def __init__(
+        self,
+        engine: Engine,
+        *,
+        queues: Iterable[QueueConfig] = (),
+        workers: int = 4,
+        process_workers: int = 2,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        retry_delay: float = DEFAULT_RETRY_DELAY,
+        owner: Optional[str] = None,
+        offload: Optional[bool] = None,
+    ) -> None:
+        self.engine = engine
+        self.offload = not isinstance(engine.pool, StaticPool) if offload is None else offload
+        self.owner = owner or default_owner()
+        self.workers = max(1, workers)
+        self.process_workers = max(1, process_workers)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self._queues: Dict[str, _QueueState] = {}
+        self._specs: Dict[str, JobSpec] = {}
+        self._periodic: Dict[str, PeriodicJob] = {}
+        self._periodic_slots: Dict[str, int] = {}
+        self._running: Dict[int, ClaimedJob] = {}
+        # Claims run in worker threads; serialise them so per-queue capacity
+        # checks and counters stay consistent.
+        self._state_lock = threading.Lock()
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        for config in queues:
+            self.add_queue(config)
+
+    # -- configuration -----------------------------------------------------
+
+    def add_queue(self, config: QueueConfig) -> None:
+        self._queues[config.name] = _QueueState(config)
+
+    def register(self, spec: JobSpec) -> None:
+        if spec.queue not in self._queues:
+            self.add_queue(QueueConfig(spec.queue))
+        self._specs[spec.name] = spec
+
+    def add_periodic(self, periodic: PeriodicJob) -> None:
+        if periodic.name not in self._specs:
+            raise KeyError(f"Unknown job '{periodic.name}'")
+        self._periodic[periodic.name] = periodic
+
+    def ensure_schema(self) -> None:
+        JOBS_TABLE.create(self.engine, checkfirst=True)
+        for index in JOBS_TABLE.indexes:
+            index.create(self.engine, checkfirst=True)
+
+    # -- producer API ------------------------------------------------------
+
+    def enqueue(
+        self,
+        name: str,
+        payload: Optional[Mapping[str, Any]] = None,
+        *,
+        priority: Optional[int] = None,
+        delay: float = 0.0,
+        dedupe_key: Optional[str] = None,
+    ) -> Optional[int]:
+        """Persist a job and return its id, or ``None`` if ``dedupe_key`` exists."""
+
+        spec = self._specs.get(name)
+        if spec is None:
+            raise KeyError(f"Unknown job '{name}'")
+        now = time.time()
+        values = {
+            "queue": spec.queue,
+            "name": name,
+            "payload": dict(payload or {}),
+            "priority": spec.priority if priority is None else priority,
+            "status": QUEUED,
+            "attempts": 0,
+            "max_attempts": spec.max_attempts,
+            "dedupe_key": dedupe_key,
+            "run_at": now + max(0.0, delay),
+            "enqueued_at": now,
+        }
+        try:
+            with self.engine.begin() as conn:
+                result = conn.execute(sa.insert(JOBS_TABLE).values(**values))
+                job_id = result.inserted_primary_key[0]
+        except IntegrityError:
+            if dedupe_key is None:
+                raise
+            logger.debug("Job %s already enqueued for key %s", name, dedupe_key)
+            return None
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return int(job_id)
+
+    def enqueue_periodic(self, now: Optional[float] = None) -> List[int]:
+        """Enqueue due periodic runs; only one process wins each schedule slot."""
+
+        now = time.time() if now is None else now
+        enqueued: List[int] = []
+        for periodic in self._periodic.values():
+            slot = int(now // periodic.interval) if periodic.interval > 0 else int(now)
+            if self._periodic_slots.get(periodic.name) == slot:
+                continue
+            job_id = self.enqueue(
+                periodic.name,
+                periodic.payload,
+                dedupe_key=f"periodic:{periodic.name}:{slot}",
+            )
+            # Only mark the slot once the row exists (ours or another
+            # process's); a failed insert is retried on the next tick.
+            self._periodic_slots[periodic.name] = slot
+            if job_id is not None:
+                enqueued.append(job_id)
+        return enqueued
+
+    # -- claiming and bookkeeping -----------------------------------------
+
+    def claim(self, now: Optional[float] = None) -> Optional[ClaimedJob]:
+        """Lease the highest priority runnable job for a queue with free capacity."""
+
+        with self._state_lock:
+            return self._claim_locked(time.time() if now is None else now)
+
+    def _claim_locked(self, now: float) -> Optional[ClaimedJob]:
+        open_queues = [
+            name for name, state in self._queues.items() if state.running < state.config.concurrency
+        ]
+        if not open_queues or not self._specs:
+            return None
+        table = JOBS_TABLE
+        with self.engine.begin() as conn:
+            candidates = conn.execute(
+                sa.select(
+                    table.c.id,
+                    table.c.name,
+                    table.c.queue,
+                    table.c.payload,
+                    table.c.attempts,
+                    table.c.max_attempts,
+                    table.c.run_at,
+                )
+                .where(
+                    table.c.status == QUEUED,
+                    table.c.run_at <= now,
+                    table.c.queue.in_(open_queues),
+                    table.c.name.in_(list(self._specs)),
+                )
+                .order_by(table.c.priority.desc(), table.c.run_at, table.c.id)
+                .limit(_CLAIM_BATCH)
+            ).all()
+            for row in candidates:
+                claimed = conn.execute(
+                    sa.update(table)
+                    .where(table.c.id == row.id, table.c.status == QUEUED)
+                    .values(
+                        status=RUNNING,
+                        attempts=table.c.attempts + 1,
+                        started_at=now,
+                        lease_owner=self.owner,
+                        lease_expires_at=now + self.lease_seconds,
+                    )
+                )
+                if claimed.rowcount == 1:
+                    job = ClaimedJob(
+                        id=row.id,
+                        name=row.name,
+                        queue=row.queue,
+                        payload=dict(row.payload or {}),
+                        attempts=row.attempts + 1,
+                        max_attempts=row.max_attempts,
+                        run_at=row.run_at,
+                        started_at=now,
+                    )
+                    self._queues[job.queue].running += 1
+                    self._running[job.id] = job
+                    return job
+        return None
+
+    def _release(self, job: ClaimedJob) -> None:
+        with self._state_lock:
+            self._running.pop(job.id, None)
+            state = self._queues.get(job.queue)
+            if state is not None and state.running > 0:
+                state.running -= 1
+
+    def complete(self, job: ClaimedJob, result: Any = None) -> None:
+        finished = time.time()
+        with self.engine.begin() as conn:
+            conn.execute(
+                sa.update(JOBS_TABLE)
+                .where(JOBS_TABLE.c.id == job.id, JOBS_TABLE.c.lease_owner == self.owner)
+                .values(
+                    status=SUCCEEDED,
+                    finished_at=finished,
+                    lease_owner=None,
+                    lease_expires_at=None,
+                    result=_json_safe(result),
+                    last_error=None,
+                )
+            )
+        self._release(job)
+        JOB_LATENCY.labels(job.queue, "wait").observe(max(0.0, job.started_at - job.run_at))
+        JOB_LATENCY.labels(job.queue, "run").observe(max(0.0, finished - job.started_at))
+        JOBS_FINISHED_TOTAL.labels(job.queue, SUCCEEDED).inc()
+
+    def fail(self, job: ClaimedJob, error: str) -> None:
+        now = time.time()
+        retry = job.attempts < job.max_attempts
+        values: Dict[str, Any] = {
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "last_error": error[:2000],
+        }
+        if retry:
+            delay = min(MAX_RETRY_DELAY, self.retry_delay * 2 ** (job.attempts - 1))
+            values.update(status=QUEUED, run_at=now + delay)
+        else:
+            values.update(status=FAILED, finished_at=now)
+        with self.engine.begin() as conn:
+            conn.execute(
+                sa.update(JOBS_TABLE)
+                .where(JOBS_TABLE.c.id == job.id, JOBS_TABLE.c.lease_owner == self.owner)
+                .values(**values)
+            )
+        self._release(job)
+        JOBS_FINISHED_TOTAL.labels(job.queue, "retried" if retry else FAILED).inc()
+
+    def heartbeat(self, now: Optional[float] = None) -> int:
+        """Extend the leases of jobs running in this process."""
+
+        with self._state_lock:
+            running = list(self._running)
+        if not running:
+            return 0
+        now = time.time() if now is None else now
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                sa.update(JOBS_TABLE)
+                .where(
+                    JOBS_TABLE.c.id.in_(running),
+                    JOBS_TABLE.c.lease_owner == self.owner,
+                    JOBS_TABLE.c.status == RUNNING,
+                )
+                .values(lease_expires_at=now + self.lease_seconds)
+            )
+        return result.rowcount or 0
+
+    def recover_expired(self, now: Optional[float] = None) -> int:
+        """Requeue (or fail) running jobs whose lease has lapsed."""
+
+        now = time.time() if now is None else now
+        table = JOBS_TABLE
+        expired = (table.c.status == RUNNING) & (table.c.lease_expires_at < now)
+        with self.engine.begin() as conn:
+            failed = conn.execute(
+                sa.update(table)
+                .where(expired, table.c.attempts >= table.c.max_attempts)
+                .values(
+                    status=FAILED,
+                    finished_at=now,
+                    lease_owner=None,
+                    lease_expires_at=None,
+                    last_error="lease expired",
+                )
+            ).rowcount or 0
+            requeued = conn.execute(
+                sa.update(table)
+                .where(expired)
+                .values(status=QUEUED, run_at=now, lease_owner=None, lease_expires_at=None)
+            ).rowcount or 0
+        if failed or requeued:
+            logger.warning("Recovered expired job leases (requeued=%d, failed=%d)", requeued, failed)
+        return failed + requeued
+
+    def prune(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                sa.delete(JOBS_TABLE).where(
+                    JOBS_TABLE.c.status.in_((SUCCEEDED, FAILED)),
+                    JOBS_TABLE.c.finished_at < now - FINISHED_RETENTION_SECONDS,
+                )
+            )
+        return result.rowcount or 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth, running jobs and recent failures."""
+
+        table = JOBS_TABLE
+        now = time.time()
+        with self.engine.connect() as conn:
+            counts = conn.execute(
+                sa.select(table.c.queue, table.c.status, sa.func.count(), sa.func.min(table.c.run_at))
+                .group_by(table.c.queue, table.c.status)
+            ).all()
+            failures = conn.execute(
+                sa.select(table.c.id, table.c.name, table.c.queue, table.c.finished_at, table.c.last_error)
+                .where(table.c.status == FAILED)
+                .order_by(table.c.finished_at.desc())
+                .limit(10)
+            ).all()
+        queues: Dict[str, Dict[str, Any]] = {
+            name: {
+                "concurrency": state.config.concurrency,
+                "runningLocal": state.running,
+                QUEUED: 0,
+                RUNNING: 0,
+                SUCCEEDED: 0,
+                FAILED: 0,
+                "oldestQueuedAgeSeconds": None,
+            }
+            for name, state in self._queues.items()
+        }
+        for queue, status, count, oldest in counts:
+            entry = queues.setdefault(
+                queue,
+                {"concurrency": 0, "runningLocal": 0, QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0,
+                 "oldestQueuedAgeSeconds": None},
+            )
+            entry[status] = count
+            if status == QUEUED and oldest is not None:
+                entry["oldestQueuedAgeSeconds"] = max(0.0, now - oldest)
+        for queue, entry in queues.items():
+            for status in (QUEUED, RUNNING):
+                JOB_QUEUE_DEPTH.labels(queue, status).set(entry[status])
+        return {
+            "owner": self.owner,
+            "queues": queues,
+            "periodic": [
+                {
+                    "name": periodic.name,
+                    "intervalSeconds": periodic.interval,
+                    "nextRunAt": (int(now // periodic.interval) + 1) * periodic.interval
+                    if periodic.interval > 0
+                    else now,
+                }
+                for periodic in self._periodic.values()
+            ],
+            "recentFailures": [
+                {
+                    "id": row.id,
+                    "name": row.name,
+                    "queue": row.queue,
+                    "finishedAt": row.finished_at,
+                    "error": row.last_error,
+                }
+                for row in failures
+            ],
+        }
+
+    # -- execution ---------------------------------------------------------
+
+    async def _db(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a bookkeeping call without blocking the event loop when possible."""
+
+        if self.offload:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    async def execute(self, job: ClaimedJob) -> None:
+        spec = self._specs[job.name]
+        try:
+            if spec.cpu_bound:
+                loop = asyncio.get_running_loop()
+                if self._process_pool is None:
+                    self._process_pool = ProcessPoolExecutor(max_workers=self.process_workers)
+                call: Any = loop.run_in_executor(
+                    self._process_pool, _call_with_payload, spec.handler, job.payload
+                )
+            elif inspect.iscoroutinefunction(spec.handler):
+                call = spec.handler(**job.payload)
+            else:
+                call = asyncio.to_thread(spec.handler, **job.payload)
+            if spec.timeout is not None:
+                result = await asyncio.wait_for(call, spec.timeout)
+            else:
+                result = await call
+            if inspect.isawaitable(result):
+                result = await result
+        except asyncio.CancelledError:
+            # Leave the lease to expire so another worker can pick the job up.
+            self._release(job)
+            raise
+        except Exception as exc:
+            logger.exception("Background job %s (%s) failed", job.name, job.id)
+            await self._db(self.fail, job, f"{type(exc).__name__}: {exc}")
+            return
+        await self._db(self.complete, job, result)
+
+    async def run_pending(self) -> int:
+        """Run claimable jobs until none are left; used by tests and CLIs."""
+
+        processed = 0
+        while True:
+            job = await self._db(self.claim)
+            if job is None:
+                return processed
+            await self.execute(job)
+            processed += 1
+
+    async def _worker_loop(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            try:
+                job = await self._db(self.claim)
+            except Exception:
+                logger.exception("Failed to claim background job")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.execute(job)
+            # Capacity freed up; let idle workers look again.
+            self._wakeup.set()
+
+    async def _scheduler_loop(self) -> None:
+        assert self._wakeup is not None
+        intervals = [p.interval for p in self._periodic.values() if p.interval > 0]
+        tick = min([self.poll_interval, *intervals]) if intervals else self.poll_interval
+        while True:
+            try:
+                await self._db(self.enqueue_periodic)
+            except Exception:
+                logger.exception("Failed to enqueue periodic jobs")
+            await asyncio.sleep(tick)
+
+    async def _maintenance_loop(self) -> None:
+        interval = max(0.05, self.lease_seconds / 3)
+        while True:
+            try:
+                await self._db(self._maintain)
+            except Exception:
+                logger.exception("Background job maintenance failed")
+            await asyncio.sleep(interval)
+
+    def _maintain(self) -> None:
+        self.heartbeat()
+        self.recover_expired()
+        self.prune()
+        self.stats()
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker_loop()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._scheduler_loop()))
+        self._tasks.append(asyncio.create_task(self._maintenance_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+
+
+def _call_with_payload(handler: Callable[..., Any], payload: Dict[str, Any]) -> Any:
+    return handler(**payload)
+
+
+__all__ = [
+    "ClaimedJob",
+    "FAILED",
+    "JobQueue",
+    "JobSpec",
+    "PeriodicJob",
+    "QUEUED",
+    "QueueConfig",
+    "RUNNING",
+    "SUCCEEDED",
+]
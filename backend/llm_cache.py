@@ -0,0 +1,270 @@
+"""Response cache for chat completions.
+
+Identical AI requests are common: the same note re-suggested after a no-op
+edit, several tabs on one encounter, or compose re-running beautify on text
+that has not changed.  :class:`LLMResponseCache` lets :func:`call_openai`
+answer those from a cache instead of paying model latency and cost again.
+
+Entries are keyed by a SHA-256 over the model, temperature, the prompt
+policy version and the (already de-identified) messages.  Two keys are
+stored per response: an exact one and one over whitespace-normalised
+messages, so re-sending a note that only differs in trailing spaces or line
+wrapping still hits.
+
+Memory is a size-bounded LRU (``LLM_CACHE_MAX_ENTRIES``, ``0`` disables the
+cache) with a TTL (``LLM_CACHE_TTL_SECONDS``).  When ``LLM_CACHE_PATH`` is
+set, entries are also written to a SQLite file so hits survive restarts.
+Cached responses are encrypted with the artifact key in both tiers.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Mapping, Optional, Sequence, Tuple
+
+import structlog
+from prometheus_client import REGISTRY, Counter
+
+from backend.memory_diagnostics import register_cache
+
+logger = structlog.get_logger(__name__)
+
+
+def _get_or_create_metric(metric_cls, name: str, documentation: str, labelnames, **kwargs):
+    existing = REGISTRY._names_to_collectors.get(name)
+    if existing is not None:
+        return existing
+    return metric_cls(name, documentation, labelnames=labelnames, **kwargs)
+
+
+LLM_CACHE_REQUESTS = _get_or_create_metric(
+    Counter,
+    "revenuepilot_llm_cache_requests_total",
+    "Chat completion lookups answered from memory, disk or the model",
+    ("result",),
+)
+
+CacheKeys = Tuple[str, str]
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS llm_response_cache ("
+    "key TEXT PRIMARY KEY,"
+    "expires_at REAL NOT NULL,"
+    "payload BLOB NOT NULL)"
+)
+
+
+def _normalise_content(content: Any) -> str:
+    return " ".join(str(content or "").split())
+
+
+def _digest(parts: Sequence[Any]) -> str:
+    blob = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Two-tier (memory LRU + optional SQLite) cache of chat completions."""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 3600.0,
+        path: Optional[str] = None,
+    ) -> None:
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = max(0.0, float(ttl))
+        self.path = Path(path) if path else None
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._policy: Callable[[], str] = lambda: ""
+
+    @classmethod
+    def from_env(cls) -> "LLMResponseCache":
+        def _number(name: str, default: float) -> float:
+            try:
+                return float(os.getenv(name, str(default)))
+            except ValueError:
+                return default
+
+        return cls(
+            max_entries=int(_number("LLM_CACHE_MAX_ENTRIES", 1024)),
+            ttl=_number("LLM_CACHE_TTL_SECONDS", 3600),
+            path=os.getenv("LLM_CACHE_PATH", "").strip() or None,
+        )
+
+    def __len__(self) -> int:
+        """Entries held in the in-memory tier."""
+
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def configure_policy(self, provider: Callable[[], str]) -> None:
+        """Set the callable returning the current prompt policy version."""
+
+        self._policy = provider
+
+    def keys(
+        self,
+        model: str,
+        temperature: float,
+        messages: Sequence[Mapping[str, Any]],
+    ) -> CacheKeys:
+        """Return the ``(exact, normalised)`` keys for a request."""
+
+        policy = self._policy()
+        head = [str(model), float(temperature), policy]
+        exact = _digest(
+            head + [[m.get("role"), m.get("content")] for m in messages]
+        )
+        normalised = _digest(
+            head + [[m.get("role"), _normalise_content(m.get("content"))] for m in messages]
+        )
+        return exact, normalised
+
+    # -- storage -------------------------------------------------------------
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        if self._conn is None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(str(self.path), check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(_SCHEMA)
+                conn.commit()
+            except sqlite3.Error as exc:
+                logger.warning("llm_cache_open_failed", path=str(self.path), error=str(exc))
+                self.path = None
+                return None
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, key: str, expires_at: float, blob: bytes) -> None:
+        self._entries[key] = (expires_at, blob)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _lookup(self, key: str, now: float) -> Tuple[Optional[bytes], str]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1], "memory"
+            del self._entries[key]
+        conn = self._db()
+        if conn is None:
+            return None, "miss"
+        try:
+            row = conn.execute(
+                "SELECT expires_at, payload FROM llm_response_cache WHERE key=?", (key,)
+            ).fetchone()
+        except sqlite3.Error as exc:
+            logger.warning("llm_cache_read_failed", error=str(exc))
+            return None, "miss"
+        if row is None or row[0] <= now:
+            return None, "miss"
+        self._remember(key, row[0], row[1])
+        return row[1], "disk"
+
+    def get(self, keys: CacheKeys) -> Optional[Dict[str, Any]]:
+        """Return the cached payload for *keys* (exact key first) or ``None``."""
+
+        if not self.enabled:
+            return None
+        from backend.encryption import decrypt_artifact
+
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                blob, tier = self._lookup(key, now)
+                if blob is None:
+                    continue
+                try:
+                    payload = json.loads(decrypt_artifact(blob).decode("utf-8"))
+                except Exception as exc:
+                    logger.warning("llm_cache_decrypt_failed", error=str(exc))
+                    self._entries.pop(key, None)
+                    continue
+                LLM_CACHE_REQUESTS.labels(tier).inc()
+                return payload
+        LLM_CACHE_REQUESTS.labels("miss").inc()
+        return None
+
+    def put(self, keys: CacheKeys, payload: Mapping[str, Any]) -> None:
+        """Store *payload* (at least ``{"content": str}``) under both keys."""
+
+        if not self.enabled:
+            return
+        from backend.encryption import encrypt_artifact
+
+        blob = encrypt_artifact(json.dumps(dict(payload), separators=(",", ":")).encode("utf-8"))
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                self._remember(key, expires_at, blob)
+            conn = self._db()
+            if conn is None:
+                return
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO llm_response_cache (key, expires_at, payload) VALUES (?, ?, ?)",
+                        [(key, expires_at, blob) for key in dict.fromkeys(keys)],
+                    )
+            except sqlite3.Error as exc:
+                logger.warning("llm_cache_write_failed", error=str(exc))
+
+    def prune(self) -> int:
+        """Drop expired rows from the persistent tier."""
+
+        conn = self._db()
+        if conn is None:
+            return 0
+        with self._lock:
+            try:
+                with conn:
+                    cursor = conn.execute(
+                        "DELETE FROM llm_response_cache WHERE expires_at <= ?", (time.time(),)
+                    )
+                return cursor.rowcount or 0
+            except sqlite3.Error as exc:
+                logger.warning("llm_cache_prune_failed", error=str(exc))
+                return 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            conn = self._db()
+            if conn is not None:
+                with conn:
+                    conn.execute("DELETE FROM llm_response_cache")
+
+    def close(self) -> None:
+        with self._lock:
+            conn, self._conn = self._conn, None
+            if conn is not None:
+                conn.close()
+
+
+LLM_CACHE = LLMResponseCache.from_env()
+register_cache("llm.responses", LLM_CACHE)
+
+
+__all__ = [
+    "LLM_CACHE",
+    "LLMResponseCache",
+]
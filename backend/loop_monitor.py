@@ -0,0 +1,266 @@
+"""Event-loop lag monitor and blocking-call detector.
+
+:class:`LoopLagMonitor` schedules a callback every ``interval`` seconds on the
+running loop and records how late it fires.  That drift goes into the
+``revenuepilot_event_loop_lag_seconds`` histogram.  The callback also
+refreshes a heartbeat.  A watchdog thread notices when the heartbeat is
+overdue by more than ``threshold`` while the loop is still blocked.  It then
+captures the loop thread's stack, which is the code doing the blocking.
+
+Stalls are attributed to the request whose task was running on the loop.
+The HTTP middleware binds the route and trace id with :func:`bind_request`,
+and the watchdog reads them from that task's context.  Each stall increments
+``revenuepilot_blocking_calls_total{route}`` and is kept in a bounded list
+of recent offenders for the debug endpoint.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import structlog
+from prometheus_client import REGISTRY, Counter, Histogram
+
+logger = structlog.get_logger(__name__)
+
+
+def _get_or_create_metric(metric_cls, name: str, documentation: str, labelnames, **kwargs):
+    existing = REGISTRY._names_to_collectors.get(name)
+    if existing is not None:
+        return existing
+    return metric_cls(name, documentation, labelnames=labelnames, **kwargs)
+
+
+EVENT_LOOP_LAG = _get_or_create_metric(
+    Histogram,
+    "revenuepilot_event_loop_lag_seconds",
+    "Delay between when a scheduled loop callback was due and when it ran",
+    (),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+BLOCKING_CALLS = _get_or_create_metric(
+    Counter,
+    "revenuepilot_blocking_calls_total",
+    "Event-loop stalls longer than the blocking threshold by route",
+    ("route",),
+)
+
+# (route, trace id) of the request being served by the current task.
+_REQUEST_CTX: ContextVar[Optional[Tuple[str, Optional[str]]]] = ContextVar(
+    "loop_monitor_request", default=None
+)
+
+
+def bind_request(route: str, trace_id: Optional[str]) -> Token:
+    return _REQUEST_CTX.set((route, trace_id))
+
+
+def unbind_request(token: Token) -> None:
+    _REQUEST_CTX.reset(token)
+
+
+def _running_task(loop: asyncio.AbstractEventLoop) -> Optional[asyncio.Task]:
+    # Read from the watchdog thread; ``asyncio.current_task`` only answers for
+    # the calling thread's loop.
+    current = getattr(asyncio.tasks, "_current_tasks", None)
+    if not isinstance(current, dict):
+        return None
+    return current.get(loop)
+
+
+def _task_request(task: Optional[asyncio.Task]) -> Optional[Tuple[str, Optional[str]]]:
+    if task is None:
+        return None
+    get_context = getattr(task, "get_context", None)
+    context = get_context() if get_context is not None else getattr(task, "_context", None)
+    if context is None:
+        return None
+    return context.get(_REQUEST_CTX)
+
+
+@dataclass
+class BlockingCall:
+    route: str
+    trace_id: Optional[str]
+    task: Optional[str]
+    detected_at: float
+    blocked_for: float
+    stack: List[str] = field(default_factory=list)
+    finished: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "route": self.route,
+            "traceId": self.trace_id,
+            "task": self.task,
+            "detectedAt": self.detected_at,
+            "blockedSeconds": self.blocked_for,
+            "finished": self.finished,
+            "stack": list(self.stack),
+        }
+
+
+class LoopLagMonitor:
+    """Measure loop lag continuously and capture the stacks of long stalls."""
+
+    def __init__(
+        self,
+        *,
+        interval: float = 0.1,
+        threshold: float = 0.25,
+        keep: int = 50,
+        max_frames: int = 40,
+        enabled: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.interval = max(0.001, float(interval))
+        self.threshold = max(0.001, float(threshold))
+        self.max_frames = max_frames
+        self.enabled = enabled
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._offenders: Deque[BlockingCall] = deque(maxlen=max(1, int(keep)))
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._ticker: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._beat = 0.0
+        self._stall: Optional[BlockingCall] = None
+        self._stall_beat: Optional[float] = None
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    @classmethod
+    def from_env(cls) -> "LoopLagMonitor":
+        def _number(name: str, default: float) -> float:
+            try:
+                return float(os.getenv(name, str(default)))
+            except ValueError:
+                return default
+
+        return cls(
+            interval=_number("EVENT_LOOP_MONITOR_INTERVAL_MS", 100) / 1000.0,
+            threshold=_number("EVENT_LOOP_BLOCK_THRESHOLD_MS", 250) / 1000.0,
+            keep=int(_number("EVENT_LOOP_OFFENDERS", 50)),
+            enabled=os.getenv("EVENT_LOOP_MONITOR", "1").lower() not in {"0", "false", "no"},
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._ticker is not None and not self._ticker.done()
+
+    async def start(self) -> None:
+        if not self.enabled or self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = self._clock()
+        self._stop.clear()
+        self._ticker = self._loop.create_task(self._tick())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="revenuepilot-loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        ticker, self._ticker = self._ticker, None
+        if ticker is not None:
+            ticker.cancel()
+            try:
+                await ticker
+            except asyncio.CancelledError:
+                pass
+        self._stop.set()
+        watchdog, self._watchdog = self._watchdog, None
+        if watchdog is not None:
+            watchdog.join(timeout=1.0)
+
+    async def _tick(self) -> None:
+        while True:
+            due = self._clock() + self.interval
+            await asyncio.sleep(self.interval)
+            now = self._clock()
+            lag = max(0.0, now - due)
+            self._beat = now
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            EVENT_LOOP_LAG.observe(lag)
+            with self._lock:
+                stall, self._stall = self._stall, None
+                if stall is not None:
+                    stall.blocked_for = lag
+                    stall.finished = True
+
+    def _watch(self) -> None:
+        poll = min(self.interval, self.threshold / 2)
+        while not self._stop.wait(poll):
+            beat = self._beat
+            overdue = self._clock() - beat - self.interval
+            if overdue >= self.threshold and self._stall_beat != beat:
+                self._stall_beat = beat
+                self._capture(overdue)
+
+    def _capture(self, overdue: float) -> None:
+        loop = self._loop
+        frame = sys._current_frames().get(self._loop_thread) if self._loop_thread else None
+        stack: List[str] = []
+        if frame is not None:
+            summary = traceback.extract_stack(frame)[-self.max_frames :]
+            stack = [f"{entry.filename}:{entry.lineno} in {entry.name}" for entry in summary]
+        task = _running_task(loop) if loop is not None else None
+        route, trace_id = _task_request(task) or ("unknown", None)
+        call = BlockingCall(
+            route=route,
+            trace_id=trace_id,
+            task=task.get_name() if task is not None else None,
+            detected_at=time.time(),
+            blocked_for=overdue,
+            stack=stack,
+        )
+        with self._lock:
+            self._stall = call
+            self._offenders.append(call)
+        BLOCKING_CALLS.labels(route).inc()
+        logger.warning(
+            "event_loop_blocked",
+            route=route,
+            trace_id=trace_id,
+            blocked_for=round(overdue, 4),
+            frame=stack[-1] if stack else None,
+        )
+
+    def offenders(self) -> List[Dict[str, Any]]:
+        """Recent stalls, newest first."""
+
+        with self._lock:
+            return [call.to_dict() for call in reversed(self._offenders)]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "intervalSeconds": self.interval,
+            "thresholdSeconds": self.threshold,
+            "lastLagSeconds": self.last_lag,
+            "maxLagSeconds": self.max_lag,
+            "offenders": self.offenders(),
+        }
+
+
+__all__ = [
+    "BLOCKING_CALLS",
+    "EVENT_LOOP_LAG",
+    "BlockingCall",
+    "LoopLagMonitor",
+    "bind_request",
+    "unbind_request",
+]
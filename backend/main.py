@@ -49,6 +49,7 @@ from typing import (
     Awaitable,
     Iterator,
     Mapping,
+    Union,
 )
 from sqlalchemy.orm import Session
 from fastapi import (
@@ -71,6 +72,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.encoders import jsonable_encoder
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from starlette.websockets import WebSocketState
 from prometheus_client import (
     CONTENT_TYPE_LATEST,
     Counter,
@@ -152,9 +154,36 @@ from backend.compose_job import (
     STAGE_PROGRESS as COMPOSE_STAGE_PROGRESS,
     STAGE_SEQUENCE as COMPOSE_STAGE_SEQUENCE,
 )
+from backend.compose_scheduler import FairScheduler, ProgressCoalescer, ScheduledItem
 from backend.openai_client import call_openai, get_embedding_client  # type: ignore
 from backend.ai_gate import AIGate
 from backend.encryption import encrypt_artifact
+from backend.deid_cache import DEID_CACHE
+from backend.deid_service import DEID_SERVICE
+from backend.event_ingest import EventIngestBuffer
+from backend.llm_cache import LLM_CACHE
+from backend.collaboration import CollaborationHub
+from backend.coalesce import SingleFlight, request_key
+from backend.db_pool import SQLitePool, configure_connection
+from backend.db_instrumentation import (
+    connect as instrumented_connect,
+    finish_request as finish_query_stats,
+    get_query_trace,
+    instrument_sqlalchemy,
+    server_timing,
+    start_request as start_query_stats,
+)
+from backend.loop_monitor import LoopLagMonitor, bind_request, unbind_request
+from backend.memory_diagnostics import MemoryTracer, cache_sizes, register_cache
+from backend.profiling import SamplingProfiler
+from backend.rate_limit import RateLimiter, backend_from_env, retry_after_header
+from backend.token_cache import SQLiteRevocationFeed, VerifiedTokenCache
+from backend.db_async import (
+    async_driver_available,
+    configure_sync_threadpool,
+    dispose_async_engines,
+    get_async_sessionmaker,
+)
 from backend.security import (
     PromptPrivacyGuard,
     hash_identifier,
@@ -202,6 +231,13 @@ from backend.time_utils import ensure_utc, utc_now
 from backend.ws_codes import CodesDeltaStream
 from backend.ws_compliance import ComplianceDeltaStream
 from backend.ws_compose import ComposeDeltaStream
+from backend.ws_streams import (
+    ReplayBuffer,
+    WS_REGISTRY_SIZE,
+    env_float as ws_env_float,
+    run_sweeper,
+    serialise_frame,
+)
 from backend.notifications_service import (
     NotificationEvent,
     NotificationNotFoundError,
@@ -296,6 +332,7 @@ from backend.scheduling import (  # type: ignore
     configure_database as configure_schedule_database,
 )
 from backend import code_tables  # type: ignore
+from backend import code_search  # type: ignore
 from backend import patients  # type: ignore
 from backend import visits  # type: ignore
 from backend.charts import process_chart  # type: ignore
@@ -349,6 +386,7 @@ from backend.observability import (
     ObservabilityRecorder,
     configure_recorder,
     observe_ai_route,
+    capture_cache_state,
     build_observability_dashboard,
     get_observability_trace,
     reset_observability_for_tests,
@@ -425,6 +463,21 @@ def deidentify(text: str) -> str:  # pragma: no cover - thin wrapper
         },
     )
 
+
+async def deidentify_async(text: str) -> str:  # pragma: no cover - thin wrapper
+    """Async :func:`deidentify` that keeps NER engines off the event loop."""
+
+    return await DEID_POLICY.apply_async(
+        text,
+        engine=_DEID_ENGINE,
+        hash_tokens=_HASH_TOKENS,
+        availability_overrides={
+            "presidio": _PRESIDIO_AVAILABLE,
+            "philter": _PHILTER_AVAILABLE,
+            "scrubadub": _SCRUBBER_AVAILABLE,
+        },
+    )
+
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(level=getattr(logging, LOG_LEVEL, logging.INFO), format="%(message)s")
 
@@ -501,6 +554,7 @@ PROMPT_GUARD = PromptPrivacyGuard()
 _STABLE_PROMPT_CACHE_LOCK = threading.Lock()
 _STABLE_PROMPT_CACHE_SIZE = 128
 _STABLE_PROMPT_CACHE: "OrderedDict[Tuple[str, str, str, str, str, str], List[Dict[str, Any]]]" = OrderedDict()
+register_cache("prompts.stable_blocks", _STABLE_PROMPT_CACHE)
 
 
 def _get_or_create_metric(metric_cls, name: str, documentation: str, labelnames):
@@ -559,6 +613,10 @@ def _prompt_policy_version() -> str:
     return f"deid:{DEID_POLICY.engine}|scrub:{PROMPT_GUARD.mode}"
 
 
+# Cached completions are only reused under the same de-identification policy.
+LLM_CACHE.configure_policy(_prompt_policy_version)
+
+
 def _clone_messages(messages: Sequence[Mapping[str, Any]]) -> List[Dict[str, Any]]:
     return [copy.deepcopy(message) for message in messages]
 
@@ -670,7 +728,7 @@ def _hash_json_payload(payload: Mapping[str, Any]) -> Optional[str]:
     return digest[:12]
 
 
-def _build_state_summary(
+async def _build_state_summary(
     note_text: str,
     *,
     request: Any,
@@ -699,7 +757,7 @@ def _build_state_summary(
         summary["region"] = prompt_context.region
     transcript_cursor = getattr(request, "transcriptCursor", None)
     if transcript_cursor:
-        summary["cursor"] = DEID_POLICY.apply(str(transcript_cursor))
+        summary["cursor"] = await DEID_POLICY.apply_async(str(transcript_cursor))
     accepted_json = getattr(request, "acceptedJson", None)
     if isinstance(accepted_json, Mapping):
         payload_hash = _hash_json_payload(accepted_json)
@@ -736,10 +794,10 @@ def _format_state_summary(summary: Mapping[str, Any]) -> str:
     return ", ".join(parts)
 
 
-def _build_transcript_snippet(value: Any, *, limit: int = 240) -> str:
+async def _build_transcript_snippet(value: Any, *, limit: int = 240) -> str:
     if not value:
         return ""
-    snippet = DEID_POLICY.apply(str(value))
+    snippet = await DEID_POLICY.apply_async(str(value))
     snippet = re.sub(r"\s+", " ", snippet).strip()
     if not snippet:
         return ""
@@ -748,7 +806,7 @@ def _build_transcript_snippet(value: Any, *, limit: int = 240) -> str:
     return snippet
 
 
-def _format_pmh_entries(entries: Sequence[Any], *, limit: int = 3) -> str:
+async def _format_pmh_entries(entries: Sequence[Any], *, limit: int = 3) -> str:
     lines: List[str] = []
     for entry in entries:
         label: Optional[str] = None
@@ -756,16 +814,16 @@ def _format_pmh_entries(entries: Sequence[Any], *, limit: int = 3) -> str:
             for key in ("label", "name", "problem", "condition", "summary", "title"):
                 value = entry.get(key)
                 if value:
-                    label = DEID_POLICY.apply(str(value)).strip()
+                    label = (await DEID_POLICY.apply_async(str(value))).strip()
                     break
             if not label:
                 for key in ("code", "icd10", "snomed"):
                     value = entry.get(key)
                     if value:
-                        label = DEID_POLICY.apply(str(value)).strip()
+                        label = (await DEID_POLICY.apply_async(str(value))).strip()
                         break
         elif isinstance(entry, (str, int, float)):
-            label = DEID_POLICY.apply(str(entry)).strip()
+            label = (await DEID_POLICY.apply_async(str(entry))).strip()
         if label:
             lines.append(f"- {label}")
         if len(lines) >= limit:
@@ -773,13 +831,13 @@ def _format_pmh_entries(entries: Sequence[Any], *, limit: int = 3) -> str:
     return "\n".join(lines)
 
 
-def _format_attachments_meta(request: Any) -> List[str]:
+async def _format_attachments_meta(request: Any) -> List[str]:
     items: List[str] = []
     if getattr(request, "chart", None):
-        chart_text = DEID_POLICY.apply(str(request.chart))
+        chart_text = await DEID_POLICY.apply_async(str(request.chart))
         items.append(f"chartTextChars={len(chart_text)}")
     if getattr(request, "audio", None):
-        audio_text = DEID_POLICY.apply(str(request.audio))
+        audio_text = await DEID_POLICY.apply_async(str(request.audio))
         items.append(f"audioTranscriptChars={len(audio_text)}")
     agencies = getattr(request, "agencies", None)
     if isinstance(agencies, Sequence):
@@ -787,7 +845,7 @@ def _format_attachments_meta(request: Any) -> List[str]:
         for agency in agencies:
             if agency is None:
                 continue
-            cleaned_value = DEID_POLICY.apply(str(agency)).strip()
+            cleaned_value = (await DEID_POLICY.apply_async(str(agency))).strip()
             if cleaned_value:
                 cleaned.append(cleaned_value)
             if len(cleaned) >= 5:
@@ -797,7 +855,7 @@ def _format_attachments_meta(request: Any) -> List[str]:
     return items
 
 
-def _build_dynamic_note_message(
+async def _build_dynamic_note_message(
     *,
     route: str,
     prompt_context: PromptContext,
@@ -816,7 +874,7 @@ def _build_dynamic_note_message(
         sections.append(f"Changed note sentences:\n{diff_payload}")
 
     state_summary = _format_state_summary(
-        _build_state_summary(sanitized_note, request=request, prompt_context=prompt_context)
+        await _build_state_summary(sanitized_note, request=request, prompt_context=prompt_context)
     )
     if state_summary:
         sections.append(f"State summary: {state_summary}")
@@ -826,15 +884,15 @@ def _build_dynamic_note_message(
         if rule_lines:
             sections.append("User rules:\n" + "\n".join(rule_lines))
 
-    transcript_snippet = _build_transcript_snippet(getattr(request, "audio", None))
+    transcript_snippet = await _build_transcript_snippet(getattr(request, "audio", None))
     if transcript_snippet:
         sections.append(f"Transcript snippet: {transcript_snippet}")
 
-    pmh_text = _format_pmh_entries(pmh_entries or [])
+    pmh_text = await _format_pmh_entries(pmh_entries or [])
     if pmh_text:
         sections.append("PMH highlights:\n" + pmh_text)
 
-    attachments = _format_attachments_meta(request)
+    attachments = await _format_attachments_meta(request)
     if attachments:
         sections.append("Attachments meta:\n" + "\n".join(f"- {item}" for item in attachments))
 
@@ -850,23 +908,26 @@ def _build_dynamic_note_message(
     return {"role": "user", "content": content}
 
 
-def _fetch_previous_note_snapshot(
+async def _fetch_previous_note_snapshot(
     note_id: Optional[str],
     clinician_id: Optional[int],
 ) -> Optional[str]:
     if not note_id or clinician_id is None:
         return None
+    snapshot: Optional[str] = None
     try:
         with session_scope(db_conn) as session:
             state = session.get(AINoteState, note_id)
             if state and state.clinician_id == clinician_id and state.last_note_snapshot:
-                return DEID_POLICY.apply(state.last_note_snapshot)
+                snapshot = state.last_note_snapshot
     except Exception:
         logger.debug("previous_snapshot_lookup_failed", note_id=note_id)
-    return None
+    if not snapshot:
+        return None
+    return await DEID_POLICY.apply_async(snapshot)
 
 
-def _fetch_pmh_entries_for_session(
+async def _fetch_pmh_entries_for_session(
     username: Optional[str],
     session_id: Optional[str],
 ) -> Sequence[Any]:
@@ -886,7 +947,7 @@ def _fetch_pmh_entries_for_session(
     if not patient_identifier:
         return []
     try:
-        snapshot = context_pipeline.get_snapshot(str(patient_identifier), "superficial")
+        snapshot = await context_pipeline.get_snapshot_async(str(patient_identifier), "superficial")
     except Exception:
         snapshot = None
     if isinstance(snapshot, Mapping):
@@ -1117,14 +1178,38 @@ _EXPORT_RETRY_TASKS: Set[asyncio.Task[None]] = set()
 _export_worker_lock: Optional[asyncio.Lock] = None
 
 try:
-    _COMPOSE_WORKER_COUNT = max(1, int(os.getenv("COMPOSE_WORKERS", "1")))
+    _COMPOSE_WORKER_COUNT = max(1, int(os.getenv("COMPOSE_WORKERS", "4")))
+except (TypeError, ValueError):  # pragma: no cover - defensive parsing
+    _COMPOSE_WORKER_COUNT = 4
+
+try:
+    _COMPOSE_MAX_INFLIGHT_PER_FLOW = max(
+        1, int(os.getenv("COMPOSE_MAX_INFLIGHT_PER_USER", str(max(1, _COMPOSE_WORKER_COUNT // 2))))
+    )
+except (TypeError, ValueError):  # pragma: no cover - defensive parsing
+    _COMPOSE_MAX_INFLIGHT_PER_FLOW = max(1, _COMPOSE_WORKER_COUNT // 2)
+
+try:
+    _COMPOSE_PROGRESS_FLUSH_SECONDS = max(
+        0.0, float(os.getenv("COMPOSE_PROGRESS_FLUSH_MS", "250")) / 1000.0
+    )
 except (TypeError, ValueError):  # pragma: no cover - defensive parsing
-    _COMPOSE_WORKER_COUNT = 1
+    _COMPOSE_PROGRESS_FLUSH_SECONDS = 0.25
 
-_COMPOSE_QUEUE: Optional[asyncio.Queue[ComposeJobPayload]] = None
+try:
+    # JSON object mapping a username or clinic id to its scheduling weight.
+    _COMPOSE_FLOW_WEIGHTS: Dict[str, float] = {
+        str(key): float(value)
+        for key, value in json.loads(os.getenv("COMPOSE_FLOW_WEIGHTS", "{}") or "{}").items()
+    }
+except (TypeError, ValueError, AttributeError):  # pragma: no cover - defensive parsing
+    _COMPOSE_FLOW_WEIGHTS = {}
+
+_COMPOSE_QUEUE: Optional[FairScheduler[ComposeJobPayload]] = None
 _COMPOSE_WORKERS: List[asyncio.Task[None]] = []
 _COMPOSE_WORKER_LOCK: Optional[asyncio.Lock] = None
 _COMPOSE_CANCELLATIONS: Set[int] = set()
+_COMPOSE_RUNNING: Dict[int, asyncio.Task[None]] = {}
 _COMPOSE_PIPELINE: Optional[ComposePipeline] = None
 
 _ALERT_SUMMARY: Dict[str, Any] = {
@@ -1234,6 +1319,28 @@ def _record_ai_error(route: str, detail: Any, trace_id: str | None = None) -> No
         _ALERT_SUMMARY["updatedAt"] = now
 
 
+AI_REQUEST_FLIGHTS: SingleFlight[str] = SingleFlight("ai")
+
+
+async def _call_openai_coalesced(
+    route: str, messages: List[Dict[str, str]], **kwargs: Any
+) -> str:
+    """Run ``call_openai`` off the event loop, sharing identical concurrent calls.
+
+    Panels refreshing for the same note (HTTP and WebSocket alike) build the
+    same messages; only the first caller reaches the model and the rest await
+    its result, recorded as ``coalesced`` on their route observation.
+    """
+
+    key = request_key(kwargs.get("model"), kwargs.get("temperature"), messages)
+    return await AI_REQUEST_FLIGHTS.run(
+        key,
+        lambda: asyncio.to_thread(call_openai, messages, **kwargs),
+        route=route,
+        on_join=lambda: capture_cache_state("coalesced"),
+    )
+
+
 def _observability_alert_handler(event: Dict[str, Any]) -> None:
     if not event:
         return
@@ -1485,13 +1592,49 @@ async def lifespan(app: FastAPI):  # pragma: no cover - exercised indirectly in
     logger.info("lifespan_startup")
     # Lightweight startup tasks could go here (e.g. warm caches)
     worker.start_scheduler()
+    await event_ingest.start()
+    await LOOP_MONITOR.start()
+    LLM_CACHE.prune()
+    configure_sync_threadpool()
+    from backend.ws_compose import compose_stream as published_compose_stream
+
+    registry_sweeper = asyncio.create_task(
+        run_sweeper(
+            [
+                transcription_manager,
+                compliance_manager,
+                collaboration_manager,
+                codes_manager,
+                schedule_manager,
+                compliance_stream,
+                compose_stream,
+                published_compose_stream,
+                codes_stream,
+                context_pipeline.events,
+                collaboration_rooms,
+            ],
+            ws_env_float("WS_SWEEP_INTERVAL_SECONDS", 60.0),
+        )
+    )
     start_ts = time.time()
     try:
         yield
     finally:
         global _SHUTTING_DOWN
         _SHUTTING_DOWN = True
+        registry_sweeper.cancel()
+        collaboration_rooms.save_all()
         await worker.stop_scheduler()
+        try:
+            DEID_CACHE.save()
+        except Exception as exc:  # pragma: no cover - persistence is best effort
+            logger.warning("deid_cache_save_failed", error=str(exc))
+        await DEID_SERVICE.stop()
+        await event_ingest.stop()
+        await LOOP_MONITOR.stop()
+        LLM_CACHE.close()
+        DB_POOL.close()
+        await dispose_async_engines()
         try:
             db_conn.commit()  # ensure any buffered writes are flushed
         except Exception:  # pragma: no cover - defensive
@@ -1502,6 +1645,18 @@ async def lifespan(app: FastAPI):  # pragma: no cover - exercised indirectly in
 # Instantiate app with lifespan for graceful shutdown
 app = FastAPI(title="RevenuePilot API", lifespan=lifespan)
 
+# Admin-triggered stack sampling (``/system/profile``); idle until a session
+# is started.
+PROFILER = SamplingProfiler.from_env()
+# Loop lag histogram and blocking-call capture (``/system/event-loop``);
+# started in the application lifespan.
+LOOP_MONITOR = LoopLagMonitor.from_env()
+# On-demand tracemalloc snapshots and diffs (``/system/memory/*``).
+MEMORY_TRACER = MemoryTracer.from_env()
+# Per-request query counts and DB time for every SQLAlchemy engine; raw
+# sqlite3 work is covered by opening ``db_conn`` through ``instrumented_connect``.
+instrument_sqlalchemy()
+
 
 @app.middleware("http")
 async def inject_trace_id(request: Request, call_next):
@@ -1511,6 +1666,14 @@ async def inject_trace_id(request: Request, call_next):
     token = _TRACE_ID_CTX.set(trace_id)
     bind_contextvars(trace_id=trace_id, path=request.url.path, method=request.method)
     request.state.trace_id = trace_id
+    path = request.url.path
+    template = _normalise_path_for_metrics(path)
+    route = f"{request.method} {template}"
+    loop_token = bind_request(route, trace_id)
+    query_token = start_query_stats()
+    profiled = None
+    if PROFILER.active:
+        profiled = PROFILER.begin_request(request.method, path, template, trace_id)
     response = None
     try:
         response = await call_next(request)
@@ -1519,8 +1682,12 @@ async def inject_trace_id(request: Request, call_next):
         logger.exception("request_failed", path=request.url.path, method=request.method)
         raise
     finally:
+        PROFILER.end_request(profiled)
+        unbind_request(loop_token)
+        query_stats = finish_query_stats(query_token, route, trace_id)
         if response is not None:
             response.headers["X-Trace-Id"] = trace_id
+            response.headers["Server-Timing"] = server_timing(query_stats)
         try:
             unbind_contextvars("trace_id", "path", "method")
         except LookupError:  # pragma: no cover - defensive cleanup
@@ -1663,6 +1830,7 @@ START_TIME = time.time()
 
 # Simple in-memory cache for dashboard and system endpoints
 _DASHBOARD_CACHE: Dict[str, tuple[float, Any]] = {}
+register_cache("dashboard.responses", _DASHBOARD_CACHE)
 DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "10"))
 
 
@@ -1692,6 +1860,13 @@ def _cached_response(key: str, builder: Callable[[], Any]):
 
 # Simple in-memory storage for note versions keyed by note ID.
 NOTE_VERSIONS: Dict[str, List[Dict[str, str]]] = defaultdict(list)
+register_cache(
+    "notes.versions",
+    lambda: {
+        "notes": len(NOTE_VERSIONS),
+        "versions": sum(len(versions) for versions in NOTE_VERSIONS.values()),
+    },
+)
 
 
 # Health/readiness endpoint used by the desktop app to know when the backend is up.
@@ -1765,6 +1940,8 @@ def _memory_stats() -> Dict[str, Any]:  # pragma: no cover - platform variabilit
             stats["open_fds"] = None
     except Exception:
         stats["open_fds"] = None
+    stats["tracemalloc"] = MEMORY_TRACER.status()
+    stats["caches"] = cache_sizes()
     return stats
 
 @app.get("/system/memory", tags=["system"])
@@ -1798,11 +1975,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory store for analytics events.  Each event is a dictionary with
-# keys: eventType (str), details (dict) and timestamp (float).  This is
-# reset when the server restarts.  For production use, persist events
-# to a database.
-events: List[Dict[str, Any]] = []
+# Most recent analytics events kept in memory.  Each event is a dictionary
+# with keys: eventType (str), details (dict) and timestamp (float).  The
+# ``events`` table is the system of record; this window is bounded and reset
+# when the server restarts.
+EVENTS_MEMORY_LIMIT = int(os.getenv("EVENTS_MEMORY_LIMIT", "1000"))
+events: deque = deque(maxlen=EVENTS_MEMORY_LIMIT)
+register_cache("analytics.events", lambda: len(events))
+
+# Batched writer for ``/event`` and ``/api/activity/log``; started in the
+# application lifespan.
+event_ingest = EventIngestBuffer.from_env(lambda: db_conn)
+EVENT_BATCH_MAX = int(os.getenv("EVENT_BATCH_MAX", "500"))
 
 # Mapping of CPT codes to projected reimbursement amounts.  This mirrors the
 # ``calcRevenue`` helper on the frontend so that revenue projections can be
@@ -1821,6 +2005,13 @@ TRANSCRIPT_HISTORY_LIMIT = int(os.getenv("TRANSCRIPT_HISTORY", "5"))
 transcript_history: Dict[str, deque] = defaultdict(
     lambda: deque(maxlen=TRANSCRIPT_HISTORY_LIMIT)
 )
+register_cache(
+    "transcription.history",
+    lambda: {
+        "users": len(transcript_history),
+        "transcripts": sum(len(history) for history in transcript_history.values()),
+    },
+)
 
 
 # Simple in-memory notification tracking replaced by NotificationService.
@@ -2376,9 +2567,28 @@ def auth_session_scope() -> Iterator[SQLAlchemySession]:
         session.close()
 
 
-db_conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+db_conn = instrumented_connect(DB_PATH, check_same_thread=False)
+configure_connection(db_conn)
 create_all_tables(db_conn)
 
+# Worker threads check connections out of ``DB_POOL`` rather than sharing
+# ``db_conn``.  Tests swap ``db_conn`` for in-memory databases, which cannot be
+# pooled, so :func:`db_pool` falls back to serialising onto that connection.
+DB_POOL = SQLitePool.from_env(DB_PATH)
+_POOLED_DB_CONN = db_conn
+_WRAPPED_DB_POOL: Optional[Tuple[sqlite3.Connection, SQLitePool]] = None
+
+
+def db_pool() -> SQLitePool:
+    """Return the connection pool for the active database."""
+
+    global _WRAPPED_DB_POOL
+    if db_conn is _POOLED_DB_CONN and DB_PATH != ":memory:":
+        return DB_POOL
+    if _WRAPPED_DB_POOL is None or _WRAPPED_DB_POOL[0] is not db_conn:
+        _WRAPPED_DB_POOL = (db_conn, SQLitePool.wrap(db_conn))
+    return _WRAPPED_DB_POOL[1]
+
 
 # Keep the compliance ORM bound to the active database connection.
 compliance_engine.configure_engine(engine=db.engine)
@@ -2399,10 +2609,26 @@ def _context_session_factory() -> SQLAlchemySession:
     return _auth_sessionmaker()
 
 
+def _context_async_session() -> Optional[Any]:
+    """Return an async session on the application database, if available.
+
+    ``None`` (synchronous fallback) when tests have swapped ``db_conn`` for an
+    in-memory database or the async SQLite driver is not installed.
+    """
+
+    if db_conn is not _POOLED_DB_CONN or DB_PATH == ":memory:":
+        return None
+    url = f"sqlite:///{DB_PATH}"
+    if not async_driver_available(url):
+        return None
+    return get_async_sessionmaker(url)()
+
+
 context_pipeline = ChartContextPipeline(
     _context_session_factory,
     default_profile=os.getenv("PROFILE", "balanced"),
     upload_dir=lambda: UPLOAD_DIR,
+    async_session_factory=_context_async_session,
 )
 
 _observability_recorder = ObservabilityRecorder(
@@ -3870,44 +4096,34 @@ if _DEID_ENGINE == "regex":
 # ---------------------------------------------------------------------------
 
 
-class RateLimiter:
-    """Simple fixed-window rate limiter keyed by an arbitrary string."""
+# Every limiter shares one backend so that, with ``RATE_LIMIT_BACKEND=sqlite``,
+# limits hold across all workers pointed at the same file.
+RATE_LIMIT_BACKEND = backend_from_env()
 
-    def __init__(self, limit: int, window_seconds: int):
-        self.limit = limit
-        self.window_seconds = window_seconds
-        self._events: Dict[str, deque[float]] = defaultdict(deque)
-        self._lock = threading.Lock()
 
-    def allow(self, key: str) -> bool:
-        now = time.time()
-        with self._lock:
-            events = self._events[key]
-            threshold = now - self.window_seconds
-            while events and events[0] <= threshold:
-                events.popleft()
-            if len(events) >= self.limit:
-                return False
-            events.append(now)
-            return True
+def _ai_rate_limit_per_minute() -> int:
+    try:
+        return int(os.getenv("AI_RATE_LIMIT_PER_MINUTE", "120"))
+    except ValueError:
+        return 120
+
+
+AI_RATE_LIMITER = RateLimiter(
+    limit=_ai_rate_limit_per_minute(), window_seconds=60, name="ai", backend=RATE_LIMIT_BACKEND
+)
 
-    def retry_after(self, key: str) -> float:
-        now = time.time()
-        with self._lock:
-            events = self._events.get(key)
-            if not events:
-                return 0.0
-            threshold = now - self.window_seconds
-            while events and events[0] <= threshold:
-                events.popleft()
-            if len(events) < self.limit:
-                return 0.0
-            oldest = events[0]
-            return max(0.0, self.window_seconds - (now - oldest))
-
-    def reset(self, key: str) -> None:
-        with self._lock:
-            self._events.pop(key, None)
+
+def _enforce_ai_rate_limit(user: Mapping[str, Any], route: str) -> None:
+    """Throttle expensive AI endpoints per user and route."""
+
+    allowed, retry_after = AI_RATE_LIMITER.check(f"{user.get('sub')}:{route}")
+    if allowed:
+        return
+    raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail={"error": "Too many AI requests", "code": "RATE_LIMITED"},
+        headers=retry_after_header(retry_after),
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -3946,10 +4162,18 @@ REMEMBER_ME_REFRESH_TOKEN_EXPIRE_DAYS = int(
 )
 OFFLINE_TOKEN_EXPIRE_DAYS = int(os.getenv("OFFLINE_TOKEN_EXPIRE_DAYS", "21"))
 
-LOGIN_RATE_LIMITER = RateLimiter(limit=5, window_seconds=15 * 60)
-MFA_VERIFY_RATE_LIMITER = RateLimiter(limit=3, window_seconds=5 * 60)
-MFA_RESEND_RATE_LIMITER = RateLimiter(limit=1, window_seconds=60)
-FORGOT_PASSWORD_RATE_LIMITER = RateLimiter(limit=3, window_seconds=15 * 60)
+LOGIN_RATE_LIMITER = RateLimiter(
+    limit=5, window_seconds=15 * 60, name="login", backend=RATE_LIMIT_BACKEND
+)
+MFA_VERIFY_RATE_LIMITER = RateLimiter(
+    limit=3, window_seconds=5 * 60, name="mfa_verify", backend=RATE_LIMIT_BACKEND
+)
+MFA_RESEND_RATE_LIMITER = RateLimiter(
+    limit=1, window_seconds=60, name="mfa_resend", backend=RATE_LIMIT_BACKEND
+)
+FORGOT_PASSWORD_RATE_LIMITER = RateLimiter(
+    limit=3, window_seconds=15 * 60, name="forgot_password", backend=RATE_LIMIT_BACKEND
+)
 
 
 def _client_ip(request: Request) -> str:
@@ -4411,14 +4635,37 @@ def create_token(username: str, role: str, clinic: str | None = None) -> str:
     return create_access_token(username, role, clinic)
 
 
+TOKEN_CACHE = VerifiedTokenCache.from_env()
+register_cache("auth.verified_tokens", TOKEN_CACHE)
+TOKEN_REVOCATIONS = SQLiteRevocationFeed(TOKEN_CACHE, lambda: db_pool())
+TOKEN_CACHE.add_revocation_hook(TOKEN_REVOCATIONS.publish)
+
+# Revoked sessions must outlive any access token issued for them.
+_MAX_ACCESS_TOKEN_SECONDS = max(
+    ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    REMEMBER_ME_ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    OFFLINE_TOKEN_EXPIRE_DAYS * 86400,
+)
+
+
+def _decode_access_token(token: str) -> Dict[str, Any]:
+    return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     required_role: str | None = None,
 ):
-    """Decode the provided JWT and optionally enforce a required role."""
+    """Decode the provided JWT and optionally enforce a required role.
+
+    Verified claims are cached per token by :data:`TOKEN_CACHE`, so repeat
+    presentations skip the signature check until the token expires or its
+    session is revoked.
+    """
     token = credentials.credentials
+    TOKEN_REVOCATIONS.maybe_poll()
     try:
-        data = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        data = TOKEN_CACHE.verify(token, _decode_access_token)
     except jwt.PyJWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -5034,15 +5281,13 @@ async def login(model: LoginModel, request: Request) -> Dict[str, Any]:
     limiter_key = f"{ip_address}:{normalized_identifier}"
 
     def _enforce_login_rate_limit() -> None:
-        allowed = LOGIN_RATE_LIMITER.allow(limiter_key)
+        allowed, retry_after = LOGIN_RATE_LIMITER.check(limiter_key)
         if allowed:
             return
-        retry_after = LOGIN_RATE_LIMITER.retry_after(limiter_key)
-        headers = {"Retry-After": str(int(math.ceil(retry_after)))} if retry_after else None
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail={"error": "Too many login attempts", "code": "RATE_LIMITED"},
-            headers=headers,
+            headers=retry_after_header(retry_after),
         )
 
     clinic_id: str | None = None
@@ -5219,9 +5464,9 @@ async def auth_policy() -> Dict[str, Any]:
 @app.post("/api/auth/verify-mfa")
 async def verify_mfa(model: VerifyMFAModel, request: Request) -> Dict[str, Any]:
     token = model.mfaSessionToken
-    if not MFA_VERIFY_RATE_LIMITER.allow(token):
-        retry = MFA_VERIFY_RATE_LIMITER.retry_after(token)
-        headers = {"Retry-After": str(int(math.ceil(retry)))} if retry else None
+    allowed, retry = MFA_VERIFY_RATE_LIMITER.check(token)
+    if not allowed:
+        headers = retry_after_header(retry)
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail={"error": "Too many verification attempts", "code": "RATE_LIMITED"},
@@ -5299,9 +5544,9 @@ async def verify_mfa(model: VerifyMFAModel, request: Request) -> Dict[str, Any]:
 @app.post("/api/auth/resend-mfa")
 async def resend_mfa(model: ResendMFAModel) -> Dict[str, Any]:
     token = model.mfaSessionToken
-    if not MFA_RESEND_RATE_LIMITER.allow(token):
-        retry = MFA_RESEND_RATE_LIMITER.retry_after(token)
-        headers = {"Retry-After": str(int(math.ceil(retry)))} if retry else None
+    allowed, retry = MFA_RESEND_RATE_LIMITER.check(token)
+    if not allowed:
+        headers = retry_after_header(retry)
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail={"error": "MFA resend rate limited", "code": "RATE_LIMITED"},
@@ -5346,9 +5591,9 @@ async def resend_mfa(model: ResendMFAModel) -> Dict[str, Any]:
 @app.post("/api/auth/forgot-password")
 async def forgot_password(model: ForgotPasswordModel, request: Request) -> Dict[str, Any]:
     ip_address = _client_ip(request)
-    if not FORGOT_PASSWORD_RATE_LIMITER.allow(ip_address):
-        retry = FORGOT_PASSWORD_RATE_LIMITER.retry_after(ip_address)
-        headers = {"Retry-After": str(int(math.ceil(retry)))} if retry else None
+    allowed, retry = FORGOT_PASSWORD_RATE_LIMITER.check(ip_address)
+    if not allowed:
+        headers = retry_after_header(retry)
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail={"error": "Too many requests", "code": "RATE_LIMITED"},
@@ -5476,11 +5721,19 @@ async def reset_password_with_token(
         "DELETE FROM refresh_tokens WHERE user_id=?",
         (match["user_id"],),
     )
+    revoked_sessions = [
+        row["id"]
+        for row in db_conn.execute(
+            "SELECT id FROM sessions WHERE user_id=?", (match["user_id"],)
+        ).fetchall()
+    ]
     db_conn.execute(
         "DELETE FROM sessions WHERE user_id=?",
         (match["user_id"],),
     )
     db_conn.commit()
+    for session_id in revoked_sessions:
+        TOKEN_CACHE.revoke_session(session_id, now_ts + _MAX_ACCESS_TOKEN_SECONDS)
 
     user_row = db_conn.execute(
         "SELECT username FROM users WHERE id=?",
@@ -5687,7 +5940,9 @@ async def refresh(model: RefreshModel, request: Request) -> Dict[str, Any]:
         ip_address=client_host,
         user_agent=user_agent,
     )
-    access_token = create_access_token(data["sub"], data["role"], data.get("clinic"))
+    access_token = create_access_token(
+        data["sub"], data["role"], data.get("clinic"), session_id=data.get("sid")
+    )
     expires_at_iso = (
         datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     ).isoformat() + "Z"
@@ -5751,6 +6006,13 @@ async def auth_logout(model: LogoutModel, request: Request) -> Dict[str, bool]:
             break
     db_conn.commit()
     session_removed = _remove_auth_session(user_id, model.token)
+    if data.get("sid"):
+        TOKEN_CACHE.revoke_session(data["sid"], time.time() + _MAX_ACCESS_TOKEN_SECONDS)
+    presented = request.headers.get("authorization") or ""
+    if presented.lower().startswith("bearer "):
+        TOKEN_CACHE.revoke_token(
+            presented[7:].strip(), time.time() + _MAX_ACCESS_TOKEN_SECONDS
+        )
     if success:
         _insert_audit_log(
             data.get("sub"),
@@ -9405,6 +9667,7 @@ class CodesReviewSnapshotResponse(BaseModel):
 
 _CODE_REVIEW_SNAPSHOT_LOCK = threading.Lock()
 _CODE_REVIEW_SNAPSHOTS: Dict[str, List[Dict[str, Any]]] = {}
+register_cache("codes.review_snapshots", _CODE_REVIEW_SNAPSHOTS)
 
 _SNAPSHOT_SUGGESTION_LIBRARY: List[Dict[str, Any]] = [
     {
@@ -9728,6 +9991,7 @@ class SuggestionGateState:
 
 _SUGGESTION_GATE_LOCK = threading.Lock()
 _SUGGESTION_GATE_STATES: Dict[Tuple[str, str], SuggestionGateState] = {}
+register_cache("suggestions.gate_states", _SUGGESTION_GATE_STATES)
 _SECTION_HEADER_RE = re.compile(r"^[A-Z][A-Z0-9\s/&'()\-]{2,}:$")
 _MIN_CHAR_DELTA = 40
 _MIN_SECONDS_BETWEEN_REQUESTS = 2.0
@@ -10723,17 +10987,12 @@ async def get_events(user=Depends(require_role("admin"))) -> List[Dict[str, Any]
         return []
 
 
-# Endpoint: log an event for analytics purposes.  The frontend should
-# call this endpoint whenever a notable action occurs (e.g., starting
-# a note, beautifying a note, requesting suggestions).  Events are
-# stored in the global `events` list.  Returns a simple status.
-@app.post("/event", deprecated=True)
-async def log_event(
-    event: EventModel, user=Depends(require_role("user"))
-) -> Dict[str, str]:
+def _normalise_event(event: EventModel) -> Dict[str, Any]:
+    """Return the stored, redacted form of an analytics event."""
+
     data = {
         "eventType": event.eventType,
-        "details": event.details or {},
+        "details": dict(event.details or {}),
         "timestamp": event.timestamp or datetime.utcnow().timestamp(),
     }
 
@@ -10771,79 +11030,46 @@ async def log_event(
     data["details"] = redact_value(data["details"])
     if isinstance(data["details"], Mapping):
         data["details"] = dict(data["details"])
+    return data
+
 
+# Endpoint: log an event for analytics purposes.  The frontend should
+# call this endpoint whenever a notable action occurs (e.g., starting
+# a note, beautifying a note, requesting suggestions).  Events are
+# queued on ``event_ingest`` and written to the database in batches.
+# Returns a simple status.
+@app.post("/event", deprecated=True)
+async def log_event(
+    event: EventModel, user=Depends(require_role("user"))
+) -> Dict[str, str]:
+    data = _normalise_event(event)
     events.append(data)
-    # Persist the event to the SQLite database.  Serialize the details
-    # dictionary as JSON for storage.  Use a simple INSERT statement
-    # and commit immediately because the volume of events is low in
-    # this prototype.  In a production system, consider batching
-    # writes or using an async database driver.
-    try:
-        try:
-            event_columns = {
-                row[1] for row in db_conn.execute("PRAGMA table_info(events)")
-            }
-        except Exception:
-            event_columns = set()
-        has_time_to_close = "time_to_close" in event_columns
-        codes_payload = (
-            json.dumps(data["details"].get("codes"))
-            if data["details"].get("codes") is not None
-            else None
-        )
-        compliance_payload = (
-            json.dumps(data["details"].get("compliance"))
-            if data["details"].get("compliance") is not None
-            else None
-        )
-        public_health_value = (
-            1
-            if data["details"].get("publicHealth") is True
-            else 0 if data["details"].get("publicHealth") is False else None
-        )
-        common_params = [
-            data["eventType"],
-            data["timestamp"],
-            json.dumps(data["details"], ensure_ascii=False),
-            data["details"].get("revenue"),
-        ]
-        if has_time_to_close:
-            insert_sql = (
-                "INSERT INTO events (eventType, timestamp, details, revenue, time_to_close, codes, compliance_flags, public_health, satisfaction) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
-            )
-            params = common_params + [
-                data["details"].get("timeToClose"),
-                codes_payload,
-                compliance_payload,
-                public_health_value,
-                data["details"].get("satisfaction"),
-            ]
-        else:
-            insert_sql = (
-                "INSERT INTO events (eventType, timestamp, details, revenue, codes, compliance_flags, public_health, satisfaction) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
-            )
-            params = common_params + [
-                codes_payload,
-                compliance_payload,
-                public_health_value,
-                data["details"].get("satisfaction"),
-            ]
-        db_conn.execute(insert_sql, params)
-        db_conn.commit()
-    except Exception as exc:
-        logger.error("events_persist_failed", error=str(exc))
+    event_ingest.submit([data])
     return {"status": "logged"}
 
 
 @app.post("/api/activity/log")
 async def log_activity_event(
-    event: EventModel, user=Depends(require_role("user"))
-) -> Dict[str, str]:
-    """Canonical activity logging endpoint that forwards to ``/event`` handler."""
+    event: Union[EventModel, List[EventModel]] = Body(...),
+    user=Depends(require_role("user")),
+) -> Dict[str, Any]:
+    """Canonical activity logging endpoint.
+
+    Accepts a single event or an array of up to ``EVENT_BATCH_MAX`` events
+    so the frontend can flush its activity buffer in one request.
+    """
 
-    return await log_event(event, user)
+    if not isinstance(event, list):
+        return await log_event(event, user)
+    if len(event) > EVENT_BATCH_MAX:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {EVENT_BATCH_MAX} events per request",
+        )
+    batch = [_normalise_event(item) for item in event]
+    events.extend(batch)
+    accepted = event_ingest.submit(batch)
+    return {"status": "logged", "accepted": accepted, "dropped": len(batch) - accepted}
 
 
 @app.post("/survey")
@@ -11653,6 +11879,7 @@ def reset_compose_workers_for_tests() -> None:
 
     _COMPOSE_WORKERS.clear()
     _COMPOSE_CANCELLATIONS.clear()
+    _COMPOSE_RUNNING.clear()
     global _COMPOSE_QUEUE, _COMPOSE_WORKER_LOCK, _COMPOSE_PIPELINE
     _COMPOSE_QUEUE = None
     _COMPOSE_WORKER_LOCK = None
@@ -12395,11 +12622,15 @@ async def get_status_observability(
 async def get_status_observability_trace(
     trace_id: str, user=Depends(require_roles("analyst"))
 ) -> Dict[str, Any]:
-    """Return details for a specific AI route invocation."""
+    """Return details for a specific AI route invocation and its DB queries."""
 
     detail = get_observability_trace(trace_id)
-    if detail is None:
+    database = get_query_trace(trace_id)
+    if detail is None and database is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Trace not found")
+    detail = dict(detail or {"traceId": trace_id})
+    if database is not None:
+        detail["database"] = database
     return detail
 
 
@@ -12410,7 +12641,159 @@ async def get_status_alerts(user=Depends(require_roles("analyst"))) -> Dict[str,
     return _snapshot_alert_summary()
 
 
-def _aggregate_events_for_day(day: date) -> bool:
+@app.get("/status/jobs")
+async def get_status_jobs(user=Depends(require_roles("analyst"))) -> Dict[str, Any]:
+    """Return background job queue depth, running jobs and recent failures."""
+
+    return await asyncio.to_thread(worker.job_status)
+
+
+class ProfileStartRequest(BaseModel):
+    seconds: Optional[float] = Field(default=None, gt=0)
+    route: Optional[str] = Field(default=None, max_length=256)
+    method: Optional[str] = Field(default=None, max_length=16)
+    traceId: Optional[str] = Field(default=None, max_length=128)
+    requests: Optional[int] = Field(default=None, ge=1, le=1000)
+
+
+@app.post("/system/profile", tags=["system"])
+async def start_profile(
+    req: ProfileStartRequest, user=Depends(require_role("admin"))
+) -> Dict[str, Any]:
+    """Start sampling for ``seconds``, or for requests matching a route or trace.
+
+    ``route`` matches the raw path or its metrics form (``/api/compose/:param``).
+    """
+
+    try:
+        session = PROFILER.start(
+            seconds=req.seconds,
+            route=req.route,
+            method=req.method,
+            trace_id=req.traceId,
+            requests=req.requests,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+    except RuntimeError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc)) from exc
+    return session.to_dict()
+
+
+@app.get("/system/profile", tags=["system"])
+async def list_profiles(user=Depends(require_role("admin"))) -> Dict[str, Any]:
+    return {"sessions": [session.to_dict(top=0) for session in PROFILER.sessions()]}
+
+
+@app.get("/system/profile/{session_id}", tags=["system"], response_model=None)
+async def get_profile(
+    session_id: str,
+    format: str = Query("json", pattern="^(json|collapsed)$"),
+    top: int = Query(20, ge=0, le=500),
+    user=Depends(require_role("admin")),
+) -> Response | Dict[str, Any]:
+    """Return a session summary, or its collapsed stacks for flamegraph tools."""
+
+    session = PROFILER.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    if format == "collapsed":
+        response = Response(content=session.collapsed(), media_type="text/plain")
+        response.headers["X-Bypass-Envelope"] = "1"
+        return response
+    return session.to_dict(top=top)
+
+
+@app.get("/system/event-loop", tags=["system"])
+async def event_loop_status(user=Depends(require_role("admin"))) -> Dict[str, Any]:
+    """Return current loop lag and the most recent blocking calls."""
+
+    return LOOP_MONITOR.snapshot()
+
+
+@app.delete("/system/profile/{session_id}", tags=["system"])
+async def stop_profile(session_id: str, user=Depends(require_role("admin"))) -> Dict[str, Any]:
+    session = PROFILER.stop(session_id)
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return session.to_dict(top=0)
+
+
+class TracemallocStartRequest(BaseModel):
+    frames: Optional[int] = Field(default=None, ge=1, le=100)
+
+
+class MemorySnapshotRequest(BaseModel):
+    name: str = Field(..., min_length=1, max_length=64)
+
+
+@app.post("/system/memory/tracemalloc", tags=["system"])
+async def start_tracemalloc(
+    req: TracemallocStartRequest, user=Depends(require_role("admin"))
+) -> Dict[str, Any]:
+    """Start tracing Python allocations, keeping ``frames`` frames per trace."""
+
+    return MEMORY_TRACER.start(req.frames)
+
+
+@app.delete("/system/memory/tracemalloc", tags=["system"])
+async def stop_tracemalloc(user=Depends(require_role("admin"))) -> Dict[str, Any]:
+    return MEMORY_TRACER.stop()
+
+
+@app.get("/system/memory/caches", tags=["system"])
+async def memory_caches(user=Depends(require_role("admin"))) -> Dict[str, Any]:
+    """Return the sizes of in-process caches and registries."""
+
+    return {"caches": cache_sizes()}
+
+
+@app.get("/system/memory/snapshots", tags=["system"])
+async def list_memory_snapshots(user=Depends(require_role("admin"))) -> Dict[str, Any]:
+    return MEMORY_TRACER.status()
+
+
+@app.post("/system/memory/snapshots", tags=["system"])
+async def take_memory_snapshot(
+    req: MemorySnapshotRequest, user=Depends(require_role("admin"))
+) -> Dict[str, Any]:
+    try:
+        return await asyncio.to_thread(MEMORY_TRACER.take_snapshot, req.name)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+    except RuntimeError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc)) from exc
+
+
+@app.delete("/system/memory/snapshots/{name}", tags=["system"])
+async def delete_memory_snapshot(name: str, user=Depends(require_role("admin"))) -> Dict[str, Any]:
+    if not MEMORY_TRACER.delete_snapshot(name):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Snapshot not found")
+    return {"deleted": name}
+
+
+@app.get("/system/memory/diff", tags=["system"])
+async def memory_diff(
+    base: str = Query(..., min_length=1),
+    target: Optional[str] = Query(None),
+    top: int = Query(20, ge=1, le=500),
+    user=Depends(require_role("admin")),
+) -> Dict[str, Any]:
+    """Return the largest allocation changes from ``base`` to ``target``.
+
+    Without ``target`` the comparison is against the heap right now.  Changes
+    are listed by ``file:line`` and totalled by subsystem.
+    """
+
+    try:
+        return await asyncio.to_thread(MEMORY_TRACER.diff, base, target, top=top)
+    except KeyError as exc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Snapshot not found") from exc
+    except RuntimeError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc)) from exc
+
+
+def _aggregate_events_for_day(day: date, conn: sqlite3.Connection) -> bool:
     """Aggregate metrics for a single UTC day into ``event_aggregates``."""
 
     start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
@@ -12418,7 +12801,7 @@ def _aggregate_events_for_day(day: date) -> bool:
     start_ts = start.timestamp()
     end_ts = end.timestamp()
 
-    cursor = db_conn.cursor()
+    cursor = conn.cursor()
     try:
         row = cursor.execute(
             """
@@ -12471,7 +12854,7 @@ def _aggregate_events_for_day(day: date) -> bool:
         "clinicians": row["clinicians"] or 0,
     }
 
-    db_conn.execute(
+    conn.execute(
         """
         INSERT INTO event_aggregates (day, start_ts, end_ts, total_events, metrics, computed_at)
         VALUES (?, ?, ?, ?, ?, ?)
@@ -12491,14 +12874,22 @@ def _aggregate_events_for_day(day: date) -> bool:
             time.time(),
         ),
     )
-    db_conn.commit()
     return True
 
 
 def _aggregate_pending_days() -> int:
-    """Aggregate any days that have not yet been summarised."""
+    """Aggregate any days that have not yet been summarised.
 
-    cursor = db_conn.cursor()
+    Runs in a worker thread, so it uses a pooled connection and commits all
+    days in one transaction.
+    """
+
+    with db_pool().write() as conn:
+        return _aggregate_days(conn)
+
+
+def _aggregate_days(conn: sqlite3.Connection) -> int:
+    cursor = conn.cursor()
     first_last = cursor.execute(
         "SELECT MIN(timestamp) AS first_ts, MAX(timestamp) AS last_ts FROM events"
     ).fetchone()
@@ -12525,7 +12916,7 @@ def _aggregate_pending_days() -> int:
     aggregated_days = 0
     current = start_day
     while current <= last_full_day:
-        if _aggregate_events_for_day(current):
+        if _aggregate_events_for_day(current, conn):
             aggregated_days += 1
         current += timedelta(days=1)
     return aggregated_days
@@ -13607,7 +13998,8 @@ async def summarize(
     Returns:
         A dictionary containing "summary", "patient_friendly", "recommendations", "warnings".
     """
-    prompt_context = PROMPT_GUARD.prepare("summary", req)
+    _enforce_ai_rate_limit(user, "summarize")
+    prompt_context = await PROMPT_GUARD.prepare_async("summary", req)
     cleaned = prompt_context.text or ""
     offline_active = req.useOfflineMode if req.useOfflineMode is not None else False
     if not offline_active:
@@ -13687,9 +14079,9 @@ async def summarize(
                 ),
             )
             observation.add_metadata("promptCache", cache_state)
-            previous_snapshot = _fetch_previous_note_snapshot(req.noteId, clinician_id)
-            pmh_entries = _fetch_pmh_entries_for_session(user.get("sub"), req.sessionId)
-            dynamic_message = _build_dynamic_note_message(
+            previous_snapshot = await _fetch_previous_note_snapshot(req.noteId, clinician_id)
+            pmh_entries = await _fetch_pmh_entries_for_session(user.get("sub"), req.sessionId)
+            dynamic_message = await _build_dynamic_note_message(
                 route="summary",
                 prompt_context=prompt_context,
                 request=req,
@@ -14063,7 +14455,8 @@ async def beautify_note(req: NoteRequest, user=Depends(require_role("user"))) ->
     Returns:
         A dictionary with the beautified note as a string.
     """
-    prompt_context = PROMPT_GUARD.prepare("beautify", req)
+    _enforce_ai_rate_limit(user, "beautify")
+    prompt_context = await PROMPT_GUARD.prepare_async("beautify", req)
     cleaned = prompt_context.text or ""
     offline_active = req.useOfflineMode if req.useOfflineMode is not None else False
     if not offline_active:
@@ -14121,9 +14514,9 @@ async def beautify_note(req: NoteRequest, user=Depends(require_role("user"))) ->
                 ),
             )
             observation.add_metadata("promptCache", cache_state)
-            previous_snapshot = _fetch_previous_note_snapshot(req.noteId, clinician_id)
-            pmh_entries = _fetch_pmh_entries_for_session(user.get("sub"), req.sessionId)
-            dynamic_message = _build_dynamic_note_message(
+            previous_snapshot = await _fetch_previous_note_snapshot(req.noteId, clinician_id)
+            pmh_entries = await _fetch_pmh_entries_for_session(user.get("sub"), req.sessionId)
+            dynamic_message = await _build_dynamic_note_message(
                 route="beautify",
                 prompt_context=prompt_context,
                 request=req,
@@ -14170,15 +14563,10 @@ async def suggest(
     Returns:
         SuggestionsResponse with four categories of suggestions.
     """
+    _enforce_ai_rate_limit(user, "suggest")
 
-    combined = req.text or ""
-    if req.chart:
-        combined += "\n" + str(req.chart)
-    if req.audio:
-        combined += "\n" + str(req.audio)
-    cleaned = deidentify(combined)
     # Combine the main note with any optional chart text or audio transcript
-    prompt_context = PROMPT_GUARD.prepare("suggest", req)
+    prompt_context = await PROMPT_GUARD.prepare_async("suggest", req)
     cleaned = prompt_context.text or ""
     if prompt_context.rules:
         rules_section = "\n\nUser‑defined rules:\n" + "\n".join(
@@ -14257,7 +14645,7 @@ async def suggest(
                     patient_identifier = context_blob.get("patientId") or context_blob.get("patient_id")
         if patient_identifier:
             try:
-                snapshot = context_pipeline.get_snapshot(str(patient_identifier), "superficial")
+                snapshot = await context_pipeline.get_snapshot_async(str(patient_identifier), "superficial")
             except Exception:
                 snapshot = None
             if isinstance(snapshot, dict):
@@ -14527,7 +14915,9 @@ async def suggest(
                 )
             )
             messages = stable_messages + [dynamic_message]
-            response_content = call_openai(messages, model=model_name or "gpt-4o")
+            response_content = await _call_openai_coalesced(
+                "suggest", messages, model=model_name or "gpt-4o"
+            )
             _record_prompt_usage("suggest", observation, cache_state)
             data = json.loads(response_content)
             codes_list: List[CodeSuggestion] = []
@@ -14973,7 +15363,7 @@ async def generate_plan(
                 if snippet:
                     speaker = entry.get("speaker") or "transcript"
                     combined += f"\n\nTranscript ({speaker}): {snippet}"
-    cleaned = deidentify(combined)
+    cleaned = await deidentify_async(combined)
     codes_for_prompt, extra_context = _build_plan_prompt_context(req, cleaned)
 
     offline_active = req.useOfflineMode if req.useOfflineMode is not None else False
@@ -15477,28 +15867,46 @@ async def _compose_worker_loop() -> None:
         if queue is None:
             await asyncio.sleep(0.25)
             continue
-        job = await queue.get()
+        scheduled: ScheduledItem[ComposeJobPayload] = await queue.get()
+        job = scheduled.item
+        outcome = "cancelled"
         try:
             if _compose_is_cancelled(job.compose_id):
                 logger.info("compose_job_skipped_cancelled", composeId=job.compose_id)
+                _compose_clear_cancelled(job.compose_id)
                 continue
-            await _process_compose_job(job)
+            # Run the job as its own task so a cancel request can interrupt an
+            # in-flight model call without taking the worker down with it.
+            task = asyncio.get_running_loop().create_task(_process_compose_job(job))
+            _COMPOSE_RUNNING[job.compose_id] = task
+            try:
+                await asyncio.wait({task})
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+            if not task.cancelled():
+                outcome = task.result() or "completed"
         except asyncio.CancelledError:
             raise
         except Exception as exc:  # pragma: no cover - defensive logging
+            outcome = "failed"
             logger.exception(
                 "compose_worker_error", composeId=job.compose_id, error=str(exc)
             )
         finally:
-            queue.task_done()
+            _COMPOSE_RUNNING.pop(job.compose_id, None)
+            queue.task_done(scheduled, outcome)
 
 
-async def _process_compose_job(job: ComposeJobPayload) -> None:
+async def _process_compose_job(job: ComposeJobPayload) -> str:
+    """Run ``job`` through the compose pipeline and return its final status."""
+
     from backend.ws_compose import compose_stream
 
     compose_id = job.compose_id
     pipeline = _get_compose_pipeline()
     last_event: Dict[str, Any] = {"stage": None, "status": None, "progress": None}
+    outcome = "failed"
 
     async def _publish_compose_detail(detail: Mapping[str, Any]) -> None:
         encounter_value = job.encounter_id or detail.get("encounterId")
@@ -15524,13 +15932,7 @@ async def _process_compose_job(job: ComposeJobPayload) -> None:
                 error=str(exc),
             )
 
-    async def reporter(state: Any) -> None:
-        state_dict = state.as_dict() if hasattr(state, "as_dict") else dict(state)
-        detail = _compose_state_detail(job, state_dict)
-        status_value = state_dict.get("status") or "in_progress"
-        if status_value not in {"completed", "failed", "blocked", "cancelled"}:
-            status_value = "in_progress"
-        await _publish_compose_detail(detail)
+    def _persist_progress(status_value: str, detail: Dict[str, Any]) -> None:
         _update_compose_record(compose_id, status_value, detail)
         stage = detail.get("stage")
         progress = detail.get("progress")
@@ -15551,12 +15953,33 @@ async def _process_compose_job(job: ComposeJobPayload) -> None:
         if job.username:
             _compose_update_session_state(job.username, detail, status_value)
 
+    progress_writes = ProgressCoalescer(
+        _COMPOSE_PROGRESS_FLUSH_SECONDS, flush=lambda snapshot: _persist_progress(*snapshot)
+    )
+
+    async def reporter(state: Any) -> None:
+        state_dict = state.as_dict() if hasattr(state, "as_dict") else dict(state)
+        detail = _compose_state_detail(job, state_dict)
+        status_value = state_dict.get("status") or "in_progress"
+        if status_value not in {"completed", "failed", "blocked", "cancelled"}:
+            status_value = "in_progress"
+        await _publish_compose_detail(detail)
+        # Subscribers get every update; the database only sees the latest
+        # snapshot at most once per flush interval (terminal states always).
+        if progress_writes.offer(
+            (status_value, detail), force=status_value != "in_progress"
+        ):
+            _persist_progress(status_value, detail)
+
     try:
         final_state = await pipeline.run(
             job, reporter, is_cancelled=lambda: _compose_is_cancelled(compose_id)
         )
+        # The final state written below supersedes any held-back snapshot.
+        progress_writes.discard()
         final_detail = _compose_state_detail(job, final_state.as_dict())
         final_status = final_state.status
+        outcome = final_status
         await _publish_compose_detail(final_detail)
         _update_compose_record(compose_id, final_status, final_detail)
         if job.username:
@@ -15575,6 +15998,10 @@ async def _process_compose_job(job: ComposeJobPayload) -> None:
             event_detail["validationOk"] = False
             _record_compose_event("compose_failed", compose_id, event_detail)
     except ComposeJobCancelled:
+        outcome = "cancelled"
+        pending_progress = progress_writes.drain()
+        if pending_progress is not None:
+            _persist_progress(*pending_progress)
         record = _load_compose_record(compose_id)
         if record is not None:
             _, detail_payload = record
@@ -15638,7 +16065,9 @@ async def _process_compose_job(job: ComposeJobPayload) -> None:
         if job.username:
             _compose_update_session_state(job.username, fallback_detail, "failed")
     finally:
+        progress_writes.discard()
         _compose_clear_cancelled(compose_id)
+    return outcome
 
 
 async def _ensure_compose_workers() -> None:
@@ -15647,7 +16076,10 @@ async def _ensure_compose_workers() -> None:
         _COMPOSE_WORKER_LOCK = asyncio.Lock()
     async with _COMPOSE_WORKER_LOCK:
         if _COMPOSE_QUEUE is None:
-            _COMPOSE_QUEUE = asyncio.Queue()
+            _COMPOSE_QUEUE = FairScheduler(
+                weights=_COMPOSE_FLOW_WEIGHTS,
+                max_inflight_per_flow=_COMPOSE_MAX_INFLIGHT_PER_FLOW,
+            )
         if _COMPOSE_WORKERS:
             return
         loop = asyncio.get_running_loop()
@@ -15673,12 +16105,13 @@ async def _enqueue_compose_job(job: ComposeJobPayload) -> None:
     queue = _COMPOSE_QUEUE
     if queue is None:  # pragma: no cover - defensive
         raise RuntimeError("compose queue unavailable")
-    await queue.put(job)
+    await queue.put(job, user=job.username, clinic=job.clinic)
     logger.info(
         "compose_job_enqueued",
         composeId=job.compose_id,
         sessionId=job.session_id,
         encounterId=job.encounter_id,
+        queueDepth=len(queue),
     )
 
 @app.post("/api/v1/workflow/sessions", response_model=WorkflowSessionResponse)
@@ -16245,6 +16678,7 @@ async def start_compose_job(
         encounter_id=encounter_id,
         note_id=note_id,
         username=user.get("sub"),
+        clinic=user.get("clinic"),
     )
     await _enqueue_compose_job(job_payload)
     _record_compose_event(
@@ -16315,6 +16749,12 @@ async def cancel_compose_job(
         _compose_update_session_state(user.get("sub", ""), detail, status)
         return _compose_response_from_detail(compose_id, status, detail)
     _compose_mark_cancelled(compose_id)
+    queue = _COMPOSE_QUEUE
+    if queue is not None and queue.remove(lambda job: job.compose_id == compose_id):
+        _compose_clear_cancelled(compose_id)
+    running = _COMPOSE_RUNNING.get(compose_id)
+    if running is not None and not running.done():
+        running.cancel()
     detail["status"] = "cancelled"
     detail["stage"] = detail.get("stage") or "cancelled"
     try:
@@ -17489,7 +17929,7 @@ async def download_finalized_pdf(
 
 
 async def _codes_suggest(req: CodesSuggestRequest) -> CodesSuggestResponse:
-    cleaned = deidentify(req.content or "")
+    cleaned = await deidentify_async(req.content or "")
     offline = req.useOfflineMode or USE_OFFLINE_MODEL
     context_stage = (req.context_stage or "superficial").lower()
     context_lines = [f"Context stage: {context_stage}"]
@@ -17557,7 +17997,7 @@ async def _codes_suggest(req: CodesSuggestRequest) -> CodesSuggestResponse:
                     ),
                 },
             ]
-            resp = call_openai(messages)
+            resp = await _call_openai_coalesced("codes_suggest", messages)
             data = json.loads(resp)
             normalised = _normalize_code_suggestions(data.get("suggestions", []))
             deduped = _dedupe_code_suggestions(normalised, req.codes)
@@ -17586,6 +18026,7 @@ async def codes_suggest(
             status_code=status.HTTP_409_CONFLICT,
             content={"message": _NO_MEANINGFUL_CHANGES_MESSAGE},
         )
+    _enforce_ai_rate_limit(user, "codes_suggest")
     return await _codes_suggest(req)
 
 
@@ -17782,7 +18223,7 @@ async def _compliance_check(
     username: Optional[str] = None,
 ) -> ComplianceCheckResponse:
     conn = db or db_conn
-    cleaned = deidentify(req.content or "")
+    cleaned = await deidentify_async(req.content or "")
     offline = req.useOfflineMode or USE_OFFLINE_MODEL
     cache_state = "warm" if offline else "cold"
     model_name = "offline" if offline else "gpt-4o"
@@ -17835,7 +18276,7 @@ async def _compliance_check(
                         "content": f"Note:\n{cleaned}\nCodes:{codes}",
                     },
                 ]
-                resp = call_openai(messages)
+                resp = await _call_openai_coalesced("compliance_check", messages)
                 data = json.loads(resp)
                 alerts = [ComplianceAlert(**a) for a in data.get("alerts", [])]
                 response = _build_compliance_response(alerts, conn)
@@ -17872,6 +18313,7 @@ async def compliance_check(
             status_code=status.HTTP_409_CONFLICT,
             content={"message": _NO_MEANINGFUL_CHANGES_MESSAGE},
         )
+    _enforce_ai_rate_limit(user, "compliance_check")
     conn = resolve_session_connection(session)
     return await _compliance_check(req, conn, username=user.get("sub"))
 
@@ -18124,7 +18566,7 @@ async def compliance_resources(
 async def _differentials_generate(
     req: DifferentialsGenerateRequest,
 ) -> DifferentialsResponse:
-    cleaned = deidentify(req.content or "")
+    cleaned = await deidentify_async(req.content or "")
     offline = req.useOfflineMode or USE_OFFLINE_MODEL
     potential_concerns: list[str] = []
     concern_keys: set[str] = set()
@@ -18213,7 +18655,7 @@ async def _differentials_generate(
                         "content": json.dumps(context_payload, ensure_ascii=False, indent=2),
                     },
                 ]
-                resp = call_openai(messages)
+                resp = await _call_openai_coalesced("differentials_generate", messages)
                 data = json.loads(resp)
                 diffs = _normalize_differentials(data.get("differentials", []), skipped_messages)
                 for msg in _coerce_string_list(data.get("potentialConcerns")):
@@ -18261,6 +18703,7 @@ async def differentials_generate(
             status_code=status.HTTP_409_CONFLICT,
             content={"message": _NO_MEANINGFUL_CHANGES_MESSAGE},
         )
+    _enforce_ai_rate_limit(user, "differentials_generate")
     return await _differentials_generate(req)
 
 
@@ -18328,7 +18771,7 @@ async def _prevention_suggest(req: PreventionSuggestRequest) -> PreventionRespon
                     ),
                 },
             ]
-            resp = call_openai(messages)
+            resp = await _call_openai_coalesced("prevention_suggest", messages)
             data = json.loads(resp)
             recs = _normalize_prevention_items(data.get("recommendations", []))
             return PreventionResponse(recommendations=recs)
@@ -18344,6 +18787,7 @@ async def _prevention_suggest(req: PreventionSuggestRequest) -> PreventionRespon
 async def prevention_suggest(
     req: PreventionSuggestRequest, user=Depends(require_role("user"))
 ) -> PreventionResponse:
+    _enforce_ai_rate_limit(user, "prevention_suggest")
     return await _prevention_suggest(req)
 
 
@@ -18359,7 +18803,7 @@ async def ws_prevention_suggest(websocket: WebSocket):
 
 
 async def _realtime_analyze(req: RealtimeAnalyzeRequest) -> RealtimeAnalysisResponse:
-    cleaned = deidentify(req.content or "")
+    cleaned = await deidentify_async(req.content or "")
     offline = req.useOfflineMode or USE_OFFLINE_MODEL
     cache_state = "warm" if offline else "cold"
     model_name = "offline" if offline else "gpt-4o"
@@ -18397,7 +18841,7 @@ async def _realtime_analyze(req: RealtimeAnalyzeRequest) -> RealtimeAnalysisResp
                     "content": f"Content:\n{cleaned}\nContext:{context}",
                 },
             ]
-            resp = call_openai(messages)
+            resp = await _call_openai_coalesced("realtime_analysis", messages)
             data = json.loads(resp)
             if not data.get("analysisId"):
                 data["analysisId"] = str(uuid4())
@@ -18421,6 +18865,7 @@ async def _realtime_analyze(req: RealtimeAnalyzeRequest) -> RealtimeAnalysisResp
 async def realtime_analyze(
     req: RealtimeAnalyzeRequest, user=Depends(require_role("user"))
 ) -> RealtimeAnalysisResponse:
+    _enforce_ai_rate_limit(user, "realtime_analysis")
     return await _realtime_analyze(req)
 
 
@@ -18440,7 +18885,7 @@ async def analyze_compliance(
 ):
     """Analyze compliance issues in a note using an AI model."""
 
-    cleaned = deidentify(req.text or "")
+    cleaned = await deidentify_async(req.text or "")
     offline = USE_OFFLINE_MODEL
     cache_state = "warm" if offline else "cold"
     model_name = req.suggestModel or ("offline" if offline else "gpt-4o")
@@ -18531,7 +18976,7 @@ async def auto_save_note(note: AutoSaveModel, user=Depends(require_role("user"))
 async def finalize_check(req: NoteRequest, user=Depends(require_role("user"))):
     """Use an AI model to check if a note is ready for finalization."""
 
-    cleaned = deidentify(req.text or "")
+    cleaned = await deidentify_async(req.text or "")
     offline = USE_OFFLINE_MODEL
     cache_state = "warm" if offline else "cold"
     trace_id = current_trace_id()
@@ -18578,7 +19023,7 @@ async def analyze_note(
 ) -> Dict[str, Any]:
     """Extract structured content from a note via the LLM."""
 
-    cleaned = deidentify(req.text or "")
+    cleaned = await deidentify_async(req.text or "")
     offline = USE_OFFLINE_MODEL
     cache_state = "warm" if offline else "cold"
     trace_id = current_trace_id()
@@ -18615,7 +19060,7 @@ async def analyze_note(
 @app.post("/followup", response_model=ScheduleResponse)
 async def followup(req: ScheduleRequest, user=Depends(require_role("user"))) -> ScheduleResponse:
     """Return a recommended follow-up interval (no persistence)."""
-    cleaned = deidentify(req.text or "")
+    cleaned = await deidentify_async(req.text or "")
     follow = recommend_follow_up(
         req.codes or [],
         [cleaned],
@@ -19358,21 +19803,116 @@ async def get_code_documentation(code: str, user=Depends(require_role("user"))):
     documentation = code_tables.get_documentation(code)
     return _success_payload(documentation)
 
+
+@app.get("/api/codes/search")
+async def search_codes(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    code_type: str | None = Query(None, alias="type"),
+    specialty: str | None = Query(None),
+    user=Depends(require_role("user")),
+):
+    """Autocomplete CPT/ICD-10/HCPCS codes by code prefix or description."""
+
+    # Index rebuilds and the freshness check query SQLite; keep them off the loop.
+    results = await asyncio.to_thread(
+        code_search.search_codes,
+        q,
+        limit=limit,
+        code_type=code_type.strip() if code_type else None,
+        specialty=specialty.strip() if specialty else None,
+    )
+    return _success_payload({"query": q, "results": results, "count": len(results)})
+
 # ---------------------------------------------------------------------------
 # WebSocket endpoints
 # ---------------------------------------------------------------------------
 
 
 class ConnectionManager:
-    """Track active WebSocket sessions and replay missed events on reconnect."""
+    """Track active WebSocket sessions and replay missed events on reconnect.
 
-    def __init__(self) -> None:
+    Per-user replay history and event counters outlive the user's sessions so
+    a reconnect can resume, but users with no session for ``ttl`` seconds are
+    forgotten by :meth:`sweep`, and ``max_users`` optionally caps how many
+    disconnected users are remembered.
+    """
+
+    def __init__(
+        self,
+        name: str = "ws",
+        *,
+        history_size: Optional[int] = None,
+        history_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        max_users: Optional[int] = None,
+    ) -> None:
+        self.name = name
         self.active: Dict[str, WebSocket] = {}
         self.session_users: Dict[str, str] = {}
         self.user_sessions: Dict[str, Set[str]] = defaultdict(set)
         self.latest_session_by_user: Dict[str, str] = {}
-        self.history: Dict[str, deque[dict]] = defaultdict(deque)
+        self.history: Dict[str, ReplayBuffer] = {}
         self.counters: Dict[str, int] = defaultdict(int)
+        self.history_size = history_size or int(ws_env_float("WS_REPLAY_EVENTS", 50))
+        self.history_bytes = (
+            history_bytes if history_bytes is not None else int(ws_env_float("WS_REPLAY_MAX_BYTES", 256 * 1024))
+        )
+        self.ttl = ttl if ttl is not None else ws_env_float("WS_REGISTRY_TTL_SECONDS", 3600.0)
+        cap = max_users if max_users is not None else int(ws_env_float("WS_REGISTRY_MAX_USERS", 0))
+        self.max_users = cap if cap > 0 else None
+        self._last_seen: "OrderedDict[str, float]" = OrderedDict()
+        self._last_sweep = time.monotonic()
+
+    def _touch(self, username: str) -> None:
+        now = time.monotonic()
+        self._last_seen[username] = now
+        self._last_seen.move_to_end(username)
+        over_cap = self.max_users is not None and len(self._last_seen) > self.max_users
+        if over_cap or now - self._last_sweep > self.ttl:
+            self.sweep(now)
+
+    def _forget(self, username: str) -> None:
+        self._last_seen.pop(username, None)
+        self.history.pop(username, None)
+        self.counters.pop(username, None)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Evict idle users and sessions whose socket has already closed."""
+
+        now = time.monotonic() if now is None else now
+        self._last_sweep = now
+        for session_id, ws in list(self.active.items()):
+            if (
+                getattr(ws, "client_state", None) == WebSocketState.DISCONNECTED
+                or getattr(ws, "application_state", None) == WebSocketState.DISCONNECTED
+            ):
+                self.disconnect(session_id)
+        removed = 0
+        for username, seen in list(self._last_seen.items()):
+            if now - seen > self.ttl and username not in self.user_sessions:
+                self._forget(username)
+                removed += 1
+        if self.max_users is not None and len(self._last_seen) > self.max_users:
+            for username in list(self._last_seen):
+                if len(self._last_seen) <= self.max_users:
+                    break
+                if username not in self.user_sessions:
+                    self._forget(username)
+                    removed += 1
+        self._report()
+        return removed
+
+    def sizes(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self.active),
+            "users": len(self._last_seen),
+            "replay_bytes": sum(buffer.nbytes for buffer in self.history.values()),
+        }
+
+    def _report(self) -> None:
+        for kind, value in self.sizes().items():
+            WS_REGISTRY_SIZE.labels(self.name, kind).set(value)
 
     async def connect(
         self,
@@ -19388,11 +19928,11 @@ class ConnectionManager:
         self.active[session_id] = websocket
         self.user_sessions[username].add(session_id)
         self.latest_session_by_user[username] = session_id
-        events = list(self.history[username])
-        if last_event_id is not None:
-            events = [e for e in events if e["eventId"] > last_event_id]
-        for payload in events:
-            await websocket.send_json(payload)
+        self._touch(username)
+        history = self.history.get(username)
+        frames = history.since(last_event_id) if history is not None else []
+        for frame in frames:
+            await websocket.send_text(frame)
         return session_id
 
     def disconnect(self, session_id: str) -> None:
@@ -19400,6 +19940,8 @@ class ConnectionManager:
         username = self.session_users.pop(session_id, None)
         if not username:
             return
+        if username in self._last_seen:
+            self._last_seen[username] = time.monotonic()
         sessions = self.user_sessions.get(username)
         if sessions:
             sessions.discard(session_id)
@@ -19414,23 +19956,31 @@ class ConnectionManager:
 
         return self.latest_session_by_user.get(username)
 
+    def _record(self, username: str, payload: Dict[str, Any]) -> str:
+        """Assign the next event id, store the frame for replay and return it."""
+
+        self.counters[username] += 1
+        enriched = {"eventId": self.counters[username], **payload}
+        enriched.setdefault("event", "message")
+        frame = serialise_frame(enriched)
+        history = self.history.get(username)
+        if history is None:
+            history = self.history[username] = ReplayBuffer(self.history_size, self.history_bytes)
+        history.append(self.counters[username], frame)
+        self._touch(username)
+        return frame
+
     async def push(self, session_id: str, payload: Dict[str, Any]) -> None:
         username = self.session_users.get(session_id)
         if not username:
             return
-        self.counters[username] += 1
-        enriched = {"eventId": self.counters[username], **payload}
-        enriched.setdefault("event", "message")
-        history = self.history[username]
-        history.append(enriched)
-        if len(history) > 50:
-            history.popleft()
+        frame = self._record(username, payload)
         for sid in list(self.user_sessions.get(username, [])):
             ws = self.active.get(sid)
             if ws is None:
                 continue
             try:
-                await ws.send_json(enriched)
+                await ws.send_text(frame)
             except Exception:
                 self.disconnect(sid)
 
@@ -19441,13 +19991,7 @@ class ConnectionManager:
         if session_id:
             await self.push(session_id, payload)
             return
-        self.counters[username] += 1
-        enriched = {"eventId": self.counters[username], **payload}
-        enriched.setdefault("event", "message")
-        history = self.history[username]
-        history.append(enriched)
-        if len(history) > 50:
-            history.popleft()
+        self._record(username, payload)
 
 
 async def _ws_endpoint(
@@ -19487,17 +20031,60 @@ async def _ws_endpoint(
         manager.disconnect(session_id)
 
 
-transcription_manager = ConnectionManager()
-compliance_manager = ConnectionManager()
-collaboration_manager = ConnectionManager()
-codes_manager = ConnectionManager()
-schedule_manager = ConnectionManager()
+transcription_manager = ConnectionManager("transcription")
+compliance_manager = ConnectionManager("compliance")
+collaboration_manager = ConnectionManager("collaboration")
+codes_manager = ConnectionManager("codes")
+schedule_manager = ConnectionManager("schedule")
 
 compliance_stream = ComplianceDeltaStream()
 compose_stream = ComposeDeltaStream()
 codes_stream = CodesDeltaStream()
 
 
+def _load_collaboration_document(note_id: str) -> str:
+    """Return the latest saved text for a collaboration room."""
+
+    ensure_note_versions_table(db_conn)
+    with session_scope(db_conn) as session:
+        latest = session.execute(
+            sa.select(NoteVersion.content)
+            .where(NoteVersion.note_id == str(note_id))
+            .order_by(sa.desc(NoteVersion.created_at), sa.desc(NoteVersion.id))
+            .limit(1)
+        ).scalar_one_or_none()
+        if latest is not None:
+            return latest
+        normalized = _normalize_note_identifier(note_id)
+        note = session.get(Note, normalized) if normalized is not None else None
+        return (note.content or "") if note is not None else ""
+
+
+def _save_collaboration_document(note_id: str, content: str, username: Optional[str]) -> None:
+    """Compact a collaboration room into a ``note_versions`` row."""
+
+    user_id = _get_user_db_id(username) if username else None
+    with session_scope(db_conn) as session:
+        _save_note_version(session, note_id, content, user_id)
+
+
+collaboration_rooms = CollaborationHub(
+    _load_collaboration_document, _save_collaboration_document
+)
+
+# Lambdas so registries swapped out by tests are measured, not the originals.
+register_cache("ws.transcription", lambda: transcription_manager.sizes())
+register_cache("ws.compliance", lambda: compliance_manager.sizes())
+register_cache("ws.collaboration", lambda: collaboration_manager.sizes())
+register_cache("ws.codes", lambda: codes_manager.sizes())
+register_cache("ws.schedule", lambda: schedule_manager.sizes())
+register_cache("ws.compliance_stream", lambda: len(compliance_stream))
+register_cache("ws.compose_stream", lambda: len(compose_stream))
+register_cache("ws.codes_stream", lambda: len(codes_stream))
+register_cache("ws.context_events", lambda: context_pipeline.events.sizes())
+register_cache("ws.collaboration_rooms", lambda: len(collaboration_rooms.rooms))
+
+
 async def _broadcast_schedule_event(payload: Dict[str, Any]) -> None:
     """Broadcast *payload* to all active schedule websocket subscribers."""
 
@@ -19665,7 +20252,7 @@ async def ws_context_updates(websocket: WebSocket, correlation_id: str) -> None:
     queue = await context_pipeline.events.connect(correlation_id)
     try:
         await websocket.send_json({"event": "connected", "correlation_id": correlation_id})
-        status_payload = context_pipeline.get_status_by_correlation(correlation_id)
+        status_payload = await context_pipeline.get_status_by_correlation_async(correlation_id)
         patient_hint = websocket.query_params.get("patient_id") or ""
         if status_payload:
             stages = status_payload.get("stages", {})
@@ -19747,6 +20334,19 @@ async def ws_collaboration(websocket: WebSocket) -> None:
     await _ws_endpoint(collaboration_manager, websocket, channel="collaboration")
 
 
+@app.websocket("/ws/collaboration/{note_id}")
+async def ws_collaboration_room(websocket: WebSocket, note_id: str) -> None:
+    """Shared editing room for one note.
+
+    Clients exchange operational-transform deltas; see
+    :mod:`backend.collaboration` for the message protocol.
+    """
+
+    await collaboration_rooms.handle(
+        websocket, note_id, lambda ws: ws_require_role(ws, "user")
+    )
+
+
 @app.websocket("/ws/codes")
 async def ws_codes(websocket: WebSocket) -> None:
     """Stream coding deltas for a specific encounter."""
@@ -20343,7 +20943,7 @@ async def upload_chart(
 
 @app.get("/api/patients/{patient_id}/context/status")
 async def get_patient_context_status(patient_id: str, user=Depends(require_role("user"))):
-    status_payload = context_pipeline.get_status(patient_id)
+    status_payload = await context_pipeline.get_status_async(patient_id)
     if not status_payload:
         raise HTTPException(status_code=404, detail="No chart context available")
     return status_payload
@@ -20355,7 +20955,7 @@ async def get_patient_context_snapshot(
     stage: str = Query("superficial"),
     user=Depends(require_role("user")),
 ):
-    snapshot = context_pipeline.get_snapshot(patient_id, stage)
+    snapshot = await context_pipeline.get_snapshot_async(patient_id, stage)
     if not snapshot:
         raise HTTPException(status_code=404, detail="No chart context available")
     return snapshot
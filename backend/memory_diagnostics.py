@@ -0,0 +1,315 @@
+"""Heap growth diagnostics: tracemalloc snapshots and a cache registry.
+
+:class:`MemoryTracer` wraps :mod:`tracemalloc` for the admin endpoints.
+Tracing is started and stopped on demand because it slows allocation-heavy
+code and adds its own memory overhead.  While it runs, named snapshots can be
+taken and compared.  A diff lists the allocation sites whose traced size
+changed most (grouped by ``file:line``) and the same change totalled per
+subsystem.  A subsystem is the ``backend`` module, the third-party package,
+or ``stdlib``.
+
+The cache registry answers the other half of "what is growing".  Modules that
+keep in-process caches or registries call :func:`register_cache` with the
+container, or a callable returning its size (or a mapping of figures), and
+:func:`cache_sizes` reports them all.  Registration is by name, so
+re-registering replaces the earlier entry.
+"""
+
+from __future__ import annotations
+
+import os
+import sysconfig
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sized, Union
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+CacheSource = Union[Sized, Callable[[], Union[int, Mapping[str, Any]]]]
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+_ROOT_DIR = os.path.dirname(_BACKEND_DIR)
+_STDLIB_DIR = os.path.normcase(os.path.abspath(sysconfig.get_paths()["stdlib"]))
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+# -- cache registry ---------------------------------------------------------
+
+
+@dataclass
+class _RegisteredCache:
+    name: str
+    subsystem: str
+    source: CacheSource
+
+
+_CACHES: Dict[str, _RegisteredCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def register_cache(name: str, source: CacheSource, *, subsystem: Optional[str] = None) -> None:
+    """Expose an in-process cache or registry to :func:`cache_sizes`.
+
+    ``source`` is either the container itself (anything with ``len()``) or a
+    zero-argument callable returning an entry count or a mapping of figures.
+    Pass a callable when the container may be rebound.  ``subsystem``
+    defaults to the part of ``name`` before the first dot.
+    """
+
+    entry = _RegisteredCache(name, subsystem or name.split(".", 1)[0], source)
+    with _CACHES_LOCK:
+        _CACHES[name] = entry
+
+
+def unregister_cache(name: str) -> None:
+    with _CACHES_LOCK:
+        _CACHES.pop(name, None)
+
+
+def _measure(source: CacheSource) -> Dict[str, Any]:
+    value = len(source) if isinstance(source, Sized) else source()
+    if isinstance(value, Mapping):
+        return dict(value)
+    return {"entries": int(value)}
+
+
+def cache_sizes() -> List[Dict[str, Any]]:
+    """Current size of every registered cache, sorted by name."""
+
+    with _CACHES_LOCK:
+        entries = sorted(_CACHES.values(), key=lambda entry: entry.name)
+    report = []
+    for entry in entries:
+        item: Dict[str, Any] = {"name": entry.name, "subsystem": entry.subsystem}
+        try:
+            item["sizes"] = _measure(entry.source)
+        except Exception as exc:  # pragma: no cover - defensive
+            item["error"] = str(exc)
+        report.append(item)
+    return report
+
+
+# -- tracemalloc ------------------------------------------------------------
+
+
+def subsystem_for(filename: str) -> str:
+    """Map a source file to the subsystem its allocations are reported under."""
+
+    path = os.path.normcase(os.path.abspath(filename))
+    parts = path.replace("\\", "/").split("/")
+    for marker in ("site-packages", "dist-packages"):
+        if marker in parts:
+            index = parts.index(marker)
+            if index + 1 < len(parts):
+                package = parts[index + 1]
+                return package[:-3] if package.endswith(".py") else package
+    if path.startswith(os.path.normcase(_BACKEND_DIR) + os.sep):
+        relative = os.path.relpath(path, _BACKEND_DIR).replace(os.sep, "/")
+        first = relative.split("/", 1)[0]
+        return "backend." + (first[:-3] if first.endswith(".py") else first)
+    if path.startswith(_STDLIB_DIR + os.sep) or filename.startswith("<frozen"):
+        return "stdlib"
+    return "other"
+
+
+def _short_path(filename: str) -> str:
+    for marker in ("site-packages" + os.sep, "dist-packages" + os.sep):
+        index = filename.rfind(marker)
+        if index >= 0:
+            return filename[index + len(marker) :]
+    if filename.startswith(_ROOT_DIR + os.sep):
+        return os.path.relpath(filename, _ROOT_DIR)
+    if filename.startswith(_STDLIB_DIR + os.sep):
+        return os.path.relpath(filename, _STDLIB_DIR)
+    return filename
+
+
+@dataclass
+class _NamedSnapshot:
+    name: str
+    taken_at: float
+    snapshot: tracemalloc.Snapshot
+    traced_bytes: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "takenAt": self.taken_at, "tracedBytes": self.traced_bytes}
+
+
+class MemoryTracer:
+    """Start/stop tracemalloc and keep a bounded set of named snapshots."""
+
+    def __init__(
+        self,
+        *,
+        frames: int = 10,
+        max_snapshots: int = 8,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.frames = max(1, int(frames))
+        self.max_snapshots = max(2, int(max_snapshots))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._snapshots: "OrderedDict[str, _NamedSnapshot]" = OrderedDict()
+        self._started_at: Optional[float] = None
+
+    @classmethod
+    def from_env(cls) -> "MemoryTracer":
+        def _number(name: str, default: float) -> float:
+            try:
+                return float(os.getenv(name, str(default)))
+            except ValueError:
+                return default
+
+        return cls(
+            frames=int(_number("TRACEMALLOC_FRAMES", 10)),
+            max_snapshots=int(_number("TRACEMALLOC_MAX_SNAPSHOTS", 8)),
+        )
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: Optional[int] = None) -> Dict[str, Any]:
+        """Start tracing; a no-op apart from reporting when already tracing."""
+
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(max(1, int(frames or self.frames)))
+                self._started_at = self._clock()
+                logger.info("tracemalloc_started", frames=tracemalloc.get_traceback_limit())
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop tracing.  Existing snapshots stay available for diffing."""
+
+        with self._lock:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+                logger.info("tracemalloc_stopped")
+            self._started_at = None
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else None,
+            "startedAt": self._started_at,
+            "tracedBytes": current,
+            "peakBytes": peak,
+            "overheadBytes": tracemalloc.get_tracemalloc_memory() if tracing else 0,
+            "snapshots": self.snapshots(),
+        }
+
+    def snapshots(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [snap.to_dict() for snap in self._snapshots.values()]
+
+    def _take(self) -> tracemalloc.Snapshot:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not tracing; start it first")
+        return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+    def take_snapshot(self, name: str) -> Dict[str, Any]:
+        """Store a snapshot under ``name``, replacing any with that name.
+
+        Raises ``ValueError`` for an empty name and ``RuntimeError`` when
+        tracemalloc is not running.  The oldest snapshot is dropped once
+        ``max_snapshots`` are held.
+        """
+
+        name = (name or "").strip()
+        if not name:
+            raise ValueError("Snapshot name is required")
+        snapshot = self._take()
+        traced = sum(stat.size for stat in snapshot.statistics("filename"))
+        named = _NamedSnapshot(name, self._clock(), snapshot, traced)
+        with self._lock:
+            self._snapshots.pop(name, None)
+            self._snapshots[name] = named
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return named.to_dict()
+
+    def delete_snapshot(self, name: str) -> bool:
+        with self._lock:
+            return self._snapshots.pop(name, None) is not None
+
+    def _get(self, name: str) -> _NamedSnapshot:
+        with self._lock:
+            named = self._snapshots.get(name)
+        if named is None:
+            raise KeyError(name)
+        return named
+
+    def diff(self, base: str, target: Optional[str] = None, *, top: int = 20) -> Dict[str, Any]:
+        """Compare snapshot ``target`` (default: the heap now) against ``base``.
+
+        Raises ``KeyError`` for unknown snapshot names and ``RuntimeError``
+        when ``target`` is omitted and tracemalloc is not running.
+        """
+
+        before = self._get(base)
+        if target is not None:
+            after = self._get(target)
+            after_snapshot, after_name = after.snapshot, after.name
+        else:
+            after_snapshot, after_name = self._take(), None
+
+        by_line = []
+        for stat in after_snapshot.compare_to(before.snapshot, "lineno")[:top]:
+            frame = stat.traceback[0]
+            by_line.append(
+                {
+                    "location": f"{_short_path(frame.filename)}:{frame.lineno}",
+                    "subsystem": subsystem_for(frame.filename),
+                    "sizeDiff": stat.size_diff,
+                    "size": stat.size,
+                    "countDiff": stat.count_diff,
+                    "count": stat.count,
+                }
+            )
+
+        totals: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"sizeDiff": 0, "size": 0, "countDiff": 0, "count": 0}
+        )
+        for stat in after_snapshot.compare_to(before.snapshot, "filename"):
+            entry = totals[subsystem_for(stat.traceback[0].filename)]
+            entry["sizeDiff"] += stat.size_diff
+            entry["size"] += stat.size
+            entry["countDiff"] += stat.count_diff
+            entry["count"] += stat.count
+        by_subsystem = sorted(
+            ({"subsystem": name, **values} for name, values in totals.items()),
+            key=lambda item: abs(item["sizeDiff"]),
+            reverse=True,
+        )[:top]
+
+        return {
+            "base": before.name,
+            "target": after_name,
+            "totalSizeDiff": sum(values["sizeDiff"] for values in totals.values()),
+            "byLine": by_line,
+            "bySubsystem": by_subsystem,
+        }
+
+
+__all__ = [
+    "CacheSource",
+    "MemoryTracer",
+    "cache_sizes",
+    "register_cache",
+    "subsystem_for",
+    "unregister_cache",
+]
@@ -1012,6 +1012,17 @@ def capture_prompt_estimate(messages: Iterable[Mapping[str, Any]], *, model: Opt
     _RECORDER.capture_prompt_estimate(messages, model=model)
 
 
+def capture_cache_state(state: str, *, metadata: Optional[Mapping[str, Any]] = None) -> None:
+    """Record a response-cache outcome on the active route observation."""
+
+    observation = _CURRENT_OBSERVATION.get()
+    if observation is None:
+        return
+    observation.set_cache_state(state)
+    for key, value in (metadata or {}).items():
+        observation.add_metadata(key, value)
+
+
 def record_gate_decision(
     *,
     route: str,
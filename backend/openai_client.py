@@ -13,9 +13,8 @@ Any exception during OpenAI or local model invocation is converted into a
 RuntimeError so callers have a consistent error path.
 """
 
-from collections import OrderedDict
 from threading import Lock
-from typing import Dict, List, Sequence
+from typing import Dict, List, Optional, Sequence, Tuple
 import os
 import hashlib
 
@@ -23,12 +22,17 @@ import hashlib
 # dependency in offline/local deterministic modes.
 
 from backend.embedding import HashingVectorizerEmbedding
-from backend.observability import capture_openai_usage, capture_prompt_estimate
+from backend.embedding_cache import EmbeddingCache
+from backend.llm_cache import LLM_CACHE
+from backend.observability import capture_cache_state, capture_openai_usage, capture_prompt_estimate
 from backend.key_manager import get_api_key
 
 # Cached llama.cpp model instance
 _LLAMA = None
+# llama.cpp contexts are not thread-safe; completions may run in worker threads.
+_LLAMA_LOCK = Lock()
 _EMBED_CLIENTS: Dict[str, "EmbeddingClient"] = {}
+_EMBED_CACHE: Optional[EmbeddingCache] = None
 
 
 def _use_offline() -> bool:
@@ -99,6 +103,10 @@ def _build_prompt(messages: List[Dict[str, str]]) -> str:
 def call_openai(messages: List[Dict[str, str]], model: str = "gpt-4o", temperature: float = 0) -> str:
     """Chat completion with offline/local fallbacks.
 
+    Local and remote completions are served from :data:`LLM_CACHE` when an
+    identical request was answered recently; the outcome is reported on the
+    active route observation.
+
     Args:
         messages: OpenAI-style message dicts.
         model: Remote model name (ignored for offline/local modes).
@@ -113,23 +121,56 @@ def call_openai(messages: List[Dict[str, str]], model: str = "gpt-4o", temperatu
         capture_prompt_estimate(messages, model="offline")
         return _deterministic_placeholder(messages)
 
+    if not LLM_CACHE.enabled:
+        return _complete(messages, model, temperature)[0]
+    cache_model = f"local:{model}" if _use_local() else model
+    keys = LLM_CACHE.keys(cache_model, temperature, messages)
+    cached = LLM_CACHE.get(keys)
+    if cached is not None:
+        capture_cache_state(
+            "hit",
+            metadata={
+                "llmCacheSavedTokens": int(cached.get("promptTokens", 0))
+                + int(cached.get("completionTokens", 0)),
+            },
+        )
+        return cached["content"]
+    content, prompt_tokens, completion_tokens = _complete(messages, model, temperature)
+    LLM_CACHE.put(
+        keys,
+        {
+            "content": content,
+            "promptTokens": prompt_tokens,
+            "completionTokens": completion_tokens,
+        },
+    )
+    capture_cache_state("miss")
+    return content
+
+
+def _complete(
+    messages: List[Dict[str, str]], model: str, temperature: float
+) -> Tuple[str, int, int]:
+    """Run a local or remote completion; return content and token usage."""
+
     # 2. Local model mode
     if _use_local():
         try:
-            llama = _get_llama()
             prompt = _build_prompt(messages)
-            # Deterministic generation (seed fixed in loader)
-            out = llama(
-                prompt,
-                max_tokens=int(os.getenv("LOCAL_MAX_TOKENS", "256")),
-                temperature=temperature,
-                top_p=1.0,
-            )
+            with _LLAMA_LOCK:
+                llama = _get_llama()
+                # Deterministic generation (seed fixed in loader)
+                out = llama(
+                    prompt,
+                    max_tokens=int(os.getenv("LOCAL_MAX_TOKENS", "256")),
+                    temperature=temperature,
+                    top_p=1.0,
+                )
             text = out["choices"][0]["text"].strip()
             if not text:
                 raise RuntimeError("Empty local model response")
             capture_prompt_estimate(messages, model=f"local:{model}")
-            return text
+            return text, 0, 0
         except Exception as exc:
             # Surface as runtime error so caller fallback logic triggers.
             raise RuntimeError(f"Local model inference failed: {exc}") from exc
@@ -167,7 +208,7 @@ def call_openai(messages: List[Dict[str, str]], model: str = "gpt-4o", temperatu
                 except (TypeError, ValueError):
                     completion_tokens = 0
         capture_openai_usage(prompt_tokens, completion_tokens, model=model)
-        return response.choices[0].message["content"]
+        return response.choices[0].message["content"], prompt_tokens, completion_tokens
     except Exception as exc:  # pragma: no cover - network errors / SDK issues
         raise RuntimeError(f"Error calling OpenAI: {exc}") from exc
 
@@ -175,13 +216,19 @@ def call_openai(messages: List[Dict[str, str]], model: str = "gpt-4o", temperatu
 class EmbeddingClient:
     """Thin wrapper around the OpenAI embedding API with local fallbacks."""
 
-    def __init__(self, model: str = "text-embedding-3-small", *, cache_size: int = 256) -> None:
-        if cache_size <= 0:
+    def __init__(
+        self,
+        model: str = "text-embedding-3-small",
+        *,
+        cache_size: Optional[int] = None,
+        cache: Optional[EmbeddingCache] = None,
+    ) -> None:
+        if cache_size is not None and cache_size <= 0:
             raise ValueError("cache_size must be positive")
         self._model = model
-        self._cache_size = cache_size
-        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
-        self._lock = Lock()
+        if cache is None:
+            cache = EmbeddingCache.from_env(max_entries=cache_size)
+        self._cache = cache
         self._offline_embedder = None
         if _use_offline() or _use_local():
             self._offline_embedder = HashingVectorizerEmbedding(dimensions=1536)
@@ -190,6 +237,13 @@ class EmbeddingClient:
     def model(self) -> str:
         return self._model
 
+    @property
+    def _cache_model(self) -> str:
+        # Offline hashing vectors must never be served in place of real ones.
+        if self._offline_embedder is not None:
+            return f"offline:{self._model}"
+        return self._model
+
     def embed(self, text: str) -> List[float]:
         return self.embed_many([text])[0]
 
@@ -197,48 +251,18 @@ class EmbeddingClient:
         if not texts:
             return []
 
-        cached: List[List[float] | None] = [None] * len(texts)
-        missing: List[str] = []
-        missing_indices: List[int] = []
-
-        for idx, text in enumerate(texts):
-            cached_vec = self._cache_get(text)
-            if cached_vec is not None:
-                cached[idx] = list(cached_vec)
-            else:
-                missing.append(text)
-                missing_indices.append(idx)
+        cached = self._cache.get_many(self._cache_model, texts)
+        missing = list(dict.fromkeys(text for text, vec in zip(texts, cached) if vec is None))
 
         if missing:
             fetched = self._fetch_embeddings(missing)
             if len(fetched) != len(missing):
                 raise RuntimeError("Embedding response size mismatch")
-            for text, vector in zip(missing, fetched):
-                normalized = self._normalize_vector(vector)
-                self._cache_set(text, normalized)
-            for idx, text in zip(missing_indices, missing):
-                cached[idx] = list(self._cache[text])
-
-        return [vec if vec is not None else [] for vec in cached]
-
-    def _cache_key(self, text: str) -> str:
-        return text
-
-    def _cache_get(self, text: str) -> List[float] | None:
-        key = self._cache_key(text)
-        with self._lock:
-            vector = self._cache.get(key)
-            if vector is not None:
-                self._cache.move_to_end(key)
-            return vector
-
-    def _cache_set(self, text: str, vector: List[float]) -> None:
-        key = self._cache_key(text)
-        with self._lock:
-            self._cache[key] = vector
-            self._cache.move_to_end(key)
-            while len(self._cache) > self._cache_size:
-                self._cache.popitem(last=False)
+            vectors = {text: self._normalize_vector(vector) for text, vector in zip(missing, fetched)}
+            self._cache.put_many(self._cache_model, list(vectors.items()))
+            cached = [vec if vec is not None else vectors[text] for text, vec in zip(texts, cached)]
+
+        return [list(vec) if vec is not None else [] for vec in cached]
 
     def _normalize_vector(self, vector: Sequence[float]) -> List[float]:
         if not isinstance(vector, (list, tuple)):
@@ -249,7 +273,7 @@ class EmbeddingClient:
 
     def _fetch_embeddings(self, texts: Sequence[str]) -> List[List[float]]:
         if self._offline_embedder is not None:
-            return [self._offline_embedder.embed(text) for text in texts]
+            return self._offline_embedder.embed_many(texts).tolist()
 
         api_key = get_api_key()
         if not api_key:
@@ -271,6 +295,9 @@ class EmbeddingClient:
 def get_embedding_client(model: str = "text-embedding-3-small") -> EmbeddingClient:
     """Return (and cache) an :class:`EmbeddingClient` for *model*."""
 
+    global _EMBED_CACHE
     if model not in _EMBED_CLIENTS:
-        _EMBED_CLIENTS[model] = EmbeddingClient(model=model)
+        if _EMBED_CACHE is None:
+            _EMBED_CACHE = EmbeddingCache.from_env()
+        _EMBED_CLIENTS[model] = EmbeddingClient(model=model, cache=_EMBED_CACHE)
     return _EMBED_CLIENTS[model]
@@ -0,0 +1,355 @@
+"""On-demand statistical stack sampler.
+
+:class:`SamplingProfiler` runs a daemon thread that reads every thread's
+Python stack through ``sys._current_frames()`` at a fixed interval.  It
+aggregates the stacks into flamegraph-compatible collapsed lines
+(``thread;outer;...;leaf count``).  A profile session captures one of:
+
+* everything for a fixed number of seconds;
+* the next ``requests`` requests whose path matches ``route``, optionally
+  restricted to one HTTP method; or
+* requests carrying a given ``X-Trace-Id``.
+
+Request-scoped sessions sample the whole process while a matching request is
+in flight.  Concurrent requests on the same event loop therefore contribute
+samples too; profile under representative rather than peak load when the
+distinction matters.
+
+The sampler thread only exists while a session is live.  With no sessions,
+the per-request hook is a single attribute check, so the profiler can stay
+wired into the middleware in production.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+# Leaf frames of threads that are parked rather than running Python code.
+_IDLE_FRAMES = {("threading.py", "wait"), ("selectors.py", "select")}
+_TRUNCATED = "[truncated]"
+
+
+def _frame_label(code) -> str:
+    directory, filename = os.path.split(code.co_filename)
+    module = f"{os.path.basename(directory)}/{filename}" if directory else filename
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({module}:{code.co_firstlineno})"
+
+
+class ProfileSession:
+    """One profiling request and the stacks collected for it."""
+
+    def __init__(
+        self,
+        *,
+        seconds: float,
+        route: Optional[str] = None,
+        method: Optional[str] = None,
+        trace_id: Optional[str] = None,
+        requests: Optional[int] = None,
+        max_stacks: int = 20_000,
+        started_at: float,
+    ) -> None:
+        self.id = uuid.uuid4().hex
+        self.route = route
+        self.method = method.upper() if method else None
+        self.trace_id = trace_id
+        self.requests = requests
+        self.remaining = requests
+        self.max_stacks = max_stacks
+        self.started_at = started_at
+        self.deadline = started_at + seconds
+        self.finished_at: Optional[float] = None
+        self.matched = 0
+        self.inflight = 0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+
+    @property
+    def request_scoped(self) -> bool:
+        return self.route is not None or self.trace_id is not None
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    @property
+    def capturing(self) -> bool:
+        return not self.done and (not self.request_scoped or self.inflight > 0)
+
+    def matches(self, method: str, path: str, template: str, trace_id: Optional[str]) -> bool:
+        if self.done or (self.remaining is not None and self.remaining <= 0):
+            return False
+        if self.trace_id is not None and trace_id != self.trace_id:
+            return False
+        if self.method is not None and method.upper() != self.method:
+            return False
+        if self.route is not None and self.route not in (path, template):
+            return False
+        return True
+
+    def add(self, stack: str) -> None:
+        self.samples += 1
+        if stack not in self.stacks and len(self.stacks) >= self.max_stacks:
+            stack = _TRUNCATED
+        self.stacks[stack] += 1
+
+    def collapsed(self) -> str:
+        """Return stacks in Brendan Gregg's folded format."""
+
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def to_dict(self, *, top: int = 20) -> Dict[str, Any]:
+        if self.done:
+            status = "completed"
+        elif self.capturing:
+            status = "running"
+        else:
+            status = "armed"
+        return {
+            "id": self.id,
+            "status": status,
+            "route": self.route,
+            "method": self.method,
+            "traceId": self.trace_id,
+            "requests": self.requests,
+            "matchedRequests": self.matched,
+            "samples": self.samples,
+            "distinctStacks": len(self.stacks),
+            "startedAt": self.started_at,
+            "deadline": self.deadline,
+            "finishedAt": self.finished_at,
+            "topStacks": [
+                {"stack": stack, "samples": count} for stack, count in self.stacks.most_common(top)
+            ],
+        }
+
+
+class SamplingProfiler:
+    """Registry of profile sessions sharing one sampler thread."""
+
+    def __init__(
+        self,
+        *,
+        interval: float = 0.005,
+        max_seconds: float = 300.0,
+        max_sessions: int = 4,
+        keep_finished: int = 20,
+        max_depth: int = 128,
+        include_idle: bool = False,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.interval = max(0.001, float(interval))
+        self.max_seconds = max_seconds
+        self.max_sessions = max(1, int(max_sessions))
+        self.keep_finished = max(0, int(keep_finished))
+        self.max_depth = max_depth
+        self.include_idle = include_idle
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, ProfileSession]" = OrderedDict()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_names: Dict[int, str] = {}
+        # Read without the lock on every request; only ever flipped under it.
+        self.active = False
+
+    @classmethod
+    def from_env(cls) -> "SamplingProfiler":
+        def _number(name: str, default: float) -> float:
+            try:
+                return float(os.getenv(name, str(default)))
+            except ValueError:
+                return default
+
+        return cls(
+            interval=_number("PROFILER_INTERVAL_MS", 5) / 1000.0,
+            max_seconds=_number("PROFILER_MAX_SECONDS", 300.0),
+            max_sessions=int(_number("PROFILER_MAX_SESSIONS", 4)),
+        )
+
+    # -- sessions ----------------------------------------------------------
+
+    def start(
+        self,
+        *,
+        seconds: Optional[float] = None,
+        route: Optional[str] = None,
+        method: Optional[str] = None,
+        trace_id: Optional[str] = None,
+        requests: Optional[int] = None,
+    ) -> ProfileSession:
+        """Open a session; see the module docstring for the modes.
+
+        Request-scoped sessions capture one request unless ``requests`` says
+        otherwise and expire after ``seconds`` (default: the maximum).
+        Raises ``ValueError`` for invalid arguments and ``RuntimeError`` when
+        too many sessions are live.
+        """
+
+        request_scoped = route is not None or trace_id is not None
+        if not request_scoped and not seconds:
+            raise ValueError("Provide seconds, a route or a trace id")
+        if seconds is not None and seconds <= 0:
+            raise ValueError("seconds must be positive")
+        if requests is not None and (requests <= 0 or not request_scoped):
+            raise ValueError("requests must be positive and needs a route or trace id")
+        seconds = min(seconds or self.max_seconds, self.max_seconds)
+        if request_scoped and requests is None:
+            requests = 1
+
+        with self._lock:
+            live = sum(1 for session in self._sessions.values() if not session.done)
+            if live >= self.max_sessions:
+                raise RuntimeError("Too many profiling sessions are running")
+            session = ProfileSession(
+                seconds=seconds,
+                route=route,
+                method=method,
+                trace_id=trace_id,
+                requests=requests,
+                started_at=self._clock(),
+            )
+            self._sessions[session.id] = session
+            self._prune_locked()
+            self.active = True
+            self._ensure_thread_locked()
+        logger.info(
+            "profiler_session_started",
+            session_id=session.id,
+            seconds=seconds,
+            route=route,
+            trace_id=trace_id,
+            requests=requests,
+        )
+        return session
+
+    def get(self, session_id: str) -> Optional[ProfileSession]:
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def sessions(self) -> List[ProfileSession]:
+        with self._lock:
+            return list(self._sessions.values())
+
+    def stop(self, session_id: str) -> Optional[ProfileSession]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and not session.done:
+                self._finish_locked(session)
+            return session
+
+    # -- request hooks -----------------------------------------------------
+
+    def begin_request(
+        self, method: str, path: str, template: str, trace_id: Optional[str]
+    ) -> Optional[List[ProfileSession]]:
+        """Mark a request in flight for every matching session."""
+
+        if not self.active:
+            return None
+        with self._lock:
+            matched = [
+                session
+                for session in self._sessions.values()
+                if session.matches(method, path, template, trace_id)
+            ]
+            for session in matched:
+                if session.remaining is not None:
+                    session.remaining -= 1
+                session.matched += 1
+                session.inflight += 1
+            if matched:
+                self._ensure_thread_locked()
+        return matched or None
+
+    def end_request(self, matched: Optional[List[ProfileSession]]) -> None:
+        if not matched:
+            return
+        with self._lock:
+            for session in matched:
+                session.inflight -= 1
+                if session.inflight <= 0 and session.remaining == 0 and not session.done:
+                    self._finish_locked(session)
+
+    # -- sampling ----------------------------------------------------------
+
+    def _finish_locked(self, session: ProfileSession) -> None:
+        session.finished_at = self._clock()
+        self.active = any(not other.done for other in self._sessions.values())
+        logger.info(
+            "profiler_session_finished",
+            session_id=session.id,
+            samples=session.samples,
+            matched_requests=session.matched,
+        )
+
+    def _prune_locked(self) -> None:
+        finished = [sid for sid, session in self._sessions.items() if session.done]
+        for sid in finished[: max(0, len(finished) - self.keep_finished)]:
+            del self._sessions[sid]
+
+    def _ensure_thread_locked(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="revenuepilot-profiler", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                now = self._clock()
+                for session in self._sessions.values():
+                    if not session.done and now >= session.deadline:
+                        self._finish_locked(session)
+                if not self.active:
+                    self._thread = None
+                    return
+                capturing = [s for s in self._sessions.values() if s.capturing]
+            if capturing:
+                stacks = self._sample(own)
+                with self._lock:
+                    for session in capturing:
+                        for stack in stacks:
+                            session.add(stack)
+
+    def _thread_name(self, ident: int) -> str:
+        name = self._thread_names.get(ident)
+        if name is None:
+            self._thread_names = {t.ident: t.name for t in threading.enumerate() if t.ident}
+            name = self._thread_names.get(ident, f"thread-{ident}")
+        return name
+
+    def _sample(self, own: int) -> List[str]:
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            code = frame.f_code
+            if not self.include_idle and (
+                os.path.basename(code.co_filename),
+                code.co_name,
+            ) in _IDLE_FRAMES:
+                continue
+            labels = []
+            while frame is not None and len(labels) < self.max_depth:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            labels.append(self._thread_name(ident).replace(";", ":"))
+            stacks.append(";".join(reversed(labels)))
+        return stacks
+
+
+__all__ = ["ProfileSession", "SamplingProfiler"]
@@ -20,6 +20,7 @@ import time
 from typing import Dict, List, Optional, Tuple
 
 from backend.egress import secure_get
+from backend.memory_diagnostics import register_cache
 
 # ---------------------------------------------------------------------------
 # Configuration
@@ -44,6 +45,7 @@ CACHE_TTL = int(os.getenv("GUIDELINE_CACHE_TTL", 24 * 60 * 60))
 # ---------------------------------------------------------------------------
 
 _cache: Dict[Tuple[int, str, str, Tuple[str, ...]], Tuple[float, List[Dict]]] = {}
+register_cache("public_health.recommendations", _cache)
 
 
 def _now() -> float:
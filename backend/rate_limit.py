@@ -0,0 +1,330 @@
+"""Token-bucket rate limiting with pluggable shared state.
+
+:class:`RateLimiter` allows ``limit`` requests per ``window_seconds`` for each
+key.  Each key is a token bucket that holds at most ``limit`` tokens and
+refills at ``limit / window_seconds`` tokens per second.  A bucket is just
+``(tokens, updated_at)``, so checking a key is O(1) no matter how many
+requests it has made.
+
+Buckets live in a backend:
+
+* :class:`MemoryBackend` keeps them in process.  Keys are spread over sharded
+  locks, and buckets that have refilled completely are evicted because they
+  are indistinguishable from a missing key.  A per-shard key cap bounds
+  memory when keys rotate quickly, such as one key per client IP.
+* :class:`SQLiteBackend` keeps them in a SQLite table.  Every worker that
+  points at the same file shares the limits, so adding workers does not
+  multiply the allowed attempts.
+
+:func:`backend_from_env` picks the backend from ``RATE_LIMIT_BACKEND``
+(``memory`` or ``sqlite``) and ``RATE_LIMIT_DB_PATH``.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, List, Optional, Protocol, Tuple
+
+import structlog
+from prometheus_client import REGISTRY, Counter
+
+logger = structlog.get_logger(__name__)
+
+
+def _get_or_create_metric(metric_cls, name: str, documentation: str, labelnames, **kwargs):
+    existing = REGISTRY._names_to_collectors.get(name)
+    if existing is not None:
+        return existing
+    return metric_cls(name, documentation, labelnames=labelnames, **kwargs)
+
+
+RATE_LIMIT_DECISIONS = _get_or_create_metric(
+    Counter,
+    "revenuepilot_rate_limit_decisions_total",
+    "Rate limiter decisions by limiter and outcome",
+    ("limiter", "outcome"),
+)
+
+
+def _refill(tokens: float, updated: float, now: float, capacity: float, rate: float) -> float:
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+
+def _take(
+    tokens: float, updated: float, now: float, capacity: float, rate: float, cost: float
+) -> Tuple[bool, float, float]:
+    """Return ``(allowed, tokens_after, retry_after)`` for one request."""
+
+    tokens = _refill(tokens, updated, now, capacity, rate)
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / rate
+
+
+class RateLimitBackend(Protocol):
+    def acquire(
+        self, key: str, capacity: float, rate: float, cost: float = 1.0
+    ) -> Tuple[bool, float]:
+        """Take *cost* tokens from *key*; return ``(allowed, retry_after)``."""
+
+    def retry_after(self, key: str, capacity: float, rate: float, cost: float = 1.0) -> float:
+        """Seconds until *key* has *cost* tokens, without consuming any."""
+
+    def reset(self, key: str) -> None:
+        """Forget *key*, restoring a full bucket."""
+
+
+class MemoryBackend:
+    """In-process buckets behind sharded locks with idle-key eviction."""
+
+    def __init__(
+        self,
+        *,
+        shards: int = 16,
+        max_keys: int = 100_000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._shards = max(1, int(shards))
+        self._max_keys_per_shard = max(1, int(max_keys) // self._shards)
+        self._clock = clock
+        self._locks = [threading.Lock() for _ in range(self._shards)]
+        # key -> (tokens, updated_at, idle_after); ordered by last update.
+        self._buckets: List["OrderedDict[str, Tuple[float, float, float]]"] = [
+            OrderedDict() for _ in range(self._shards)
+        ]
+
+    def _shard(self, key: str) -> int:
+        return zlib.crc32(key.encode("utf-8")) % self._shards
+
+    def __len__(self) -> int:
+        return sum(len(buckets) for buckets in self._buckets)
+
+    def _evict(self, buckets: "OrderedDict[str, Tuple[float, float, float]]", now: float) -> None:
+        # Oldest entries come first; stop at the first one still refilling.
+        while buckets:
+            key, (_, _, idle_after) = next(iter(buckets.items()))
+            if idle_after > now and len(buckets) <= self._max_keys_per_shard:
+                break
+            del buckets[key]
+
+    def acquire(
+        self, key: str, capacity: float, rate: float, cost: float = 1.0
+    ) -> Tuple[bool, float]:
+        index = self._shard(key)
+        now = self._clock()
+        with self._locks[index]:
+            buckets = self._buckets[index]
+            tokens, updated, _ = buckets.pop(key, (capacity, now, now))
+            allowed, tokens, retry = _take(tokens, updated, now, capacity, rate, cost)
+            buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            self._evict(buckets, now)
+        return allowed, retry
+
+    def retry_after(self, key: str, capacity: float, rate: float, cost: float = 1.0) -> float:
+        index = self._shard(key)
+        now = self._clock()
+        with self._locks[index]:
+            state = self._buckets[index].get(key)
+        if state is None:
+            return 0.0
+        tokens = _refill(state[0], state[1], now, capacity, rate)
+        return 0.0 if tokens >= cost else (cost - tokens) / rate
+
+    def reset(self, key: str) -> None:
+        index = self._shard(key)
+        with self._locks[index]:
+            self._buckets[index].pop(key, None)
+
+
+class SQLiteBackend:
+    """Buckets stored in a SQLite table shared by every worker process."""
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+        "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, "
+        "idle_after REAL NOT NULL)"
+    )
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        busy_timeout_ms: int = 5000,
+        prune_every: int = 1000,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        from backend.db_pool import configure_connection
+
+        self.path = str(path)
+        self._clock = clock
+        self._prune_every = max(1, int(prune_every))
+        self._ops = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            isolation_level=None,
+            timeout=busy_timeout_ms / 1000,
+        )
+        configure_connection(self._conn, busy_timeout_ms=busy_timeout_ms)
+        self._conn.execute(self._SCHEMA)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_rate_limit_buckets_idle "
+            "ON rate_limit_buckets (idle_after)"
+        )
+
+    def acquire(
+        self, key: str, capacity: float, rate: float, cost: float = 1.0
+    ) -> Tuple[bool, float]:
+        now = self._clock()
+        with self._lock:
+            conn = self._conn
+            # IMMEDIATE takes the write lock up front so concurrent workers
+            # cannot both read the same token count and overspend it.
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                tokens, updated = (row[0], row[1]) if row else (capacity, now)
+                allowed, tokens, retry = _take(tokens, updated, now, capacity, rate, cost)
+                conn.execute(
+                    "INSERT INTO rate_limit_buckets (key, tokens, updated_at, idle_after) "
+                    "VALUES (?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+                    "tokens = excluded.tokens, updated_at = excluded.updated_at, "
+                    "idle_after = excluded.idle_after",
+                    (key, tokens, now, now + (capacity - tokens) / rate),
+                )
+                self._ops += 1
+                if self._ops % self._prune_every == 0:
+                    conn.execute("DELETE FROM rate_limit_buckets WHERE idle_after <= ?", (now,))
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        return allowed, retry
+
+    def retry_after(self, key: str, capacity: float, rate: float, cost: float = 1.0) -> float:
+        now = self._clock()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return 0.0
+        tokens = _refill(row[0], row[1], now, capacity, rate)
+        return 0.0 if tokens >= cost else (cost - tokens) / rate
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM rate_limit_buckets WHERE key = ?", (key,))
+
+    def prune(self) -> int:
+        """Delete buckets that have refilled completely; return the count."""
+
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM rate_limit_buckets WHERE idle_after <= ?", (self._clock(),)
+            )
+            return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def backend_from_env() -> RateLimitBackend:
+    """Build the backend selected by ``RATE_LIMIT_BACKEND``."""
+
+    kind = os.getenv("RATE_LIMIT_BACKEND", "memory").strip().lower()
+    if kind == "sqlite":
+        path = os.getenv("RATE_LIMIT_DB_PATH")
+        if path:
+            try:
+                return SQLiteBackend(path)
+            except sqlite3.Error as exc:
+                logger.warning("rate_limit_sqlite_unavailable", path=path, error=str(exc))
+        else:
+            logger.warning("rate_limit_sqlite_path_missing")
+    elif kind != "memory":
+        logger.warning("rate_limit_backend_unknown", backend=kind)
+    try:
+        max_keys = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+    except ValueError:
+        max_keys = 100_000
+    return MemoryBackend(max_keys=max_keys)
+
+
+class RateLimiter:
+    """Allow ``limit`` requests per ``window_seconds`` for each key.
+
+    Limiters sharing a backend are separated by ``name``.  A ``limit`` of zero
+    or less disables the limiter.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        window_seconds: float,
+        *,
+        name: str = "default",
+        backend: Optional[RateLimitBackend] = None,
+    ) -> None:
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.name = name
+        self.backend: RateLimitBackend = backend if backend is not None else MemoryBackend()
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit > 0 and self.window_seconds > 0
+
+    @property
+    def _rate(self) -> float:
+        return self.limit / self.window_seconds
+
+    def _key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    def check(self, key: str, cost: float = 1.0) -> Tuple[bool, float]:
+        """Consume *cost* tokens; return ``(allowed, retry_after_seconds)``."""
+
+        if not self.enabled:
+            return True, 0.0
+        allowed, retry = self.backend.acquire(self._key(key), float(self.limit), self._rate, cost)
+        RATE_LIMIT_DECISIONS.labels(self.name, "allowed" if allowed else "limited").inc()
+        return allowed, retry
+
+    def allow(self, key: str) -> bool:
+        return self.check(key)[0]
+
+    def retry_after(self, key: str) -> float:
+        if not self.enabled:
+            return 0.0
+        return self.backend.retry_after(self._key(key), float(self.limit), self._rate)
+
+    def reset(self, key: str) -> None:
+        self.backend.reset(self._key(key))
+
+
+def retry_after_header(seconds: float) -> Optional[dict]:
+    """Return a ``Retry-After`` header dict for *seconds*, or ``None``."""
+
+    return {"Retry-After": str(int(math.ceil(seconds)))} if seconds > 0 else None
+
+
+__all__ = [
+    "MemoryBackend",
+    "RateLimitBackend",
+    "RateLimiter",
+    "SQLiteBackend",
+    "backend_from_env",
+    "retry_after_header",
+]
@@ -2,15 +2,18 @@
 
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import os
 from dataclasses import dataclass
-from typing import Any, Iterable, List, Mapping, Optional
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
 
 import structlog
 from prometheus_client import Counter
 
 from backend import deid as deid_module
+from backend.deid_cache import DEID_CACHE
+from backend.deid_service import DEID_SERVICE
 
 
 logger = structlog.get_logger(__name__)
@@ -47,6 +50,19 @@ class DeidentificationPolicy:
     def set_engine(self, value: str) -> None:
         self._engine = self._normalise(value)
 
+    def _resolve(
+        self,
+        engine: str | None,
+        availability_overrides: dict[str, bool] | None,
+    ) -> Tuple[str, dict[str, bool], str]:
+        resolved = self._normalise(engine) if engine is not None else self._engine
+        overrides = self._availability()
+        if availability_overrides:
+            overrides.update(availability_overrides)
+        # Key the cache on the engine that will actually run.
+        effective = resolved if resolved == "regex" or overrides.get(resolved) else "regex"
+        return resolved, overrides, effective
+
     def apply(
         self,
         text: str,
@@ -55,11 +71,45 @@ class DeidentificationPolicy:
         hash_tokens: bool = True,
         availability_overrides: dict[str, bool] | None = None,
     ) -> str:
-        resolved = self._normalise(engine) if engine is not None else self._engine
-        overrides = self._availability()
-        if availability_overrides:
-            overrides.update(availability_overrides)
-        return deid_module.deidentify(
+        resolved, overrides, effective = self._resolve(engine, availability_overrides)
+        return DEID_CACHE.scrub(
+            text,
+            engine=effective,
+            hash_tokens=hash_tokens,
+            scrubber=lambda chunk: deid_module.deidentify(
+                chunk,
+                engine=resolved,
+                hash_tokens=hash_tokens,
+                availability_overrides=overrides,
+            ),
+        )
+
+    async def apply_async(
+        self,
+        text: str,
+        *,
+        engine: str | None = None,
+        hash_tokens: bool = True,
+        availability_overrides: dict[str, bool] | None = None,
+    ) -> str:
+        """Like :meth:`apply` but never runs an NER engine on the event loop.
+
+        Presidio is routed through the batching worker pool; other non-regex
+        engines run in a thread.
+        """
+
+        resolved, overrides, effective = self._resolve(engine, availability_overrides)
+        if effective == "regex":
+            return self.apply(text, engine=resolved, hash_tokens=hash_tokens, availability_overrides=overrides)
+        if effective == "presidio" and DEID_SERVICE.enabled and deid_module._PRESIDIO_AVAILABLE:
+            return await DEID_CACHE.scrub_async(
+                text,
+                engine=effective,
+                hash_tokens=hash_tokens,
+                scrubber=lambda chunk: DEID_SERVICE.deidentify(chunk, hash_tokens=hash_tokens),
+            )
+        return await asyncio.to_thread(
+            self.apply,
             text,
             engine=resolved,
             hash_tokens=hash_tokens,
@@ -144,63 +194,64 @@ class PromptPrivacyGuard:
     def profile(self, name: str) -> PromptProfile:
         return self._profiles.get(name, PromptProfile())
 
-    def prepare(self, name: str, request: Any) -> PromptContext:
-        profile = self.profile(name)
-        mode = self.mode
+    def _inputs(self, name: str, request: Any) -> Tuple[List[str], Optional[List[str]], Dict[str, Any]]:
+        """Return the prompt pieces and rules to scrub plus the demographics to pass on."""
+
         if not self.enabled:
             PROMPT_REDACTIONS_SKIPPED.labels(profile=name).inc()
-            return self._legacy_prepare(request)
+            parts = [
+                str(value)
+                for value in (
+                    getattr(request, "text", None),
+                    getattr(request, "chart", None),
+                    getattr(request, "audio", None),
+                )
+                if value
+            ]
+            rules = [r for r in getattr(request, "rules", []) if isinstance(r, str) and r]
+            demographics = {
+                "age": getattr(request, "age", None),
+                "sex": getattr(request, "sex", None),
+                "region": getattr(request, "region", None),
+            }
+            return ["\n\n".join(parts)], rules, demographics
 
-        PROMPT_REDACTIONS_TOTAL.labels(profile=name, mode=mode).inc()
-        parts: List[str] = []
+        profile = self.profile(name)
+        PROMPT_REDACTIONS_TOTAL.labels(profile=name, mode=self.mode).inc()
+        parts = []
         if getattr(request, "text", None):
             parts.append(str(request.text))
         if profile.include_chart and getattr(request, "chart", None):
             parts.append(str(request.chart))
         if profile.include_audio and getattr(request, "audio", None):
             parts.append(str(request.audio))
-        sanitized = [DEID_POLICY.apply(p) for p in parts if p]
-        combined = "\n\n".join(sanitized)
 
         rules: Optional[List[str]] = None
         if profile.include_rules and getattr(request, "rules", None):
-            rules = [
-                DEID_POLICY.apply(r)
-                for r in request.rules
-                if isinstance(r, str) and r
-            ]
-            if not rules:
-                rules = None
+            rules = [r for r in request.rules if isinstance(r, str) and r]
 
-        age = request.age if profile.allow_demographics else None
-        sex = request.sex if profile.allow_demographics else None
-        region = request.region if profile.allow_demographics else None
-        return PromptContext(text=combined, rules=rules, age=age, sex=sex, region=region)
+        demographics = {
+            "age": request.age if profile.allow_demographics else None,
+            "sex": request.sex if profile.allow_demographics else None,
+            "region": request.region if profile.allow_demographics else None,
+        }
+        return [p for p in parts if p], rules, demographics
 
-    def _legacy_prepare(self, request: Any) -> PromptContext:
-        parts: List[str] = []
-        if getattr(request, "text", None):
-            parts.append(str(request.text))
-        if getattr(request, "chart", None):
-            parts.append(str(request.chart))
-        if getattr(request, "audio", None):
-            parts.append(str(request.audio))
-        combined = "\n\n".join(parts)
-        cleaned = DEID_POLICY.apply(combined)
-        rules = [
-            DEID_POLICY.apply(r)
-            for r in getattr(request, "rules", [])
-            if isinstance(r, str) and r
-        ]
-        if not rules:
-            rules = None
-        return PromptContext(
-            text=cleaned,
-            rules=rules,
-            age=getattr(request, "age", None),
-            sex=getattr(request, "sex", None),
-            region=getattr(request, "region", None),
-        )
+    def prepare(self, name: str, request: Any) -> PromptContext:
+        parts, rules, demographics = self._inputs(name, request)
+        combined = "\n\n".join(DEID_POLICY.apply(p) for p in parts)
+        cleaned_rules = [DEID_POLICY.apply(r) for r in rules or []]
+        return PromptContext(text=combined, rules=cleaned_rules or None, **demographics)
+
+    async def prepare_async(self, name: str, request: Any) -> PromptContext:
+        """Async :meth:`prepare`; all pieces are scrubbed concurrently."""
+
+        parts, rules, demographics = self._inputs(name, request)
+        rules = rules or []
+        cleaned = await asyncio.gather(*(DEID_POLICY.apply_async(p) for p in [*parts, *rules]))
+        combined = "\n\n".join(cleaned[: len(parts)])
+        cleaned_rules = list(cleaned[len(parts):])
+        return PromptContext(text=combined, rules=cleaned_rules or None, **demographics)
 
 
 __all__ = [
@@ -0,0 +1,278 @@
+"""Cache of verified JWT claims with session revocation.
+
+Each access token is presented many times during its lifetime, and every
+presentation paid for a full ``jwt.decode`` signature check.
+:class:`VerifiedTokenCache` remembers the claims of tokens that already
+verified.  Entries are keyed by a SHA-256 digest of the token, so raw tokens
+are never held in memory.  An entry is dropped once the token's ``exp``
+passes.
+
+Revocation works per token digest or per session id (the ``sid`` claim).
+Revoked entries are rejected whether or not they are cached.  Revocations
+made in one worker reach the others through hooks.
+:class:`SQLiteRevocationFeed` is the stock hook: it appends revocations to a
+table in the shared database, and each worker polls that table every few
+seconds.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import jwt
+import structlog
+from prometheus_client import REGISTRY, Counter
+
+logger = structlog.get_logger(__name__)
+
+
+def _get_or_create_metric(metric_cls, name: str, documentation: str, labelnames, **kwargs):
+    existing = REGISTRY._names_to_collectors.get(name)
+    if existing is not None:
+        return existing
+    return metric_cls(name, documentation, labelnames=labelnames, **kwargs)
+
+
+TOKEN_CACHE_LOOKUPS = _get_or_create_metric(
+    Counter,
+    "revenuepilot_token_cache_lookups_total",
+    "Verified token cache lookups by outcome",
+    ("outcome",),
+)
+
+
+class TokenRevokedError(jwt.InvalidTokenError):
+    """Raised for a token or session that has been revoked."""
+
+
+RevocationHook = Callable[[str, str, float], None]
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of verified token claims."""
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        *,
+        max_ttl: float = 900.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.max_entries = max(0, int(max_entries))
+        self.max_ttl = max_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        # kind ("token" or "session") -> identifier -> revoked until.
+        self._revoked: Dict[str, Dict[str, float]] = {"token": {}, "session": {}}
+        self._hooks: List[RevocationHook] = []
+
+    @classmethod
+    def from_env(cls) -> "VerifiedTokenCache":
+        try:
+            max_entries = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+        except ValueError:
+            max_entries = 10_000
+        return cls(max_entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _is_revoked(self, kind: str, identifier: Optional[str], now: float) -> bool:
+        if not identifier:
+            return False
+        until = self._revoked[kind].get(identifier)
+        if until is None:
+            return False
+        if until <= now:
+            del self._revoked[kind][identifier]
+            return False
+        return True
+
+    def verify(self, token: str, decode: Callable[[str], Mapping[str, Any]]) -> Dict[str, Any]:
+        """Return the claims for *token*, calling ``decode(token)`` on a miss.
+
+        ``decode`` must verify the signature and expiry; its exceptions
+        propagate unchanged.  A copy of the claims is returned so callers can
+        mutate it freely.
+        """
+
+        digest = token_digest(token)
+        now = self._clock()
+        with self._lock:
+            if self._is_revoked("token", digest, now):
+                TOKEN_CACHE_LOOKUPS.labels("revoked").inc()
+                raise TokenRevokedError("Token has been revoked")
+            entry = self._entries.get(digest)
+            if entry is not None:
+                claims, expires_at = entry
+                if expires_at > now:
+                    if self._is_revoked("session", claims.get("sid"), now):
+                        del self._entries[digest]
+                        TOKEN_CACHE_LOOKUPS.labels("revoked").inc()
+                        raise TokenRevokedError("Session has been revoked")
+                    self._entries.move_to_end(digest)
+                    TOKEN_CACHE_LOOKUPS.labels("hit").inc()
+                    return dict(claims)
+                del self._entries[digest]
+
+        claims = dict(decode(token))
+        TOKEN_CACHE_LOOKUPS.labels("miss").inc()
+        now = self._clock()
+        expires_at = now + self.max_ttl
+        exp = claims.get("exp")
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, float(exp))
+        with self._lock:
+            if self._is_revoked("session", claims.get("sid"), now):
+                raise TokenRevokedError("Session has been revoked")
+            if self.max_entries and expires_at > now:
+                self._entries[digest] = (claims, expires_at)
+                self._entries.move_to_end(digest)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return dict(claims)
+
+    def add_revocation_hook(self, hook: RevocationHook) -> None:
+        """Call ``hook(kind, identifier, until)`` for every local revocation."""
+
+        self._hooks.append(hook)
+
+    def apply_revocation(self, kind: str, identifier: str, until: float) -> None:
+        """Record a revocation without notifying hooks (used by feeds)."""
+
+        if kind not in self._revoked:
+            raise ValueError(f"Unknown revocation kind: {kind!r}")
+        with self._lock:
+            current = self._revoked[kind].get(identifier, 0.0)
+            self._revoked[kind][identifier] = max(current, until)
+            if kind == "token":
+                self._entries.pop(identifier, None)
+            else:
+                for digest in [
+                    d for d, (claims, _) in self._entries.items() if claims.get("sid") == identifier
+                ]:
+                    del self._entries[digest]
+
+    def _revoke(self, kind: str, identifier: str, until: float) -> None:
+        self.apply_revocation(kind, identifier, until)
+        for hook in list(self._hooks):
+            try:
+                hook(kind, identifier, until)
+            except Exception as exc:  # pragma: no cover - defensive logging
+                logger.warning("token_revocation_hook_failed", kind=kind, error=str(exc))
+
+    def revoke_token(self, token: str, until: float) -> None:
+        """Reject *token* until the timestamp *until* (normally its ``exp``)."""
+
+        self._revoke("token", token_digest(token), until)
+
+    def revoke_session(self, session_id: str, until: float) -> None:
+        """Reject every token carrying ``sid == session_id`` until *until*."""
+
+        self._revoke("session", session_id, until)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            for revoked in self._revoked.values():
+                revoked.clear()
+
+
+class SQLiteRevocationFeed:
+    """Share revocations between workers through a SQLite table.
+
+    ``pool`` returns the :class:`backend.db_pool.SQLitePool` for the shared
+    database.  Register :meth:`publish` as a revocation hook and call
+    :meth:`maybe_poll` on the request path.
+    """
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS auth_revocations ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, "
+        "identifier TEXT NOT NULL, revoked_until REAL NOT NULL)"
+    )
+
+    def __init__(
+        self,
+        cache: VerifiedTokenCache,
+        pool: Callable[[], Any],
+        *,
+        poll_interval: float = 2.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.cache = cache
+        self._pool = pool
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._last_id = 0
+        self._next_poll = 0.0
+        self._poll_lock = threading.Lock()
+
+    def publish(self, kind: str, identifier: str, until: float) -> None:
+        try:
+            with self._pool().write() as conn:
+                conn.execute(self._SCHEMA)
+                conn.execute(
+                    "DELETE FROM auth_revocations WHERE revoked_until <= ?", (self._clock(),)
+                )
+                conn.execute(
+                    "INSERT INTO auth_revocations (kind, identifier, revoked_until) "
+                    "VALUES (?, ?, ?)",
+                    (kind, identifier, until),
+                )
+        except Exception as exc:
+            logger.warning("token_revocation_publish_failed", kind=kind, error=str(exc))
+
+    def poll(self) -> int:
+        """Apply revocations recorded since the last poll; return the count."""
+
+        try:
+            with self._pool().read() as conn:
+                rows = conn.execute(
+                    "SELECT id, kind, identifier, revoked_until FROM auth_revocations "
+                    "WHERE id > ? ORDER BY id",
+                    (self._last_id,),
+                ).fetchall()
+        except sqlite3.OperationalError as exc:
+            # Nothing has been revoked yet, so the table does not exist.
+            if "no such table" in str(exc):
+                return 0
+            raise
+        for row_id, kind, identifier, until in rows:
+            self._last_id = max(self._last_id, row_id)
+            if kind in ("token", "session"):
+                self.cache.apply_revocation(kind, identifier, until)
+        return len(rows)
+
+    def maybe_poll(self) -> None:
+        """Poll at most once per ``poll_interval`` seconds across threads."""
+
+        now = self._clock()
+        if now < self._next_poll or not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_poll = now + self.poll_interval
+            self.poll()
+        except Exception as exc:
+            logger.warning("token_revocation_poll_failed", error=str(exc))
+        finally:
+            self._poll_lock.release()
+
+
+__all__ = [
+    "SQLiteRevocationFeed",
+    "TokenRevokedError",
+    "VerifiedTokenCache",
+    "token_digest",
+]
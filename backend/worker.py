@@ -1,4 +1,5 @@
 import asyncio
+import inspect
 import logging
 import os
 import sys
@@ -6,13 +7,14 @@ from collections.abc import Mapping, Sequence
 from typing import Any, Awaitable, Callable, Dict, List, Optional
 
 import requests
+import sqlalchemy as sa
 
-from backend import code_tables, codes_data, compliance
+from backend import code_tables, codes_data, compliance, jobs
 
 logger = logging.getLogger(__name__)
 
-# Queue for background jobs
-_task_queue: asyncio.Queue[Callable[[], Awaitable[None]]] = asyncio.Queue()
+# Durable job queue created by ``start_scheduler``
+_job_queue: Optional[jobs.JobQueue] = None
 # Track running background tasks so they can be cancelled on shutdown
 _background_tasks: List[asyncio.Task] = []
 
@@ -34,6 +36,22 @@ ANALYTICS_REFRESH_INTERVAL = 24 * 60 * 60
 MODEL_REFRESH_INTERVAL = 24 * 60 * 60
 AUDIT_REFRESH_INTERVAL = 24 * 60 * 60
 
+JOB_DATABASE_URL_ENV = "JOB_QUEUE_DATABASE_URL"
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_PROCESS_WORKERS = int(os.getenv("JOB_PROCESS_WORKERS", "2"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", str(jobs.DEFAULT_LEASE_SECONDS)))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", str(jobs.DEFAULT_POLL_INTERVAL)))
+
+# Per-process concurrency per queue.  Code refreshes get their own lane so a
+# slow download cannot hold up the audit trail or model jobs.
+JOB_QUEUES = (
+    jobs.QueueConfig("codes", concurrency=1),
+    jobs.QueueConfig("compliance", concurrency=1),
+    jobs.QueueConfig("analytics", concurrency=1),
+    jobs.QueueConfig("maintenance", concurrency=2),
+    jobs.QueueConfig("default", concurrency=2),
+)
+
 
 def _normalize_key(value: str) -> str:
     return value.lower().replace("-", "").replace("_", "")
@@ -311,8 +329,11 @@ async def aggregate_analytics_and_backup() -> None:
         logger.exception("Analytics aggregation job failed")
 
 
-async def retrain_model() -> None:
-    """Placeholder task for AI model retraining."""
+def retrain_model() -> None:
+    """Placeholder task for AI model retraining.
+
+    Retraining is CPU bound, so the job runs in the worker process pool.
+    """
     logger.info("Retraining AI model")
 
 
@@ -321,56 +342,161 @@ async def generate_audit_trail() -> None:
     logger.info("Generating audit trail")
 
 
-async def _run_periodic(interval: float, coro: Callable[[], Awaitable[None]]) -> None:
-    """Run ``coro`` every ``interval`` seconds."""
-    while True:
-        try:
-            await coro()
-        except Exception:
-            logger.exception("Scheduled task failed")
-        await asyncio.sleep(interval)
-
-
-async def _worker() -> None:
-    """Process queued jobs sequentially."""
-    while True:
-        job = await _task_queue.get()
-        try:
-            await job()
-        except Exception:
-            logger.exception("Worker job failed")
-        finally:
-            _task_queue.task_done()
-
-
-def start_scheduler() -> None:
-    """Start background scheduler and worker loop."""
-    _background_tasks.extend(
-        [
-            asyncio.create_task(_run_periodic(CODE_REFRESH_INTERVAL, update_code_databases)),
-            asyncio.create_task(_run_periodic(COMPLIANCE_REFRESH_INTERVAL, check_compliance_rules)),
-            asyncio.create_task(
-                _run_periodic(ANALYTICS_REFRESH_INTERVAL, aggregate_analytics_and_backup)
-            ),
-            asyncio.create_task(_run_periodic(MODEL_REFRESH_INTERVAL, queue_model_retraining)),
-            asyncio.create_task(_run_periodic(AUDIT_REFRESH_INTERVAL, queue_audit_trail_generation)),
-            asyncio.create_task(_worker()),
-        ]
+def _module_job(attribute: str) -> Callable[[], Awaitable[Any]]:
+    """Return a handler that resolves ``attribute`` on this module at run time."""
+
+    async def _run(**payload: Any) -> Any:
+        result = globals()[attribute](**payload)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    _run.__name__ = attribute
+    return _run
+
+
+def _resolve_job_engine() -> sa.engine.Engine:
+    url = os.getenv(JOB_DATABASE_URL_ENV)
+    if url:
+        return sa.create_engine(url, future=True)
+    from backend import migrations
+
+    main_module = sys.modules.get("backend.main")
+    conn = getattr(main_module, "db_conn", None) if main_module is not None else None
+    if conn is not None:
+        path = _connection_file(conn)
+        if path is None:
+            # In-memory database: only reachable through the shared connection.
+            return migrations._engine_from_connection(conn)
+    else:
+        # Outside the API process, share the application's database file so
+        # jobs stay durable and visible to the API's workers.
+        from backend import database_legacy
+
+        path = str(database_legacy.SQLITE_PATH)
+    # A pooled engine of its own lets job bookkeeping run in worker threads
+    # without sharing the API's sqlite3 connection across threads.
+    return sa.create_engine(f"sqlite:///{path}", future=True)
+
+
+def _connection_file(conn: Any) -> Optional[str]:
+    try:
+        rows = conn.execute("PRAGMA database_list").fetchall()
+    except Exception:
+        return None
+    for row in rows:
+        if row[1] == "main" and row[2]:
+            return str(row[2])
+    return None
+
+
+def build_job_queue(engine: Optional[sa.engine.Engine] = None) -> jobs.JobQueue:
+    """Create a job queue with the built-in jobs and periodic schedule."""
+
+    queue = jobs.JobQueue(
+        engine or _resolve_job_engine(),
+        queues=JOB_QUEUES,
+        workers=JOB_WORKERS,
+        process_workers=JOB_PROCESS_WORKERS,
+        lease_seconds=JOB_LEASE_SECONDS,
+        poll_interval=JOB_POLL_INTERVAL,
+    )
+    queue.register(jobs.JobSpec("update_code_databases", _module_job("update_code_databases"), queue="codes"))
+    queue.register(
+        jobs.JobSpec("check_compliance_rules", _module_job("check_compliance_rules"), queue="compliance")
+    )
+    queue.register(
+        jobs.JobSpec(
+            "aggregate_analytics_and_backup",
+            _module_job("aggregate_analytics_and_backup"),
+            queue="analytics",
+            max_attempts=1,
+        )
+    )
+    queue.register(jobs.JobSpec("retrain_model", retrain_model, queue="maintenance", cpu_bound=True))
+    queue.register(
+        jobs.JobSpec(
+            "generate_audit_trail", _module_job("generate_audit_trail"), queue="maintenance", priority=10
+        )
     )
+    queue.add_periodic(jobs.PeriodicJob("update_code_databases", CODE_REFRESH_INTERVAL))
+    queue.add_periodic(jobs.PeriodicJob("check_compliance_rules", COMPLIANCE_REFRESH_INTERVAL))
+    queue.add_periodic(jobs.PeriodicJob("aggregate_analytics_and_backup", ANALYTICS_REFRESH_INTERVAL))
+    queue.add_periodic(jobs.PeriodicJob("retrain_model", MODEL_REFRESH_INTERVAL))
+    queue.add_periodic(jobs.PeriodicJob("generate_audit_trail", AUDIT_REFRESH_INTERVAL))
+    queue.ensure_schema()
+    return queue
 
 
-def queue_model_retraining() -> Awaitable[None]:
+def get_job_queue() -> Optional[jobs.JobQueue]:
+    return _job_queue
+
+
+def start_scheduler(engine: Optional[sa.engine.Engine] = None) -> jobs.JobQueue:
+    """Start the durable job queue workers and periodic scheduler."""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = build_job_queue(engine)
+    _job_queue.start()
+    return _job_queue
+
+
+def enqueue_job(
+    name: str,
+    payload: Optional[Mapping[str, Any]] = None,
+    **options: Any,
+) -> Optional[int]:
+    """Persist a background job; returns the job id or ``None`` when de-duplicated."""
+
+    queue = _job_queue
+    if queue is None:
+        queue = start_scheduler() if _loop_running() else build_job_queue()
+    return queue.enqueue(name, payload, **options)
+
+
+def _loop_running() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+async def enqueue_job_async(
+    name: str,
+    payload: Optional[Mapping[str, Any]] = None,
+    **options: Any,
+) -> Optional[int]:
+    """Async :func:`enqueue_job`; the insert runs in a thread."""
+
+    queue = _job_queue or start_scheduler()
+    return await asyncio.to_thread(queue.enqueue, name, payload, **options)
+
+
+async def queue_model_retraining() -> None:
     """Queue the AI model retraining task."""
-    return _task_queue.put(retrain_model)
+    await enqueue_job_async("retrain_model")
 
 
-def queue_audit_trail_generation() -> Awaitable[None]:
+async def queue_audit_trail_generation() -> None:
     """Queue the audit trail generation task."""
-    return _task_queue.put(generate_audit_trail)
+    await enqueue_job_async("generate_audit_trail")
+
+
+def job_status() -> Dict[str, Any]:
+    """Return queue depth, running and failed job details."""
+
+    if _job_queue is None:
+        return {"running": False, "queues": {}, "periodic": [], "recentFailures": []}
+    return {"running": True, **_job_queue.stats()}
 
 
 async def stop_scheduler() -> None:
-    """Cancel all running background tasks."""
+    """Stop job workers and cancel any other background tasks."""
+    global _job_queue
+    if _job_queue is not None:
+        await _job_queue.stop()
+        _job_queue = None
     for task in _background_tasks:
         task.cancel()
     await asyncio.gather(*_background_tasks, return_exceptions=True)
@@ -382,4 +508,3 @@ def register_analytics_aggregator(callback: Callable[[], Awaitable[None]]) -> No
 
     global _aggregate_callback
     _aggregate_callback = callback
-
@@ -4,11 +4,13 @@
 
 from __future__ import annotations
 
+from backend.memory_diagnostics import register_cache
 from backend.ws_streams import EncounterDeltaStream
 
 
 # A singleton stream for broadcasting compose job updates keyed by encounter.
 compose_stream = EncounterDeltaStream("compose")
+register_cache("ws.compose_published", compose_stream)
 
 
 __all__ = ["compose_stream"]
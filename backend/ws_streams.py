@@ -1,31 +1,129 @@
-"""Reusable helpers for encounter-scoped WebSocket streams."""
+"""Reusable helpers for encounter-scoped WebSocket streams.
+
+Besides :class:`EncounterDeltaStream` this module holds the pieces that keep
+long-lived WebSocket registries bounded: :class:`ReplayBuffer`, a ring of
+pre-serialised frames used for reconnect replay, the
+``revenuepilot_ws_registry_entries`` gauge and :func:`run_sweeper`, which
+periodically evicts idle entries from every registered ``sweep()``-capable
+registry.
+"""
 
 from __future__ import annotations
 
 import asyncio
 import copy
 import json
+import os
 import time
+from collections import OrderedDict, deque
 from dataclasses import dataclass, field
-from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, Set
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Mapping, Optional, Protocol, Set, Tuple
 
 import structlog
 from fastapi import WebSocket, WebSocketDisconnect
+from prometheus_client import REGISTRY, Gauge
 
 logger = structlog.get_logger(__name__)
 
 AuthCallable = Callable[[WebSocket], Awaitable[Mapping[str, Any]]]
 
 
+def _get_or_create_metric(metric_cls, name: str, documentation: str, labelnames, **kwargs):
+    existing = REGISTRY._names_to_collectors.get(name)
+    if existing is not None:
+        return existing
+    return metric_cls(name, documentation, labelnames=labelnames, **kwargs)
+
+
+WS_REGISTRY_SIZE = _get_or_create_metric(
+    Gauge,
+    "revenuepilot_ws_registry_entries",
+    "Entries held by in-memory WebSocket registries",
+    ("registry", "kind"),
+)
+
+
+def env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def serialise_frame(payload: Mapping[str, Any]) -> str:
+    """Serialise *payload* exactly as ``WebSocket.send_json`` would."""
+
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+class ReplayBuffer:
+    """Bounded ring of ``(event_id, frame)`` pairs kept for reconnect replay.
+
+    Frames are stored as UTF-8 bytes of the already serialised JSON so replay
+    does not re-encode and the buffer's footprint is easy to account for.  The
+    oldest frames are dropped once either ``max_events`` or ``max_bytes`` is
+    exceeded.
+    """
+
+    __slots__ = ("max_events", "max_bytes", "nbytes", "_frames")
+
+    def __init__(self, max_events: int = 50, max_bytes: int = 256 * 1024) -> None:
+        self.max_events = max(1, int(max_events))
+        self.max_bytes = max(0, int(max_bytes))
+        self.nbytes = 0
+        self._frames: Deque[Tuple[int, bytes]] = deque()
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def append(self, event_id: int, frame: str) -> None:
+        data = frame.encode("utf-8")
+        self._frames.append((event_id, data))
+        self.nbytes += len(data)
+        while self._frames and (
+            len(self._frames) > self.max_events
+            or (self.max_bytes and self.nbytes > self.max_bytes and len(self._frames) > 1)
+        ):
+            _, dropped = self._frames.popleft()
+            self.nbytes -= len(dropped)
+
+    def since(self, last_event_id: Optional[int] = None) -> List[str]:
+        """Return frames newer than *last_event_id* (all frames when ``None``)."""
+
+        return [
+            data.decode("utf-8")
+            for event_id, data in self._frames
+            if last_event_id is None or event_id > last_event_id
+        ]
+
+
+class SweepableRegistry(Protocol):
+    def sweep(self, now: Optional[float] = None) -> int: ...
+
+
+async def run_sweeper(registries: Iterable[SweepableRegistry], interval: float) -> None:
+    """Call ``sweep()`` on every registry each *interval* seconds until cancelled."""
+
+    targets = list(registries)
+    while True:
+        await asyncio.sleep(interval)
+        for registry in targets:
+            try:
+                registry.sweep()
+            except Exception as exc:  # pragma: no cover - defensive logging
+                logger.warning("ws_registry_sweep_failed", registry=repr(registry), error=str(exc))
+
+
 @dataclass
 class _EncounterState:
     """Track connection and delivery state for a single encounter."""
 
     clients: Set[WebSocket] = field(default_factory=set)
     last_event_id: int = 0
-    last_payload: Optional[Dict[str, Any]] = None
+    last_frame: Optional[bytes] = None
     last_fingerprint: Optional[str] = None
     last_sent_monotonic: float = 0.0
+    last_active: float = field(default_factory=time.monotonic)
     pending: Optional[Dict[str, Any]] = None
     pending_fingerprint: Optional[str] = None
     flush_task: Optional[asyncio.Task[None]] = None
@@ -35,10 +133,68 @@ class _EncounterState:
 class EncounterDeltaStream:
     """Manage WebSocket connections and delta delivery per encounter."""
 
-    def __init__(self, channel: str, *, min_interval: float = 0.5) -> None:
+    def __init__(
+        self,
+        channel: str,
+        *,
+        min_interval: float = 0.5,
+        ttl: Optional[float] = None,
+        max_states: Optional[int] = None,
+    ) -> None:
         self.channel = channel
         self.min_interval = min_interval
-        self._states: Dict[str, _EncounterState] = {}
+        # Idle encounters (no clients, nothing pending) are forgotten after
+        # ``ttl`` seconds; ``max_states`` optionally caps how many are kept.
+        self.ttl = ttl if ttl is not None else env_float("WS_STATE_TTL_SECONDS", 3600.0)
+        cap = max_states if max_states is not None else int(env_float("WS_MAX_ENCOUNTERS", 0))
+        self.max_states = cap if cap > 0 else None
+        self._states: "OrderedDict[str, _EncounterState]" = OrderedDict()
+        self._last_sweep = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def _state(self, encounter_id: str) -> _EncounterState:
+        state = self._states.get(encounter_id)
+        if state is None:
+            state = self._states[encounter_id] = _EncounterState()
+        else:
+            self._states.move_to_end(encounter_id)
+        state.last_active = now = time.monotonic()
+        over_cap = self.max_states is not None and len(self._states) > self.max_states
+        if over_cap or now - self._last_sweep > self.ttl:
+            self.sweep(now, keep=encounter_id)
+        return state
+
+    @staticmethod
+    def _idle(state: _EncounterState) -> bool:
+        return (
+            not state.clients
+            and state.pending is None
+            and (state.flush_task is None or state.flush_task.done())
+            and not state.lock.locked()
+        )
+
+    def sweep(self, now: Optional[float] = None, *, keep: Optional[str] = None) -> int:
+        """Drop idle encounter states past their TTL or over the size cap."""
+
+        now = time.monotonic() if now is None else now
+        self._last_sweep = now
+        removed = 0
+        for encounter_id, state in list(self._states.items()):
+            if now - state.last_active > self.ttl and self._idle(state):
+                del self._states[encounter_id]
+                removed += 1
+        if self.max_states is not None and len(self._states) > self.max_states:
+            # Oldest first; encounters with live clients are never evicted.
+            for encounter_id, state in list(self._states.items()):
+                if len(self._states) <= self.max_states:
+                    break
+                if encounter_id != keep and self._idle(state):
+                    del self._states[encounter_id]
+                    removed += 1
+        WS_REGISTRY_SIZE.labels(self.channel, "encounters").set(len(self._states))
+        return removed
 
     async def handle(self, websocket: WebSocket, authenticator: AuthCallable) -> None:
         """Authenticate *websocket* and stream deltas for its encounter."""
@@ -68,14 +224,14 @@ class EncounterDeltaStream:
             }
         )
 
-        state = self._states.setdefault(encounter_id, _EncounterState())
+        state = self._state(encounter_id)
         async with state.lock:
             state.clients.add(websocket)
-            snapshot = copy.deepcopy(state.last_payload)
+            snapshot = state.last_frame
 
         if snapshot is not None:
             try:
-                await websocket.send_json(snapshot)
+                await websocket.send_text(snapshot.decode("utf-8"))
             except Exception as exc:  # pragma: no cover - defensive close
                 logger.warning(
                     "stream_snapshot_send_failed",
@@ -103,13 +259,14 @@ class EncounterDeltaStream:
         finally:
             async with state.lock:
                 state.clients.discard(websocket)
+                state.last_active = time.monotonic()
 
     async def publish(self, encounter_id: str, payload: Mapping[str, Any]) -> None:
         """Broadcast *payload* to listeners for *encounter_id* if changed."""
 
         if not encounter_id:
             return
-        state = self._states.setdefault(encounter_id, _EncounterState())
+        state = self._state(encounter_id)
         cloned = copy.deepcopy(dict(payload))
         fingerprint = self._fingerprint(cloned)
         async with state.lock:
@@ -159,7 +316,7 @@ class EncounterDeltaStream:
         fingerprint = state.pending_fingerprint or self._fingerprint(payload)
         state.pending_fingerprint = None
 
-        if fingerprint == state.last_fingerprint and state.last_payload is not None:
+        if fingerprint == state.last_fingerprint and state.last_frame is not None:
             return
 
         state.last_event_id += 1
@@ -169,7 +326,8 @@ class EncounterDeltaStream:
         enriched.setdefault("channel", self.channel)
         enriched["eventId"] = state.last_event_id
 
-        state.last_payload = enriched
+        frame = serialise_frame(enriched)
+        state.last_frame = frame.encode("utf-8")
         state.last_fingerprint = fingerprint
         state.last_sent_monotonic = time.monotonic()
 
@@ -179,7 +337,7 @@ class EncounterDeltaStream:
         dead: Set[WebSocket] = set()
         for ws in state.clients:
             try:
-                await ws.send_json(enriched)
+                await ws.send_text(frame)
             except Exception:
                 dead.add(ws)
         for ws in dead:
@@ -200,5 +358,12 @@ class EncounterDeltaStream:
             return repr(sorted(payload.items()))
 
 
-__all__ = ["EncounterDeltaStream", "AuthCallable"]
+__all__ = [
+    "AuthCallable",
+    "EncounterDeltaStream",
+    "ReplayBuffer",
+    "WS_REGISTRY_SIZE",
+    "run_sweeper",
+    "serialise_frame",
+]
 
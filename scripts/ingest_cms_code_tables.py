@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """Synchronise CPT, ICD-10 and HCPCS tables with official CMS datasets.
 
-The script downloads datasets from the CMS Provider Data API and upserts the
+The script downloads datasets from the CMS Provider Data API and loads the
 records into the SQLite database used by the RevenuePilot backend.  Dataset IDs
 are supplied via command line arguments or environment variables so the script
 can target different releases without code changes.
@@ -14,25 +14,52 @@ Example usage::
         --icd-dataset "$CMS_ICD10_DATASET_ID" \
         --hcpcs-dataset "$CMS_HCPCS_DATASET_ID"
 
+    # Replay a recorded dataset (JSON array, ``{"results": [...]}`` or JSONL)
+    scripts/ingest_cms_code_tables.py --icd-file tests/fixtures/cms_icd10_sample.json
+
 Pass ``--interval 1440`` to re-run ingestion once per day.
+
+Pipeline
+--------
+
+Pages are fetched concurrently (``--concurrency`` requests in flight) but
+yielded in offset order.  The source column for each logical field is resolved
+once per dataset from the first record, rows are streamed through generators
+and bulk inserted with ``executemany`` into a ``<table>_staging`` copy in
+transactions of ``--batch-size`` rows.  The live table is only touched by the
+final swap (``DROP`` + ``ALTER TABLE ... RENAME``) which runs in a single
+transaction, so readers never see a partially loaded table.
+
+Each committed batch records the next page offset in ``cms_ingest_checkpoints``.
+An interrupted run resumes from that cursor on the next invocation unless
+``--no-resume`` is given.
 """
 
 from __future__ import annotations
 
 import argparse
+import json
 import logging
 import os
 import sqlite3
 import time
-from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from backend import migrations
-from sqlalchemy.orm import Session
 
 DATA_API_BASE = "https://data.cms.gov/provider-data/api/1/datastore/query"
 DEFAULT_PAGE_SIZE = 5000
+DEFAULT_CONCURRENCY = 4
+DEFAULT_BATCH_SIZE = 20000
+CHECKPOINT_TABLE = "cms_ingest_checkpoints"
 LOGGER = logging.getLogger("cms_ingest")
 
 
@@ -47,48 +74,94 @@ def _to_float(value: Any) -> Optional[float]:
         return None
 
 
-def _pick_field(record: Dict[str, Any], *candidates: str) -> Any:
-    lower_map = {key.lower(): key for key in record.keys()}
-    for candidate in candidates:
-        if candidate in record:
-            return record[candidate]
-        lower = candidate.lower()
-        if lower in lower_map:
-            return record[lower_map[lower]]
-    for candidate in candidates:
-        lower = candidate.lower()
-        for key in record.keys():
-            if lower in key.lower():
-                return record[key]
-    return None
-
-
-def _transform_cpt(record: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, Any]]]:
-    raw_code = _pick_field(record, "hcpcs_code", "hcpcs_cd", "code")
-    if not raw_code:
-        return None
-    code = str(raw_code).strip().upper()
-    if not code:
-        return None
-    description = _pick_field(record, "hcpcs_description", "long_description", "short_description", "description")
-    rvu = _pick_field(
-        record,
-        "non_facility_total_rvu",
-        "total_rvu",
-        "md_total_rvu",
-        "rvu",
-    )
-    reimbursement = _pick_field(
-        record,
+# ---------------------------------------------------------------------------
+# Column mapping
+# ---------------------------------------------------------------------------
+
+FieldSpec = Mapping[str, Sequence[str]]
+FieldMap = Dict[str, Optional[str]]
+
+
+def resolve_field_map(keys: Iterable[str], spec: FieldSpec) -> FieldMap:
+    """Resolve each logical field in ``spec`` to a concrete source column.
+
+    Candidates are tried in order as exact then case-insensitive names; if none
+    match, the first column containing a candidate as a substring is used.  The
+    CMS datastore returns a uniform schema per dataset so this runs once per
+    dataset instead of once per record.
+    """
+
+    columns = list(keys)
+    exact = set(columns)
+    lower_map = {key.lower(): key for key in columns}
+    resolved: FieldMap = {}
+    for name, candidates in spec.items():
+        match: Optional[str] = None
+        for candidate in candidates:
+            if candidate in exact:
+                match = candidate
+                break
+            if candidate.lower() in lower_map:
+                match = lower_map[candidate.lower()]
+                break
+        if match is None:
+            for candidate in candidates:
+                lower = candidate.lower()
+                match = next((key for key in columns if lower in key.lower()), None)
+                if match is not None:
+                    break
+        resolved[name] = match
+    return resolved
+
+
+def _get(record: Mapping[str, Any], fields: FieldMap, name: str) -> Any:
+    column = fields.get(name)
+    return record.get(column) if column else None
+
+
+_CPT_FIELDS: FieldSpec = {
+    "code": ("hcpcs_code", "hcpcs_cd", "code"),
+    "description": ("hcpcs_description", "long_description", "short_description", "description"),
+    "rvu": ("non_facility_total_rvu", "total_rvu", "md_total_rvu", "rvu"),
+    "reimbursement": (
         "non_facility_price",
         "non_facility_payment_amount",
         "payment_rate",
         "non_facility_rate",
-    )
+    ),
+}
+
+_ICD_FIELDS: FieldSpec = {
+    "code": ("icd10_code", "diagnosis_code", "code", "icd_code"),
+    "description": ("long_description", "full_code_title", "description"),
+    "clinical_context": ("clinical_context", "clinical_category", "clinical_classification"),
+}
+
+_HCPCS_FIELDS: FieldSpec = {
+    "code": ("hcpcs_code", "code"),
+    "description": ("long_description", "hcpcs_long_description", "description"),
+    "rvu": ("rvu", "total_rvu"),
+    "reimbursement": ("payment_rate", "non_facility_price", "nonfacility_price"),
+    "coverage_status": ("coverage_status", "status"),
+    "coverage_notes": ("coverage_notes", "note", "coverage_note"),
+}
+
+
+def _normalise_code(raw: Any) -> Optional[str]:
+    if not raw:
+        return None
+    code = str(raw).strip().upper()
+    return code or None
+
+
+def _transform_cpt(record: Mapping[str, Any], fields: FieldMap) -> Optional[Tuple[str, Dict[str, Any]]]:
+    code = _normalise_code(_get(record, fields, "code"))
+    if code is None:
+        return None
     info = {
-        "description": description,
-        "rvu": _to_float(rvu),
-        "reimbursement": _to_float(reimbursement),
+        "description": _get(record, fields, "description"),
+        "rvu": _to_float(_get(record, fields, "rvu")),
+        "reimbursement": _to_float(_get(record, fields, "reimbursement")),
         "documentation": None,
         "icd10_prefixes": [],
         "demographics": None,
@@ -98,18 +171,13 @@ def _transform_cpt(record: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, Any]
     return code, info
 
 
-def _transform_icd(record: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, Any]]]:
-    raw_code = _pick_field(record, "icd10_code", "diagnosis_code", "code", "icd_code")
-    if not raw_code:
-        return None
-    code = str(raw_code).strip().upper()
-    if not code:
+def _transform_icd(record: Mapping[str, Any], fields: FieldMap) -> Optional[Tuple[str, Dict[str, Any]]]:
+    code = _normalise_code(_get(record, fields, "code"))
+    if code is None:
         return None
-    description = _pick_field(record, "long_description", "full_code_title", "description")
-    clinical_context = _pick_field(record, "clinical_context", "clinical_category", "clinical_classification")
     info = {
-        "description": description,
-        "clinicalContext": clinical_context,
+        "description": _get(record, fields, "description"),
+        "clinicalContext": _get(record, fields, "clinical_context"),
         "contraindications": [],
         "documentation": None,
         "demographics": None,
@@ -119,27 +187,21 @@ def _transform_icd(record: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, Any]
     return code, info
 
 
-def _transform_hcpcs(record: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, Any]]]:
-    raw_code = _pick_field(record, "hcpcs_code", "code")
-    if not raw_code:
+def _transform_hcpcs(record: Mapping[str, Any], fields: FieldMap) -> Optional[Tuple[str, Dict[str, Any]]]:
+    code = _normalise_code(_get(record, fields, "code"))
+    if code is None:
         return None
-    code = str(raw_code).strip().upper()
-    if not code:
-        return None
-    description = _pick_field(record, "long_description", "hcpcs_long_description", "description")
-    rvu = _pick_field(record, "rvu", "total_rvu")
-    reimbursement = _pick_field(record, "payment_rate", "non_facility_price", "nonfacility_price")
-    coverage_status = _pick_field(record, "coverage_status", "status")
-    coverage_notes = _pick_field(record, "coverage_notes", "note", "coverage_note")
     coverage: Dict[str, Any] = {}
+    coverage_status = _get(record, fields, "coverage_status")
+    coverage_notes = _get(record, fields, "coverage_notes")
     if coverage_status:
         coverage["status"] = coverage_status
     if coverage_notes:
         coverage["notes"] = coverage_notes
     info = {
-        "description": description,
-        "rvu": _to_float(rvu),
-        "reimbursement": _to_float(reimbursement),
+        "description": _get(record, fields, "description"),
+        "rvu": _to_float(_get(record, fields, "rvu")),
+        "reimbursement": _to_float(_get(record, fields, "reimbursement")),
         "coverage": coverage or None,
         "documentation": None,
         "demographics": None,
@@ -149,145 +211,545 @@ def _transform_hcpcs(record: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, An
     return code, info
 
 
-def fetch_cms_dataset(
+# ---------------------------------------------------------------------------
+# Target tables
+# ---------------------------------------------------------------------------
+
+
+def _json(value: Any) -> Optional[str]:
+    return None if value is None else json.dumps(value)
+
+
+@dataclass(frozen=True)
+class TableSpec:
+    """Describe how transformed records map onto a code table."""
+
+    table: str
+    fields: FieldSpec
+    transformer: Callable[[Mapping[str, Any], FieldMap], Optional[Tuple[str, Dict[str, Any]]]]
+    columns: Tuple[str, ...]  # ``to_row`` output followed by ``last_updated``
+    to_row: Callable[[str, Mapping[str, Any]], Tuple[Any, ...]]
+
+
+CPT_TABLE = TableSpec(
+    table="cpt_codes",
+    fields=_CPT_FIELDS,
+    transformer=_transform_cpt,
+    columns=(
+        "code",
+        "description",
+        "rvu",
+        "reimbursement",
+        "documentation",
+        "icd10_prefixes",
+        "demographics",
+        "encounter_types",
+        "specialties",
+        "last_updated",
+    ),
+    to_row=lambda code, info: (
+        code,
+        info.get("description"),
+        info.get("rvu"),
+        info.get("reimbursement"),
+        _json(info.get("documentation")),
+        _json(info.get("icd10_prefixes")),
+        _json(info.get("demographics")),
+        _json(info.get("encounterTypes")),
+        _json(info.get("specialties")),
+    ),
+)
+
+ICD10_TABLE = TableSpec(
+    table="icd10_codes",
+    fields=_ICD_FIELDS,
+    transformer=_transform_icd,
+    columns=(
+        "code",
+        "description",
+        "clinical_context",
+        "contraindications",
+        "documentation",
+        "demographics",
+        "encounter_types",
+        "specialties",
+        "last_updated",
+    ),
+    to_row=lambda code, info: (
+        code,
+        info.get("description"),
+        info.get("clinicalContext"),
+        _json(info.get("contraindications")),
+        _json(info.get("documentation")),
+        _json(info.get("demographics")),
+        _json(info.get("encounterTypes")),
+        _json(info.get("specialties")),
+    ),
+)
+
+HCPCS_TABLE = TableSpec(
+    table="hcpcs_codes",
+    fields=_HCPCS_FIELDS,
+    transformer=_transform_hcpcs,
+    columns=(
+        "code",
+        "description",
+        "rvu",
+        "reimbursement",
+        "coverage",
+        "documentation",
+        "demographics",
+        "encounter_types",
+        "specialties",
+        "last_updated",
+    ),
+    to_row=lambda code, info: (
+        code,
+        info.get("description"),
+        info.get("rvu"),
+        info.get("reimbursement"),
+        _json(info.get("coverage")),
+        _json(info.get("documentation")),
+        _json(info.get("demographics")),
+        _json(info.get("encounterTypes")),
+        _json(info.get("specialties")),
+    ),
+)
+
+
+# ---------------------------------------------------------------------------
+# Sources
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class Page:
+    """A page of raw records starting at ``offset``."""
+
+    offset: int
+    records: List[Dict[str, Any]]
+
+    @property
+    def next_offset(self) -> int:
+        return self.offset + len(self.records)
+
+
+def _fetch_page(
+    session: requests.Session,
+    dataset_id: str,
+    offset: int,
+    size: int,
+    headers: Mapping[str, str],
+) -> List[Dict[str, Any]]:
+    url = f"{DATA_API_BASE}/{dataset_id}/0"
+    resp = session.get(url, params={"offset": offset, "limit": size}, headers=headers, timeout=60)
+    resp.raise_for_status()
+    payload = resp.json()
+    records = payload.get("results") if isinstance(payload, dict) else payload
+    return list(records or [])
+
+
+def fetch_cms_pages(
     dataset_id: str,
     *,
     session: requests.Session,
     app_token: Optional[str] = None,
     page_size: int = DEFAULT_PAGE_SIZE,
     limit: Optional[int] = None,
-) -> Iterator[Dict[str, Any]]:
-    """Yield records from the CMS provider data API for a dataset."""
+    start_offset: int = 0,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> Iterator[Page]:
+    """Yield pages from the CMS API in offset order with bounded parallelism.
+
+    Up to ``concurrency`` page requests are kept in flight.  The first short
+    or empty page marks the end of the dataset and outstanding requests are
+    cancelled.  ``limit`` is an absolute row bound so resumed runs honour it.
+    """
 
     headers = {"Accept": "application/json"}
     if app_token:
         headers["X-App-Token"] = app_token
-    offset = 0
-    fetched = 0
-    while True:
-        if limit is not None and fetched >= limit:
-            break
-        current_size = page_size
-        if limit is not None:
-            remaining = limit - fetched
-            if remaining <= 0:
+    workers = max(1, concurrency)
+    end = limit if limit is not None else None
+    next_offset = start_offset
+    pending: Deque[Tuple[int, int, Any]] = deque()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cms-fetch") as pool:
+
+        def submit() -> None:
+            nonlocal next_offset
+            size = page_size
+            if end is not None:
+                size = min(page_size, end - next_offset)
+            if size <= 0:
+                return
+            future = pool.submit(_fetch_page, session, dataset_id, next_offset, size, headers)
+            pending.append((next_offset, size, future))
+            next_offset += size
+
+        for _ in range(workers):
+            submit()
+        while pending:
+            offset, size, future = pending.popleft()
+            records = future.result()
+            if records:
+                yield Page(offset, records)
+            if len(records) < size:
+                for _, _, outstanding in pending:
+                    outstanding.cancel()
                 break
-            current_size = min(page_size, remaining)
-        params = {"offset": offset, "limit": current_size}
-        url = f"{DATA_API_BASE}/{dataset_id}/0"
-        resp = session.get(url, params=params, headers=headers, timeout=60)
-        resp.raise_for_status()
-        payload = resp.json()
-        records = payload.get("results") if isinstance(payload, dict) else payload
-        if not records:
-            break
-        for record in records:
-            fetched += 1
-            yield record
-        if len(records) < current_size:
-            break
-        offset += current_size
-
-
-Transformer = Callable[[Dict[str, Any]], Optional[Tuple[str, Dict[str, Any]]]]
-Seeder = Callable[[Session, Iterable[Tuple[str, Dict[str, Any]]], bool], None]
+            submit()
+
+
+def fetch_cms_dataset(
+    dataset_id: str,
+    *,
+    session: requests.Session,
+    app_token: Optional[str] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    limit: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Yield records from the CMS provider data API for a dataset."""
+
+    for page in fetch_cms_pages(
+        dataset_id,
+        session=session,
+        app_token=app_token,
+        page_size=page_size,
+        limit=limit,
+        concurrency=1,
+    ):
+        yield from page.records
+
+
+def read_recorded_pages(
+    path: str | Path,
+    *,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    limit: Optional[int] = None,
+    start_offset: int = 0,
+) -> Iterator[Page]:
+    """Yield pages from a recorded dataset file.
+
+    Accepts a JSON array of records, a CMS response body (``{"results": [...]}``)
+    or JSON lines.  Offsets match what the live API would return so checkpoints
+    are interchangeable between the two sources.
+    """
+
+    text = Path(path).read_text(encoding="utf-8")
+    try:
+        payload: Any = json.loads(text)
+    except json.JSONDecodeError:
+        payload = [json.loads(line) for line in text.splitlines() if line.strip()]
+    records = payload.get("results") if isinstance(payload, dict) else payload
+    records = list(records or [])
+    end = len(records) if limit is None else min(limit, len(records))
+    for offset in range(start_offset, end, page_size):
+        yield Page(offset, records[offset : min(offset + page_size, end)])
+
+
+# ---------------------------------------------------------------------------
+# Staging, checkpoints and swap
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class IngestStats:
+    """Throughput metrics for a single dataset load."""
+
+    label: str
+    source: str
+    rows: int = 0
+    skipped: int = 0
+    pages: int = 0
+    batches: int = 0
+    resumed_from: int = 0
+    elapsed: float = 0.0
+    fields: FieldMap = field(default_factory=dict)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def ensure_checkpoint_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+            target_table TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            next_offset INTEGER NOT NULL,
+            rows INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """
+    )
+    conn.commit()
+
+
+def _staging_name(table: str) -> str:
+    return f"{table}_staging"
+
+
+def _table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone()
+    return row is not None
+
+
+def load_checkpoint(conn: sqlite3.Connection, table: str, source: str) -> Optional[Tuple[int, int]]:
+    """Return ``(next_offset, rows)`` for an unfinished load of ``source``."""
+
+    row = conn.execute(
+        f"SELECT source, next_offset, rows FROM {CHECKPOINT_TABLE} WHERE target_table = ?",
+        (table,),
+    ).fetchone()
+    if row is None or row[0] != source or not _table_exists(conn, _staging_name(table)):
+        return None
+    return int(row[1]), int(row[2])
+
+
+def _create_staging(conn: sqlite3.Connection, table: str, *, append: bool) -> None:
+    staging = _staging_name(table)
+    row = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    if row is None:
+        raise RuntimeError(f"Table {table} does not exist; run migrations first")
+    create_sql = row[0].replace(table, staging, 1)
+    conn.execute(f"DROP TABLE IF EXISTS {staging}")
+    conn.execute(create_sql)
+    if append:
+        conn.execute(f"INSERT INTO {staging} SELECT * FROM {table}")
+    conn.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE target_table = ?", (table,))
+    conn.commit()
+
+
+def _write_batch(
+    conn: sqlite3.Connection,
+    spec: TableSpec,
+    rows: List[Tuple[Any, ...]],
+    *,
+    source: str,
+    next_offset: int,
+    total_rows: int,
+) -> None:
+    staging = _staging_name(spec.table)
+    columns = ", ".join(spec.columns)
+    placeholders = ", ".join("?" for _ in spec.columns)
+    try:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {staging} ({columns}) VALUES ({placeholders})",
+            rows,
+        )
+        conn.execute(
+            f"INSERT OR REPLACE INTO {CHECKPOINT_TABLE} "
+            "(target_table, source, next_offset, rows, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (spec.table, source, next_offset, total_rows, time.time()),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def swap_staging(conn: sqlite3.Connection, table: str) -> None:
+    """Atomically replace ``table`` with its staging copy."""
+
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {_staging_name(table)} RENAME TO {table}")
+        conn.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE target_table = ?", (table,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def load_pages(
+    conn: sqlite3.Connection,
+    spec: TableSpec,
+    pages: Callable[[int], Iterable[Page]],
+    *,
+    label: str,
+    source: str,
+    append: bool = False,
+    resume: bool = True,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> IngestStats:
+    """Stream ``pages`` into ``spec.table`` via a staging table.
+
+    ``pages`` is called with the offset to start from so interrupted loads
+    continue from their last committed page.
+    """
+
+    ensure_checkpoint_table(conn)
+    stats = IngestStats(label=label, source=source)
+    checkpoint = load_checkpoint(conn, spec.table, source) if resume else None
+    if checkpoint is not None:
+        stats.resumed_from, stats.rows = checkpoint
+        LOGGER.info("Resuming %s load from offset %d (%d rows staged)", label, *checkpoint)
+    else:
+        _create_staging(conn, spec.table, append=append)
+
+    started = time.perf_counter()
+    loaded_at = datetime.now(timezone.utc).isoformat()
+    buffer: List[Tuple[Any, ...]] = []
+    fields: Optional[FieldMap] = None
+    next_offset = stats.resumed_from
+
+    def flush() -> None:
+        if not buffer:
+            return
+        _write_batch(
+            conn,
+            spec,
+            buffer,
+            source=source,
+            next_offset=next_offset,
+            total_rows=stats.rows,
+        )
+        stats.batches += 1
+        buffer.clear()
+
+    for page in pages(stats.resumed_from):
+        if fields is None and page.records:
+            fields = resolve_field_map(page.records[0].keys(), spec.fields)
+            stats.fields = fields
+            LOGGER.debug("Resolved %s columns: %s", label, fields)
+        for record in page.records:
+            transformed = spec.transformer(record, fields or {})
+            if transformed is None:
+                stats.skipped += 1
+                continue
+            buffer.append(spec.to_row(*transformed) + (loaded_at,))
+            stats.rows += 1
+        stats.pages += 1
+        next_offset = page.next_offset
+        if len(buffer) >= batch_size:
+            flush()
+    flush()
+
+    if stats.rows == 0:
+        LOGGER.warning("No %s records were ingested from %s", label, source)
+        conn.execute(f"DROP TABLE IF EXISTS {_staging_name(spec.table)}")
+        conn.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE target_table = ?", (spec.table,))
+        conn.commit()
+    else:
+        swap_staging(conn, spec.table)
+    stats.elapsed = time.perf_counter() - started
+    LOGGER.info(
+        "Loaded %d %s rows (%d skipped) from %s in %.2fs: %d pages, %d batches, %.0f rows/s",
+        stats.rows,
+        label,
+        stats.skipped,
+        source,
+        stats.elapsed,
+        stats.pages,
+        stats.batches,
+        stats.rows_per_second,
+    )
+    return stats
 
 
 def ingest_dataset(
     conn: sqlite3.Connection,
     *,
-    dataset_id: Optional[str],
-    transformer: Transformer,
-    seeder: Seeder,
+    spec: TableSpec,
     label: str,
-    app_token: Optional[str],
-    limit: Optional[int],
-    page_size: int,
-    overwrite: bool,
+    dataset_id: Optional[str] = None,
+    dataset_file: Optional[str] = None,
+    app_token: Optional[str] = None,
+    limit: Optional[int] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    append: bool = False,
+    resume: bool = True,
 ) -> int:
-    if not dataset_id:
+    if dataset_file:
+        source = f"file:{Path(dataset_file).resolve()}"
+
+        def pages(start: int) -> Iterable[Page]:
+            return read_recorded_pages(
+                dataset_file, page_size=page_size, limit=limit, start_offset=start
+            )
+
+    elif dataset_id:
+        source = f"cms:{dataset_id}"
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max(1, concurrency))
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        def pages(start: int) -> Iterable[Page]:
+            return fetch_cms_pages(
+                dataset_id,
+                session=session,
+                app_token=app_token,
+                page_size=page_size,
+                limit=limit,
+                start_offset=start,
+                concurrency=concurrency,
+            )
+
+    else:
         LOGGER.info("Skipping %s ingestion – no dataset ID provided", label)
         return 0
 
-    session = requests.Session()
     try:
-        rows: list[Tuple[str, Dict[str, Any]]] = []
-        for raw in fetch_cms_dataset(
-            dataset_id,
-            session=session,
-            app_token=app_token,
-            page_size=page_size,
-            limit=limit,
-        ):
-            transformed = transformer(raw)
-            if transformed is None:
-                continue
-            code, info = transformed
-            if not code:
-                continue
-            rows.append((code, info))
-        if not rows:
-            LOGGER.warning("No %s records were ingested from dataset %s", label, dataset_id)
-            return 0
-        with migrations.session_scope(conn) as orm_session:
-            seeder(orm_session, rows, overwrite)
-        LOGGER.info("Upserted %d %s rows", len(rows), label)
-        return len(rows)
+        stats = load_pages(
+            conn,
+            spec,
+            pages,
+            label=label,
+            source=source,
+            append=append,
+            resume=resume,
+            batch_size=batch_size,
+        )
+        return stats.rows
     except Exception as exc:  # pragma: no cover - network failure
-        LOGGER.exception("Failed to ingest %s dataset %s: %s", label, dataset_id, exc)
+        LOGGER.exception("Failed to ingest %s from %s: %s", label, source, exc)
         return 0
     finally:
-        session.close()
+        if dataset_id and not dataset_file:
+            session.close()
 
 
 def run_ingestion(conn: sqlite3.Connection, args: argparse.Namespace) -> Dict[str, int]:
     totals: Dict[str, int] = {}
-    overwrite = not args.append
-    totals["cpt"] = ingest_dataset(
-        conn,
-        dataset_id=args.cpt_dataset,
-        transformer=_transform_cpt,
-        seeder=lambda s, data, flag: migrations.seed_cpt_codes(s, data, overwrite=flag),
-        label="CPT/HCPCS",
-        app_token=args.app_token,
-        limit=args.limit,
-        page_size=args.page_size,
-        overwrite=overwrite,
-    )
-    conn.commit()
-
-    totals["icd10"] = ingest_dataset(
-        conn,
-        dataset_id=args.icd_dataset,
-        transformer=_transform_icd,
-        seeder=lambda s, data, flag: migrations.seed_icd10_codes(s, data, overwrite=flag),
-        label="ICD-10",
-        app_token=args.app_token,
-        limit=args.limit,
-        page_size=args.page_size,
-        overwrite=overwrite,
-    )
-    conn.commit()
-
-    totals["hcpcs"] = ingest_dataset(
-        conn,
-        dataset_id=args.hcpcs_dataset,
-        transformer=_transform_hcpcs,
-        seeder=lambda s, data, flag: migrations.seed_hcpcs_codes(s, data, overwrite=flag),
-        label="HCPCS",
-        app_token=args.app_token,
-        limit=args.limit,
-        page_size=args.page_size,
-        overwrite=overwrite,
+    jobs = (
+        ("cpt", CPT_TABLE, "CPT/HCPCS", args.cpt_dataset, args.cpt_file),
+        ("icd10", ICD10_TABLE, "ICD-10", args.icd_dataset, args.icd_file),
+        ("hcpcs", HCPCS_TABLE, "HCPCS", args.hcpcs_dataset, args.hcpcs_file),
     )
-    conn.commit()
-
+    for key, spec, label, dataset_id, dataset_file in jobs:
+        totals[key] = ingest_dataset(
+            conn,
+            spec=spec,
+            label=label,
+            dataset_id=dataset_id,
+            dataset_file=dataset_file,
+            app_token=args.app_token,
+            limit=args.limit,
+            page_size=args.page_size,
+            concurrency=args.concurrency,
+            batch_size=args.batch_size,
+            append=args.append,
+            resume=not args.no_resume,
+        )
     return totals
 
 
 def ensure_tables(conn: sqlite3.Connection) -> None:
     migrations.create_all_tables(conn)
     conn.commit()
+    ensure_checkpoint_table(conn)
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -300,11 +762,17 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument("--cpt-dataset", default=os.environ.get("CMS_PFS_DATASET_ID"), help="CMS dataset ID for CPT/HCPCS pricing data.")
     parser.add_argument("--icd-dataset", default=os.environ.get("CMS_ICD10_DATASET_ID"), help="CMS dataset ID for ICD-10 codes.")
     parser.add_argument("--hcpcs-dataset", default=os.environ.get("CMS_HCPCS_DATASET_ID"), help="CMS dataset ID for HCPCS metadata.")
+    parser.add_argument("--cpt-file", default=None, help="Recorded CPT/HCPCS pricing dataset to load instead of the API.")
+    parser.add_argument("--icd-file", default=None, help="Recorded ICD-10 dataset to load instead of the API.")
+    parser.add_argument("--hcpcs-file", default=None, help="Recorded HCPCS dataset to load instead of the API.")
     parser.add_argument("--app-token", default=os.environ.get("CMS_APP_TOKEN"), help="CMS API app token (optional but recommended).")
     parser.add_argument("--limit", type=int, default=None, help="Limit the number of rows ingested from each dataset (for testing).")
     parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Number of records to request per API call.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Maximum number of page requests in flight.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows written per staging transaction.")
     parser.add_argument("--interval", type=int, default=0, help="Repeat ingestion every N minutes (0 to run once).")
     parser.add_argument("--append", action="store_true", help="Append to existing tables instead of overwriting them.")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore checkpoints from interrupted runs and start over.")
     parser.add_argument("--log-level", default="INFO", help="Logging level (default: INFO).")
     return parser
 
@@ -0,0 +1,937 @@
+#!/usr/bin/env python3
+"""Simulate a clinic day against the API and report per-route latency.
+
+Usage::
+
+    # Boot the app in-process on a throwaway database, backed by a fake LLM
+    python scripts/load_test.py run --users 20 --duration 120 --output load.json
+
+    # Drive a running deployment with an existing clinician account
+    python scripts/load_test.py run --base-url http://localhost:8000 \
+        --username loadtest --password secret --users 10 --iterations 5
+
+    # Serve only the fake OpenAI-compatible endpoint
+    python scripts/load_test.py fake-llm --port 8081 --median-ms 800 --p95-ms 2500
+
+Every virtual user repeats one scripted encounter: log in, open a visit
+session, create a note and type into it with auto-save and ``/suggest``
+gating, upload a chart, stream audio to ``/api/transcribe/stream``, compose,
+finalize and download the PDF.  Users run concurrently with randomised think
+time between keystrokes.
+
+The fake LLM answers ``/v1/chat/completions`` and ``/v1/embeddings`` after a
+log-normal delay fitted to ``--median-ms``/``--p95-ms`` and reports token
+usage of roughly four characters per token, so the token and cost metrics
+move as they would against the real API.
+
+The report lists p50/p95/p99 latency and the error rate per route.  In
+in-process mode it also includes event-loop lag sampled on the server loop
+and the change in server-side histograms (see :data:`SERVER_METRICS`) over the
+run; the server's own loop-lag histogram makes lag visible in ``--base-url``
+mode as well.  Pass ``--output`` to keep the JSON report for run-to-run
+comparison.
+
+The audio step needs the optional ``websockets`` package, both to connect and
+for uvicorn to serve websockets; it is skipped when the package is missing.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+try:  # pragma: no cover - optional dependency
+    import websockets
+except ImportError:  # pragma: no cover - optional dependency
+    websockets = None  # type: ignore[assignment]
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Histograms whose ``_sum``/``_count`` deltas are reported after a run.
+SERVER_METRICS = (
+    "revenuepilot_request_latency_seconds",
+    "revenuepilot_event_loop_lag_seconds",
+    "revenuepilot_db_pool_wait_seconds",
+    "revenuepilot_db_query_seconds",
+    "revenuepilot_db_time_per_request_seconds",
+    "revenuepilot_compose_run_seconds",
+    "revenuepilot_compose_queue_wait_seconds",
+)
+
+_Z_95 = 1.6448536269514722
+
+_NOTE_SENTENCES = [
+    "Patient presents for follow-up of type 2 diabetes and hypertension.",
+    "Reports good adherence to metformin 500 mg twice daily.",
+    "Denies chest pain, shortness of breath or palpitations.",
+    "Blood pressure 138/86, heart rate 74, BMI 31.",
+    "Hemoglobin A1c 7.4 percent, down from 8.1 three months ago.",
+    "Foot exam normal, monofilament sensation intact bilaterally.",
+    "Assessment: diabetes improving, hypertension above goal.",
+    "Plan: increase lisinopril to 20 mg daily and recheck in three months.",
+    "Counselled on diet and exercise; referred to nutrition.",
+    "Due for retinal exam and pneumococcal vaccination.",
+]
+
+_CHART_TEXT = (
+    "Problem list: type 2 diabetes mellitus, essential hypertension, hyperlipidemia.\n"
+    "Medications: metformin 500 mg BID, lisinopril 10 mg daily, atorvastatin 40 mg.\n"
+    "Allergies: penicillin (rash).\n"
+    "Labs 2025-08-12: Hemoglobin A1c 7.4 %, creatinine 1.1 mg/dL, LDL 118 mg/dL.\n"
+)
+
+
+# ---------------------------------------------------------------------------
+# Fake OpenAI-compatible server
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class LatencyModel:
+    """Log-normal response delay with the given median and 95th percentile."""
+
+    median_ms: float = 800.0
+    p95_ms: float = 2500.0
+    error_rate: float = 0.0
+
+    @property
+    def sigma(self) -> float:
+        if self.median_ms <= 0 or self.p95_ms <= self.median_ms:
+            return 0.0
+        return math.log(self.p95_ms / self.median_ms) / _Z_95
+
+    def sample(self, rng: random.Random) -> float:
+        """Return one delay in seconds."""
+
+        if self.median_ms <= 0:
+            return 0.0
+        return rng.lognormvariate(math.log(self.median_ms / 1000.0), self.sigma)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _fake_completion(messages: Sequence[Dict[str, Any]]) -> str:
+    joined = "\n".join(str(message.get("content") or "") for message in messages)
+    if "json" in joined.lower():
+        return json.dumps(
+            {
+                "codes": [
+                    {"code": "99213", "rationale": "Established patient visit", "confidence": 0.82},
+                    {"code": "E11.9", "rationale": "Type 2 diabetes", "confidence": 0.77},
+                ],
+                "compliance": ["Document time spent counselling"],
+                "publicHealth": [{"recommendation": "Pneumococcal vaccination", "reason": "Age"}],
+                "differentials": [{"diagnosis": "Essential hypertension", "score": 0.6}],
+                "summary": "Follow-up of diabetes and hypertension; medication adjusted.",
+                "recommendations": ["Recheck HbA1c in three months"],
+                "warnings": [],
+            }
+        )
+    last = str(messages[-1].get("content") or "") if messages else ""
+    return last[:4000] or "Note reviewed."
+
+
+def _fake_embedding(text: str, dims: int) -> List[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    vector = [rng.gauss(0.0, 1.0) for _ in range(dims)]
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def create_fake_llm_app(
+    latency: Optional[LatencyModel] = None,
+    *,
+    embedding_dims: int = 1536,
+    seed: Optional[int] = None,
+) -> FastAPI:
+    """Return an ASGI app mimicking the OpenAI chat and embedding endpoints."""
+
+    latency = latency or LatencyModel()
+    rng = random.Random(seed)
+    app = FastAPI(title="Fake LLM")
+    app.state.requests = Counter()
+
+    async def _delay() -> Optional[JSONResponse]:
+        await asyncio.sleep(latency.sample(rng))
+        if latency.error_rate and rng.random() < latency.error_rate:
+            return JSONResponse(
+                {"error": {"message": "Simulated upstream failure", "type": "server_error"}},
+                status_code=503,
+            )
+        return None
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        app.state.requests["chat"] += 1
+        body = await request.json()
+        failure = await _delay()
+        if failure is not None:
+            return failure
+        messages = body.get("messages") or []
+        content = _fake_completion(messages)
+        prompt_tokens = sum(estimate_tokens(str(m.get("content") or "")) for m in messages)
+        completion_tokens = estimate_tokens(content)
+        return {
+            "id": f"chatcmpl-fake-{app.state.requests['chat']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        app.state.requests["embeddings"] += 1
+        body = await request.json()
+        failure = await _delay()
+        if failure is not None:
+            return failure
+        inputs = body.get("input") or []
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        tokens = sum(estimate_tokens(str(text)) for text in inputs)
+        return {
+            "object": "list",
+            "data": [
+                {"object": "embedding", "index": index, "embedding": _fake_embedding(str(text), embedding_dims)}
+                for index, text in enumerate(inputs)
+            ],
+            "model": body.get("model", "fake"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "fake", "object": "model"}]}
+
+    return app
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Linearly interpolated percentile ``q`` (0-100) of ``values``."""
+
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return ordered[low]
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _distribution(values: Sequence[float]) -> Dict[str, float]:
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0,
+    }
+
+
+@dataclass
+class RouteStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    statuses: Counter = field(default_factory=Counter)
+
+
+class Recorder:
+    """Collect latency samples and outcomes per route label."""
+
+    def __init__(self) -> None:
+        self._routes: Dict[str, RouteStats] = {}
+
+    def record(
+        self, route: str, seconds: float, status: Optional[int | str], error: bool
+    ) -> None:
+        stats = self._routes.setdefault(route, RouteStats())
+        stats.latencies.append(seconds)
+        stats.statuses[str(status) if status is not None else "exception"] += 1
+        if error:
+            stats.errors += 1
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        report: Dict[str, Dict[str, Any]] = {}
+        for route, stats in sorted(self._routes.items()):
+            count = len(stats.latencies)
+            report[route] = {
+                "count": count,
+                "errors": stats.errors,
+                "errorRate": stats.errors / count if count else 0.0,
+                "statuses": dict(stats.statuses),
+                **{f"{key}Ms": value * 1000 for key, value in _distribution(stats.latencies).items()},
+            }
+        return report
+
+
+class LoopLagProbe:
+    """Sample how late ``asyncio.sleep`` wakes up on the loop it runs on."""
+
+    def __init__(self, interval: float = 0.05) -> None:
+        self.interval = interval
+        self.samples: List[float] = []
+        self._stopped = False
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while not self._stopped:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def stop(self) -> None:
+        self._stopped = True
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "samples": len(self.samples),
+            **{f"{key}Ms": value * 1000 for key, value in _distribution(self.samples).items()},
+        }
+
+
+def parse_histograms(text: str, names: Iterable[str]) -> Dict[str, Dict[str, float]]:
+    """Total the ``_sum`` and ``_count`` series of each histogram in ``names``."""
+
+    wanted = set(names)
+    totals: Dict[str, Dict[str, float]] = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        series, _, value = line.rpartition(" ")
+        metric = series.split("{", 1)[0]
+        for suffix in ("_sum", "_count"):
+            if metric.endswith(suffix) and metric[: -len(suffix)] in wanted:
+                entry = totals.setdefault(metric[: -len(suffix)], {"sum": 0.0, "count": 0.0})
+                try:
+                    entry[suffix[1:]] += float(value)
+                except ValueError:
+                    pass
+    return totals
+
+
+def _metric_deltas(
+    before: Dict[str, Dict[str, float]], after: Dict[str, Dict[str, float]]
+) -> Dict[str, Dict[str, float]]:
+    deltas: Dict[str, Dict[str, float]] = {}
+    for name, totals in after.items():
+        previous = before.get(name, {"sum": 0.0, "count": 0.0})
+        count = totals["count"] - previous["count"]
+        total = totals["sum"] - previous["sum"]
+        deltas[name] = {
+            "count": count,
+            "sumSeconds": total,
+            "meanMs": total / count * 1000 if count else 0.0,
+        }
+    return deltas
+
+
+# ---------------------------------------------------------------------------
+# Journeys
+# ---------------------------------------------------------------------------
+
+
+def _unwrap(payload: Any) -> Any:
+    if isinstance(payload, dict) and isinstance(payload.get("data"), dict):
+        return payload["data"]
+    return payload
+
+
+@dataclass
+class JourneyOptions:
+    typing_steps: int = 8
+    think_time: float = 2.0
+    audio_chunks: int = 10
+    compose_timeout: float = 60.0
+
+
+@dataclass
+class VirtualUser:
+    index: int
+    client: httpx.AsyncClient
+    recorder: Recorder
+    username: str
+    password: str
+    options: JourneyOptions
+    rng: random.Random
+    token: Optional[str] = None
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"} if self.token else {}
+
+    async def call(
+        self, route: str, method: str, url: str, *, expected: Sequence[int] = (), **kwargs: Any
+    ) -> Optional[Any]:
+        """Issue one request, record it under ``route`` and return the body.
+
+        Statuses listed in ``expected`` (such as gate blocks) are not counted
+        as errors but still return ``None``.
+        """
+
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.record(route, time.perf_counter() - start, None, True)
+            return None
+        elapsed = time.perf_counter() - start
+        failed = response.status_code >= 400
+        self.recorder.record(
+            route, elapsed, response.status_code, failed and response.status_code not in expected
+        )
+        if failed:
+            return None
+        if not response.headers.get("content-type", "").startswith("application/json"):
+            return response.content
+        return _unwrap(response.json())
+
+    async def think(self) -> None:
+        if self.options.think_time > 0:
+            await asyncio.sleep(self.options.think_time * self.rng.uniform(0.5, 1.5))
+
+
+async def _login(user: VirtualUser) -> bool:
+    user.token = None
+    body = await user.call(
+        "POST /login", "POST", "/login", json={"username": user.username, "password": user.password}
+    )
+    if isinstance(body, dict):
+        user.token = body.get("access_token") or body.get("accessToken")
+    return bool(user.token)
+
+
+async def _type_note(user: VirtualUser, note_id: str) -> str:
+    content = ""
+    for _ in range(user.options.typing_steps):
+        await user.think()
+        content = f"{content} {user.rng.choice(_NOTE_SENTENCES)}".strip()
+        await user.call(
+            "POST /api/notes/auto-save",
+            "POST",
+            "/api/notes/auto-save",
+            json={"noteId": note_id, "content": content},
+        )
+        gate = await user.call(
+            "POST /api/notes/ai/gate",
+            "POST",
+            "/api/notes/ai/gate",
+            json={"noteId": note_id, "noteContent": content, "requestType": "auto"},
+        )
+        if isinstance(gate, dict) and gate.get("allowed"):
+            # ``/suggest`` applies its own meaningful-change gate and answers
+            # 409 when it declines to run; that is throttling, not failure.
+            await user.call(
+                "POST /suggest",
+                "POST",
+                "/suggest",
+                json={"text": content, "noteId": note_id},
+                expected=(409,),
+            )
+    return content
+
+
+async def _stream_audio(user: VirtualUser, ws_url: str) -> None:
+    if websockets is None:
+        return
+    route = "WS /api/transcribe/stream"
+    start = time.perf_counter()
+    first_interim: Optional[float] = None
+    try:
+        async with websockets.connect(f"{ws_url}/api/transcribe/stream?token={user.token}") as ws:
+            await ws.recv()  # connection handshake
+            chunk = bytes(3200)  # 100 ms of 16 kHz, 16-bit silence
+            for _ in range(user.options.audio_chunks):
+                await ws.send(chunk)
+                try:
+                    await asyncio.wait_for(ws.recv(), timeout=0.1)
+                except asyncio.TimeoutError:
+                    continue
+                if first_interim is None:
+                    first_interim = time.perf_counter() - start
+    except Exception:
+        user.recorder.record(route, time.perf_counter() - start, None, True)
+        return
+    user.recorder.record(route, time.perf_counter() - start, 101, False)
+    if first_interim is not None:
+        user.recorder.record(f"{route} (first interim)", first_interim, 101, False)
+
+
+async def _compose(user: VirtualUser, encounter_id: str, patient_id: str, content: str) -> None:
+    session = await user.call(
+        "POST /api/v1/workflow/sessions",
+        "POST",
+        "/api/v1/workflow/sessions",
+        json={"encounterId": encounter_id, "patientId": patient_id, "noteContent": content},
+    )
+    if not isinstance(session, dict) or not session.get("sessionId"):
+        return
+    start = time.perf_counter()
+    job = await user.call(
+        "POST /api/compose/start",
+        "POST",
+        "/api/compose/start",
+        json={
+            "sessionId": session["sessionId"],
+            "encounterId": encounter_id,
+            "noteContent": content,
+            "patientMetadata": {"age": 64, "sex": "F"},
+            "selectedCodes": [{"code": "99213", "category": "procedure"}],
+        },
+    )
+    if not isinstance(job, dict) or not job.get("composeId"):
+        return
+    status = job.get("status")
+    deadline = start + user.options.compose_timeout
+    while status in {"queued", "in_progress"} and time.perf_counter() < deadline:
+        await asyncio.sleep(0.5)
+        polled = await user.call(
+            "GET /api/compose/{composeId}", "GET", f"/api/compose/{job['composeId']}"
+        )
+        if isinstance(polled, dict):
+            status = polled.get("status")
+    user.recorder.record(
+        "compose (end-to-end)",
+        time.perf_counter() - start,
+        status or "timeout",
+        status not in {"completed", "blocked"},
+    )
+
+
+async def clinic_journey(user: VirtualUser, iteration: int, ws_url: Optional[str]) -> None:
+    """Run one encounter from login to PDF download."""
+
+    if not await _login(user):
+        return
+    encounter_number = 100000 + user.index * 10000 + iteration
+    encounter_id = str(encounter_number)
+    patient_id = f"lt-{user.index}-{iteration}"
+
+    visit = await user.call(
+        "POST /api/visits/session",
+        "POST",
+        "/api/visits/session",
+        json={"encounterId": encounter_number, "patientId": patient_id},
+    )
+    note = await user.call(
+        "POST /api/notes/create",
+        "POST",
+        "/api/notes/create",
+        json={"patientId": patient_id, "encounterId": encounter_id, "content": ""},
+    )
+    if not isinstance(note, dict) or not note.get("noteId"):
+        return
+    content = await _type_note(user, str(note["noteId"]))
+
+    await user.call(
+        "POST /api/charts/upload",
+        "POST",
+        "/api/charts/upload",
+        params={"patient_id": patient_id},
+        files={"file": (f"chart-{patient_id}.txt", _CHART_TEXT.encode("utf-8"), "text/plain")},
+    )
+    if ws_url:
+        await _stream_audio(user, ws_url)
+    await _compose(user, encounter_id, patient_id, content)
+
+    finalized = await user.call(
+        "POST /api/notes/finalize",
+        "POST",
+        "/api/notes/finalize",
+        json={
+            "content": content,
+            "codes": ["99213"],
+            "diagnoses": ["E11.9", "I10"],
+            "prevention": ["Pneumococcal vaccination"],
+            "patientId": patient_id,
+        },
+    )
+    if isinstance(finalized, dict) and finalized.get("finalizedNoteId"):
+        await user.call(
+            "GET /api/notes/{id}/pdf",
+            "GET",
+            f"/api/notes/{finalized['finalizedNoteId']}/pdf",
+            params={"variant": "note", "patientId": patient_id},
+        )
+    if isinstance(visit, dict) and visit.get("sessionId"):
+        await user.call(
+            "PUT /api/visits/session",
+            "PUT",
+            "/api/visits/session",
+            json={"sessionId": visit["sessionId"], "action": "stop"},
+        )
+
+
+Journey = Callable[[VirtualUser, int, Optional[str]], Awaitable[None]]
+
+
+async def run_users(
+    base_url: str,
+    credentials: Sequence[tuple[str, str]],
+    *,
+    users: int,
+    duration: Optional[float],
+    iterations: Optional[int],
+    options: JourneyOptions,
+    journey: Journey = clinic_journey,
+    seed: int = 0,
+) -> tuple[Recorder, float]:
+    """Run ``users`` concurrent journeys until ``duration`` or ``iterations``."""
+
+    recorder = Recorder()
+    ws_url = base_url.replace("http", "ws", 1) if websockets is not None else None
+    deadline = time.perf_counter() + duration if duration else None
+    limits = httpx.Limits(max_connections=users * 2, max_keepalive_connections=users * 2)
+
+    async def worker(index: int, client: httpx.AsyncClient) -> None:
+        username, password = credentials[index % len(credentials)]
+        user = VirtualUser(
+            index, client, recorder, username, password, options, random.Random(seed + index)
+        )
+        iteration = 0
+        while iterations is None or iteration < iterations:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            await journey(user, iteration, ws_url)
+            iteration += 1
+
+    start = time.perf_counter()
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+        await asyncio.gather(*(worker(index, client) for index in range(users)))
+    return recorder, time.perf_counter() - start
+
+
+# ---------------------------------------------------------------------------
+# Servers
+# ---------------------------------------------------------------------------
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ServerThread(threading.Thread):
+    """Serve an ASGI app with uvicorn on a private event loop."""
+
+    def __init__(self, app: Any, port: int, *, probe: Optional[LoopLagProbe] = None) -> None:
+        super().__init__(daemon=True)
+        import uvicorn
+
+        self.port = port
+        self.probe = probe
+        self.server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on")
+        )
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def run(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        if self.probe is not None:
+            loop.create_task(self.probe.run())
+        try:
+            loop.run_until_complete(self.server.serve())
+        finally:
+            loop.close()
+
+    def start_and_wait(self, timeout: float = 60.0) -> None:
+        self.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if not self.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError(f"Server on port {self.port} failed to start")
+            time.sleep(0.05)
+
+    def stop(self) -> None:
+        if self.probe is not None:
+            self.probe.stop()
+        self.server.should_exit = True
+        self.join(timeout=30)
+
+
+def _prepare_in_process_env(workdir: Path, llm_url: str) -> None:
+    now = datetime.now(timezone.utc).isoformat()
+    os.environ.update(
+        {
+            "REVENUEPILOT_DATA_DIR": str(workdir),
+            "REVENUEPILOT_DB_PATH": str(workdir / "revenuepilot.db"),
+            "ANALYTICS_DB_PATH": str(workdir / "analytics.db"),
+            "CHART_UPLOAD_DIR": str(workdir / "uploads"),
+            "OPENAI_API_BASE": f"{llm_url}/v1",
+            "OPENAI_BASE_URL": f"{llm_url}/v1",
+        }
+    )
+    os.environ.pop("USE_OFFLINE_MODEL", None)
+    os.environ.pop("USE_LOCAL_MODELS", None)
+    defaults = {
+        "ENVIRONMENT": "development",
+        "JWT_SECRET": "load-test-secret",
+        "JWT_SECRET_ROTATED_AT": now,
+        "OPENAI_API_KEY": "sk-load-test-aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa",
+        "OPENAI_API_KEY_ROTATED_AT": now,
+    }
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+
+def _seed_users(main: Any, count: int) -> List[tuple[str, str]]:
+    from backend import auth
+
+    credentials = [(f"loadtest-{index}", "load-test-password") for index in range(count)]
+    with main.auth_session_scope() as session:
+        for username, password in credentials:
+            auth.register_user(session, username, password, "user")
+    return credentials
+
+
+def _prometheus_text() -> str:
+    from prometheus_client import REGISTRY, generate_latest
+
+    return generate_latest(REGISTRY).decode("utf-8")
+
+
+async def _scrape_metrics(base_url: str, credentials: tuple[str, str]) -> str:
+    """Return the Prometheus exposition of a remote server, or ``""``."""
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as client:
+        try:
+            login = await client.post(
+                "/login", json={"username": credentials[0], "password": credentials[1]}
+            )
+            token = _unwrap(login.json()).get("access_token")
+            response = await client.get(
+                "/metrics",
+                params={"format": "prometheus"},
+                headers={"Authorization": f"Bearer {token}"},
+            )
+        except (httpx.HTTPError, ValueError, AttributeError):
+            return ""
+    return response.text if response.status_code == 200 else ""
+
+
+def run_load_test(args: argparse.Namespace) -> Dict[str, Any]:
+    options = JourneyOptions(
+        typing_steps=args.typing_steps,
+        think_time=args.think_time,
+        audio_chunks=args.audio_chunks,
+        compose_timeout=args.compose_timeout,
+    )
+    iterations = args.iterations if args.iterations else None
+    duration = args.duration if not iterations else None
+    report: Dict[str, Any] = {
+        "generatedAt": datetime.now(timezone.utc).isoformat(),
+        "mode": "remote" if args.base_url else "in-process",
+        "users": args.users,
+        "options": vars(options),
+        "audioStep": websockets is not None,
+    }
+
+    if args.base_url:
+        credentials = [(args.username, args.password)]
+        before = parse_histograms(
+            asyncio.run(_scrape_metrics(args.base_url, credentials[0])), SERVER_METRICS
+        )
+        recorder, elapsed = asyncio.run(
+            run_users(
+                args.base_url,
+                credentials,
+                users=args.users,
+                duration=duration,
+                iterations=iterations,
+                options=options,
+                seed=args.seed,
+            )
+        )
+        after = parse_histograms(
+            asyncio.run(_scrape_metrics(args.base_url, credentials[0])), SERVER_METRICS
+        )
+    else:
+        workdir = Path(tempfile.mkdtemp(prefix="revenuepilot-load-"))
+        llm = ServerThread(
+            create_fake_llm_app(
+                LatencyModel(args.median_ms, args.p95_ms, args.llm_error_rate), seed=args.seed
+            ),
+            _free_port(),
+        )
+        llm.start_and_wait()
+        _prepare_in_process_env(workdir, llm.url)
+        sys.path.insert(0, str(ROOT))
+        from backend import main
+
+        credentials = _seed_users(main, args.users)
+        probe = LoopLagProbe(args.lag_interval)
+        app_server = ServerThread(main.app, _free_port(), probe=probe)
+        app_server.start_and_wait()
+        before = parse_histograms(_prometheus_text(), SERVER_METRICS)
+        try:
+            recorder, elapsed = asyncio.run(
+                run_users(
+                    app_server.url,
+                    credentials,
+                    users=args.users,
+                    duration=duration,
+                    iterations=iterations,
+                    options=options,
+                    seed=args.seed,
+                )
+            )
+        finally:
+            after = parse_histograms(_prometheus_text(), SERVER_METRICS)
+            app_server.stop()
+            llm.stop()
+        report["eventLoopLag"] = probe.summary()
+        report["workdir"] = str(workdir)
+
+    routes = recorder.summary()
+    total = sum(entry["count"] for entry in routes.values())
+    errors = sum(entry["errors"] for entry in routes.values())
+    report.update(
+        {
+            "elapsedSeconds": elapsed,
+            "requests": total,
+            "throughputPerSecond": total / elapsed if elapsed else 0.0,
+            "errorRate": errors / total if total else 0.0,
+            "routes": routes,
+            "serverMetrics": _metric_deltas(before, after),
+        }
+    )
+    return report
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"{report['mode']} run: {report['users']} users, {report['requests']} requests "
+        f"in {report['elapsedSeconds']:.1f}s ({report['throughputPerSecond']:.1f} req/s), "
+        f"error rate {report['errorRate']:.2%}",
+        "",
+        f"{'route':<42} {'count':>6} {'err%':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}",
+    ]
+    for route, entry in report["routes"].items():
+        lines.append(
+            f"{route:<42} {entry['count']:>6} {entry['errorRate']:>6.1%} "
+            f"{entry['p50Ms']:>9.1f} {entry['p95Ms']:>9.1f} {entry['p99Ms']:>9.1f}"
+        )
+    lag = report.get("eventLoopLag")
+    if lag:
+        lines += [
+            "",
+            f"event-loop lag: p50 {lag['p50Ms']:.1f} ms, p95 {lag['p95Ms']:.1f} ms, "
+            f"p99 {lag['p99Ms']:.1f} ms, max {lag['maxMs']:.1f} ms",
+        ]
+    if report["serverMetrics"]:
+        lines.append("")
+        for name, delta in report["serverMetrics"].items():
+            lines.append(
+                f"{name}: {delta['sumSeconds']:.3f}s over {int(delta['count'])} observations "
+                f"(mean {delta['meanMs']:.2f} ms)"
+            )
+    if not report["audioStep"]:
+        lines += ["", "audio streaming skipped: install 'websockets' to enable it"]
+    return "\n".join(lines)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="RevenuePilot load-test harness")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_llm_options(sub: argparse.ArgumentParser) -> None:
+        sub.add_argument("--median-ms", type=float, default=800.0, help="Fake LLM median latency")
+        sub.add_argument("--p95-ms", type=float, default=2500.0, help="Fake LLM p95 latency")
+        sub.add_argument(
+            "--llm-error-rate", type=float, default=0.0, help="Fraction of LLM calls that fail"
+        )
+        sub.add_argument("--seed", type=int, default=0)
+
+    run = commands.add_parser("run", help="Run the clinic-day journeys")
+    run.add_argument("--base-url", help="Target a running server instead of booting one")
+    run.add_argument("--username", default="loadtest", help="Account used with --base-url")
+    run.add_argument("--password", default="", help="Password used with --base-url")
+    run.add_argument("--users", type=int, default=10, help="Concurrent virtual users")
+    run.add_argument("--duration", type=float, default=60.0, help="Run time in seconds")
+    run.add_argument(
+        "--iterations", type=int, default=0, help="Encounters per user; overrides --duration"
+    )
+    run.add_argument("--typing-steps", type=int, default=8, help="Auto-saves per note")
+    run.add_argument("--think-time", type=float, default=2.0, help="Mean pause between edits")
+    run.add_argument("--audio-chunks", type=int, default=10, help="100 ms audio frames per visit")
+    run.add_argument("--compose-timeout", type=float, default=60.0)
+    run.add_argument("--lag-interval", type=float, default=0.05, help="Loop lag sample period")
+    run.add_argument("--output", type=Path, help="Write the JSON report here")
+    add_llm_options(run)
+
+    fake = commands.add_parser("fake-llm", help="Serve only the fake OpenAI-compatible API")
+    fake.add_argument("--port", type=int, default=8081)
+    fake.add_argument("--embedding-dims", type=int, default=1536)
+    add_llm_options(fake)
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if args.command == "fake-llm":
+        import uvicorn
+
+        app = create_fake_llm_app(
+            LatencyModel(args.median_ms, args.p95_ms, args.llm_error_rate),
+            embedding_dims=args.embedding_dims,
+            seed=args.seed,
+        )
+        uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+        return 0
+
+    report = run_load_test(args)
+    print(format_report(report))
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    return 1 if report["requests"] == 0 else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
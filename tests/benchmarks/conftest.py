@@ -0,0 +1,181 @@
+"""Fixtures and regression budgets for the hot-path benchmark suite.
+
+The suite is skipped by default.  Run it with::
+
+    RUN_BENCHMARKS=1 pytest tests/benchmarks --no-cov
+
+Benchmarks are ``pytest-benchmark`` runs over fixed synthetic corpora, with
+``USE_OFFLINE_MODEL`` and the hashing embedder, so they never touch the
+network.  Each run writes the median, mean and minimum timings to
+``BENCHMARK_RESULTS`` (default ``.benchmarks/results.json``).  A benchmark
+fails when its median exceeds the median stored in ``BENCHMARK_BASELINE``
+(default ``tests/benchmarks/baseline.json``) by more than
+``BENCHMARK_MAX_REGRESSION``, a fraction that defaults to ``0.5``.  Set
+``BENCHMARK_UPDATE_BASELINE=1`` to rewrite the baseline from the current
+run.  Baselines are machine-specific, so regenerate them on the machine
+that enforces the budgets.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import random
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import pytest
+
+os.environ.setdefault("USE_OFFLINE_MODEL", "1")
+
+pytest.importorskip("pytest_benchmark")
+
+from backend import main  # noqa: E402
+from backend.migrations import create_all_tables  # noqa: E402
+
+_BENCH_DIR = Path(__file__).parent
+_RESULTS: Dict[str, Dict[str, float]] = {}
+
+_PROBLEMS = [
+    "Type 2 diabetes mellitus without complications",
+    "Essential hypertension",
+    "Hyperlipidemia",
+    "Chronic kidney disease stage 3",
+    "Major depressive disorder, recurrent",
+    "Asthma, mild persistent",
+    "Gastroesophageal reflux disease",
+    "Osteoarthritis of the knee",
+]
+_MEDICATIONS = [
+    "Metformin 500 mg BID",
+    "Lisinopril 10 mg daily",
+    "Atorvastatin 40 mg nightly",
+    "Sertraline 50 mg daily",
+    "Albuterol 90 mcg inhaler PRN",
+    "Omeprazole 20 mg daily",
+]
+_LABS = [
+    "Hemoglobin A1c 7.4 % on 2025-08-12",
+    "Creatinine 1.3 mg/dL on 2025-08-12",
+    "LDL 118 mg/dL on 2025-07-30",
+    "Hemoglobin 12.9 g/dL on 2025-09-01",
+]
+
+
+def _max_regression() -> float:
+    try:
+        return float(os.getenv("BENCHMARK_MAX_REGRESSION", "0.5"))
+    except ValueError:
+        return 0.5
+
+
+def _baseline_path() -> Path:
+    return Path(os.getenv("BENCHMARK_BASELINE", str(_BENCH_DIR / "baseline.json")))
+
+
+def _load_baseline() -> Dict[str, Dict[str, float]]:
+    path = _baseline_path()
+    if not path.exists():
+        return {}
+    with path.open(encoding="utf-8") as handle:
+        return json.load(handle).get("benchmarks", {})
+
+
+def build_note(seed: int, paragraphs: int = 6) -> str:
+    """Return a deterministic synthetic clinical note."""
+
+    rng = random.Random(seed)
+    lines = [
+        f"Patient John Doe, DOB 01/0{1 + seed % 9}/1961, MRN {100000 + seed}, "
+        f"phone 555-01{seed % 100:02d}, seen at 12 Main Street.",
+        "Chief Complaint: follow-up of chronic conditions.",
+        "History of Present Illness:",
+    ]
+    for _ in range(paragraphs):
+        lines.append(
+            f"Patient reports {rng.choice(['improved', 'stable', 'worsening'])} "
+            f"symptoms related to {rng.choice(_PROBLEMS).lower()}. "
+            f"Adherent to {rng.choice(_MEDICATIONS)}. Denies chest pain or dyspnea. "
+            f"BP {rng.randint(110, 160)}/{rng.randint(70, 95)}, HR {rng.randint(55, 100)}."
+        )
+    lines.append("Assessment:")
+    lines.extend(f"- {problem}" for problem in rng.sample(_PROBLEMS, 3))
+    lines.append("Medications:")
+    lines.extend(f"- {med}" for med in rng.sample(_MEDICATIONS, 3))
+    lines.append("Labs:")
+    lines.extend(f"- {lab}" for lab in rng.sample(_LABS, 2))
+    lines.append("Allergies: Penicillin (rash).")
+    lines.append("Plan: continue current therapy, recheck labs in 3 months.")
+    return "\n".join(lines)
+
+
+@pytest.fixture(scope="session")
+def note_corpus() -> List[str]:
+    return [build_note(seed) for seed in range(20)]
+
+
+@pytest.fixture
+def core_db(monkeypatch) -> sqlite3.Connection:
+    """In-memory database with the full schema, installed as ``main.db_conn``."""
+
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    main._init_core_tables(conn)
+    create_all_tables(conn)
+    conn.execute(
+        "INSERT OR IGNORE INTO users (username, password_hash, role) VALUES (?, ?, ?)",
+        ("bench", "pw", "user"),
+    )
+    conn.commit()
+    monkeypatch.setattr(main, "db_conn", conn)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def bench(benchmark, request) -> Callable[..., Any]:
+    """Run ``benchmark(fn, *args)`` and enforce the baseline budget."""
+
+    def run(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        result = benchmark(fn, *args, **kwargs)
+        if benchmark.disabled or benchmark.stats is None:
+            return result
+        stats = benchmark.stats.stats
+        name = request.node.name
+        _RESULTS[name] = {
+            "median": stats.median,
+            "mean": stats.mean,
+            "min": stats.min,
+            "rounds": stats.rounds,
+        }
+        if os.getenv("BENCHMARK_UPDATE_BASELINE") == "1":
+            return result
+        baseline = _load_baseline().get(name)
+        if baseline:
+            budget = baseline["median"] * (1 + _max_regression())
+            if stats.median > budget:
+                pytest.fail(
+                    f"{name}: median {stats.median * 1e3:.3f} ms exceeds budget "
+                    f"{budget * 1e3:.3f} ms (baseline {baseline['median'] * 1e3:.3f} ms)"
+                )
+        return result
+
+    return run
+
+
+def pytest_sessionfinish(session: pytest.Session, exitstatus: int) -> None:
+    if not _RESULTS:
+        return
+    payload = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "benchmarks": dict(sorted(_RESULTS.items())),
+    }
+    results_path = Path(os.getenv("BENCHMARK_RESULTS", ".benchmarks/results.json"))
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    results_path.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
+    if os.getenv("BENCHMARK_UPDATE_BASELINE") == "1":
+        baseline = {"benchmarks": {**_load_baseline(), **payload["benchmarks"]}}
+        baseline["benchmarks"] = dict(sorted(baseline["benchmarks"].items()))
+        _baseline_path().write_text(json.dumps(baseline, indent=2) + "\n", encoding="utf-8")
@@ -0,0 +1,67 @@
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import main
+
+_EVENT_COUNT = 5000
+
+
+@pytest.fixture
+def analytics_client(core_db):
+    rng = random.Random(7)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(_EVENT_COUNT):
+        event_type = rng.choice(["note_closed", "beautify", "suggest", "summary"])
+        code = rng.choice(["99212", "99213", "99214", "99215"])
+        details = {
+            "clinician": rng.choice(["alice", "bob", "carol"]),
+            "clinic": rng.choice(["north-clinic", "uptown-clinic"]),
+            "payer": rng.choice(["acme-health", "northcare"]),
+            "codes": [code],
+            "denial": rng.random() < 0.1,
+            "deficiency": rng.random() < 0.1,
+            "compliance": ["Missing ROS"] if rng.random() < 0.2 else [],
+            "timeToClose": rng.uniform(60, 900),
+        }
+        timestamp = (start + timedelta(minutes=37 * i)).timestamp()
+        rows.append(
+            (
+                event_type,
+                timestamp,
+                json.dumps(details),
+                rng.uniform(50, 250) if event_type == "note_closed" else None,
+                details["timeToClose"],
+                json.dumps([code]),
+                json.dumps(details["compliance"]),
+            )
+        )
+    core_db.executemany(
+        "INSERT INTO events (eventType, timestamp, details, revenue, time_to_close, codes, "
+        "compliance_flags) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    core_db.commit()
+    client = TestClient(main.app)
+    token = main.create_token("bench-admin", "admin")
+    client.headers["Authorization"] = f"Bearer {token}"
+    yield client
+    client.close()
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/api/analytics/usage",
+        "/api/analytics/coding-accuracy",
+        "/api/analytics/revenue",
+        "/api/analytics/compliance",
+    ],
+)
+def test_analytics_endpoint(bench, analytics_client, path):
+    response = bench(analytics_client.get, path)
+    assert response.status_code == 200
@@ -0,0 +1,106 @@
+import hashlib
+import itertools
+from datetime import datetime, timezone
+
+import pytest
+
+from backend import code_tables, compliance, deid, pdf_render
+from backend.clinical_parsing import ClinicalFactExtractor
+from backend.context_pipeline import UploadedChartFile
+
+
+def _chart_file(index: int, text: str) -> UploadedChartFile:
+    data = text.encode("utf-8")
+    return UploadedChartFile(
+        name=f"chart-{index}.txt",
+        mime="text/plain",
+        data=data,
+        text=text,
+        sha256=hashlib.sha256(data).hexdigest(),
+        doc_id=f"doc-{index}",
+        uploaded_at=datetime(2025, 9, 1, tzinfo=timezone.utc),
+    )
+
+
+@pytest.fixture
+def compliance_rules(core_db):
+    previous = compliance._engine
+    compliance.configure_engine(connection=core_db)
+    assert compliance.get_rules()
+    yield
+    if previous is not None:
+        compliance.configure_engine(engine=previous)
+
+
+def test_compliance_evaluate_note(bench, compliance_rules, note_corpus):
+    notes = itertools.cycle(note_corpus)
+    result = bench(lambda: compliance.evaluate_note(next(notes), {"payer": "medicare"}))
+    assert "issues" in result
+
+
+def test_clinical_fact_extractor(bench, note_corpus):
+    extractor = ClinicalFactExtractor()
+    files = [_chart_file(i, note) for i, note in enumerate(note_corpus)]
+    facts, _ = bench(extractor.extract, files)
+    assert facts["problems"]
+
+
+@pytest.mark.parametrize("engine", ["regex", "presidio", "philter", "scrubadub"])
+def test_deidentify(bench, note_corpus, engine):
+    available = {
+        "regex": True,
+        "presidio": deid._PRESIDIO_AVAILABLE,
+        "philter": deid._PHILTER_AVAILABLE,
+        "scrubadub": deid._SCRUBBER_AVAILABLE,
+    }
+    if not available[engine]:
+        pytest.skip(f"{engine} is not installed")
+    notes = itertools.cycle(note_corpus)
+    scrubbed = bench(lambda: deid.deidentify(next(notes), engine=engine))
+    assert scrubbed and "MRN" in scrubbed
+
+
+@pytest.mark.parametrize("scrub", ["spans", "sequential"])
+@pytest.mark.parametrize("size_kb", [10, 50, 100])
+def test_regex_scrub_throughput(bench, benchmark, note_corpus, size_kb, scrub):
+    # "sequential" is the pass-by-pass reference the span scan must match.
+    text = ""
+    for note in itertools.cycle(note_corpus):
+        if len(text) >= size_kb * 1000:
+            break
+        text += note + "\n\n"
+    benchmark.extra_info["bytes"] = len(text)
+    if scrub == "spans":
+        scrubbed = bench(deid._regex_scrub, text)
+    else:
+        scrubbed = bench(deid._sequential_scrub, text, True)
+    assert scrubbed == deid._sequential_scrub(text, True)
+
+
+def test_validate_combination(bench, core_db):
+    result = bench(
+        code_tables.validate_combination,
+        ["99213", "99214", "93000", "36415"],
+        ["E11.9", "I10", "E78.5", "Z00.00"],
+        age=64,
+        gender="female",
+        encounter_type="office",
+        session=core_db,
+    )
+    assert "conflicts" in result
+
+
+def test_calculate_billing(bench, core_db):
+    result = bench(
+        code_tables.calculate_billing,
+        ["99213", "99214", "93000", "36415"],
+        "medicare",
+        session=core_db,
+    )
+    assert result
+
+
+def test_render_pdf_from_text(bench, note_corpus):
+    text = "\n\n".join(note_corpus)
+    pdf = bench(pdf_render.render_pdf_from_text, text, "Benchmark note")
+    assert pdf.startswith(b"%PDF")
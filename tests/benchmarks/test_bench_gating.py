@@ -0,0 +1,63 @@
+import itertools
+
+import pytest
+
+from backend import main
+from backend.ai_gating import AIGateInput, AIGatingService, normalize_note_text
+from backend.openai_client import EmbeddingClient
+
+
+@pytest.fixture
+def offline_embedder(monkeypatch):
+    monkeypatch.setenv("USE_OFFLINE_MODEL", "1")
+    return EmbeddingClient(main.AI_EMBED_MODEL)
+
+
+def _clinician_id(conn) -> int:
+    return conn.execute("SELECT id FROM users WHERE username='bench'").fetchone()["id"]
+
+
+def test_ai_gating_service_evaluate(bench, core_db, note_corpus, offline_embedder):
+    service = AIGatingService(
+        core_db,
+        model_high="high-bench",
+        model_mini="mini-bench",
+        hash_salt="bench",
+        min_secs=0.0,
+        cooldown_full=0.0,
+        cooldown_mini=0.0,
+        embedding_client=offline_embedder,
+    )
+    clinician_id = _clinician_id(core_db)
+    notes = itertools.cycle(note_corpus)
+
+    def evaluate():
+        return service.evaluate(
+            AIGateInput(
+                note_id="bench-note",
+                clinician_id=clinician_id,
+                text=next(notes),
+                request_type="manual_full",
+            )
+        )
+
+    decision = bench(evaluate)
+    assert decision.route
+
+
+def test_evaluate_suggest_gate(bench, core_db, note_corpus, offline_embedder):
+    clinician_id = _clinician_id(core_db)
+    notes = itertools.cycle([normalize_note_text(note) for note in note_corpus])
+
+    def evaluate():
+        return main._evaluate_suggest_gate(
+            note_id="bench-suggest",
+            clinician_id=clinician_id,
+            normalized=next(notes),
+            intent="auto",
+            transcript_cursor=None,
+            accepted_json=None,
+            embedder=offline_embedder,
+        )
+
+    assert bench(evaluate) is not None
@@ -0,0 +1,116 @@
+import asyncio
+import hashlib
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker
+
+from backend.context_pipeline import ChartContextPipeline, UploadedChartFile
+from backend.db import models as db_models
+from backend.db_pool import SQLitePool
+from backend.ws_streams import EncounterDeltaStream
+
+
+@pytest.fixture
+def context_db(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'context.sqlite'}", future=True)
+    db_models.Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, expire_on_commit=False, future=True)
+    yield ChartContextPipeline(factory, upload_dir=tmp_path / "uploads"), factory
+    engine.dispose()
+
+
+def test_chart_context_indexing(bench, context_db, note_corpus):
+    pipeline, session_factory = context_db
+    files = []
+    for index, note in enumerate(note_corpus[:5]):
+        data = note.encode("utf-8")
+        files.append(
+            UploadedChartFile(
+                name=f"chart-{index}.txt",
+                mime="text/plain",
+                data=data,
+                text=note,
+                sha256=hashlib.sha256(data).hexdigest(),
+                doc_id=f"doc-{index}",
+                uploaded_at=datetime(2025, 9, 1, tzinfo=timezone.utc),
+            )
+        )
+    patients = (f"pt-{i}" for i in itertools.count())
+
+    def index():
+        # A fresh patient each round so every document is (re)indexed.
+        patient_id = next(patients)
+        asyncio.run(
+            pipeline._run_indexed(f"ctx_{patient_id}", patient_id, files, None, "balanced")
+        )
+        return patient_id
+
+    patient_id = bench(index)
+    with session_factory() as session:
+        chunks = session.scalar(
+            sa.select(sa.func.count())
+            .select_from(db_models.PatientIndexChunk)
+            .where(db_models.PatientIndexChunk.patient_id == patient_id)
+        )
+    assert chunks > 0
+
+
+class _Client:
+    def __init__(self) -> None:
+        self.frames = 0
+
+    async def send_text(self, data: str) -> None:
+        self.frames += 1
+
+
+def test_encounter_delta_stream_fanout(bench):
+    stream = EncounterDeltaStream("bench", min_interval=0, ttl=60)
+    clients = [_Client() for _ in range(50)]
+    stream._state("enc-1").clients.update(clients)
+    counter = itertools.count()
+    loop = asyncio.new_event_loop()
+
+    def publish_batch():
+        async def run():
+            for _ in range(20):
+                value = next(counter)
+                await stream.publish(
+                    "enc-1", {"type": "codes", "codes": [f"9921{value % 5}"], "seq": value}
+                )
+
+        loop.run_until_complete(run())
+
+    try:
+        bench(publish_batch)
+    finally:
+        loop.close()
+    assert clients[0].frames > 0
+    assert len({client.frames for client in clients}) == 1
+
+
+def test_db_pool_concurrent_reads(bench, tmp_path):
+    pool = SQLitePool(str(tmp_path / "pool.sqlite"), readers=4)
+    with pool.write() as conn:
+        conn.execute("CREATE TABLE events (id INTEGER PRIMARY KEY, kind TEXT, value REAL)")
+        conn.executemany(
+            "INSERT INTO events (kind, value) VALUES (?, ?)",
+            [(f"kind-{i % 7}", float(i)) for i in range(5000)],
+        )
+
+    def read(_):
+        with pool.read() as conn:
+            return conn.execute(
+                "SELECT kind, COUNT(*), SUM(value) FROM events GROUP BY kind"
+            ).fetchall()
+
+    executor = ThreadPoolExecutor(max_workers=4)
+    try:
+        results = bench(lambda: list(executor.map(read, range(40))))
+    finally:
+        executor.shutdown()
+        pool.close()
+    assert len(results) == 40 and len(results[0]) == 7
@@ -6,7 +6,7 @@ import sys
 from collections import defaultdict, deque
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Generator, Iterator, List
+from typing import Generator, Iterator, List, Optional
 
 import pytest
 import sqlalchemy as sa
@@ -138,6 +138,19 @@ def pytest_addoption(parser: pytest.Parser) -> None:
         dest='run_postgres',
         help='Execute tests marked with @pytest.mark.postgres that require PostgreSQL.',
     )
+    parser.addoption(
+        '--run-benchmarks',
+        action='store_true',
+        default=_env_flag('RUN_BENCHMARKS'),
+        dest='run_benchmarks',
+        help='Collect the performance suite in tests/benchmarks (needs pytest-benchmark).',
+    )
+
+
+def pytest_ignore_collect(collection_path: Path, config: pytest.Config) -> Optional[bool]:
+    if collection_path == Path(__file__).parent / 'benchmarks':
+        return not config.getoption('run_benchmarks')
+    return None
 
 
 def pytest_configure(config: pytest.Config) -> None:
@@ -179,6 +192,11 @@ os.environ.setdefault('JWT_SECRET', 'test-jwt-secret')
 os.environ.setdefault('JWT_SECRET_ROTATED_AT', _now_iso)
 os.environ.setdefault('OPENAI_API_KEY', 'sk-test-aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa')
 os.environ.setdefault('OPENAI_API_KEY_ROTATED_AT', _now_iso)
+# Tests swap ``call_openai`` backends freely; a shared response cache would
+# leak completions between them.
+os.environ.setdefault('LLM_CACHE_MAX_ENTRIES', '0')
+# Many tests hit the AI endpoints as the same user within seconds.
+os.environ.setdefault('AI_RATE_LIMIT_PER_MINUTE', '0')
 
 
 @dataclass
@@ -201,11 +219,13 @@ def in_memory_db() -> Iterator[DatabaseContext]:
     """Provide an isolated in-memory SQLite database for each test."""
 
     from backend import main
+    from backend.db_instrumentation import InstrumentedConnection
 
     engine = sa.create_engine(
         'sqlite+pysqlite:///:memory:',
         future=True,
-        connect_args={'check_same_thread': False},
+        # Instrumented so query budgets see raw sqlite3 statements too.
+        connect_args={'check_same_thread': False, 'factory': InstrumentedConnection},
         poolclass=StaticPool,
     )
     connection = engine.connect()
@@ -209,6 +209,32 @@ def test_events_metrics_with_auth(client):
     assert resp.json()["current"]["total_notes"] >= 1
 
 
+def test_activity_log_accepts_event_arrays(client, monkeypatch):
+    token = client.post(
+        "/login", json={"username": "user", "password": "pw"}
+    ).json()["access_token"]
+    batch = [
+        {"eventType": "note_started", "codes": ["99213"]},
+        {"eventType": "note_closed", "details": {"patientID": "p1"}},
+    ]
+    resp = client.post("/api/activity/log", json=batch, headers=auth_header(token))
+    assert resp.status_code == 200
+    assert resp.json() == {"status": "logged", "accepted": 2, "dropped": 0}
+    rows = main.db_conn.execute(
+        "SELECT eventType, revenue FROM events ORDER BY id"
+    ).fetchall()
+    assert [tuple(row) for row in rows] == [("note_started", 75.0), ("note_closed", None)]
+
+    resp = client.post(
+        "/api/activity/log", json={"eventType": "single"}, headers=auth_header(token)
+    )
+    assert resp.json() == {"status": "logged"}
+
+    monkeypatch.setattr(main, "EVENT_BATCH_MAX", 1)
+    resp = client.post("/api/activity/log", json=batch, headers=auth_header(token))
+    assert resp.status_code == 413
+
+
 def test_export_requires_auth(client, monkeypatch):
     # invalid token should return 401
     resp = client.post(
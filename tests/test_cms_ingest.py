@@ -0,0 +1,142 @@
+import importlib.util
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from backend import code_tables, main
+
+ROOT = Path(__file__).resolve().parents[1]
+FIXTURE = ROOT / 'tests' / 'fixtures' / 'cms_icd10_sample.json'
+
+_spec = importlib.util.spec_from_file_location(
+    'ingest_cms_code_tables', ROOT / 'scripts' / 'ingest_cms_code_tables.py'
+)
+assert _spec and _spec.loader
+ingest = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = ingest
+_spec.loader.exec_module(ingest)
+
+
+@pytest.fixture
+def conn():
+    db = sqlite3.connect(':memory:', check_same_thread=False)
+    db.row_factory = sqlite3.Row
+    main._init_core_tables(db)
+    ingest.ensure_tables(db)
+    yield db
+    db.close()
+
+
+def _codes(db):
+    return [row[0] for row in db.execute('SELECT code FROM icd10_codes ORDER BY code')]
+
+
+def test_resolve_field_map_matches_case_and_substrings():
+    fields = ingest.resolve_field_map(
+        ['ICD10_Code', 'Long_Description', 'primary_clinical_category'],
+        ingest._ICD_FIELDS,
+    )
+    assert fields == {
+        'code': 'ICD10_Code',
+        'description': 'Long_Description',
+        'clinical_context': 'primary_clinical_category',
+    }
+
+
+def test_recorded_dataset_loads_through_staging(conn):
+    conn.execute("INSERT INTO icd10_codes (code, description) VALUES ('OLD.1', 'stale')")
+    conn.commit()
+
+    rows = ingest.ingest_dataset(
+        conn,
+        spec=ingest.ICD10_TABLE,
+        label='ICD-10',
+        dataset_file=str(FIXTURE),
+        page_size=3,
+        batch_size=2,
+    )
+
+    assert rows == 7
+    assert 'OLD.1' not in _codes(conn)
+    assert 'I48.91' in _codes(conn)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    assert 'icd10_codes_staging' not in tables
+    assert conn.execute(f'SELECT COUNT(*) FROM {ingest.CHECKPOINT_TABLE}').fetchone()[0] == 0
+
+    info = code_tables.validate_icd10('E11.65', session=conn)
+    assert info['description'] == 'Type 2 diabetes mellitus with hyperglycemia'
+    assert info['clinicalContext'] == 'Endocrine'
+
+
+def test_append_keeps_existing_rows(conn):
+    conn.execute("INSERT INTO icd10_codes (code, description) VALUES ('OLD.1', 'kept')")
+    conn.commit()
+    ingest.ingest_dataset(
+        conn,
+        spec=ingest.ICD10_TABLE,
+        label='ICD-10',
+        dataset_file=str(FIXTURE),
+        append=True,
+    )
+    assert 'OLD.1' in _codes(conn)
+    assert 'E11.9' in _codes(conn)
+
+
+def test_interrupted_load_resumes_from_page_cursor(conn):
+    source = f'file:{FIXTURE.resolve()}'
+    calls = []
+
+    def failing_pages(start):
+        calls.append(start)
+        pages = ingest.read_recorded_pages(FIXTURE, page_size=2, start_offset=start)
+        for index, page in enumerate(pages):
+            if index == 2:
+                raise RuntimeError('network dropped')
+            yield page
+
+    with pytest.raises(RuntimeError):
+        ingest.load_pages(
+            conn,
+            ingest.ICD10_TABLE,
+            failing_pages,
+            label='ICD-10',
+            source=source,
+            batch_size=1,
+        )
+    assert _codes(conn) == []
+    assert ingest.load_checkpoint(conn, 'icd10_codes', source) == (4, 4)
+
+    def pages(start):
+        calls.append(start)
+        return ingest.read_recorded_pages(FIXTURE, page_size=2, start_offset=start)
+
+    stats = ingest.load_pages(
+        conn,
+        ingest.ICD10_TABLE,
+        pages,
+        label='ICD-10',
+        source=source,
+    )
+    assert calls == [0, 4]
+    assert stats.resumed_from == 4
+    assert stats.rows == 7
+    assert len(_codes(conn)) == 7
+
+
+def test_fetch_pages_keeps_offset_order(monkeypatch):
+    data = [{'code': str(i)} for i in range(23)]
+
+    def fake_fetch(session, dataset_id, offset, size, headers):
+        time.sleep(0.01 * ((offset // size) % 3))
+        return data[offset : offset + size]
+
+    monkeypatch.setattr(ingest, '_fetch_page', fake_fetch)
+    pages = list(ingest.fetch_cms_pages('ds', session=None, page_size=5, concurrency=3))
+    assert [page.offset for page in pages] == [0, 5, 10, 15, 20]
+    assert [r['code'] for page in pages for r in page.records] == [str(i) for i in range(23)]
+
+    limited = list(ingest.fetch_cms_pages('ds', session=None, page_size=5, limit=12, start_offset=5))
+    assert [len(page.records) for page in limited] == [5, 2]
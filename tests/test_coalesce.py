@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from backend.coalesce import COALESCED_CALLS, SingleFlight, request_key
+
+
+def _saved(route):
+    return COALESCED_CALLS.labels(route)._value.get()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_calls_share_one_flight():
+    flights = SingleFlight("test")
+    calls = []
+    release = asyncio.Event()
+
+    async def work():
+        calls.append(1)
+        await release.wait()
+        return {"codes": ["99213"]}
+
+    before = _saved("share")
+    waiters = [
+        asyncio.create_task(flights.run("k", work, route="share")) for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+    assert len(flights) == 1
+    release.set()
+    results = await asyncio.gather(*waiters)
+
+    assert calls == [1]
+    assert all(result is results[0] for result in results)
+    assert _saved("share") - before == 2
+    assert len(flights) == 0
+
+
+@pytest.mark.asyncio
+async def test_different_keys_run_separately_and_errors_reach_all_waiters():
+    flights = SingleFlight("test")
+
+    async def boom():
+        await asyncio.sleep(0)
+        raise RuntimeError("model down")
+
+    async def ok():
+        return "ok"
+
+    first = asyncio.create_task(flights.run("a", boom))
+    second = asyncio.create_task(flights.run("a", boom))
+    other = asyncio.create_task(flights.run("b", ok))
+    outcomes = await asyncio.gather(first, second, other, return_exceptions=True)
+
+    assert [type(o) for o in outcomes[:2]] == [RuntimeError, RuntimeError]
+    assert outcomes[2] == "ok"
+
+
+@pytest.mark.asyncio
+async def test_shared_call_is_cancelled_only_when_every_waiter_leaves():
+    flights = SingleFlight("test")
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def work():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return "done"
+
+    a = asyncio.create_task(flights.run("k", work))
+    b = asyncio.create_task(flights.run("k", work))
+    await started.wait()
+
+    a.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await a
+    await asyncio.sleep(0)
+    assert not cancelled.is_set()
+
+    b.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await b
+    await asyncio.wait_for(cancelled.wait(), 1)
+    await asyncio.sleep(0)
+    assert len(flights) == 0
+
+
+def test_request_key_is_order_insensitive_for_mappings():
+    assert request_key({"a": 1, "b": 2}) == request_key({"b": 2, "a": 1})
+    assert request_key("gpt-4o", [1]) != request_key("gpt-4o-mini", [1])
@@ -0,0 +1,141 @@
+import random
+import sqlite3
+import string
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import code_search, main, migrations
+from backend.code_search import CodeEntry, CodeSearchIndex
+
+
+@pytest.fixture
+def client(monkeypatch):
+    conn = sqlite3.connect(':memory:', check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    main._init_core_tables(conn)
+    migrations.ensure_settings_table(conn)
+    conn.execute(
+        "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
+        ('user', main.hash_password('pw'), 'user'),
+    )
+    conn.commit()
+    monkeypatch.setattr(main, 'db_conn', conn)
+    code_search.invalidate_code_search_index()
+    yield TestClient(main.app), conn
+    code_search.invalidate_code_search_index()
+    conn.close()
+
+
+def _token(client):
+    resp = client.post('/login', json={'username': 'user', 'password': 'pw'})
+    assert resp.status_code == 200
+    return resp.json()['access_token']
+
+
+def _index():
+    entries = [
+        CodeEntry('E11', 'ICD-10', 'diagnoses', 'Type 2 diabetes mellitus'),
+        CodeEntry('E11.9', 'ICD-10', 'diagnoses', 'Type 2 diabetes mellitus without complications'),
+        CodeEntry('E11.65', 'ICD-10', 'diagnoses', 'Type 2 diabetes mellitus with hyperglycemia'),
+        CodeEntry('E10.9', 'ICD-10', 'diagnoses', 'Type 1 diabetes mellitus without complications'),
+        CodeEntry('I10', 'ICD-10', 'diagnoses', 'Essential (primary) hypertension'),
+        CodeEntry('99213', 'CPT', 'codes', 'Office or other outpatient visit, established patient'),
+    ]
+    return CodeSearchIndex(entries, specialty_prefixes={'cardiology': ['I10']})
+
+
+def test_code_prefix_matches_with_and_without_dot():
+    index = _index()
+    codes = [r['code'] for r in index.search('E11')]
+    assert codes[:3] == ['E11', 'E11.65', 'E11.9']
+    assert [r['code'] for r in index.search('E116')] == ['E11.65']
+    assert [r['code'] for r in index.search('e11.6')] == ['E11.65']
+    assert index.search('E11')[0]['match'] == 'code'
+
+
+def test_description_bm25_ranking_and_prefix_completion():
+    index = _index()
+    results = index.search('type 2 diab')
+    assert results[0]['code'].startswith('E11')
+    assert 'E10.9' in [r['code'] for r in results]
+    assert all(r['match'] == 'description' for r in results)
+
+    hyper = index.search('diabetes hyperglyc')
+    assert hyper[0]['code'] == 'E11.65'
+
+
+def test_type_and_specialty_filters():
+    index = _index()
+    assert [r['code'] for r in index.search('9', code_type='CPT')] == ['99213']
+    assert [r['code'] for r in index.search('hypertension', specialty='Cardiology')] == ['I10']
+    assert index.search('diabetes', specialty='cardiology') == []
+    assert index.search('diabetes', specialty='unknown') == []
+
+
+def test_limit_is_respected():
+    index = _index()
+    assert len(index.search('E1', limit=2)) == 2
+    assert index.search('   ') == []
+
+
+def test_search_latency_on_large_table():
+    rng = random.Random(7)
+    words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))) for _ in range(3000)]
+    entries = []
+    for idx in range(80000):
+        letter = string.ascii_uppercase[idx % 26]
+        code = f"{letter}{idx // 26 % 100:02d}.{idx % 1000:03d}"
+        description = ' '.join(rng.choices(words, k=rng.randint(4, 12)))
+        entries.append(CodeEntry(code, 'ICD-10', 'diagnoses', description))
+    index = CodeSearchIndex(entries)
+    queries = ['E1', 'K35.1', words[0], f"{words[1]} {words[2][:3]}", words[3][:2]]
+    samples = []
+    for _ in range(20):
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, limit=20)
+            samples.append(time.perf_counter() - start)
+    samples.sort()
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    assert p99 < 0.05
+
+
+def test_search_endpoint_reads_database(client):
+    test_client, conn = client
+    with migrations.session_scope(conn) as session:
+        migrations.seed_icd10_codes(
+            session,
+            [
+                ('I48.91', {'description': 'Unspecified atrial fibrillation', 'specialties': []}),
+                ('I50.9', {'description': 'Heart failure, unspecified', 'specialties': ['cardiology']}),
+            ],
+            overwrite=False,
+        )
+    code_search.invalidate_code_search_index()
+    headers = {'Authorization': f'Bearer {_token(test_client)}'}
+
+    resp = test_client.get('/api/codes/search', params={'q': 'atrial fib'}, headers=headers)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body['results'][0]['code'] == 'I48.91'
+    assert body['count'] == len(body['results'])
+
+    resp = test_client.get(
+        '/api/codes/search',
+        params={'q': 'unspecified', 'specialty': 'cardiology', 'type': 'ICD-10'},
+        headers=headers,
+    )
+    codes = [r['code'] for r in resp.json()['results']]
+    assert 'I50.9' in codes
+    assert 'I48.91' not in codes
+
+    resp = test_client.get('/api/codes/search', params={'q': '9921'}, headers=headers)
+    assert resp.json()['results'][0]['code'] == '99213'
+
+
+def test_search_endpoint_requires_auth(client):
+    test_client, _ = client
+    resp = test_client.get('/api/codes/search', params={'q': 'E11'})
+    assert resp.status_code in {401, 403}
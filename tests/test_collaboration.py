@@ -0,0 +1,116 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+from backend import collaboration as collab
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+
+def _random_op(rng, document):
+    builder = collab._Builder()
+    cursor = 0
+    while cursor < len(document):
+        size = rng.randint(1, len(document) - cursor)
+        choice = rng.random()
+        if choice < 0.4:
+            builder.retain(size)
+        elif choice < 0.7:
+            builder.delete(size)
+        else:
+            builder.insert(rng.choice(["x", "yz", "\n"]))
+            builder.retain(size)
+        cursor += size
+    if rng.random() < 0.5:
+        builder.insert("tail")
+    return builder.ops
+
+
+def test_transform_converges():
+    rng = random.Random(7)
+    for _ in range(500):
+        document = "".join(rng.choice("abc ") for _ in range(rng.randint(0, 20)))
+        a = _random_op(rng, document)
+        b = _random_op(rng, document)
+        a_prime, b_prime = collab.transform(a, b)
+        left = collab.apply(collab.apply(document, a), b_prime)
+        right = collab.apply(collab.apply(document, b), a_prime)
+        assert left == right, (document, a, b)
+
+
+def test_apply_rejects_ops_for_other_lengths():
+    with pytest.raises(collab.OperationError):
+        collab.apply("abc", [2, "x"])
+    with pytest.raises(collab.OperationError):
+        collab.normalise({"op": 1})
+
+
+def test_concurrent_edits_are_transformed_and_broadcast():
+    saved = []
+    hub = collab.CollaborationHub(
+        lambda note_id: "Hello world", lambda *args: saved.append(args), compact_every=2, history_limit=1
+    )
+    alice, bob = FakeWebSocket(), FakeWebSocket()
+
+    async def run():
+        room = await hub.join("42", alice, "alice")
+        await hub.join("42", bob, "bob")
+        # Both edit revision 0 concurrently.
+        await hub.submit(room, alice, {"type": "op", "revision": 0, "op": [5, ",", 6]})
+        await hub.submit(room, bob, {"type": "op", "revision": 0, "op": [11, "!"]})
+        # Revision 0 has now been compacted out of the history.
+        await hub.submit(room, bob, {"type": "op", "revision": 0, "op": [11, "?"]})
+        return room
+
+    room = asyncio.run(run())
+    assert room.document == "Hello, world!"
+    assert room.revision == 2
+    assert alice.sent[0]["event"] == "snapshot" and alice.sent[0]["document"] == "Hello world"
+    assert [m["event"] for m in alice.sent[1:]] == ["presence", "ack", "op"]
+    assert alice.sent[-1]["op"] == [12, "!"] and alice.sent[-1]["userId"] == "bob"
+    assert bob.sent[-1]["event"] == "resync" and bob.sent[-1]["document"] == "Hello, world!"
+    assert saved == [("42", "Hello, world!", "bob")]
+    assert len(room.history) == 1
+
+
+def test_keystroke_frames_do_not_grow_with_the_note():
+    hub = collab.CollaborationHub(lambda note_id: "x" * 200_000, lambda *args: None)
+    typist, viewer = FakeWebSocket(), FakeWebSocket()
+
+    async def run():
+        room = await hub.join("big", typist, "a")
+        await hub.join("big", viewer, "b")
+        await hub.submit(room, typist, {"type": "op", "revision": 0, "op": [100_000, "k", 100_000]})
+
+    asyncio.run(run())
+    frame = json.dumps(viewer.sent[-1], separators=(",", ":"))
+    assert viewer.sent[-1]["op"] == [100_000, "k", 100_000]
+    assert len(frame) < 120
+
+
+def test_invalid_ops_trigger_resync_and_idle_rooms_are_saved():
+    saved = []
+    hub = collab.CollaborationHub(lambda note_id: "abc", lambda *args: saved.append(args), ttl=10)
+    client = FakeWebSocket()
+
+    async def run():
+        room = await hub.join("n", client, "a")
+        await hub.submit(room, client, {"type": "op", "revision": 0, "op": [5, "x"]})
+        await hub.submit(room, client, {"type": "op", "revision": 0, "op": [3, "d"]})
+        await hub.leave(room, client)
+        return room
+
+    room = asyncio.run(run())
+    assert [m["event"] for m in client.sent[1:4]] == ["error", "resync", "ack"]
+    assert saved == [("n", "abcd", "a")]
+    assert hub.sweep(room.last_active + 5) == 0
+    assert hub.sweep(room.last_active + 11) == 1
+    assert hub.rooms == {}
@@ -225,3 +225,33 @@ def test_compose_job_can_be_cancelled(api_client, compose_user, monkeypatch):
 
     events = _compose_events()
     assert any(event["eventType"] == "compose_cancelled" for event in events)
+
+
+def test_compose_cancel_interrupts_in_flight_model_call(api_client, compose_user, monkeypatch):
+    client = api_client
+    token = main.create_token(compose_user.username, compose_user.role)
+
+    session = _create_session(client, token)
+
+    from backend import compose_job as compose_module
+
+    finished = {"beautify": False}
+
+    async def hanging_beautify(self, note: str, job):  # type: ignore[override]
+        await asyncio.sleep(30)
+        finished["beautify"] = True
+        return note, "remote"
+
+    monkeypatch.setattr(compose_module.ComposePipeline, "_beautify", hanging_beautify)
+
+    compose_id = _start_compose(client, token, session)["composeId"]
+    time.sleep(0.1)
+    started = time.time()
+    resp = client.post(f"/api/compose/{compose_id}/cancel", headers=_auth_header(token))
+    assert resp.status_code == 200, resp.text
+
+    result = _poll_until_complete(client, token, compose_id, timeout=2.0)
+    assert result["status"] == "cancelled"
+    assert time.time() - started < 2.0
+    assert finished["beautify"] is False
+    assert compose_id not in main._COMPOSE_RUNNING
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from backend.compose_scheduler import FairScheduler, ProgressCoalescer
+
+
+def _drain(scheduler):
+    order = []
+    while True:
+        scheduled = scheduler.get_nowait()
+        if scheduled is None:
+            return order
+        order.append(scheduled.item)
+        scheduler.task_done(scheduled)
+
+
+def test_bulk_user_does_not_starve_others():
+    scheduler = FairScheduler()
+    for idx in range(20):
+        scheduler.put_nowait(f"bulk-{idx}", user="bulk", clinic="c1")
+    scheduler.put_nowait("alice-1", user="alice", clinic="c1")
+    scheduler.put_nowait("bob-1", user="bob", clinic="c2")
+
+    order = _drain(scheduler)
+    assert order.index("alice-1") <= 2
+    assert order.index("bob-1") <= 2
+    assert [item for item in order if item.startswith("bulk")] == [f"bulk-{i}" for i in range(20)]
+
+
+def test_weights_share_throughput():
+    scheduler = FairScheduler(weights={"vip": 3})
+    for idx in range(12):
+        scheduler.put_nowait(("vip", idx), user="vip")
+        scheduler.put_nowait(("std", idx), user="std")
+    first = _drain(scheduler)[:8]
+    assert sum(1 for user, _ in first if user == "vip") == 6
+
+
+def test_inflight_cap_prefers_other_flows_but_stays_work_conserving():
+    scheduler = FairScheduler(max_inflight_per_flow=1)
+    scheduler.put_nowait("a1", user="a")
+    scheduler.put_nowait("a2", user="a")
+    scheduler.put_nowait("b1", user="b")
+
+    first = scheduler.get_nowait()
+    assert first.item == "a1"
+    assert scheduler.get_nowait().item == "b1"
+    # Only flow "a" is waiting, so the cap is relaxed instead of idling a worker.
+    assert scheduler.get_nowait().item == "a2"
+    assert scheduler.inflight == 3
+
+
+def test_remove_drops_queued_jobs():
+    scheduler = FairScheduler()
+    for idx in range(3):
+        scheduler.put_nowait(idx, user="u")
+    assert scheduler.remove(lambda item: item == 1) == 1
+    assert _drain(scheduler) == [0, 2]
+    assert len(scheduler) == 0
+
+
+@pytest.mark.asyncio
+async def test_get_waits_for_put():
+    scheduler = FairScheduler()
+    waiter = asyncio.create_task(scheduler.get())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    await scheduler.put("job", user="u")
+    scheduled = await asyncio.wait_for(waiter, 1)
+    assert scheduled.item == "job"
+
+
+def test_progress_coalescer_limits_writes():
+    coalescer = ProgressCoalescer(interval=60)
+    assert coalescer.offer("s1") is True
+    assert coalescer.offer("s2") is False
+    assert coalescer.offer("s3") is False
+    assert coalescer.offer("done", force=True) is True
+    assert coalescer.drain() is None
+    assert coalescer.offer("s4") is False
+    assert coalescer.drain() == "s4"
+    assert coalescer.writes == 3
+
+
+def test_progress_coalescer_flushes_trailing_snapshot_on_timer():
+    written = []
+
+    async def scenario():
+        coalescer = ProgressCoalescer(interval=0.05, flush=written.append)
+        assert coalescer.offer("s1") is True
+        assert coalescer.offer("s2") is False
+        assert coalescer.offer("s3") is False
+        await asyncio.sleep(0.12)
+        assert written == ["s3"]
+        assert coalescer.pending is None
+
+        coalescer.offer("s4")
+        coalescer.discard()
+        await asyncio.sleep(0.12)
+        assert written == ["s3"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker
+
+from backend.context_pipeline import ChartContextPipeline
+from backend.db import models as db_models
+from backend.db_async import (
+    async_database_url,
+    async_driver_available,
+    async_session_scope,
+    dispose_async_engines,
+    get_async_sessionmaker,
+)
+
+
+def test_async_database_url_maps_drivers():
+    assert async_database_url("sqlite:////tmp/a.db") == "sqlite+aiosqlite:////tmp/a.db"
+    assert async_database_url("postgresql://u@h/db") == "postgresql+psycopg://u@h/db"
+    assert async_database_url("postgres+psycopg2://u@h/db") == "postgresql+psycopg://u@h/db"
+    with pytest.raises(ValueError):
+        async_database_url("mysql://u@h/db")
+
+
+requires_async_driver = pytest.mark.skipif(
+    not async_driver_available("sqlite://"), reason="aiosqlite/greenlet not installed"
+)
+
+
+@pytest.fixture
+def sqlite_url(tmp_path):
+    url = f"sqlite:///{tmp_path / 'context.sqlite'}"
+    engine = sa.create_engine(url, future=True)
+    db_models.Base.metadata.create_all(engine)
+    yield url, sessionmaker(bind=engine, expire_on_commit=False, future=True)
+    asyncio.run(dispose_async_engines())
+    engine.dispose()
+
+
+@requires_async_driver
+def test_async_session_scope_commits(sqlite_url):
+    url, _ = sqlite_url
+
+    async def run():
+        async with async_session_scope(url) as session:
+            session.add(
+                db_models.PatientContextSuperficial(
+                    patient_id="p1",
+                    correlation_id="c1",
+                    kv={"a": 1},
+                    provenance={"doc_count": 1},
+                    generated_at=datetime(2024, 1, 1, tzinfo=timezone.utc),
+                )
+            )
+        async with async_session_scope(url) as session:
+            row = await session.get(db_models.PatientContextSuperficial, "p1")
+            mode = (await session.execute(sa.text("PRAGMA journal_mode"))).scalar()
+            return row.kv, mode
+
+    assert asyncio.run(run()) == ({"a": 1}, "wal")
+
+
+@requires_async_driver
+def test_pipeline_async_queries_match_sync(sqlite_url):
+    url, sync_factory = sqlite_url
+    with sync_factory() as session:
+        session.add(
+            db_models.PatientContextSuperficial(
+                patient_id="p1",
+                correlation_id="c1",
+                kv={"summary": "ok"},
+                provenance={"doc_count": 2},
+                generated_at=datetime(2024, 1, 1, tzinfo=timezone.utc),
+            )
+        )
+        session.commit()
+
+    calls = []
+
+    def async_factory():
+        calls.append(1)
+        return get_async_sessionmaker(url)()
+
+    pipeline = ChartContextPipeline(sync_factory, async_session_factory=async_factory)
+
+    async_snapshot = asyncio.run(pipeline.get_snapshot_async("p1", "superficial"))
+    assert calls == [1]
+    assert async_snapshot == pipeline.get_snapshot("p1", "superficial")
+    assert async_snapshot["summary"] == {"summary": "ok"}
+    assert asyncio.run(pipeline.get_status_async("p1")) is None
+
+
+def test_pipeline_falls_back_to_sync_session(sqlite_url):
+    _, sync_factory = sqlite_url
+    pipeline = ChartContextPipeline(sync_factory, async_session_factory=lambda: None)
+    assert asyncio.run(pipeline.get_snapshot_async("missing", "superficial")) is None
@@ -0,0 +1,88 @@
+import sqlalchemy as sa
+import pytest
+
+from backend import main
+from backend.db.models import User
+from backend.db_instrumentation import (
+    QueryBudgetExceeded,
+    connect,
+    finish_request,
+    get_query_trace,
+    normalize_statement,
+    query_budget,
+    start_request,
+)
+
+
+def test_normalize_statement_groups_literals():
+    assert normalize_statement(
+        "SELECT *  FROM notes\n WHERE id = 42 AND status = 'draft'"
+    ) == 'SELECT * FROM notes WHERE id = ? AND status = ?'
+    assert normalize_statement('DELETE FROM t WHERE id IN (?, ?, ?)') == 'DELETE FROM t WHERE id IN (?)'
+    assert normalize_statement('SELECT col2 FROM t1') == 'SELECT col2 FROM t1'
+
+
+def test_raw_and_sqlalchemy_statements_counted_once():
+    conn = connect(':memory:', check_same_thread=False)
+    conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)')
+    engine = sa.create_engine(
+        'sqlite://', creator=lambda: conn, poolclass=sa.pool.StaticPool
+    )
+    with engine.connect():
+        pass  # dialect initialisation runs its own PRAGMAs
+
+    token = start_request()
+    conn.executemany('INSERT INTO items (name) VALUES (?)', [('a',), ('b',)])
+    conn.cursor().execute('SELECT name FROM items WHERE id = 1').fetchall()
+    with engine.connect() as sa_conn:
+        sa_conn.execute(sa.text('SELECT count(*) FROM items')).scalar()
+    stats = finish_request(token, 'GET /test/db', 'trace-db-1')
+
+    assert stats.count == 3
+    assert set(stats.statements) == {
+        'INSERT INTO items (name) VALUES (?)',
+        'SELECT name FROM items WHERE id = ?',
+        'SELECT count(*) FROM items',
+    }
+    trace = get_query_trace('trace-db-1')
+    assert trace['queries'] == 3 and trace['route'] == 'GET /test/db'
+    assert len(trace['slowest']) == 3
+
+
+def test_query_budget_reports_n_plus_one():
+    conn = connect(':memory:')
+    conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY)')
+
+    with query_budget(3) as capture:
+        conn.execute('SELECT id FROM items')
+    assert capture.count == 1
+
+    with pytest.raises(QueryBudgetExceeded) as excinfo:
+        with query_budget(3):
+            for item_id in range(5):
+                conn.execute(f'SELECT id FROM items WHERE id = {item_id}')
+    assert '5x SELECT id FROM items WHERE id = ?' in str(excinfo.value)
+
+
+def test_route_budget_and_trace_detail(api_client, db_session):
+    db_session.add(User(username='budget', password_hash=main.hash_password('pw'), role='admin'))
+    db_session.commit()
+    headers = {
+        'Authorization': f"Bearer {main.create_token('budget', 'admin')}",
+        'X-Trace-Id': 'trace-db-route',
+    }
+
+    with query_budget({'GET /settings': 100}) as capture:
+        resp = api_client.get('/settings', headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers['Server-Timing'].startswith('db;dur=')
+    [request] = [entry for entry in capture.requests if entry['route'] == 'GET /settings']
+    assert request['queries'] > 0
+
+    with pytest.raises(QueryBudgetExceeded, match='GET /settings ran'):
+        with query_budget({'GET /settings': 0}):
+            api_client.get('/settings', headers=headers)
+
+    detail = api_client.get('/status/observability/trace/trace-db-route', headers=headers)
+    assert detail.status_code == 200
+    assert detail.json()['database']['route'] == 'GET /settings'
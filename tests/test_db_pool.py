@@ -0,0 +1,106 @@
+import sqlite3
+import threading
+
+import pytest
+
+from backend.db_pool import PoolTimeout, SQLitePool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLitePool(str(tmp_path / "pool.sqlite"), readers=3, checkout_timeout=2.0)
+    with pool.write() as conn:
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    yield pool
+    pool.close()
+
+
+def test_connections_use_wal_and_busy_timeout(pool):
+    with pool.read() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+        assert isinstance(conn.execute("SELECT 1 AS one").fetchone(), sqlite3.Row)
+
+
+def test_write_commits_or_rolls_back_as_a_transaction(pool):
+    with pool.write() as conn:
+        conn.execute("INSERT INTO items (name) VALUES ('kept')")
+    with pytest.raises(RuntimeError):
+        with pool.write() as conn:
+            conn.execute("INSERT INTO items (name) VALUES ('dropped')")
+            raise RuntimeError("boom")
+
+    with pool.read() as conn:
+        names = [row["name"] for row in conn.execute("SELECT name FROM items")]
+    assert names == ["kept"]
+
+
+def test_nested_checkouts_reuse_the_writer(pool):
+    with pool.write() as outer:
+        outer.execute("INSERT INTO items (name) VALUES ('a')")
+        with pool.write() as inner:
+            assert inner is outer
+        with pool.read() as reader:
+            assert reader is outer
+            assert reader.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 1
+
+
+def test_read_connections_are_read_only(pool):
+    with pool.read() as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO items (name) VALUES ('x')")
+
+
+def test_readers_run_concurrently_with_each_other_and_the_writer(pool):
+    barrier = threading.Barrier(3, timeout=2)
+    seen = []
+
+    def reader():
+        with pool.read() as conn:
+            barrier.wait()
+            seen.append(conn.execute("SELECT COUNT(*) FROM items").fetchone()[0])
+
+    with pool.write() as conn:
+        conn.execute("INSERT INTO items (name) VALUES ('uncommitted')")
+        threads = [threading.Thread(target=reader) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert seen == [0, 0, 0]
+
+
+def test_writer_checkout_times_out(tmp_path):
+    pool = SQLitePool(str(tmp_path / "busy.sqlite"), checkout_timeout=0.05)
+    errors = []
+
+    def contender():
+        try:
+            with pool.write():
+                pass
+        except PoolTimeout as exc:
+            errors.append(exc)
+
+    with pool.write():
+        thread = threading.Thread(target=contender)
+        thread.start()
+        thread.join()
+    pool.close()
+    assert len(errors) == 1
+
+
+def test_wrap_serialises_onto_an_existing_connection():
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.execute("CREATE TABLE t (v INTEGER)")
+    pool = SQLitePool.wrap(conn)
+
+    with pool.write() as writer:
+        assert writer is conn
+        writer.execute("INSERT INTO t VALUES (1)")
+    with pool.read() as reader:
+        assert reader is conn
+        assert reader.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+    pool.close()
+    conn.execute("SELECT 1")
@@ -0,0 +1,122 @@
+import random
+
+import pytest
+
+from backend import deid
+from backend.deid_cache import ParagraphDeidCache, split_paragraphs
+from backend.security import DEID_POLICY
+
+
+def _counting_scrubber(calls):
+    def scrub(chunk):
+        calls.append(chunk)
+        return deid._regex_scrub(chunk)
+
+    return scrub
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("One.\n\nTwo.", ["One.", "Two."]),
+        ("One.  \n \n\n Two.\n\nThree", ["One.", "Two.", "Three"]),
+        ("MRN\n\n1234567", ["MRN\n\n1234567"]),
+        ("Seen March\n\n3, 2020.", ["Seen March\n\n3, 2020."]),
+        ("Referred by Dr.\n\nJohn Doe.", ["Referred by Dr.\n\nJohn Doe."]),
+        ("\n\nLeading and trailing.\n\n", ["\n\nLeading and trailing.\n\n"]),
+        ("Single line", ["Single line"]),
+    ],
+)
+def test_split_paragraphs(text, expected):
+    pieces = split_paragraphs(text)
+    assert "".join(p + sep for p, sep in pieces) == text
+    assert [p for p, _ in pieces] == expected
+
+
+def test_cached_output_matches_whole_text_scrub():
+    rng = random.Random(7)
+    fragments = [
+        "Patient John Doe presented.",
+        "DOB 01/23/2020",
+        "MRN",
+        "1234567",
+        "Seen March",
+        "3, 2020.",
+        "Referred by Dr.",
+        "Maria de la Cruz",
+        "Call 555-123-4567.",
+        "Lives at 123",
+        "Main St.",
+        "https://example.com/2020-01-23",
+        "Denies chest pain.",
+    ]
+    cache = ParagraphDeidCache(max_chars=100_000)
+    for _ in range(300):
+        text = "".join(
+            rng.choice(fragments) + rng.choice(["\n\n", " \n\n", "\n \n", " ", ". "])
+            for _ in range(rng.randint(1, 8))
+        )
+        cached = cache.scrub(text, engine="regex", hash_tokens=True, scrubber=deid._regex_scrub)
+        assert cached == deid._regex_scrub(text), text
+
+
+def test_only_changed_paragraphs_are_rescrubbed():
+    cache = ParagraphDeidCache(max_chars=100_000)
+    calls = []
+    scrub = _counting_scrubber(calls)
+    note = "Patient John Doe presented.\n\nDenies chest pain.\n\nCall 555-123-4567."
+    first = cache.scrub(note, engine="regex", hash_tokens=True, scrubber=scrub)
+    assert len(calls) == 3
+
+    calls.clear()
+    edited = note.replace("Denies chest pain.", "Reports chest pain.")
+    second = cache.scrub(edited, engine="regex", hash_tokens=True, scrubber=scrub)
+    assert calls == ["Reports chest pain."]
+    assert second == deid._regex_scrub(edited)
+    assert first.split("\n\n")[0] == second.split("\n\n")[0]
+
+    calls.clear()
+    cache.scrub(edited, engine="regex", hash_tokens=False, scrubber=scrub)
+    assert len(calls) == 3  # different key space
+    assert cache.stats()["hits"] == 2
+
+
+def test_cache_is_bounded_by_characters():
+    cache = ParagraphDeidCache(max_chars=60)
+    for i in range(10):
+        cache.scrub(f"Paragraph number {i} text.", engine="regex", hash_tokens=True, scrubber=str.upper)
+    stats = cache.stats()
+    assert stats["chars"] <= 60
+    assert stats["evictions"] > 0
+    assert stats["entries"] == 2
+
+
+def test_fallback_results_are_not_cached(monkeypatch):
+    monkeypatch.setattr(deid, "_PRESIDIO_AVAILABLE", False)
+    cache = ParagraphDeidCache(max_chars=100_000)
+    text = "John Doe 555-123-4567"
+    scrub = lambda chunk: deid._presidio(chunk)
+    first = cache.scrub(text, engine="presidio", hash_tokens=True, scrubber=scrub)
+    assert first == deid._regex_scrub(text)
+    assert cache.stats()["entries"] == 0
+
+
+def test_persistence_roundtrip_is_encrypted(tmp_path):
+    path = tmp_path / "deid-cache.bin"
+    cache = ParagraphDeidCache(max_chars=100_000, path=str(path))
+    note = "Patient John Doe presented.\n\nCall 555-123-4567."
+    expected = cache.scrub(note, engine="regex", hash_tokens=True, scrubber=deid._regex_scrub)
+    assert cache.save()
+    assert b"John" not in path.read_bytes()
+
+    restored = ParagraphDeidCache(max_chars=100_000, path=str(path))
+    calls = []
+    assert restored.scrub(note, engine="regex", hash_tokens=True, scrubber=_counting_scrubber(calls)) == expected
+    assert calls == []
+
+
+def test_policy_apply_uses_cache(monkeypatch):
+    monkeypatch.setattr(DEID_POLICY, "_engine", "regex")
+    note = "Patient Jane Roe presented.\n\nMRN 7654321 on file."
+    assert DEID_POLICY.apply(note) == deid._regex_scrub(note)
+    assert DEID_POLICY.apply(note) == deid._regex_scrub(note)
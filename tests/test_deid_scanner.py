@@ -0,0 +1,159 @@
+import random
+import re
+
+import pytest
+
+from backend import deid
+
+
+def _legacy_regex_scrub(text: str, hash_tokens: bool = True) -> str:
+    """Sequential ``re.sub`` implementation before passes could be skipped."""
+
+    def _repl_email(m: re.Match) -> str:
+        raw = m.group(0).rstrip('.,;:')
+        return f"[EMAIL:{deid._hash(raw, hash_tokens)}]"
+
+    text = deid.SSN_PATTERN.sub(lambda m: f"[SSN:{deid._hash(m.group(0), hash_tokens)}]", text)
+    text = deid.EMAIL_PATTERN.sub(_repl_email, text)
+
+    def _repl(tag: str):
+        def inner(m: re.Match) -> str:
+            raw = m.group(0).strip().rstrip('.')
+            if raw.startswith('[') and ':' in raw and raw.endswith(']'):
+                return raw
+            return f"[{tag}:{deid._hash(raw, hash_tokens)}]"
+        return inner
+
+    for pattern, tag in deid.TOKEN_ORDER:
+        text = pattern.sub(_repl(tag), text)
+    text = deid.SSN_PATTERN.sub(lambda m: f"[SSN:{deid._hash(m.group(0), hash_tokens)}]", text)
+    text = deid.EMAIL_PATTERN.sub(_repl_email, text)
+    return text
+
+
+_FRAGMENTS = [
+    "Patient John Doe presented",
+    "Dr. Maria de la Cruz",
+    "Anne-Marie O'Connor",
+    "DOB 01/23/2020",
+    "DOB: 2/3/99",
+    "seen 2020-01-23",
+    "March 3rd, 2020",
+    "3 March 2020",
+    "Dec 12",
+    "SSN 123-45-6789",
+    "123456789",
+    "call 555-123-4567",
+    "(555) 987 6543",
+    "+44 20 7946 0958",
+    "lives at 123 Main St.",
+    "789 Broadway",
+    "42 Old Mill Rd",
+    "maria.cruz@example.com,",
+    "https://portal.example.com/visit/2020-01-23/123-45-6789.",
+    "www.example.org/a?id=John",
+    "http://10.0.0.1/x",
+    "192.168.0.1",
+    "MRN 1234567",
+    "mrn:7654321",
+    "follow up in 2 weeks",
+    "BP 120/80",
+    "A1c 7.2",
+    "Hello",
+    "St.",
+    "John",
+    "St.Mary",
+    "Dr.\nJohn",
+    "123 \u017fep 2020",
+    "http://x.org/John_Doe",
+    "www.a.com/DOB 01/23/2020",
+    "https://h/123-45-6789@x.com",
+]
+_JOINERS = [" ", " ", ". ", ", ", "\n", "", "; ", "/", "-", "_", ":"]
+
+
+def _make_note(rng: random.Random, parts: int) -> str:
+    out = []
+    for _ in range(parts):
+        out.append(rng.choice(_FRAGMENTS))
+        out.append(rng.choice(_JOINERS))
+    return "".join(out)
+
+
+@pytest.mark.parametrize("hash_tokens", [True, False])
+def test_regex_scrub_matches_sequential_passes(hash_tokens):
+    rng = random.Random(1234)
+    for _ in range(2000):
+        note = _make_note(rng, rng.randint(1, 12))
+        expected = _legacy_regex_scrub(note, hash_tokens)
+        assert deid._regex_scrub(note, hash_tokens) == expected, note
+
+
+@pytest.mark.parametrize(
+    "note",
+    [
+        "Visit https://example.com/2020-01-23 today",
+        "See www.example.com/123-45-6789/John.",
+        "Email a@b.com https://x.org/a@b.com",
+        "123 Main St.John Doe",
+        "MRN 1234567John",
+        "DOB 01/23/2020123-45-6789",
+        "John DoeJane",
+        "www.a.com/DOB 01/23/2020; follow up in 2 weeks. follow up",
+        "8 St.St ep 3r \u017fep 2020, A1c 7.2_123 \u017fep 202456789@x.co",
+        "44 946 958p 0, A1c 7.2 follow up in 2 weeks\nrn:7654321/seen 2020-01-23A1c 7.2 St.My http://3-5-89",
+        "",
+    ],
+)
+@pytest.mark.parametrize("hash_tokens", [True, False])
+def test_regex_scrub_edge_cases(note, hash_tokens):
+    assert deid._regex_scrub(note, hash_tokens) == _legacy_regex_scrub(note, hash_tokens)
+
+
+@pytest.mark.parametrize("hash_tokens", [True, False])
+def test_regex_scrub_matches_sequential_passes_on_long_notes(hash_tokens):
+    # Long notes make interacting matches re-run in windows that merge.
+    rng = random.Random(4321)
+    for _ in range(40):
+        note = _make_note(rng, rng.randint(100, 300))
+        assert deid._regex_scrub(note, hash_tokens) == _legacy_regex_scrub(note, hash_tokens), note
+
+
+def test_resolve_spans_prefers_priority_then_length():
+    spans = [
+        deid.Span(0, 4, "NAME", "John", priority=10),
+        deid.Span(0, 8, "NAME", "John Doe", priority=10),
+        deid.Span(5, 8, "SSN", "Doe", priority=0),
+        deid.Span(10, 12, "IP", "xx", priority=10),
+    ]
+    chosen = deid.resolve_spans(spans)
+    assert [(s.start, s.end, s.tag) for s in chosen] == [(0, 4, "NAME"), (5, 8, "SSN"), (10, 12, "IP")]
+
+
+def test_presidio_spans_share_the_resolver(monkeypatch):
+    text = "John Smith (john@example.com) MRN 1234567, SSN 123-45-6789"
+
+    class Result:
+        def __init__(self, entity_type, start, end):
+            self.entity_type = entity_type
+            self.start = start
+            self.end = end
+
+    class Analyzer:
+        def analyze(self, text, entities=None, language="en"):
+            return [
+                Result("PERSON", 0, 10),
+                Result("PERSON", 0, 4),  # overlaps the longer name
+                Result("DOMAIN_NAME", 17, 28),  # inside the email
+                Result("US_SSN", 47, 58),
+            ]
+
+    monkeypatch.setattr(deid, "_PRESIDIO_AVAILABLE", True)
+    monkeypatch.setattr(deid, "_analyzer", Analyzer())
+    out = deid._presidio(text)
+    assert out == (
+        f"[NAME:{deid._hash('John Smith', True)}] "
+        f"([EMAIL:{deid._hash('john@example.com', True)}]) "
+        f"[MRN:{deid._hash('1234567', True)}], "
+        f"SSN [SSN:{deid._hash('123-45-6789', True)}]"
+    )
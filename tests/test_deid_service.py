@@ -0,0 +1,203 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend import deid
+from backend.deid_cache import ParagraphDeidCache
+from backend.deid_service import DEID_BATCH_SIZE, DEID_FALLBACKS, DeidService
+
+
+def _thread_pool(workers):
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+def _sample(metric, suffix, labels=None):
+    for family in metric.collect():
+        for sample in family.samples:
+            if sample.name.endswith(suffix) and (labels is None or sample.labels == labels):
+                return sample.value
+    return 0.0
+
+
+def test_concurrent_calls_share_one_batch():
+    batches = []
+
+    def batch_fn(texts, hash_tokens):
+        batches.append(list(texts))
+        return [deid._regex_scrub(t, hash_tokens) for t in texts]
+
+    service = DeidService(workers=1, batch_window=0.05, batch_fn=batch_fn, executor_factory=_thread_pool)
+    texts = [f"Patient John Doe {i} call 555-123-456{i}" for i in range(5)]
+    before = _sample(DEID_BATCH_SIZE, "_count")
+
+    async def run():
+        try:
+            return await asyncio.gather(*(service.deidentify(t) for t in texts))
+        finally:
+            await service.stop()
+
+    results = asyncio.run(run())
+    assert results == [deid._regex_scrub(t) for t in texts]
+    assert batches == [texts]
+    assert _sample(DEID_BATCH_SIZE, "_count") == before + 1
+
+
+def test_batches_are_split_by_hashing_mode_and_size():
+    batches = []
+
+    def batch_fn(texts, hash_tokens):
+        batches.append((len(texts), hash_tokens))
+        return [t.upper() for t in texts]
+
+    service = DeidService(
+        workers=2, batch_window=0.05, max_batch=3, batch_fn=batch_fn, executor_factory=_thread_pool
+    )
+
+    async def run():
+        try:
+            calls = [service.deidentify(f"a{i}") for i in range(4)]
+            calls.append(service.deidentify("b", hash_tokens=False))
+            return await asyncio.gather(*calls)
+        finally:
+            await service.stop()
+
+    assert asyncio.run(run()) == ["A0", "A1", "A2", "A3", "B"]
+    assert sorted(batches) == [(1, False), (1, True), (3, True)]
+
+
+def test_timeout_falls_back_to_regex():
+    release = threading.Event()
+
+    def slow_batch(texts, hash_tokens):
+        release.wait(2)
+        return ["late" for _ in texts]
+
+    service = DeidService(
+        workers=1, batch_window=0, timeout=0.05, batch_fn=slow_batch, executor_factory=_thread_pool
+    )
+    text = "John Doe 555-123-4567"
+    before = _sample(DEID_FALLBACKS, "_total", {"reason": "timeout"})
+
+    async def run():
+        try:
+            with deid.track_fallbacks() as fallbacks:
+                out = await service.deidentify(text)
+            return out, fallbacks
+        finally:
+            release.set()
+            await service.stop()
+
+    out, fallbacks = asyncio.run(run())
+    assert out == deid._regex_scrub(text)
+    assert fallbacks == ["presidio"]
+    assert _sample(DEID_FALLBACKS, "_total", {"reason": "timeout"}) == before + 1
+
+
+def test_worker_errors_fall_back_to_regex():
+    def broken(texts, hash_tokens):
+        raise RuntimeError("analyzer crashed")
+
+    service = DeidService(workers=1, batch_window=0, batch_fn=broken, executor_factory=_thread_pool)
+    text = "MRN 1234567"
+
+    async def run():
+        try:
+            return await service.deidentify(text)
+        finally:
+            await service.stop()
+
+    assert asyncio.run(run()) == deid._regex_scrub(text)
+
+
+def test_cache_misses_are_batched_together():
+    batches = []
+
+    def batch_fn(texts, hash_tokens):
+        batches.append(len(texts))
+        time.sleep(0.01)
+        return [deid._regex_scrub(t, hash_tokens) for t in texts]
+
+    service = DeidService(workers=1, batch_window=0.02, batch_fn=batch_fn, executor_factory=_thread_pool)
+    cache = ParagraphDeidCache(max_chars=100_000)
+    note = "Patient John Doe presented.\n\nDenies chest pain.\n\nCall 555-123-4567."
+
+    async def run():
+        try:
+            first = await cache.scrub_async(
+                note, engine="presidio", hash_tokens=True, scrubber=lambda c: service.deidentify(c)
+            )
+            second = await cache.scrub_async(
+                note, engine="presidio", hash_tokens=True, scrubber=lambda c: service.deidentify(c)
+            )
+            return first, second
+        finally:
+            await service.stop()
+
+    first, second = asyncio.run(run())
+    assert first == second == deid._regex_scrub(note)
+    assert batches == [3]
+    assert cache.stats()["hits"] == 3
+
+
+def test_prepare_async_matches_prepare():
+    from types import SimpleNamespace
+
+    from backend.security import PromptPrivacyGuard
+
+    guard = PromptPrivacyGuard()
+    request = SimpleNamespace(
+        text="Patient John Doe with MRN 1234567.",
+        chart="DOB 01/23/2020",
+        audio="Call 555-123-4567.",
+        rules=["Mention John Doe", ""],
+        age=42,
+        sex="F",
+        region="CA",
+    )
+    for profile in ("beautify", "summary", "suggest"):
+        assert asyncio.run(guard.prepare_async(profile, request)) == guard.prepare(profile, request)
+
+
+def test_timed_out_text_is_not_dispatched():
+    batches = []
+
+    def batch_fn(texts, hash_tokens):
+        batches.append(list(texts))
+        return [t.upper() for t in texts]
+
+    service = DeidService(
+        workers=1, batch_window=0.2, timeout=0.02, batch_fn=batch_fn, executor_factory=_thread_pool
+    )
+
+    async def run():
+        try:
+            out = await service.deidentify("MRN 1234567")
+            await asyncio.sleep(0.3)
+            return out
+        finally:
+            await service.stop()
+
+    assert asyncio.run(run()) == deid._regex_scrub("MRN 1234567")
+    assert batches == []
+
+
+def test_full_queue_falls_back_immediately():
+    def batch_fn(texts, hash_tokens):
+        return [t.upper() for t in texts]
+
+    service = DeidService(
+        workers=1, batch_window=0.01, max_queue=1, batch_fn=batch_fn, executor_factory=_thread_pool
+    )
+    before = _sample(DEID_FALLBACKS, "_total", {"reason": "overload"})
+
+    async def run():
+        try:
+            return await asyncio.gather(*(service.deidentify(f"John Doe {i}") for i in range(3)))
+        finally:
+            await service.stop()
+
+    results = asyncio.run(run())
+    assert results[0] == "JOHN DOE 0"
+    assert results[1:] == [deid._regex_scrub(f"John Doe {i}") for i in (1, 2)]
+    assert _sample(DEID_FALLBACKS, "_total", {"reason": "overload"}) == before + 2
@@ -0,0 +1,33 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+from backend.embedding import HashingVectorizerEmbedding
+
+
+def test_buckets_match_sha1_prefix_assignment():
+    model = HashingVectorizerEmbedding(dimensions=64)
+    vector = model.embed("Cough cough fever")
+    expected = np.zeros(64)
+    for token, count in (("cough", 2), ("fever", 1)):
+        bucket = int.from_bytes(hashlib.sha1(token.encode()).digest()[:4], "big") % 64
+        expected[bucket] += count
+    expected /= np.linalg.norm(expected)
+    assert vector == pytest.approx(expected.tolist())
+
+
+def test_embed_many_matches_embed_rows():
+    model = HashingVectorizerEmbedding(dimensions=32)
+    texts = ["chest pain on exertion", "", "metformin 500mg bid", "!!!"]
+    matrix = model.embed_many(texts)
+
+    assert matrix.dtype == np.float32
+    assert matrix.shape == (4, 32)
+    for row, text in zip(matrix, texts):
+        assert row.tolist() == pytest.approx(model.embed(text), abs=1e-6)
+    assert not matrix[1].any() and not matrix[3].any()
+
+
+def test_embed_many_empty_batch():
+    assert HashingVectorizerEmbedding(dimensions=8).embed_many([]).shape == (0, 8)
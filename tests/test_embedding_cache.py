@@ -0,0 +1,76 @@
+import sqlite3
+
+import pytest
+
+from backend.embedding_cache import EmbeddingCache
+from backend.openai_client import EmbeddingClient
+
+
+def test_batched_get_reports_hits_and_misses():
+    cache = EmbeddingCache(max_entries=8)
+    cache.put_many("m", [("a", [1.0, 0.0]), ("b", [0.0, 1.0])])
+
+    assert cache.get_many("m", ["a", "x", "b"]) == [[1.0, 0.0], None, [0.0, 1.0]]
+    assert cache.get_many("other-model", ["a"]) == [None]
+
+
+def test_memory_tier_is_size_bounded():
+    cache = EmbeddingCache(max_entries=2)
+    cache.put_many("m", [("a", [1.0]), ("b", [2.0])])
+    cache.get_many("m", ["a"])
+    cache.put_many("m", [("c", [3.0])])
+
+    assert len(cache) == 2
+    assert cache.get_many("m", ["a", "b", "c"]) == [[1.0], None, [3.0]]
+
+
+def test_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    writer = EmbeddingCache(max_entries=8, path=path)
+    writer.put_many("m", [("span", [0.25, -0.5, 0.125])])
+
+    reader = EmbeddingCache(max_entries=8, path=path)
+    assert reader.get_many("m", ["span"]) == [[0.25, -0.5, 0.125]]
+    writer.close()
+    reader.close()
+
+
+def test_store_evicts_least_recently_used_rows(tmp_path):
+    path = tmp_path / "embeddings.sqlite"
+    cache = EmbeddingCache(max_entries=1, path=str(path), max_rows=3)
+    for text in ("a", "b", "c"):
+        cache.put_many("m", [(text, [1.0])])
+    cache.get_many("m", ["a"])
+    cache.put_many("m", [("d", [1.0])])
+    cache.close()
+
+    rows = sqlite3.connect(str(path)).execute("SELECT COUNT(*) FROM embedding_cache").fetchone()
+    assert rows == (3,)
+    fresh = EmbeddingCache(max_entries=8, path=str(path))
+    assert fresh.get_many("m", ["a", "b"]) == [[1.0], None]
+    fresh.close()
+
+
+def test_embedding_client_only_fetches_uncached_texts(monkeypatch):
+    monkeypatch.delenv("USE_OFFLINE_MODEL", raising=False)
+    monkeypatch.delenv("USE_LOCAL_MODELS", raising=False)
+    client = EmbeddingClient(cache=EmbeddingCache(max_entries=8))
+    fetched = []
+
+    def fake_fetch(texts):
+        fetched.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    monkeypatch.setattr(client, "_fetch_embeddings", fake_fetch)
+
+    first = client.embed_many(["cough", "fever", "cough"])
+    second = client.embed_many(["fever", "rash"])
+
+    assert fetched == [["cough", "fever"], ["rash"]]
+    assert first == [[5.0, 1.0], [5.0, 1.0], [5.0, 1.0]]
+    assert second == [[5.0, 1.0], [4.0, 1.0]]
+
+
+def test_embedding_client_rejects_non_positive_cache_size():
+    with pytest.raises(ValueError):
+        EmbeddingClient(cache_size=0)
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import sqlite3
+
+from backend.event_ingest import EVENT_INGEST_DROPPED, EventIngestBuffer
+from backend.migrations import ensure_events_table
+
+
+def _connection():
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    ensure_events_table(conn)
+    return conn
+
+
+def _event(i, **details):
+    return {"eventType": "note_started", "timestamp": float(i), "details": details}
+
+
+def _trace(conn):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    return statements
+
+
+def test_events_are_written_in_one_transaction_per_flush():
+    conn = _connection()
+    buffer = EventIngestBuffer(lambda: conn, batch_size=100, flush_interval=0.05)
+    statements = _trace(conn)
+
+    async def run():
+        await buffer.start()
+        assert buffer.submit([_event(i, codes=["99213"], publicHealth=True) for i in range(10)]) == 10
+        assert buffer.submit([_event(10, timeToClose=4.5)]) == 1
+        await asyncio.sleep(0.2)
+        await buffer.stop()
+
+    asyncio.run(run())
+    rows = conn.execute("SELECT timestamp, codes, public_health, details FROM events ORDER BY timestamp").fetchall()
+    assert len(rows) == 11
+    assert rows[0][1] == json.dumps(["99213"]) and rows[0][2] == 1
+    assert json.loads(rows[-1][3]) == {"timeToClose": 4.5}
+    assert sum(1 for sql in statements if sql.startswith("INSERT INTO events")) == 11
+    assert sum(1 for sql in statements if sql == "COMMIT") == 1
+    assert sum(1 for sql in statements if "PRAGMA table_info" in sql) == 1
+
+
+def test_full_queue_drops_new_events():
+    conn = _connection()
+    buffer = EventIngestBuffer(lambda: conn, max_queue=3, flush_interval=0.05)
+    before = EVENT_INGEST_DROPPED._value.get()
+
+    async def run():
+        await buffer.start()
+        accepted = buffer.submit([_event(i) for i in range(5)])
+        await buffer.stop()
+        return accepted
+
+    assert asyncio.run(run()) == 3
+    assert EVENT_INGEST_DROPPED._value.get() == before + 2
+    assert conn.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 3
+
+
+def test_stop_flushes_pending_events():
+    conn = _connection()
+    buffer = EventIngestBuffer(lambda: conn, flush_interval=60)
+
+    async def run():
+        await buffer.start()
+        buffer.submit([_event(i) for i in range(4)])
+        await asyncio.sleep(0)
+        await buffer.stop()
+
+    asyncio.run(run())
+    assert conn.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 4
+
+
+def test_writes_immediately_when_not_started():
+    conn = _connection()
+    buffer = EventIngestBuffer(lambda: conn)
+    assert buffer.submit([_event(1), _event(2)]) == 2
+    assert conn.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 2
@@ -0,0 +1,152 @@
+import importlib
+
+import pytest
+
+from backend import llm_cache
+from backend.llm_cache import LLMResponseCache
+from backend.observability import _CURRENT_OBSERVATION
+
+
+MESSAGES = [
+    {"role": "system", "content": "Summarise the note."},
+    {"role": "user", "content": "Patient reports  cough\nfor two days."},
+]
+
+
+def test_exact_and_normalised_keys_hit():
+    cache = LLMResponseCache(max_entries=8, ttl=60)
+    keys = cache.keys("gpt-4o", 0, MESSAGES)
+    cache.put(keys, {"content": "summary"})
+
+    assert cache.get(keys) == {"content": "summary"}
+    rewrapped = [
+        MESSAGES[0],
+        {"role": "user", "content": "Patient reports cough for two days.  "},
+    ]
+    assert cache.get(cache.keys("gpt-4o", 0, rewrapped)) == {"content": "summary"}
+    assert cache.get(cache.keys("gpt-4o", 0.7, MESSAGES)) is None
+    assert cache.get(cache.keys("gpt-4o-mini", 0, MESSAGES)) is None
+
+
+def test_policy_version_is_part_of_the_key():
+    cache = LLMResponseCache(max_entries=8, ttl=60)
+    version = {"value": "v1"}
+    cache.configure_policy(lambda: version["value"])
+    cache.put(cache.keys("gpt-4o", 0, MESSAGES), {"content": "old"})
+
+    version["value"] = "v2"
+    assert cache.get(cache.keys("gpt-4o", 0, MESSAGES)) is None
+
+
+def test_entries_expire_and_lru_is_bounded(monkeypatch):
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(llm_cache.time, "time", lambda: clock["now"])
+    cache = LLMResponseCache(max_entries=2, ttl=10)
+
+    first = cache.keys("m", 0, [{"role": "user", "content": "a"}])
+    cache.put(first, {"content": "a"})
+    assert len(cache._entries) == 1  # exact and normalised keys coincide
+    cache.put(cache.keys("m", 0, [{"role": "user", "content": "b "}]), {"content": "b"})
+    assert len(cache._entries) == 2
+    assert cache.get(first) is None
+
+    second = cache.keys("m", 0, [{"role": "user", "content": "c"}])
+    cache.put(second, {"content": "c"})
+    clock["now"] += 11
+    assert cache.get(second) is None
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = tmp_path / "llm-cache.sqlite"
+    cache = LLMResponseCache(max_entries=8, ttl=60, path=str(path))
+    keys = cache.keys("gpt-4o", 0, MESSAGES)
+    cache.put(keys, {"content": "persisted"})
+    cache.close()
+
+    raw = path.read_bytes()
+    assert b"persisted" not in raw
+
+    reopened = LLMResponseCache(max_entries=8, ttl=60, path=str(path))
+    assert reopened.get(keys) == {"content": "persisted"}
+    reopened.close()
+
+
+def test_disabled_cache_stores_nothing():
+    cache = LLMResponseCache(max_entries=0, ttl=60)
+    keys = cache.keys("gpt-4o", 0, MESSAGES)
+    cache.put(keys, {"content": "x"})
+    assert not cache.enabled
+    assert cache.get(keys) is None
+
+
+class _Observation:
+    def __init__(self):
+        self.cache_state = "cold"
+        self.metadata = {}
+
+    def set_cache_state(self, state):
+        self.cache_state = state
+
+    def add_metadata(self, key, value):
+        self.metadata[key] = value
+
+    def add_tokens(self, prompt=0, completion=0):
+        pass
+
+    def set_model(self, model):
+        pass
+
+
+def test_call_openai_serves_repeats_from_cache(monkeypatch, tmp_path):
+    monkeypatch.delenv("USE_OFFLINE_MODEL", raising=False)
+    monkeypatch.setenv("USE_LOCAL_MODELS", "true")
+    fake_model = tmp_path / "model.gguf"
+    fake_model.write_text("fake")
+    monkeypatch.setenv("LOCAL_LLM_MODEL", str(fake_model))
+
+    calls = []
+
+    class FakeLlama:
+        def __call__(self, prompt, max_tokens=256, temperature=0.0, top_p=1.0):
+            calls.append(prompt)
+            return {"choices": [{"text": "local output"}]}
+
+    from backend import openai_client as oc
+
+    importlib.reload(oc)
+    monkeypatch.setattr(oc, "_get_llama", lambda: FakeLlama())
+    monkeypatch.setattr(oc, "LLM_CACHE", LLMResponseCache(max_entries=8, ttl=60))
+
+    observation = _Observation()
+    token = _CURRENT_OBSERVATION.set(observation)
+    try:
+        assert oc.call_openai(MESSAGES) == "local output"
+        assert observation.cache_state == "miss"
+        assert oc.call_openai(MESSAGES) == "local output"
+        assert observation.cache_state == "hit"
+        assert "llmCacheSavedTokens" in observation.metadata
+    finally:
+        _CURRENT_OBSERVATION.reset(token)
+    assert len(calls) == 1
+
+
+def test_call_openai_does_not_cache_failures(monkeypatch, tmp_path):
+    monkeypatch.delenv("USE_OFFLINE_MODEL", raising=False)
+    monkeypatch.setenv("USE_LOCAL_MODELS", "true")
+    fake_model = tmp_path / "model.gguf"
+    fake_model.write_text("fake")
+    monkeypatch.setenv("LOCAL_LLM_MODEL", str(fake_model))
+
+    from backend import openai_client as oc
+
+    importlib.reload(oc)
+    cache = LLMResponseCache(max_entries=8, ttl=60)
+    monkeypatch.setattr(oc, "LLM_CACHE", cache)
+
+    def broken():
+        raise RuntimeError("fail")
+
+    monkeypatch.setattr(oc, "_get_llama", broken)
+    with pytest.raises(RuntimeError):
+        oc.call_openai(MESSAGES)
+    assert not cache._entries
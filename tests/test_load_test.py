@@ -0,0 +1,120 @@
+import asyncio
+import importlib.util
+import random
+import sys
+from pathlib import Path
+
+import httpx
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[1]
+
+_spec = importlib.util.spec_from_file_location('load_test', ROOT / 'scripts' / 'load_test.py')
+assert _spec and _spec.loader
+load_test = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = load_test
+_spec.loader.exec_module(load_test)
+
+
+def test_percentile_interpolates():
+    values = [0.4, 0.1, 0.3, 0.2, 0.5]
+    assert load_test.percentile(values, 50) == 0.3
+    assert abs(load_test.percentile(values, 95) - 0.48) < 1e-9
+    assert load_test.percentile([], 99) == 0.0
+
+
+def test_latency_model_matches_requested_percentiles():
+    model = load_test.LatencyModel(median_ms=800, p95_ms=2500)
+    rng = random.Random(3)
+    samples = [model.sample(rng) for _ in range(20000)]
+    assert abs(load_test.percentile(samples, 50) - 0.8) < 0.05
+    assert abs(load_test.percentile(samples, 95) - 2.5) < 0.2
+    assert load_test.LatencyModel(median_ms=0).sample(rng) == 0.0
+
+
+def test_fake_llm_reports_usage_and_embeddings():
+    app = load_test.create_fake_llm_app(load_test.LatencyModel(0, 0), embedding_dims=8)
+    with TestClient(app) as client:
+        resp = client.post(
+            '/v1/chat/completions',
+            json={
+                'model': 'gpt-4o',
+                'messages': [
+                    {'role': 'system', 'content': 'Respond with JSON only.'},
+                    {'role': 'user', 'content': 'Patient with hypertension.' * 4},
+                ],
+            },
+        )
+        assert resp.status_code == 200
+        body = resp.json()
+        assert '"codes"' in body['choices'][0]['message']['content']
+        usage = body['usage']
+        assert usage['prompt_tokens'] > 0 and usage['completion_tokens'] > 0
+        assert usage['total_tokens'] == usage['prompt_tokens'] + usage['completion_tokens']
+
+        resp = client.post('/v1/embeddings', json={'model': 'e', 'input': ['a', 'b']})
+        data = resp.json()['data']
+        assert [len(item['embedding']) for item in data] == [8, 8]
+        again = client.post('/v1/embeddings', json={'model': 'e', 'input': 'a'}).json()['data']
+        assert again[0]['embedding'] == data[0]['embedding']
+
+    failing = load_test.create_fake_llm_app(load_test.LatencyModel(0, 0, error_rate=1.0))
+    with TestClient(failing) as client:
+        resp = client.post('/v1/chat/completions', json={'messages': []})
+        assert resp.status_code == 503
+
+
+def test_histogram_deltas_from_exposition():
+    before = load_test.parse_histograms(
+        'revenuepilot_db_pool_wait_seconds_sum{mode="read"} 1.0\n'
+        'revenuepilot_db_pool_wait_seconds_count{mode="read"} 10\n'
+        'revenuepilot_db_pool_wait_seconds_bucket{le="0.1",mode="read"} 10\n'
+        'other_metric_sum 5\n',
+        load_test.SERVER_METRICS,
+    )
+    after = load_test.parse_histograms(
+        '# HELP revenuepilot_db_pool_wait_seconds wait\n'
+        'revenuepilot_db_pool_wait_seconds_sum{mode="read"} 1.5\n'
+        'revenuepilot_db_pool_wait_seconds_count{mode="read"} 15\n'
+        'revenuepilot_db_pool_wait_seconds_sum{mode="write"} 0.5\n'
+        'revenuepilot_db_pool_wait_seconds_count{mode="write"} 5\n',
+        load_test.SERVER_METRICS,
+    )
+    deltas = load_test._metric_deltas(before, after)
+    assert list(deltas) == ['revenuepilot_db_pool_wait_seconds']
+    delta = deltas['revenuepilot_db_pool_wait_seconds']
+    assert delta['count'] == 10
+    assert abs(delta['sumSeconds'] - 1.0) < 1e-9
+    assert abs(delta['meanMs'] - 100.0) < 1e-6
+
+
+def test_virtual_user_records_outcomes_per_route():
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == '/suggest':
+            return httpx.Response(409, json={'blocked': True})
+        if request.url.path == '/boom':
+            return httpx.Response(500, json={'detail': 'boom'})
+        return httpx.Response(200, json={'success': True, 'data': {'noteId': 'n1'}})
+
+    recorder = load_test.Recorder()
+
+    async def run():
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(handler), base_url='http://test'
+        ) as client:
+            user = load_test.VirtualUser(
+                0, client, recorder, 'u', 'p', load_test.JourneyOptions(), random.Random(0)
+            )
+            created = await user.call('POST /api/notes/create', 'POST', '/api/notes/create')
+            blocked = await user.call('POST /suggest', 'POST', '/suggest', expected=(409,))
+            failed = await user.call('GET /boom', 'GET', '/boom')
+            return created, blocked, failed
+
+    created, blocked, failed = asyncio.run(run())
+    assert created == {'noteId': 'n1'}
+    assert blocked is None and failed is None
+    summary = recorder.summary()
+    assert summary['POST /api/notes/create']['errorRate'] == 0.0
+    assert summary['POST /suggest']['errors'] == 0
+    assert summary['POST /suggest']['statuses'] == {'409': 1}
+    assert summary['GET /boom']['errorRate'] == 1.0
@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+import backend.main as main
+from backend.loop_monitor import BLOCKING_CALLS, LoopLagMonitor, bind_request
+
+
+def _blocking_handler_for_monitor(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+def test_monitor_captures_blocking_frame_and_route():
+    monitor = LoopLagMonitor(interval=0.01, threshold=0.05)
+    route = 'POST /api/test/:param'
+    before = BLOCKING_CALLS.labels(route)._value.get()
+
+    async def handler():
+        bind_request(route, 'trace-block-1')
+        _blocking_handler_for_monitor(0.3)
+
+    async def run():
+        await monitor.start()
+        try:
+            await asyncio.sleep(0.05)
+            await asyncio.create_task(handler())
+            await asyncio.sleep(0.05)
+        finally:
+            await monitor.stop()
+
+    asyncio.run(run())
+
+    offenders = monitor.offenders()
+    assert len(offenders) == 1
+    offender = offenders[0]
+    assert offender['route'] == route
+    assert offender['traceId'] == 'trace-block-1'
+    assert offender['finished'] and offender['blockedSeconds'] >= 0.2
+    assert any('_blocking_handler_for_monitor' in frame for frame in offender['stack'])
+    assert BLOCKING_CALLS.labels(route)._value.get() == before + 1
+    assert monitor.max_lag >= 0.2
+    assert not monitor.running
+
+
+def test_monitor_ignores_short_pauses():
+    monitor = LoopLagMonitor(interval=0.01, threshold=0.2)
+
+    async def run():
+        await monitor.start()
+        try:
+            for _ in range(5):
+                _blocking_handler_for_monitor(0.02)
+                await asyncio.sleep(0.02)
+        finally:
+            await monitor.stop()
+
+    asyncio.run(run())
+    assert monitor.offenders() == []
+    assert monitor.max_lag > 0
+
+
+def test_disabled_monitor_does_not_start():
+    monitor = LoopLagMonitor(enabled=False)
+
+    async def run():
+        await monitor.start()
+        assert not monitor.running
+        await monitor.stop()
+
+    asyncio.run(run())
+
+
+def test_event_loop_endpoint_is_admin_only():
+    client = TestClient(main.app)
+    admin = {'Authorization': f"Bearer {main.create_token('loop-admin', 'admin')}"}
+    user = {'Authorization': f"Bearer {main.create_token('loop-user', 'user')}"}
+
+    assert client.get('/system/event-loop', headers=user).status_code == 403
+    resp = client.get('/system/event-loop', headers=admin)
+    assert resp.status_code == 200
+    data = resp.json()
+    assert {'running', 'thresholdSeconds', 'maxLagSeconds', 'offenders'} <= set(data)
@@ -0,0 +1,133 @@
+import json
+import os
+import tracemalloc
+
+import pytest
+import structlog
+from fastapi.testclient import TestClient
+
+import backend.main as main
+from backend.memory_diagnostics import (
+    MemoryTracer,
+    cache_sizes,
+    register_cache,
+    subsystem_for,
+    unregister_cache,
+)
+
+
+@pytest.fixture
+def tracer():
+    if tracemalloc.is_tracing():
+        pytest.skip('tracemalloc already running')
+    tracer = MemoryTracer(frames=1, max_snapshots=3)
+    yield tracer
+    tracer.stop()
+
+
+def _sizes(name):
+    return next(entry for entry in cache_sizes() if entry['name'] == name)
+
+
+def _line_of(marker):
+    with open(__file__, encoding='utf-8') as handle:
+        for number, line in enumerate(handle, start=1):
+            if marker in line and '_line_of' not in line:
+                return number
+    raise AssertionError(marker)
+
+
+def test_cache_registry_reports_containers_and_callables():
+    items = {'a': 1, 'b': 2}
+    register_cache('test.items', items)
+    register_cache('test.figures', lambda: {'rooms': 3, 'bytes': 10}, subsystem='custom')
+    try:
+        assert _sizes('test.items') == {
+            'name': 'test.items',
+            'subsystem': 'test',
+            'sizes': {'entries': 2},
+        }
+        items['c'] = 3
+        assert _sizes('test.items')['sizes'] == {'entries': 3}
+        assert _sizes('test.figures')['subsystem'] == 'custom'
+
+        register_cache('test.items', lambda: 7)
+        assert _sizes('test.items')['sizes'] == {'entries': 7}
+    finally:
+        unregister_cache('test.items')
+        unregister_cache('test.figures')
+    assert not any(entry['name'].startswith('test.') for entry in cache_sizes())
+
+
+def test_subsystem_for_groups_files():
+    assert subsystem_for(main.__file__) == 'backend.main'
+    assert subsystem_for(json.__file__) == 'stdlib'
+    assert subsystem_for(structlog.__file__) == 'structlog'
+    assert subsystem_for(os.path.abspath(__file__)) == 'other'
+
+
+def test_diff_points_at_growing_line(tracer):
+    with pytest.raises(RuntimeError):
+        tracer.take_snapshot('early')
+    tracer.start()
+    tracer.take_snapshot('before')
+    retained = [bytearray(1024) for _ in range(2000)]  # the growth under test
+    tracer.take_snapshot('after')
+
+    diff = tracer.diff('before', 'after', top=5)
+    top = diff['byLine'][0]
+    assert top['location'].endswith(f"test_memory_diagnostics.py:{_line_of('the growth under test')}")
+    assert top['sizeDiff'] >= 2000 * 1024 and top['countDiff'] >= 2000
+    assert diff['bySubsystem'][0]['subsystem'] == 'other'
+    assert diff['totalSizeDiff'] >= 2000 * 1024
+
+    del retained
+    live = tracer.diff('after', top=5)
+    assert live['target'] is None and live['totalSizeDiff'] < 0
+
+    with pytest.raises(KeyError):
+        tracer.diff('missing')
+
+
+def test_snapshots_are_bounded_and_survive_stop(tracer):
+    tracer.start()
+    for name in ('s1', 's2', 's3', 's4'):
+        tracer.take_snapshot(name)
+    assert [snap['name'] for snap in tracer.snapshots()] == ['s2', 's3', 's4']
+    tracer.stop()
+    assert not tracer.tracing
+    assert tracer.diff('s2', 's4')['base'] == 's2'
+    assert tracer.delete_snapshot('s3') and not tracer.delete_snapshot('s3')
+
+
+def test_memory_endpoints_admin_only(monkeypatch, tracer):
+    monkeypatch.setattr(main, 'MEMORY_TRACER', tracer)
+    client = TestClient(main.app)
+    admin = {'Authorization': f"Bearer {main.create_token('memory-admin', 'admin')}"}
+    user = {'Authorization': f"Bearer {main.create_token('memory-user', 'user')}"}
+
+    assert client.post('/system/memory/tracemalloc', json={}, headers=user).status_code == 403
+    assert client.post('/system/memory/snapshots', json={'name': 'a'}, headers=admin).status_code == 409
+
+    started = client.post('/system/memory/tracemalloc', json={'frames': 2}, headers=admin).json()
+    assert started['tracing'] and started['frames'] == 2
+    assert client.post('/system/memory/snapshots', json={'name': 'a'}, headers=admin).status_code == 200
+    main.NOTE_VERSIONS['memory-test'].append({'content': 'x' * 4096})
+    try:
+        client.post('/system/memory/snapshots', json={'name': 'b'}, headers=admin)
+        diff = client.get('/system/memory/diff', params={'base': 'a', 'target': 'b'}, headers=admin)
+        assert diff.status_code == 200
+        assert {'byLine', 'bySubsystem', 'totalSizeDiff'} <= set(diff.json())
+        assert client.get('/system/memory/diff', params={'base': 'zz'}, headers=admin).status_code == 404
+
+        caches = {entry['name']: entry for entry in client.get('/system/memory/caches', headers=admin).json()['caches']}
+        assert caches['notes.versions']['sizes']['versions'] >= 1
+        assert {'analytics.events', 'ws.compose_stream', 'public_health.recommendations'} <= set(caches)
+    finally:
+        main.NOTE_VERSIONS.pop('memory-test', None)
+
+    listed = client.get('/system/memory/snapshots', headers=admin).json()
+    assert [snap['name'] for snap in listed['snapshots']] == ['a', 'b']
+    assert client.delete('/system/memory/snapshots/a', headers=admin).status_code == 200
+    stopped = client.delete('/system/memory/tracemalloc', headers=admin).json()
+    assert stopped['tracing'] is False
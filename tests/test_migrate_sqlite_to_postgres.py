@@ -0,0 +1,142 @@
+import csv
+import importlib.util
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+_spec = importlib.util.spec_from_file_location(
+    'migrate_sqlite_to_postgres', ROOT / 'backend' / 'scripts' / 'migrate_sqlite_to_postgres.py'
+)
+assert _spec and _spec.loader
+migrate = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = migrate
+_spec.loader.exec_module(migrate)
+
+
+@pytest.fixture
+def source_db(tmp_path):
+    path = tmp_path / 'source.db'
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE clinics (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY,
+            clinic_id INTEGER REFERENCES clinics(id),
+            username TEXT NOT NULL,
+            created_at REAL
+        );
+        CREATE TABLE events (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users(id), payload TEXT);
+        """
+    )
+    conn.executemany('INSERT INTO clinics VALUES (?, ?)', [(i, f'clinic-{i}') for i in range(1, 4)])
+    conn.executemany(
+        'INSERT INTO users VALUES (?, ?, ?, ?)',
+        [(i, i % 3 + 1, f'user-{i}', 1700000000.0 + i) for i in range(1, 51)],
+    )
+    conn.executemany(
+        'INSERT INTO events VALUES (?, ?, ?)',
+        [(i, i % 50 + 1, f'event {i}') for i in range(1, 501)],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _count(path, table):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+def test_plan_table_levels_follows_foreign_keys(source_db):
+    engine = migrate.create_engine(f'sqlite:///{source_db}')
+    tables = migrate.determine_table_order(migrate.reflect_sqlite_metadata(engine))
+    assert migrate.plan_table_levels(tables) == [['clinics'], ['users'], ['events']]
+
+
+def test_bulk_dry_run_into_sqlite_is_idempotent(source_db, tmp_path):
+    target = tmp_path / 'target.db'
+    prefix = tmp_path / 'report'
+    argv = [
+        '--sqlite', f'sqlite:///{source_db}',
+        '--postgres', f'sqlite:///{target}',
+        '--bulk', '--workers', '2', '--chunk-size', '64',
+        '--report-prefix', str(prefix),
+    ]
+    assert migrate.main(argv) == 0
+    assert _count(target, 'events') == 500
+    assert _count(target, 'users') == 50
+
+    with open(f'{prefix}.csv', newline='', encoding='utf-8') as handle:
+        rows = {row['table']: row for row in csv.DictReader(handle)}
+    assert rows['events']['inserted'] == '500'
+    assert rows['events']['end_pk'] == '500'
+
+    assert migrate.main(argv) == 0
+    with open(f'{prefix}.csv', newline='', encoding='utf-8') as handle:
+        rows = {row['table']: row for row in csv.DictReader(handle)}
+    assert rows['events']['inserted'] == '0'
+    assert rows['events']['skipped'] == '500'
+    assert _count(target, 'events') == 500
+
+
+def test_bulk_resume_skips_rows_up_to_token(source_db, tmp_path):
+    target = tmp_path / 'target.db'
+    report = migrate.bulk_migrate_table(
+        f'sqlite:///{source_db}', f'sqlite:///{target}', 'events', 100, '450'
+    )
+    assert report.attempted == 50
+    assert report.inserted == 50
+    assert report.start_pk == '450'
+    assert report.end_pk == '500'
+    with sqlite3.connect(target) as conn:
+        assert conn.execute('SELECT MIN(id) FROM events').fetchone()[0] == 451
+
+
+@pytest.mark.postgres
+def test_bulk_copy_into_postgres_commits_each_chunk(source_db, tmp_path, sqlalchemy_database_url):
+    if not sqlalchemy_database_url.startswith('postgres'):
+        pytest.skip('Requires a PostgreSQL TEST_DATABASE_URL.')
+    sa = migrate.sa
+    engine = migrate.create_engine(sqlalchemy_database_url)
+    with engine.begin() as conn:
+        conn.execute(sa.text('DROP TABLE IF EXISTS events, users, clinics CASCADE'))
+        conn.execute(sa.text('CREATE TABLE clinics (id INTEGER PRIMARY KEY, name TEXT NOT NULL)'))
+        conn.execute(
+            sa.text(
+                'CREATE TABLE users (id INTEGER PRIMARY KEY, clinic_id INTEGER REFERENCES clinics(id), '
+                'username TEXT NOT NULL, created_at TIMESTAMPTZ)'
+            )
+        )
+        conn.execute(sa.text('CREATE UNIQUE INDEX users_username_key ON users (username)'))
+        conn.execute(sa.text('CREATE INDEX users_clinic_idx ON users (clinic_id)'))
+        conn.execute(
+            sa.text('CREATE TABLE events (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users(id), payload TEXT)')
+        )
+    argv = [
+        '--sqlite', f'sqlite:///{source_db}',
+        '--postgres', sqlalchemy_database_url,
+        '--bulk', '--workers', '2', '--chunk-size', '64',
+        '--report-prefix', str(tmp_path / 'report'),
+    ]
+    try:
+        assert migrate.main(argv) == 0
+        assert migrate.main(argv) == 0
+        with engine.connect() as conn:
+            counts = {
+                table: conn.execute(sa.text(f'SELECT COUNT(*) FROM {table}')).scalar_one()
+                for table in ('clinics', 'users', 'events')
+            }
+            indexes = set(
+                conn.execute(sa.text("SELECT indexname FROM pg_indexes WHERE tablename = 'users'")).scalars()
+            )
+        assert counts == {'clinics': 3, 'users': 50, 'events': 500}
+        assert {'users_username_key', 'users_clinic_idx'} <= indexes
+    finally:
+        with engine.begin() as conn:
+            conn.execute(sa.text('DROP TABLE IF EXISTS events, users, clinics CASCADE'))
+        engine.dispose()
@@ -92,3 +92,22 @@ def test_status_alerts_reflect_events(monkeypatch):
     assert data['ai']['errors'] >= 1
     assert data['exports']['failures'] >= 1
     assert data['workflow']['total'] >= 1
+
+
+def test_status_jobs_reports_queues():
+    client = TestClient(main.app)
+    token_user = main.create_token('jobs-user', 'user')
+    token_admin = main.create_token('jobs-admin', 'admin')
+
+    assert client.get('/status/jobs', headers={'Authorization': f'Bearer {token_user}'}).status_code == 403
+
+    resp = client.get('/status/jobs', headers={'Authorization': f'Bearer {token_admin}'})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert {'running', 'queues', 'periodic', 'recentFailures'} <= set(data)
+
+    body = client.get(
+        '/metrics?format=prometheus', headers={'Authorization': f'Bearer {token_admin}'}
+    ).text
+    assert 'revenuepilot_job_queue_depth' in body
+    assert 'revenuepilot_job_latency_seconds' in body
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.main as main
+from backend.profiling import SamplingProfiler
+
+
+def _busy_loop_for_profiler(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(200))
+
+
+def _wait_for(predicate, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'condition not reached'
+        time.sleep(0.01)
+
+
+def test_timed_session_collects_collapsed_stacks():
+    profiler = SamplingProfiler(interval=0.001)
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_loop_for_profiler, args=(stop,), name='busy-worker')
+    worker.start()
+    try:
+        session = profiler.start(seconds=0.3)
+        assert profiler.active
+        _wait_for(lambda: session.done)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert not profiler.active
+    assert session.samples > 0
+    lines = session.collapsed().splitlines()
+    busy = [line for line in lines if '_busy_loop_for_profiler' in line]
+    assert busy and all(line.startswith('busy-worker;') for line in busy)
+    stack, count = busy[0].rsplit(' ', 1)
+    assert int(count) > 0 and stack.count(';') >= 1
+    # The sampler thread exits once no session is live.
+    _wait_for(lambda: profiler._thread is None)
+
+
+def test_route_session_captures_next_matching_requests():
+    profiler = SamplingProfiler(interval=0.001)
+    assert profiler.begin_request('GET', '/api/notes', '/api/notes', None) is None
+
+    session = profiler.start(route='/api/compose/:param', method='get', requests=2)
+    assert session.to_dict()['status'] == 'armed'
+    assert profiler.begin_request('GET', '/api/notes', '/api/notes', None) is None
+    assert profiler.begin_request('POST', '/api/compose/7', '/api/compose/:param', None) is None
+
+    first = profiler.begin_request('GET', '/api/compose/7', '/api/compose/:param', None)
+    assert first == [session]
+    assert session.to_dict()['status'] == 'running'
+    _wait_for(lambda: session.samples > 0)
+    profiler.end_request(first)
+    assert not session.done
+
+    second = profiler.begin_request('GET', '/api/compose/8', '/api/compose/:param', None)
+    assert profiler.begin_request('GET', '/api/compose/9', '/api/compose/:param', None) is None
+    profiler.end_request(second)
+    assert session.done and session.matched == 2
+    assert not profiler.active
+
+
+def test_trace_session_matches_only_that_trace():
+    profiler = SamplingProfiler(interval=0.001)
+    session = profiler.start(trace_id='trace-abc')
+    assert profiler.begin_request('GET', '/x', '/x', 'other') is None
+    matched = profiler.begin_request('GET', '/x', '/x', 'trace-abc')
+    profiler.end_request(matched)
+    assert session.done and session.requests == 1
+
+
+def test_session_validation_and_limits():
+    profiler = SamplingProfiler(max_sessions=1, max_seconds=5)
+    with pytest.raises(ValueError):
+        profiler.start()
+    with pytest.raises(ValueError):
+        profiler.start(seconds=1, requests=3)
+    session = profiler.start(route='/a', seconds=60)
+    assert session.deadline - session.started_at == 5
+    with pytest.raises(RuntimeError):
+        profiler.start(seconds=1)
+    assert profiler.stop(session.id) is session
+    assert session.done and not profiler.active
+    profiler.start(seconds=1)
+
+
+def test_profile_endpoints_admin_only_and_trace_scoped(monkeypatch):
+    monkeypatch.setattr(main, 'PROFILER', SamplingProfiler(interval=0.001))
+    client = TestClient(main.app)
+    admin = {'Authorization': f"Bearer {main.create_token('profile-admin', 'admin')}"}
+    user = {'Authorization': f"Bearer {main.create_token('profile-user', 'user')}"}
+
+    assert client.post('/system/profile', json={'seconds': 1}, headers=user).status_code == 403
+    assert client.post('/system/profile', json={}, headers=admin).status_code == 400
+
+    resp = client.post('/system/profile', json={'traceId': 'trace-profile-1'}, headers=admin)
+    assert resp.status_code == 200
+    session_id = resp.json()['id']
+
+    client.get('/health')
+    assert main.PROFILER.get(session_id).matched == 0
+    client.get('/health', headers={'X-Trace-Id': 'trace-profile-1'})
+
+    detail = client.get(f'/system/profile/{session_id}', headers=admin).json()
+    assert detail['status'] == 'completed'
+    assert detail['matchedRequests'] == 1
+
+    collapsed = client.get(
+        f'/system/profile/{session_id}', params={'format': 'collapsed'}, headers=admin
+    )
+    assert collapsed.status_code == 200
+    assert collapsed.headers['content-type'].startswith('text/plain')
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in collapsed.text.splitlines())
+
+    listed = client.get('/system/profile', headers=admin).json()
+    assert [entry['id'] for entry in listed['sessions']] == [session_id]
+    assert client.delete('/system/profile/missing', headers=admin).status_code == 404
@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+
+from backend.rate_limit import MemoryBackend, RateLimiter, SQLiteBackend, retry_after_header
+
+
+class _Clock:
+    def __init__(self, now: float = 1000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_bucket_allows_burst_then_refills():
+    clock = _Clock()
+    limiter = RateLimiter(3, 30, backend=MemoryBackend(clock=clock))
+
+    assert [limiter.allow("k") for _ in range(4)] == [True, True, True, False]
+    assert limiter.retry_after("k") == pytest.approx(10.0)
+
+    clock.now += 10
+    allowed, retry = limiter.check("k")
+    assert allowed and retry == 0.0
+    assert limiter.check("k") == (False, pytest.approx(10.0))
+    assert limiter.allow("other")
+
+
+def test_reset_and_disabled_limiter():
+    limiter = RateLimiter(1, 60, backend=MemoryBackend(clock=_Clock()))
+    assert limiter.allow("k") and not limiter.allow("k")
+    limiter.reset("k")
+    assert limiter.allow("k")
+
+    disabled = RateLimiter(0, 60)
+    assert all(disabled.allow("k") for _ in range(100))
+
+
+def test_limiters_sharing_a_backend_are_namespaced():
+    backend = MemoryBackend(clock=_Clock())
+    login = RateLimiter(1, 60, name="login", backend=backend)
+    mfa = RateLimiter(1, 60, name="mfa", backend=backend)
+    assert login.allow("k") and mfa.allow("k")
+    assert not login.allow("k")
+
+
+def test_memory_backend_evicts_refilled_and_excess_keys():
+    clock = _Clock()
+    backend = MemoryBackend(shards=1, max_keys=50, clock=clock)
+    limiter = RateLimiter(2, 10, backend=backend)
+
+    for i in range(20):
+        limiter.allow(f"ip-{i}")
+    assert len(backend) == 20
+    clock.now += 10
+    limiter.allow("fresh")
+    assert len(backend) == 1
+
+    for i in range(500):
+        limiter.allow(f"rotating-{i}")
+    assert len(backend) == 50
+
+
+def test_memory_backend_is_thread_safe():
+    limiter = RateLimiter(100, 3600, backend=MemoryBackend(clock=_Clock()))
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        outcomes = [limiter.allow("shared") for _ in range(50)]
+        with lock:
+            results.extend(outcomes)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 100
+
+
+def test_sqlite_backend_shares_limits_between_instances(tmp_path):
+    clock = _Clock()
+    path = str(tmp_path / "limits.sqlite")
+    first = RateLimiter(2, 60, name="login", backend=SQLiteBackend(path, clock=clock))
+    second = RateLimiter(2, 60, name="login", backend=SQLiteBackend(path, clock=clock))
+
+    assert first.allow("ip") and second.allow("ip")
+    assert not first.allow("ip")
+    assert second.retry_after("ip") == pytest.approx(30.0)
+
+    clock.now += 60
+    assert first.backend.prune() == 1
+    assert second.allow("ip")
+    second.reset("ip")
+    assert second.retry_after("ip") == 0.0
+    first.backend.close()
+    second.backend.close()
+
+
+def test_retry_after_header_rounds_up():
+    assert retry_after_header(0.2) == {"Retry-After": "1"}
+    assert retry_after_header(0.0) is None
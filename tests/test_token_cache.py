@@ -0,0 +1,120 @@
+import sqlite3
+import time
+
+import jwt
+import pytest
+
+from backend.db_pool import SQLitePool
+from backend.token_cache import SQLiteRevocationFeed, TokenRevokedError, VerifiedTokenCache
+
+SECRET = "token-cache-secret"
+
+
+def _token(sid=None, exp_in=600, sub="alice"):
+    payload = {"sub": sub, "role": "user", "exp": int(time.time()) + exp_in}
+    if sid:
+        payload["sid"] = sid
+    return jwt.encode(payload, SECRET, algorithm="HS256")
+
+
+class _CountingDecoder:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, token):
+        self.calls += 1
+        return jwt.decode(token, SECRET, algorithms=["HS256"])
+
+
+def test_verify_caches_claims_until_expiry():
+    clock_now = [time.time()]
+    cache = VerifiedTokenCache(clock=lambda: clock_now[0])
+    decode = _CountingDecoder()
+    token = _token(exp_in=60)
+
+    first = cache.verify(token, decode)
+    first["role"] = "admin"
+    assert cache.verify(token, decode)["role"] == "user"
+    assert decode.calls == 1
+
+    # Past ``exp`` the cached entry is dropped and the token re-verified.
+    clock_now[0] += 120
+    cache.verify(token, decode)
+    assert decode.calls == 2
+
+
+def test_invalid_tokens_are_not_cached():
+    cache = VerifiedTokenCache()
+    bad = jwt.encode({"sub": "x"}, "other-secret", algorithm="HS256")
+    for _ in range(2):
+        with pytest.raises(jwt.InvalidSignatureError):
+            cache.verify(bad, _CountingDecoder())
+    assert len(cache) == 0
+
+
+def test_cache_is_bounded():
+    cache = VerifiedTokenCache(max_entries=3)
+    decode = _CountingDecoder()
+    for i in range(10):
+        cache.verify(_token(sub=f"user-{i}"), decode)
+    assert len(cache) == 3
+
+
+def test_revoked_sessions_and_tokens_are_rejected():
+    cache = VerifiedTokenCache()
+    decode = _CountingDecoder()
+    cached = _token(sid="s1")
+    cache.verify(cached, decode)
+
+    cache.revoke_session("s1", time.time() + 600)
+    with pytest.raises(TokenRevokedError):
+        cache.verify(cached, decode)
+    with pytest.raises(TokenRevokedError):
+        cache.verify(_token(sid="s1", exp_in=900), decode)
+
+    other = _token(sid="s2")
+    cache.revoke_token(other, time.time() + 600)
+    with pytest.raises(jwt.PyJWTError):
+        cache.verify(other, decode)
+    assert cache.verify(_token(sid="s3"), decode)["sub"] == "alice"
+
+
+def test_revocations_fan_out_between_workers(tmp_path):
+    pool = SQLitePool(str(tmp_path / "auth.sqlite"))
+    worker_a, worker_b = VerifiedTokenCache(), VerifiedTokenCache()
+    feed_a = SQLiteRevocationFeed(worker_a, lambda: pool)
+    feed_b = SQLiteRevocationFeed(worker_b, lambda: pool, poll_interval=0)
+    worker_a.add_revocation_hook(feed_a.publish)
+
+    assert feed_b.poll() == 0
+    token = _token(sid="shared")
+    worker_b.verify(token, _CountingDecoder())
+
+    worker_a.revoke_session("shared", time.time() + 600)
+    feed_b.maybe_poll()
+    with pytest.raises(TokenRevokedError):
+        worker_b.verify(token, _CountingDecoder())
+    assert feed_b.poll() == 0
+    pool.close()
+
+
+def test_feed_prunes_expired_revocations(tmp_path):
+    pool = SQLitePool(str(tmp_path / "auth.sqlite"))
+    cache = VerifiedTokenCache()
+    feed = SQLiteRevocationFeed(cache, lambda: pool)
+    feed.publish("session", "old", time.time() - 1)
+    feed.publish("session", "new", time.time() + 600)
+    with pool.read() as conn:
+        rows = conn.execute("SELECT identifier FROM auth_revocations").fetchall()
+    assert [row["identifier"] for row in rows] == ["new"]
+    pool.close()
+
+
+def test_feed_works_on_a_wrapped_in_memory_connection():
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    pool = SQLitePool.wrap(conn)
+    cache = VerifiedTokenCache()
+    feed = SQLiteRevocationFeed(cache, lambda: pool)
+    cache.add_revocation_hook(feed.publish)
+    cache.revoke_session("s", time.time() + 60)
+    assert feed.poll() == 1
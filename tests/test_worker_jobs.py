@@ -1,10 +1,13 @@
 import asyncio
+import os
 from copy import deepcopy
 from typing import Any, Dict, List
 
 import pytest
+import sqlalchemy as sa
+from sqlalchemy.pool import StaticPool
 
-from backend import code_tables, codes_data, compliance, worker
+from backend import code_tables, codes_data, compliance, jobs, worker
 import backend.main as main_module
 
 
@@ -159,14 +162,18 @@ async def test_check_compliance_rules_refreshes_catalog(monkeypatch: pytest.Monk
         compliance._RESOURCE_LIBRARY = original_resources
 
 
+def _engine():
+    return sa.create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+        future=True,
+    )
+
+
 @pytest.mark.asyncio
 async def test_scheduler_runs_configured_jobs(monkeypatch: pytest.MonkeyPatch) -> None:
     call_order: List[str] = []
-    task_queue: asyncio.Queue = asyncio.Queue()
-
-    monkeypatch.setattr(worker, "_task_queue", task_queue, raising=False)
-    monkeypatch.setattr(worker, "_background_tasks", [], raising=False)
-
     codes_counter = {"count": 0}
 
     async def fake_codes() -> None:
@@ -181,41 +188,195 @@ async def test_scheduler_runs_configured_jobs(monkeypatch: pytest.MonkeyPatch) -
     async def fake_aggregate() -> None:
         call_order.append("aggregate")
 
-    async def fake_retrain_job() -> None:
-        call_order.append("retrain_job")
-
     async def fake_audit_job() -> None:
         call_order.append("audit_job")
 
-    async def fake_queue_model() -> None:
-        call_order.append("queue_model")
-        await worker._task_queue.put(fake_retrain_job)
-
-    async def fake_queue_audit() -> None:
-        call_order.append("queue_audit")
-        await worker._task_queue.put(fake_audit_job)
-
+    monkeypatch.setattr(worker, "_job_queue", None)
     monkeypatch.setattr(worker, "update_code_databases", fake_codes)
     monkeypatch.setattr(worker, "check_compliance_rules", fake_compliance)
     monkeypatch.setattr(worker, "aggregate_analytics_and_backup", fake_aggregate)
-    monkeypatch.setattr(worker, "queue_model_retraining", lambda: fake_queue_model())
-    monkeypatch.setattr(worker, "queue_audit_trail_generation", lambda: fake_queue_audit())
+    monkeypatch.setattr(worker, "generate_audit_trail", fake_audit_job)
 
     monkeypatch.setattr(worker, "CODE_REFRESH_INTERVAL", 0.05, raising=False)
     monkeypatch.setattr(worker, "COMPLIANCE_REFRESH_INTERVAL", 0.05, raising=False)
     monkeypatch.setattr(worker, "ANALYTICS_REFRESH_INTERVAL", 0.05, raising=False)
-    monkeypatch.setattr(worker, "MODEL_REFRESH_INTERVAL", 0.05, raising=False)
+    monkeypatch.setattr(worker, "MODEL_REFRESH_INTERVAL", 60, raising=False)
     monkeypatch.setattr(worker, "AUDIT_REFRESH_INTERVAL", 0.05, raising=False)
+    monkeypatch.setattr(worker, "JOB_POLL_INTERVAL", 0.01, raising=False)
 
-    worker.start_scheduler()
+    queue = worker.start_scheduler(_engine())
     try:
-        await asyncio.sleep(0.2)
+        await asyncio.sleep(0.3)
+        status = worker.job_status()
     finally:
         await worker.stop_scheduler()
 
-    assert codes_counter["count"] >= 2  # retried after initial failure
+    assert codes_counter["count"] >= 2  # later runs still happen after a failure
     assert "codes" in call_order
     assert "compliance" in call_order
-    assert "queue_model" in call_order and "retrain_job" in call_order
-    assert "queue_audit" in call_order and "audit_job" in call_order
     assert "aggregate" in call_order
+    assert "audit_job" in call_order
+    assert status["running"] is True
+    assert status["queues"]["codes"]["succeeded"] >= 1
+    assert {entry["name"] for entry in status["periodic"]} >= {"update_code_databases", "retrain_model"}
+    assert worker.get_job_queue() is None
+    assert queue.stats()["queues"]["maintenance"]["concurrency"] == 2
+
+
+@pytest.mark.asyncio
+async def test_slow_queue_does_not_block_other_queues() -> None:
+    queue = jobs.JobQueue(_engine(), queues=[jobs.QueueConfig("codes"), jobs.QueueConfig("maintenance")])
+    queue.ensure_schema()
+    release = asyncio.Event()
+    order: List[str] = []
+
+    async def slow_refresh() -> None:
+        order.append("refresh_started")
+        await release.wait()
+        order.append("refresh_done")
+
+    async def audit() -> str:
+        order.append("audit")
+        return "ok"
+
+    queue.register(jobs.JobSpec("refresh", slow_refresh, queue="codes"))
+    queue.register(jobs.JobSpec("audit", audit, queue="maintenance"))
+    queue.enqueue("refresh")
+    queue.enqueue("refresh")
+    audit_id = queue.enqueue("audit")
+
+    first = queue.claim()
+    assert first is not None and first.name == "refresh"
+    running = asyncio.create_task(queue.execute(first))
+    await asyncio.sleep(0)
+    # The codes lane is full, so the second refresh waits while audit runs.
+    second = queue.claim()
+    assert second is not None and second.id == audit_id
+    await queue.execute(second)
+    assert queue.claim() is None
+    release.set()
+    await running
+
+    assert order == ["refresh_started", "audit", "refresh_done"]
+    stats = queue.stats()
+    assert stats["queues"]["codes"]["succeeded"] == 1
+    assert stats["queues"]["codes"]["queued"] == 1
+
+
+@pytest.mark.asyncio
+async def test_priority_retry_and_failure() -> None:
+    queue = jobs.JobQueue(_engine(), retry_delay=0.0)
+    queue.ensure_schema()
+    calls: List[str] = []
+
+    def flaky(label: str) -> None:
+        calls.append(label)
+        raise ValueError("boom")
+
+    queue.register(jobs.JobSpec("flaky", flaky, max_attempts=2))
+    queue.enqueue("flaky", {"label": "low"})
+    queue.enqueue("flaky", {"label": "high"}, priority=5)
+
+    assert await queue.run_pending() == 4
+    assert calls == ["high", "high", "low", "low"]
+    failures = queue.stats()["recentFailures"]
+    assert len(failures) == 2
+    assert failures[0]["error"] == "ValueError: boom"
+
+
+def test_expired_lease_is_recovered_by_another_process() -> None:
+    engine = _engine()
+    first = jobs.JobQueue(engine, owner="api-1", lease_seconds=10)
+    second = jobs.JobQueue(engine, owner="api-2", lease_seconds=10)
+    for queue in (first, second):
+        queue.register(jobs.JobSpec("audit", lambda: None))
+    first.ensure_schema()
+    job_id = first.enqueue("audit")
+
+    claimed = first.claim(now=1e12)
+    assert claimed is not None and claimed.id == job_id
+    assert second.claim(now=1e12) is None
+    assert first.heartbeat(now=1e12 + 5) == 1
+
+    assert second.recover_expired(now=1e12 + 12) == 0
+    assert second.recover_expired(now=1e12 + 20) == 1
+    reclaimed = second.claim(now=1e12 + 20)
+    assert reclaimed is not None and reclaimed.id == job_id
+    assert reclaimed.attempts == 2
+
+
+def test_periodic_runs_are_deduplicated_across_processes() -> None:
+    engine = _engine()
+    queues = [jobs.JobQueue(engine, owner=f"api-{idx}") for idx in range(3)]
+    for queue in queues:
+        queue.register(jobs.JobSpec("refresh", lambda: None, queue="codes"))
+        queue.add_periodic(jobs.PeriodicJob("refresh", interval=60))
+    queues[0].ensure_schema()
+
+    enqueued = [queue.enqueue_periodic(now=600.0) for queue in queues]
+    assert sum(len(ids) for ids in enqueued) == 1
+    assert all(queue.enqueue_periodic(now=630.0) == [] for queue in queues)
+    assert len(queues[1].enqueue_periodic(now=660.0)) == 1
+
+
+@pytest.mark.asyncio
+async def test_cpu_bound_jobs_run_in_process_pool() -> None:
+    queue = jobs.JobQueue(_engine(), process_workers=1)
+    queue.ensure_schema()
+    queue.register(jobs.JobSpec("pid", os.getpid, cpu_bound=True))
+    job_id = queue.enqueue("pid")
+    try:
+        assert await queue.run_pending() == 1
+    finally:
+        await queue.stop()
+    with queue.engine.connect() as conn:
+        result = conn.execute(
+            sa.select(jobs.JOBS_TABLE.c.result).where(jobs.JOBS_TABLE.c.id == job_id)
+        ).scalar_one()
+    assert isinstance(result, int) and result != os.getpid()
+
+
+def test_failed_periodic_enqueue_is_retried_next_tick(monkeypatch: pytest.MonkeyPatch) -> None:
+    queue = jobs.JobQueue(_engine())
+    queue.register(jobs.JobSpec("refresh", lambda: None))
+    queue.add_periodic(jobs.PeriodicJob("refresh", interval=60))
+    queue.ensure_schema()
+    original = queue.enqueue
+
+    def broken(*args: Any, **kwargs: Any) -> int:
+        raise sa.exc.OperationalError("INSERT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(queue, "enqueue", broken)
+    with pytest.raises(sa.exc.OperationalError):
+        queue.enqueue_periodic(now=600.0)
+    monkeypatch.setattr(queue, "enqueue", original)
+    assert len(queue.enqueue_periodic(now=610.0)) == 1
+
+
+def test_job_engine_falls_back_to_application_database(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    from backend import database_legacy
+
+    monkeypatch.delenv(worker.JOB_DATABASE_URL_ENV, raising=False)
+    monkeypatch.setattr(main_module, "db_conn", None)
+    monkeypatch.setattr(database_legacy, "SQLITE_PATH", tmp_path / "app.db")
+    engine = worker._resolve_job_engine()
+    try:
+        assert engine.url.database == str(tmp_path / "app.db")
+    finally:
+        engine.dispose()
+
+
+def test_job_engine_uses_its_own_connections_for_file_databases(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    import sqlite3
+
+    conn = sqlite3.connect(tmp_path / "api.db", check_same_thread=False)
+    monkeypatch.delenv(worker.JOB_DATABASE_URL_ENV, raising=False)
+    monkeypatch.setattr(main_module, "db_conn", conn)
+    engine = worker._resolve_job_engine()
+    try:
+        assert engine.url.database == str(tmp_path / "api.db")
+        assert jobs.JobQueue(engine).offload is True
+        assert jobs.JobQueue(_engine()).offload is False
+    finally:
+        engine.dispose()
+        conn.close()
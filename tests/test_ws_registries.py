@@ -0,0 +1,103 @@
+import asyncio
+import json
+import time
+
+import backend.main as main
+from backend.context_pipeline import ContextEventManager
+from backend.ws_streams import EncounterDeltaStream, ReplayBuffer, WS_REGISTRY_SIZE
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+
+def _gauge(registry, kind):
+    return WS_REGISTRY_SIZE.labels(registry, kind)._value.get()
+
+
+def test_replay_buffer_bounds_events_and_bytes():
+    buffer = ReplayBuffer(max_events=3, max_bytes=1000)
+    for i in range(1, 6):
+        buffer.append(i, json.dumps({"eventId": i}))
+    assert [json.loads(f)["eventId"] for f in buffer.since()] == [3, 4, 5]
+    assert [json.loads(f)["eventId"] for f in buffer.since(4)] == [5]
+
+    small = ReplayBuffer(max_events=100, max_bytes=40)
+    for i in range(10):
+        small.append(i, json.dumps({"eventId": i, "pad": "x" * 10}))
+    assert small.nbytes <= 40
+    assert len(small) >= 1
+
+
+def test_connection_manager_replays_and_evicts_idle_users():
+    manager = main.ConnectionManager("test", history_size=2, ttl=60)
+
+    async def scenario():
+        ws = FakeWebSocket()
+        sid = await manager.connect(ws, "alice", None, None)
+        for n in range(3):
+            await manager.push(sid, {"n": n})
+        assert [m["n"] for m in ws.sent] == [0, 1, 2]
+        manager.disconnect(sid)
+        await manager.push_user("alice", {"n": 3})
+
+        again = FakeWebSocket()
+        await manager.connect(again, "alice", None, 2)
+        assert [m["eventId"] for m in again.sent] == [3, 4]
+        return again
+
+    asyncio.run(scenario())
+    assert manager.sweep(time.monotonic() + 120) == 0  # still connected
+    for session_id in list(manager.active):
+        manager.disconnect(session_id)
+    assert manager.sweep(time.monotonic() + 120) == 1
+    assert manager.history == {} and "alice" not in manager.counters
+    assert _gauge("test", "users") == 0
+
+
+def test_connection_manager_caps_disconnected_users():
+    manager = main.ConnectionManager("capped", ttl=3600, max_users=2)
+
+    async def scenario():
+        for name in ("a", "b", "c", "d"):
+            await manager.push_user(name, {"hello": name})
+
+    asyncio.run(scenario())
+    assert set(manager.history) == {"c", "d"}
+
+
+def test_encounter_stream_forgets_idle_encounters():
+    stream = EncounterDeltaStream("test-stream", min_interval=0, ttl=60, max_states=3)
+
+    async def scenario():
+        for i in range(5):
+            await stream.publish(f"enc-{i}", {"value": i})
+
+    asyncio.run(scenario())
+    assert list(stream._states) == ["enc-2", "enc-3", "enc-4"]
+    assert json.loads(stream._states["enc-4"].last_frame)["value"] == 4
+    assert stream.sweep(time.monotonic() + 120) == 3
+    assert _gauge("test-stream", "encounters") == 0
+
+
+def test_context_event_queue_drops_oldest_when_full():
+    manager = ContextEventManager(max_queue=2)
+
+    async def scenario():
+        queue = await manager.connect("corr")
+        for i in range(4):
+            await manager.broadcast("corr", {"i": i})
+        drained = [queue.get_nowait()["i"] for _ in range(queue.qsize())]
+        await manager.disconnect("corr", queue)
+        return drained
+
+    assert asyncio.run(scenario()) == [2, 3]
+    assert manager.sweep() == 0
+    assert _gauge("context", "correlations") == 0